@@ -12,7 +12,7 @@ from traceback import format_exc
 
 # Zato
 from zato.common.api import ZATO_NONE
-from zato.common.broker_message import code_to_name
+from zato.common.broker_message import BROKER, code_to_name
 from zato.common.util.api import new_cid
 from zato.common.util.config import resolve_env_variables
 
@@ -37,6 +37,12 @@ class BrokerMessageReceiver:
         (because in this case '1000' is the code for creating a new scheduler's job, see zato.common.broker_message for the list
         of all actions).
         """
+        # A batch of messages is handled one message at a time, in the order that they were published in
+        if msg.get('action') == BROKER.BATCH.value:
+            for item in msg['msg_list']:
+                self.on_broker_msg(item)
+            return
+
         try:
             # Apply pre-processing
             msg = self.preprocess_msg(msg)
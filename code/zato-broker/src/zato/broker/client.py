@@ -22,6 +22,7 @@ from requests import post as requests_post
 from requests.models import Response
 
 # Zato
+from zato.broker.outbound import OutboundQueue
 from zato.common.broker_message import code_to_name, SCHEDULER
 from zato.common.api import URLInfo
 from zato.common.util.config import get_url_protocol_from_config_item
@@ -80,6 +81,9 @@ class BrokerClient:
         # This is used to invoke services
         self.server_rpc = server_rpc
 
+        # Messages to all the servers are sent through this queue, in batches
+        self.outbound_queue = OutboundQueue(self._invoke_all_servers)
+
         self.zato_client = zato_client
         self.scheduler_address = ''
         self.scheduler_auth = None
@@ -236,15 +240,49 @@ class BrokerClient:
         except Exception:
             logger.warning(format_exc())
 
+# ################################################################################################################################
+
+    def _invoke_all_servers(self, msg:'anydict') -> 'any_':
+        """ Sends a message, or a batch of them, to all the servers. Unlike self._rpc_invoke, it raises an exception
+        if any server could not be invoked, which lets the outbound queue keep track of messages that were not sent.
+        """
+        result = self.server_rpc.invoke_all('zato.service.rpc-service-invoker', msg, ping_timeout=10) # type: ignore
+
+        if not result.is_ok:
+            raise Exception('Could not invoke server(s) {}; action:`{}`'.format(result.skipped, code_to_name[msg['action']]))
+
+        return result
+
+# ################################################################################################################################
+
+    def _needs_outbound_queue(self, msg:'anydict', from_scheduler:'bool'=False) -> 'bool':
+
+        # Only messages from servers to all the servers are batched, ..
+        # .. which excludes the ones that the scheduler sends or receives.
+        return bool(self.server_rpc) and (not from_scheduler) and msg['action'] not in to_scheduler_actions
+
+# ################################################################################################################################
+
+    def _publish(self, msg:'anydict', **kwargs:'any_') -> 'None':
+        if self._needs_outbound_queue(msg, **kwargs):
+            self.outbound_queue.put(msg)
+        else:
+            spawn(self._rpc_invoke, msg, **kwargs)
+
 # ################################################################################################################################
 
     def publish(self, msg:'anydict', *ignored_args:'any_', **kwargs:'any_') -> 'any_':
-        spawn(self._rpc_invoke, msg, **kwargs)
+        self._publish(msg, **kwargs)
 
 # ################################################################################################################################
 
     def invoke_async(self, msg:'anydict', *ignored_args:'any_', **kwargs:'any_') -> 'any_':
-        spawn(self._rpc_invoke, msg, **kwargs)
+        self._publish(msg, **kwargs)
+
+# ################################################################################################################################
+
+    def get_outbound_queue_stats(self) -> 'anydict':
+        return self.outbound_queue.get_stats()
 
 # ################################################################################################################################
 
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+from time import monotonic
+from traceback import format_exc
+
+# gevent
+from gevent import spawn
+from gevent.lock import RLock
+from gevent.queue import Empty, Queue
+
+# Zato
+from zato.common.broker_message import BROKER
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import anydict, anylist, callable_
+    from gevent import Greenlet
+
+    Greenlet = Greenlet
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class Default:
+
+    # For how many seconds, at most, messages are collected before they are sent in a single batch
+    flush_interval = 0.05
+
+    # A batch is sent as soon as it has that many messages, without waiting for the flush interval to end
+    max_batch_size = 500
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def build_batch(msg_list:'anylist') -> 'anydict':
+    """ Wraps messages in a single envelope that recipients will unpack and handle in the same order.
+    """
+    return {
+        'action': BROKER.BATCH.value,
+        'msg_list': msg_list,
+    }
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class OutboundQueue:
+    """ Collects messages that are to be sent to all the servers and sends them in batches, one batch at a time,
+    which means that recipients receive them in the same order that they were published in.
+    """
+    def __init__(
+        self,
+        send_func,                             # type: callable_
+        flush_interval=Default.flush_interval, # type: float
+        max_batch_size=Default.max_batch_size, # type: int
+    ) -> 'None':
+
+        self.send_func = send_func
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+
+        self.queue = Queue()
+        self.flusher = None # type: Greenlet | None
+        self.lock = RLock()
+
+        # Statistics
+        self.total_messages = 0
+        self.total_batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+        self.last_send_time_ms = 0.0
+        self.send_errors = 0
+
+# ################################################################################################################################
+
+    def put(self, msg:'anydict') -> 'None':
+
+        # The greenlet sending messages starts only when there is a message to send for the first time ..
+        if not self.flusher:
+            with self.lock:
+                if not self.flusher:
+                    self.flusher = spawn(self._run_flusher)
+
+        # .. and it will pick up this one along with any others published in the same flush interval.
+        self.queue.put(msg)
+
+# ################################################################################################################################
+
+    def _collect_batch(self) -> 'anylist':
+
+        # Wait for the first message ..
+        batch = [self.queue.get()]
+
+        # .. and give others a chance to be published too.
+        deadline = monotonic() + self.flush_interval
+
+        while len(batch) < self.max_batch_size:
+
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except Empty:
+                break
+
+        return batch
+
+# ################################################################################################################################
+
+    def _run_flusher(self) -> 'None':
+
+        while True:
+            batch = self._collect_batch()
+
+            try:
+                self.send_batch(batch)
+            except Exception:
+                self.send_errors += 1
+                logger.warning('Could not send a batch of %d broker message(s) -> %s', len(batch), format_exc())
+
+# ################################################################################################################################
+
+    def send_batch(self, batch:'anylist') -> 'None':
+
+        # There is no need for an envelope if there is only one message
+        msg = batch[0] if len(batch) == 1 else build_batch(batch)
+
+        start = monotonic()
+
+        try:
+            self.send_func(msg)
+        finally:
+            self.last_send_time_ms = (monotonic() - start) * 1000
+
+            batch_size = len(batch)
+
+            self.total_messages += batch_size
+            self.total_batches += 1
+            self.last_batch_size = batch_size
+            self.max_batch_size_seen = max(self.max_batch_size_seen, batch_size)
+
+# ################################################################################################################################
+
+    def get_stats(self) -> 'anydict':
+        return {
+            'depth': self.queue.qsize(),
+            'total_messages': self.total_messages,
+            'total_batches': self.total_batches,
+            'avg_batch_size': round(self.total_messages / self.total_batches, 2) if self.total_batches else 0,
+            'last_batch_size': self.last_batch_size,
+            'max_batch_size': self.max_batch_size_seen,
+            'last_send_time_ms': round(self.last_send_time_ms, 2),
+            'send_errors': self.send_errors,
+        }
+
+# ################################################################################################################################
+# ################################################################################################################################
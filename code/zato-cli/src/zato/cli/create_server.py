@@ -62,6 +62,7 @@ debugger_host=0.0.0.0
 debugger_port=5678
 ipc_host=127.0.0.1
 ipc_port_start=17050
+ipc_use_uds=True
 
 work_dir=../../work
 
@@ -157,6 +158,7 @@ sync_interval = {{events_sync_interval}}
 
 [http]
 methods_allowed=GET, POST, DELETE, PUT, PATCH, HEAD, OPTIONS
+url_cache_max_size=10000 # How many URL paths matched to channels each worker process caches
 
 [stats]
 expire_after=168 # In hours, 168 = 7 days = 1 week
@@ -243,6 +245,17 @@ log_if_wsx_deliv_server_not_found=False
 data_prefix_len=2048
 data_prefix_short_len=64
 sk_server_table_columns=6, 15, 8, 6, 17, 75
+spill_dir=pubsub-spill
+spill_segment_size=16777216
+spill_max_disk_size=1073741824
+spill_refill_max_delivery_depth=1000
+gd_group_commit=False
+gd_group_commit_window=0.002
+gd_group_commit_max_messages=500
+gd_depth_reconcile_interval=5
+delivery_confirm_batch=False
+delivery_confirm_window=0.1
+delivery_confirm_max_messages=1000
 
 [pubsub_meta_topic]
 enabled=True
@@ -265,6 +278,8 @@ hook_service=
 json_library=stdlib
 pings_missed_threshold=2
 ping_interval=30
+broadcast_pool_size=100
+broadcast_queue_size=1000
 
 [content_type]
 json = {JSON}
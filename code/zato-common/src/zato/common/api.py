@@ -425,6 +425,14 @@ class CACHE:
     class TYPE:
         BUILTIN = 'builtin'
         MEMCACHED = 'memcached'
+        SHARED = 'shared'
+
+    class BUILTIN_STORAGE:
+        WORKER = NameId('Each worker process', 'worker')
+        SHARED_MEMORY = NameId('Shared memory', 'shared-memory')
+
+        def __iter__(self):
+            return iter((self.WORKER, self.SHARED_MEMORY))
 
     class BUILTIN_KV_DATA_TYPE:
         STR = NameId('String', 'str')
@@ -469,6 +477,16 @@ class CACHE:
     class DEFAULT:
         MAX_SIZE = 10000
         MAX_ITEM_SIZE = 10000 # In characters for string/unicode, bytes otherwise
+        MAX_BYTES = 0 # Approximate memory budget of a whole cache, 0 means no limit
+        SHARED_DATA_SIZE = 50_000_000 # In bytes, for keys and values of shared-memory caches without max_bytes
+
+    class KEY_INDEX:
+        NO_INDEX = NameId('No key index', 'no-index')
+        PREFIX_SUFFIX = NameId('Prefixes and suffixes', 'prefix-suffix')
+        PREFIX_SUFFIX_CONTAINS = NameId('Prefixes, suffixes and substrings', 'prefix-suffix-contains')
+
+        def __iter__(self):
+            return iter((self.NO_INDEX, self.PREFIX_SUFFIX, self.PREFIX_SUFFIX_CONTAINS))
 
     class PERSISTENT_STORAGE:
         NO_PERSISTENT_STORAGE = NameId('No persistent storage', 'no-persistent-storage')
@@ -480,9 +498,18 @@ class CACHE:
     class SYNC_METHOD:
         NO_SYNC = NameId('No synchronization', 'no-sync')
         IN_BACKGROUND = NameId('In background', 'in-background')
+        BATCHED = NameId('In background, batched', 'batched')
 
         def __iter__(self):
-            return iter((self.NO_SYNC, self.IN_BACKGROUND))
+            return iter((self.NO_SYNC, self.IN_BACKGROUND, self.BATCHED))
+
+    class SYNC_BATCH:
+
+        # How long, in milliseconds, state changes are collected before they are sent to other workers
+        WINDOW = 5
+
+        # How many state changes, at most, a single batch can contain before it is sent out
+        SIZE = 500
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -744,6 +771,9 @@ class HTTP_SOAP:
 
     UNUSED_MARKER = 'unused'
 
+    # How many URL paths, along with channels they were matched to, each worker process caches by default
+    URL_CACHE_MAX_SIZE = 10_000
+
     class ACCEPT:
         ANY = '*/*'
         ANY_INTERNAL = 'haany'
@@ -1172,11 +1202,12 @@ class TLS:
 
 class RATE_LIMIT:
     class TYPE:
-        APPROXIMATE = NameId('Approximate', 'APPROXIMATE')
-        EXACT       = NameId('Exact', 'EXACT')
+        APPROXIMATE  = NameId('Approximate', 'APPROXIMATE')
+        EXACT        = NameId('Exact', 'EXACT')
+        EXACT_IN_RAM = NameId('Exact, in RAM', 'EXACT_IN_RAM')
 
         def __iter__(self):
-            return iter((self.APPROXIMATE, self.EXACT))
+            return iter((self.APPROXIMATE, self.EXACT, self.EXACT_IN_RAM))
 
     class OBJECT_TYPE:
         HTTP_SOAP = 'http_soap'
@@ -1850,6 +1881,14 @@ class Stats:
     # We use milliseconds because that makes it easier to construct tests.
     MaxRetention = 1000 * 60 * 60 * 24 * 365 * 2
 
+    # For how long rollups of each granularity are kept, in milliseconds - per-minute ones for a week,
+    # hourly ones for ninety days and daily ones for as long as raw events are kept by default.
+    RollupMaxRetention = {
+        'minute': 1000 * 60 * 60 * 24 * 7,
+        'hour':   1000 * 60 * 60 * 24 * 90,
+        'day':    MaxRetention,
+    }
+
     # By default, statistics will be aggregated into time buckets of that duration
     DefaultAggrTimeFreq = '5min' # Five minutes
 
@@ -1870,6 +1909,14 @@ class StatsKey:
     PerKeyLastTimestamp = 'last_timestamp'
     PerKeyLastDuration  = 'last_duration'
 
+    PerKeyTotalTime = 'total_time'
+    PerKeySketch    = 'sketch'
+
+    PerKeyP50  = 'p50'
+    PerKeyP90  = 'p90'
+    PerKeyP99  = 'p99'
+    PerKeyP999 = 'p99_9'
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -481,6 +481,8 @@ class CACHE(Constants):
     MEMCACHED_EDIT = ValueConstant('')
     MEMCACHED_DELETE = ValueConstant('')
 
+    BUILTIN_STATE_CHANGED_BATCH = ValueConstant('')
+
 class GENERIC(Constants):
     code_start = 107000
 
@@ -506,10 +508,19 @@ class SERVER_IPC(Constants):
     code_start = 107600
     INVOKE = ValueConstant('')
 
+class CLUSTER(Constants):
+    code_start = 107700
+    SERVER_JOINED = ValueConstant('')
+    SERVER_LEFT = ValueConstant('')
+
 class Common(Constants):
     code_start = 107800
     Sync_Objects = ValueConstant('')
 
+class BROKER(Constants):
+    code_start = 107900
+    BATCH = ValueConstant('')
+
 code_to_name = {}
 
 # To prevent 'RuntimeError: dictionary changed size during iteration'
@@ -19,7 +19,7 @@ from gevent.lock import RLock
 from orjson import dumps
 
 # Zato
-from zato.common.events.common import Action
+from zato.common.events.common import Action, encode_push_batch
 from zato.common.typing_ import asdict
 from zato.common.util.api import new_cid
 from zato.common.util.json_ import json_loads
@@ -91,10 +91,16 @@ class Client:
 # ################################################################################################################################
 
     def send(self, action, data=b''):
+        # type: (bytes, bytes) -> None
+        self.send_frame(action + data + b'\n')
+
+# ################################################################################################################################
+
+    def send_frame(self, frame):
         # type: (bytes) -> None
         with self.lock:
             try:
-                self.socket.sendall(action + data + b'\n')
+                self.socket.sendall(frame)
             except Exception as e:
                 self.is_connected = False
                 logger.info('Socket send error `%s` -> %s', e.args, self.remote_addr_str)
@@ -151,6 +157,17 @@ class Client:
         # .. and send it across (there will be no response).
         self.send(Action.Push, data)
 
+# ################################################################################################################################
+
+    def push_batch(self, ctx_list):
+        # type: (list) -> None
+
+        # Serialise all the contexts to a single length-prefixed frame ..
+        frame = encode_push_batch(ctx_list)
+
+        # .. and send it across (there will be no response).
+        self.send_frame(frame)
+
 # ################################################################################################################################
 
     def get_table(self):
@@ -7,10 +7,14 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
+from struct import Struct
 from typing import Optional as optional
 
+# orjson
+from orjson import dumps, loads
+
 # Zato
-from zato.common.typing_ import dataclass
+from zato.common.typing_ import dataclass, fields
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -26,6 +30,15 @@ class Default:
     # .. or once in that many seconds.
     sync_interval = 30
 
+    # Clients send events in batches of up to that many events ..
+    push_batch_size = 1000
+
+    # .. or once in that many seconds, whichever comes first ..
+    push_flush_interval = 0.1
+
+    # .. and events that do not fit in a client's backlog of that size are dropped.
+    push_max_backlog = 100_000
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -50,6 +63,7 @@ class Action:
     GetTable       = b'04'
     GetTableReply  = b'05'
     SyncState      = b'06'
+    PushBatch      = b'07'
 
     LenAction = len(Ping)
 
@@ -79,3 +93,47 @@ class PushCtx:
 
 # ################################################################################################################################
 # ################################################################################################################################
+# ################################################################################################################################
+
+# Each batch of events is sent as its action, the length of its payload and the payload itself
+_batch_len = Struct('>I')
+LenBatchLen = _batch_len.size
+
+# Payloads of batches are made of one column per each of these fields
+_push_ctx_fields = [elem.name for elem in fields(PushCtx)]
+
+# ################################################################################################################################
+
+def encode_push_batch(ctx_list, _fields=_push_ctx_fields, _pack=_batch_len.pack):
+    """ Turns a list of PushCtx objects into a frame to send to the events server. Events are stored by column,
+    i.e. each field is serialised once for the whole batch rather than once for each event.
+    """
+    # type: (list) -> bytes
+    columns = {}
+
+    for name in _fields:
+        columns[name] = [getattr(ctx, name) for ctx in ctx_list]
+
+    payload = dumps(columns)
+    return Action.PushBatch + _pack(len(payload)) + payload
+
+# ################################################################################################################################
+
+def decode_push_batch_len(data, _unpack=_batch_len.unpack):
+    """ Returns the length of a batch's payload, given LenBatchLen bytes that follow its action.
+    """
+    # type: (bytes) -> int
+    return _unpack(data)[0]
+
+# ################################################################################################################################
+
+def decode_push_batch(payload):
+    """ Turns the payload of a batch back into a list of events, each one a dict.
+    """
+    # type: (bytes) -> list
+    columns = loads(payload) # type: dict
+    names = list(columns)
+
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+# ################################################################################################################################
@@ -70,7 +70,7 @@ class InRAMStore:
 
     def should_sync(self):
         # type: () -> bool
-        sync_by_threshold = self.num_events_since_sync % self.sync_threshold == 0
+        sync_by_threshold = self.num_events_since_sync >= self.sync_threshold
         sync_by_time = (utcnow() - self.last_sync_time).total_seconds() >= self.sync_interval
 
         return sync_by_threshold or sync_by_time
@@ -82,11 +82,12 @@ class InRAMStore:
 
 # ################################################################################################################################
 
-    def post_modify_state(self):
+    def post_modify_state(self, len_events=1):
+        # type: (int) -> None
 
         # .. update counters ..
-        self.num_events_since_sync += 1
-        self.total_events += 1
+        self.num_events_since_sync += len_events
+        self.total_events += len_events
 
         # .. check if sync is needed only if our class implements the method ..
         if self.sync_state:
@@ -116,5 +117,24 @@ class InRAMStore:
             # .. update metadata and, possibly, sync state (storage).
             self.post_modify_state()
 
+# ################################################################################################################################
+
+    def access_state_many(self, opcode, data_list):
+        """ Like access_state but for a list of events at once - the lock is acquired and state is possibly synced
+        only once for the whole list.
+        """
+        # type: (str, list) -> None
+        with self.update_lock:
+
+            # Maps the incoming upcode to an actual function to handle data ..
+            func = self.opcode_to_func[opcode]
+
+            # .. store each event in RAM ..
+            for data in data_list:
+                func(data)
+
+            # .. update metadata and, possibly, sync state (storage).
+            self.post_modify_state(len(data_list))
+
 # ################################################################################################################################
 # ################################################################################################################################
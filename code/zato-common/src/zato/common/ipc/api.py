@@ -8,19 +8,22 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 # stdlib
 import logging
+import os
 
 # Zato
 from zato.common.api import IPC
 from zato.common.ipc.client import IPCClient
 from zato.common.ipc.server import IPCServer
-from zato.common.util.api import fs_safe_name, load_ipc_pid_port
+from zato.common.ipc.uds import UDSIPCClient, UDSIPCServer, UDSNotAvailable
+from zato.common.util.api import fs_safe_name, get_ipc_pid_socket_path, load_ipc_pid_port
+from zato.common.util.platform_ import is_posix
 
 # ################################################################################################################################
 # ################################################################################################################################
 
 if 0:
     from zato.common.ipc.client import IPCResponse
-    from zato.common.typing_ import callable_
+    from zato.common.typing_ import callable_, intnone
     from zato.server.base.parallel import ParallelServer
 
 # ################################################################################################################################
@@ -45,6 +48,18 @@ class IPCAPI:
         self.username = IPC.Credentials.Username
         self.password = ''
 
+        # Whether to invoke other processes over Unix domain sockets, with HTTP used only if they are not available
+        self.use_uds = is_posix
+
+        # Our own Unix domain socket server, if any
+        self.uds_server = None # type: UDSIPCServer | None
+
+        # Connections to other processes, by their PIDs ..
+        self.uds_clients = {} # type: dict[int, UDSIPCClient]
+
+        # .. and HTTP ports of the ones that we do not have such a connection to.
+        self.pid_ports = {} # type: dict[int, int]
+
 # ################################################################################################################################
 
     def set_password(self, password:'str') -> 'None':
@@ -79,6 +94,59 @@ class IPCAPI:
             server_type_suffix=server_type_suffix
         )
 
+# ################################################################################################################################
+
+    def start_uds_server(self, cluster_name:'str', server_name:'str', pid:'int', callback_func:'callable_') -> 'None':
+        """ Starts a server accepting IPC requests over a Unix domain socket. Returns once the socket can be connected to.
+        """
+        socket_path = get_ipc_pid_socket_path(cluster_name, server_name, pid)
+
+        self.uds_server = UDSIPCServer(socket_path, self.username, self.password, callback_func)
+        self.uds_server.start()
+
+# ################################################################################################################################
+
+    def stop_uds_server(self) -> 'None':
+
+        if self.uds_server:
+            self.uds_server.stop()
+
+        for client in self.uds_clients.values():
+            client.close()
+
+# ################################################################################################################################
+
+    def _get_uds_client(self, cluster_name:'str', server_name:'str', target_pid:'int') -> 'UDSIPCClient | None':
+
+        # We already have a client for that PID ..
+        if client := self.uds_clients.get(target_pid):
+            return client
+
+        # .. otherwise, we need to check if the process listens on a socket, which it will not do,
+        # .. for instance, if it is of a version that supports HTTP only ..
+        socket_path = get_ipc_pid_socket_path(cluster_name, server_name, target_pid)
+
+        if not os.path.exists(socket_path):
+            return
+
+        # .. if we are here, it means that it does.
+        client = UDSIPCClient(socket_path, self.username, self.password)
+        self.uds_clients[target_pid] = client
+
+        return client
+
+# ################################################################################################################################
+
+    def _get_ipc_port(self, cluster_name:'str', server_name:'str', target_pid:'int') -> 'int':
+
+        port = self.pid_ports.get(target_pid) # type: intnone
+
+        if not port:
+            port = load_ipc_pid_port(cluster_name, server_name, target_pid)
+            self.pid_ports[target_pid] = port
+
+        return port
+
 # ################################################################################################################################
 
     def invoke_by_pid(
@@ -94,11 +162,33 @@ class IPCAPI:
         """ Invokes a service in a specific process synchronously through IPC.
         """
 
+        # Try to use a connection to the process that is already open ..
+        if self.use_uds:
+            if client := self._get_uds_client(cluster_name, server_name, target_pid):
+                try:
+                    return client.invoke(
+                        service,
+                        request,
+                        cluster_name=cluster_name,
+                        server_name=server_name,
+                        server_pid=target_pid,
+                        timeout=timeout,
+                        source_server_name=self.parallel_server.name,
+                        source_server_pid=self.parallel_server.pid,
+                    )
+
+                # .. which may not be possible, e.g. if the process stopped, in which case we fall back to HTTP ..
+                except UDSNotAvailable as e:
+                    logger.info('Using HTTP IPC for %s:%s:%s -> %s', cluster_name, server_name, target_pid, e)
+                    _ = self.uds_clients.pop(target_pid, None)
+
+        # .. if we are here, it means that we need to use HTTP.
+
         # This is constant
         ipc_host = '127.0.0.1'
 
         # Get the port that we can find the PID listening on
-        ipc_port = load_ipc_pid_port(cluster_name, server_name, target_pid)
+        ipc_port = self._get_ipc_port(cluster_name, server_name, target_pid)
 
         # Log what we are about to do
         log_msg = f'Invoking {service} on {cluster_name}:{server_name}:{target_pid}-tcp:{ipc_port}'
@@ -122,5 +212,15 @@ class IPCAPI:
         )
         return response
 
+# ################################################################################################################################
+
+    def forget_pid(self, pid:'int') -> 'None':
+        """ Closes the connection to a process and forgets its port, e.g. because the process stopped.
+        """
+        if client := self.uds_clients.pop(pid, None):
+            client.close()
+
+        _ = self.pid_ports.pop(pid, None)
+
 # ################################################################################################################################
 # ################################################################################################################################
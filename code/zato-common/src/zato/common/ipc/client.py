@@ -51,6 +51,33 @@ class IPCResponse:
 # ################################################################################################################################
 # ################################################################################################################################
 
+def build_ipc_request(service:'str', request:'any_', source_server_name:'str', source_server_pid:'int') -> 'anydict':
+    return {
+        'source_server_name': source_server_name,
+        'source_server_pid':  source_server_pid,
+        'action':   SERVER_IPC.INVOKE.value,
+        'service':  service,
+        'data': request,
+    }
+
+# ################################################################################################################################
+
+def build_ipc_response(response:'anydict', cluster_name:'str', server_name:'str', server_pid:'int') -> 'IPCResponse':
+
+    ipc_response = IPCResponse()
+    ipc_response.data = response['response'] or None
+    ipc_response.meta = IPCResponseMeta()
+    ipc_response.meta.cid = response['cid']
+    ipc_response.meta.is_ok = response['status'] == Common_IPC.Status_OK
+    ipc_response.meta.cluster_name = cluster_name
+    ipc_response.meta.server_name = server_name
+    ipc_response.meta.server_pid = server_pid
+
+    return ipc_response
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 class IPCClient:
 
     def __init__(
@@ -88,13 +115,7 @@ class IPCClient:
         url = f'{self.api_protocol}://{self.host}:{self.port}/{url_path}'
 
         # .. prepare the full request ..
-        dict_data = {
-            'source_server_name': source_server_name,
-            'source_server_pid':  source_server_pid,
-            'action':   SERVER_IPC.INVOKE.value,
-            'service':  service,
-            'data': request,
-        }
+        dict_data = build_ipc_request(service, request, source_server_name, source_server_pid)
 
         # .. serialize it into JSON ..
         data = dumps(dict_data)
@@ -136,17 +157,8 @@ class IPCClient:
         # .. de-serialize the response ..
         response = loads(response.text)
 
-        ipc_response = IPCResponse()
-        ipc_response.data = response['response'] or None
-        ipc_response.meta = IPCResponseMeta()
-        ipc_response.meta.cid = response['cid']
-        ipc_response.meta.is_ok = response['status'] == Common_IPC.Status_OK
-        ipc_response.meta.cluster_name = cluster_name
-        ipc_response.meta.server_name = server_name
-        ipc_response.meta.server_pid = server_pid
-
         # .. and return its response.
-        return ipc_response
+        return build_ipc_response(response, cluster_name, server_name, server_pid)
 
 # ################################################################################################################################
 
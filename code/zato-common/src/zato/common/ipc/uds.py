@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from hmac import compare_digest
+from itertools import count
+from logging import getLogger
+from struct import Struct
+from traceback import format_exc
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent import socket, spawn, Timeout
+from gevent.event import AsyncResult
+from gevent.lock import RLock, Semaphore
+from gevent.server import StreamServer
+
+# orjson
+from orjson import dumps, loads
+
+# Zato
+from zato.common.api import IPC
+from zato.common.broker_message import SERVER_IPC
+from zato.common.ipc.client import build_ipc_request, build_ipc_response
+from zato.common.util.api import new_cid
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.ipc.client import IPCResponse
+    from zato.common.typing_ import any_, anydict, callable_
+
+    IPCResponse = IPCResponse
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# Each frame is the length of its payload and the ID of the request that the payload belongs to, followed by the payload itself
+_header = Struct('>IQ')
+_header_len = _header.size
+
+# Frames with this ID are used only when a connection is established, to check credentials
+_handshake_request_id = 0
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class Default:
+
+    # For how many seconds to wait for a connection to another process
+    connect_timeout = 2
+
+    # Frames larger than that are rejected
+    max_frame_size = 100_000_000
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class UDSNotAvailable(Exception):
+    """ Raised if a connection to another process cannot be established, in which case callers can use HTTP instead,
+    knowing that the process did not receive the request.
+    """
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def _read_frame(reader:'any_') -> 'tuple':
+    """ Returns the ID and payload of the next frame read or raises an exception if the connection was closed.
+    """
+    header = reader.read(_header_len)
+
+    if len(header) < _header_len:
+        raise EOFError('Connection closed')
+
+    payload_len, request_id = _header.unpack(header)
+
+    if payload_len > Default.max_frame_size:
+        raise ValueError('Frame too large -> {} > {}'.format(payload_len, Default.max_frame_size))
+
+    payload = reader.read(payload_len)
+
+    if len(payload) < payload_len:
+        raise EOFError('Connection closed')
+
+    return request_id, payload
+
+# ################################################################################################################################
+
+def _build_frame(request_id:'int', payload:'bytes') -> 'bytes':
+    return _header.pack(len(payload), request_id) + payload
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class UDSIPCServer:
+    """ Accepts IPC requests from other processes over a Unix domain socket. Each connection is kept open
+    and requests received through it are handled concurrently, each response carrying the ID of its request.
+    """
+    cid_prefix = 'zipc'
+
+    def __init__(self, socket_path:'str', username:'str', password:'str', callback_func:'callable_') -> 'None':
+        self.socket_path = socket_path
+        self.username = username
+        self.password = password
+        self.callback_func = callback_func
+        self.server = None # type: StreamServer | None
+
+        # Connections currently open, closed when the server stops
+        self.connections = set() # type: set[socket.socket]
+
+# ################################################################################################################################
+
+    def start(self) -> 'None':
+
+        # A socket left over by a previous process of the same PID
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.socket_path)
+
+        # Only processes of the same user can connect to us
+        os.chmod(self.socket_path, 0o600)
+
+        listener.listen(128)
+
+        # This returns immediately and connections are accepted in background
+        self.server = StreamServer(listener, self._on_connection)
+        self.server.start()
+
+        logger.info('IPC server listening on %s', self.socket_path)
+
+# ################################################################################################################################
+
+    def stop(self) -> 'None':
+
+        if self.server:
+            self.server.stop()
+
+        # Clients still connected will notice that we stopped and will not send any more requests through this socket
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+# ################################################################################################################################
+
+    def _check_credentials(self, payload:'bytes') -> 'bool':
+        credentials = loads(payload)
+        username = (credentials.get('username') or '').encode('utf8')
+        password = (credentials.get('password') or '').encode('utf8')
+
+        is_username_ok = compare_digest(username, self.username.encode('utf8'))
+        is_password_ok = compare_digest(password, self.password.encode('utf8'))
+
+        return is_username_ok and is_password_ok
+
+# ################################################################################################################################
+
+    def _on_connection(self, conn:'socket.socket', _ignored_address:'any_') -> 'None':
+
+        reader = conn.makefile('rb')
+        self.connections.add(conn)
+
+        # Responses to concurrent requests are written to the same connection, one at a time
+        write_lock = Semaphore()
+
+        try:
+
+            # The first frame must contain credentials ..
+            request_id, payload = _read_frame(reader)
+
+            if not (request_id == _handshake_request_id and self._check_credentials(payload)):
+                logger.info('IPC credentials error (%s)', self.socket_path)
+                return
+
+            conn.sendall(_build_frame(_handshake_request_id, dumps({'status': IPC.Status_OK})))
+
+            # .. and each subsequent one is a request that we handle in background,
+            # .. to be able to read the next one before the previous one is responded to.
+            while True:
+                request_id, payload = _read_frame(reader)
+                _ = spawn(self._handle_request, conn, write_lock, request_id, payload)
+
+        except EOFError:
+            pass
+
+        except Exception:
+            logger.info('IPC connection error (%s) -> %s', self.socket_path, format_exc())
+
+        finally:
+            self.connections.discard(conn)
+            reader.close()
+            conn.close()
+
+# ################################################################################################################################
+
+    def _handle_request(self, conn:'socket.socket', write_lock:'Semaphore', request_id:'int', payload:'bytes') -> 'None':
+
+        cid = '{}{}'.format(self.cid_prefix, new_cid())
+        response = {}
+
+        try:
+            request = loads(payload)
+            request = Bunch(request)
+
+            # This is the only action that IPC servers support
+            if request.get('action') != SERVER_IPC.INVOKE.value:
+                raise ValueError('Unsupported action `{}`'.format(request.get('action')))
+
+            response = self.callback_func(request)
+            status = IPC.Status_OK
+
+        except Exception:
+            logger.warning(format_exc())
+            status = 'error'
+
+        # The same response as the one returned over HTTP
+        data = dumps({
+            'cid': cid,
+            'status': status,
+            'response': response,
+        })
+
+        try:
+            with write_lock:
+                conn.sendall(_build_frame(request_id, data))
+        except Exception as e:
+            logger.info('IPC response could not be sent (%s) -> %s', self.socket_path, e)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class UDSIPCClient:
+    """ Invokes another process over a Unix domain socket. A single connection is kept open and reused by all the callers,
+    each of which can have its request in flight at the same time as the other ones.
+    """
+    def __init__(
+        self,
+        socket_path, # type: str
+        username,    # type: str
+        password,    # type: str
+        connect_timeout = Default.connect_timeout # type: float
+    ) -> 'None':
+        self.socket_path = socket_path
+        self.username = username
+        self.password = password
+        self.connect_timeout = connect_timeout
+
+        self.conn = None # type: socket.socket | None
+
+        # Requests waiting for their responses, by request ID
+        self.in_flight = {} # type: dict[int, AsyncResult]
+
+        # ID 0 is reserved for handshakes
+        self.request_id = count(1)
+
+        self.connect_lock = RLock()
+        self.write_lock = Semaphore()
+
+# ################################################################################################################################
+
+    def connect(self) -> 'None':
+
+        with self.connect_lock:
+
+            # Another greenlet has already connected while we were waiting for the lock
+            if self.conn:
+                return
+
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            try:
+                conn.settimeout(self.connect_timeout)
+                conn.connect(self.socket_path)
+
+                # Send our credentials ..
+                credentials = dumps({'username': self.username, 'password': self.password})
+                conn.sendall(_build_frame(_handshake_request_id, credentials))
+
+                # .. and confirm that they were accepted.
+                reader = conn.makefile('rb')
+                _, payload = _read_frame(reader)
+
+                if loads(payload).get('status') != IPC.Status_OK:
+                    raise ValueError('Handshake rejected')
+
+            except Exception as e:
+                conn.close()
+                raise UDSNotAvailable('Could not connect to {} -> {}'.format(self.socket_path, e))
+
+            # Responses are waited for with timeouts of their own
+            conn.settimeout(None)
+
+            self.conn = conn
+            _ = spawn(self._read_responses, conn, reader)
+
+# ################################################################################################################################
+
+    def _read_responses(self, conn:'socket.socket', reader:'any_') -> 'None':
+
+        try:
+            while True:
+                request_id, payload = _read_frame(reader)
+
+                # The caller may have stopped waiting for it already
+                if result := self.in_flight.pop(request_id, None):
+                    result.set(payload)
+
+        except Exception as e:
+            self._on_disconnected(conn, e)
+
+        finally:
+            reader.close()
+
+# ################################################################################################################################
+
+    def _on_disconnected(self, conn:'socket.socket', error:'Exception') -> 'None':
+
+        # We may have connected again in the meantime
+        if self.conn is conn:
+            self.conn = None
+
+        conn.close()
+
+        # All the requests that were sent through this connection will not receive their responses
+        for request_id, result in list(self.in_flight.items()):
+            _ = self.in_flight.pop(request_id, None)
+            result.set_exception(ConnectionError('IPC connection closed ({}) -> {}'.format(self.socket_path, error)))
+
+# ################################################################################################################################
+
+    def invoke_raw(self, request:'anydict', timeout:'float'=IPC.Default.Timeout) -> 'anydict':
+        """ Sends a request and returns the response as it was received, raising UDSNotAvailable if no connection
+        could be established, in which case the request was not sent.
+        """
+        if not self.conn:
+            self.connect()
+
+        conn = self.conn
+        request_id = next(self.request_id)
+
+        result = AsyncResult()
+        self.in_flight[request_id] = result
+
+        try:
+            frame = _build_frame(request_id, dumps(request))
+
+            try:
+                with self.write_lock:
+                    conn.sendall(frame) # type: ignore
+            except OSError as e:
+                self._on_disconnected(conn, e) # type: ignore
+                raise
+
+            try:
+                payload = result.get(timeout=timeout)
+            except Timeout:
+                raise TimeoutError('IPC response not received in {}s ({}) -> {}'.format(
+                    timeout, self.socket_path, request.get('service')))
+
+        finally:
+            _ = self.in_flight.pop(request_id, None)
+
+        return loads(payload)
+
+# ################################################################################################################################
+
+    def invoke(
+        self,
+        service,    # type: str
+        request,    # type: any_
+        *,
+        cluster_name, # type: str
+        server_name,  # type: str
+        server_pid,   # type: int
+        timeout=IPC.Default.Timeout, # type: float
+        source_server_name, # type: str
+        source_server_pid,  # type: int
+    ) -> 'IPCResponse':
+
+        request = build_ipc_request(service, request, source_server_name, source_server_pid)
+        response = self.invoke_raw(request, timeout)
+
+        return build_ipc_response(response, cluster_name, server_name, server_pid)
+
+# ################################################################################################################################
+
+    def close(self) -> 'None':
+        if conn := self.conn:
+            self._on_disconnected(conn, ConnectionAbortedError('Client closed'))
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -11,6 +11,7 @@ from contextlib import closing
 from logging import getLogger
 
 # gevent
+from gevent import sleep, spawn
 from gevent.lock import RLock
 
 # netaddr
@@ -20,19 +21,23 @@ from netaddr import IPNetwork
 from sqlalchemy import and_
 
 # Zato
-from zato.common.rate_limiting.common import Const, DefinitionItem, ObjectInfo
-from zato.common.rate_limiting.limiter import Approximate, Exact, RateLimitStateDelete, RateLimitStateTable
+from zato.common.rate_limiting.common import Const, DefinitionItem, NetworkTable, ObjectInfo
+from zato.common.rate_limiting.limiter import Approximate, Exact, ExactInRAM, ODBCounterStore, RateLimitStateDelete, \
+     RateLimitStateTable
 
 # ################################################################################################################################
 # ################################################################################################################################
 
 if 0:
-    from zato.common.rate_limiting.limiter import BaseLimiter
-    from zato.common.typing_ import callable_, dict_, list_, strdict
+    from gevent import Greenlet
+    from zato.common.rate_limiting.limiter import BaseLimiter, CounterStore
+    from zato.common.typing_ import anylist, callable_, dict_, list_, strdict
     from zato.distlock import LockManager
 
     # For pyflakes
     BaseLimiter = BaseLimiter
+    CounterStore = CounterStore
+    Greenlet = Greenlet
     LockManager = LockManager
 
 # ################################################################################################################################
@@ -139,7 +144,8 @@ class DefinitionParser:
 class RateLimiting:
     """ Main API for the management of rate limiting functionality.
     """
-    __slots__ = 'parser', 'config_store', 'lock', 'sql_session_func', 'global_lock_func', 'cluster_id'
+    __slots__ = 'parser', 'config_store', 'lock', 'sql_session_func', 'global_lock_func', 'cluster_id', 'counter_store', \
+        'flusher'
 
     def __init__(self) -> 'None':
         self.parser = DefinitionParser() # type: DefinitionParser
@@ -149,6 +155,10 @@ class RateLimiting:
         self.sql_session_func = None     # type: callable_
         self.cluster_id = None           # type: int
 
+        # Used by in-RAM limiters - both are created only when the first such limiter is
+        self.counter_store = None        # type: CounterStore
+        self.flusher = None              # type: Greenlet
+
 # ################################################################################################################################
 
     def _get_config_key(self, object_type:'str', object_name:'str') -> 'str':
@@ -162,7 +172,27 @@ class RateLimiting:
 
 # ################################################################################################################################
 
-    def _create_config(self, object_dict:'strdict', definition:'str', is_exact:'bool') -> 'BaseLimiter':
+    def _get_in_ram_config(self) -> 'ExactInRAM':
+
+        # Unless we were given another one, counters are added up in the ODB ..
+        if not self.counter_store:
+            self.counter_store = ODBCounterStore(self.sql_session_func)
+
+        # .. and we need to flush them there periodically.
+        if not self.flusher:
+            self.flusher = spawn(self._run_flusher)
+
+        return ExactInRAM(self.cluster_id, self.counter_store)
+
+# ################################################################################################################################
+
+    def _create_config(
+        self,
+        object_dict, # type: strdict
+        definition,  # type: str
+        is_exact,    # type: bool
+        is_in_ram=False # type: bool
+    ) -> 'BaseLimiter':
 
         object_id = object_dict['id']
         object_type = object_dict['type_']
@@ -181,18 +211,25 @@ class RateLimiting:
         else:
             has_from_any = False
 
-        config = Exact(self.cluster_id, self.sql_session_func) if is_exact else Approximate(self.cluster_id) # type: BaseLimiter
+        if is_exact:
+            if is_in_ram:
+                config = self._get_in_ram_config()
+            else:
+                config = Exact(self.cluster_id, self.sql_session_func)
+        else:
+            config = Approximate(self.cluster_id)
         config.is_active = object_dict['is_active']
         config.is_exact = is_exact
         config.api = self
         config.object_info = info
         config.definition = parsed
+        config.network_table = NetworkTable(parsed)
         config.parent_type = object_dict['parent_type']
         config.parent_name = object_dict['parent_name']
+        config.has_from_any = has_from_any
 
         if has_from_any:
 
-            config.has_from_any = has_from_any
             config.from_any_rate = def_first.rate
             config.from_any_unit = def_first.unit
 
@@ -204,8 +241,8 @@ class RateLimiting:
 
 # ################################################################################################################################
 
-    def create(self, object_dict:'strdict', definition:'str', is_exact:'bool') -> 'None':
-        config = self._create_config(object_dict, definition, is_exact)
+    def create(self, object_dict:'strdict', definition:'str', is_exact:'bool', is_in_ram:'bool'=False) -> 'None':
+        config = self._create_config(object_dict, definition, is_exact, is_in_ram)
         self.config_store[config.get_config_key()] = config
 
 # ################################################################################################################################
@@ -247,7 +284,10 @@ class RateLimiting:
         limiter = self.config_store[config_key] # type: BaseLimiter
         del self.config_store[config_key]
 
-        if limiter.is_exact:
+        if isinstance(limiter, ExactInRAM):
+            limiter.counter_store.delete_object(object_type, limiter.object_info.id)
+
+        elif limiter.is_exact:
             self._delete_from_odb(object_type, limiter.object_info.id)
 
         if remove_parent:
@@ -280,7 +320,15 @@ class RateLimiting:
 
 # ################################################################################################################################
 
-    def edit(self, object_type:'str', old_object_name:'str', object_dict:'strdict', definition:'str', is_exact:'bool') -> 'None':
+    def edit(
+        self,
+        object_type,     # type: str
+        old_object_name, # type: str
+        object_dict,     # type: strdict
+        definition,      # type: str
+        is_exact,        # type: bool
+        is_in_ram=False  # type: bool
+    ) -> 'None':
         """ Changes, in place, an existing configuration entry to input data.
         """
 
@@ -298,7 +346,7 @@ class RateLimiting:
                     old_config.object_info.type_, object_type, old_object_name, object_dict))
 
             # Now, create a new config object ..
-            new_config = self._create_config(object_dict, definition, is_exact)
+            new_config = self._create_config(object_dict, definition, is_exact, is_in_ram)
 
             # .. in case it was a rename ..
             if old_config.object_info.name != new_config.object_info.name:
@@ -350,5 +398,65 @@ class RateLimiting:
         for config in self.config_store.values(): # type: BaseLimiter
             config.cleanup()
 
+# ################################################################################################################################
+# ################################################################################################################################
+
+    def flush(self) -> 'None':
+        """ Adds up counters of all in-RAM limiters in the counter store, in one batch, updates the limiters
+        with totals that the store returns and deletes from the store periods that the limiters no longer need.
+        """
+        with self.lock:
+            limiters = [elem for elem in self.config_store.values() if isinstance(elem, ExactInRAM)]
+
+        by_limiter = []
+        items = []
+
+        for limiter in limiters:
+            pending = limiter.get_pending()
+            if pending:
+                by_limiter.append((limiter, pending))
+                items.extend(elem[1] for elem in pending)
+
+        if items:
+            self._flush_counters(by_limiter, items)
+
+        # Periods that limiters no longer need are deleted from the store here rather than when limits are checked
+        for limiter in limiters:
+            periods = limiter.get_deleted_periods()
+            if periods:
+                try:
+                    self.counter_store.delete_periods(limiter.object_info.type_, limiter.object_info.id, periods)
+                except Exception:
+                    logger.warning('Rate limiting periods could not be deleted, will retry later', exc_info=True)
+                    limiter.restore_deleted_periods(periods)
+
+# ################################################################################################################################
+
+    def _flush_counters(self, by_limiter:'anylist', items:'anylist') -> 'None':
+
+        try:
+            totals = self.counter_store.incr_many(self.cluster_id, items)
+        except Exception:
+            logger.warning('Rate limiting counters could not be flushed, will retry later', exc_info=True)
+
+            # We did not send anything so the counters need to be flushed the next time
+            for limiter, pending in by_limiter:
+                limiter.restore_pending(pending)
+        else:
+            idx = 0
+            for limiter, pending in by_limiter:
+                limiter.set_totals(pending, totals[idx:idx+len(pending)])
+                idx += len(pending)
+
+# ################################################################################################################################
+
+    def _run_flusher(self) -> 'None':
+        while True:
+            sleep(Const.in_ram_flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.warning('Exception in rate limiting flusher', exc_info=True)
+
 # ################################################################################################################################
 # ################################################################################################################################
@@ -10,7 +10,11 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 # ################################################################################################################################
 
 if 0:
-    from zato.common.typing_ import any_, strset
+    from netaddr import IPAddress
+    from zato.common.typing_ import any_, intnone, list_, strset
+
+    # For pyflakes
+    IPAddress = IPAddress
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -32,6 +36,12 @@ class Const:
     from_any = '*'
     rate_any = '*'
 
+    # How many addresses each limiter keeps the definition lines they matched for
+    ip_address_cache_max_size = 1000
+
+    # How often in-RAM limiters add their counters up in a store shared by all servers, in seconds
+    in_ram_flush_interval = 1
+
     class Unit:
         minute = 'm'
         hour   = 'h'
@@ -74,3 +84,53 @@ class DefinitionItem:
 
 # ################################################################################################################################
 # ################################################################################################################################
+
+class NetworkTable:
+    """ Finds the first line of a definition that an IP address belongs to. Networks are kept in hash tables,
+    one for each prefix length, so a lookup costs at most one dictionary access per prefix length in use
+    rather than one comparison per line.
+    """
+    __slots__ = 'from_any_idx', 'by_version'
+
+    def __init__(self, definition:'list_[DefinitionItem]') -> 'None':
+
+        # Index of the first catch-all line, if any
+        self.from_any_idx = None
+
+        # IP version -> prefix length -> network address as an integer -> index of the first line with that network
+        by_prefix = {4: {}, 6: {}}
+
+        for idx, line in enumerate(definition):
+
+            # Nothing after a catch-all line can be matched first
+            if line.from_ == Const.from_any:
+                self.from_any_idx = idx
+                break
+
+            networks = by_prefix[line.from_.version].setdefault(line.from_.prefixlen, {})
+            _ = networks.setdefault(line.from_.first, idx)
+
+        # IP version -> a list of (mask, networks) tuples
+        self.by_version = {}
+
+        for version, width in ((4, 32), (6, 128)):
+            all_ones = (1 << width) - 1
+            self.by_version[version] = [(all_ones ^ ((1 << (width - prefixlen)) - 1), networks)
+                for prefixlen, networks in sorted(by_prefix[version].items())]
+
+    def get_index(self, address:'IPAddress') -> 'intnone':
+        """ Returns the index of the first definition line matching the address or None if there is no such line.
+        """
+        out = self.from_any_idx
+        value = int(address)
+
+        for mask, networks in self.by_version[address.version]:
+            idx = networks.get(value & mask)
+            if idx is not None:
+                if out is None or idx < out:
+                    out = idx
+
+        return out
+
+# ################################################################################################################################
+# ################################################################################################################################
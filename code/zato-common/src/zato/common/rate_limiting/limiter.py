@@ -7,6 +7,8 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from contextlib import closing
 from copy import deepcopy
 from datetime import datetime
@@ -17,6 +19,10 @@ from gevent.lock import RLock
 # netaddr
 from netaddr import IPAddress
 
+# SQLAlchemy
+from sqlalchemy import and_, select
+from sqlalchemy.exc import IntegrityError
+
 # Zato
 from zato.common.odb.model import RateLimitState
 from zato.common.odb.query.rate_limiting import current_period_list, current_state as current_state_query
@@ -27,11 +33,12 @@ from zato.common.rate_limiting.common import Const, AddressNotAllowed, RateLimit
 
 if 0:
     from zato.common.rate_limiting import Approximate as RateLimiterApproximate, RateLimiting
-    from zato.common.rate_limiting.common import DefinitionItem, ObjectInfo
-    from zato.common.typing_ import any_, callable_, commondict, strcalldict, strdict, strlist
+    from zato.common.rate_limiting.common import DefinitionItem, NetworkTable, ObjectInfo
+    from zato.common.typing_ import any_, anylist, callable_, commondict, intlist, strcalldict, strdict, strlist
 
     # For pyflakes
     DefinitionItem = DefinitionItem
+    NetworkTable = NetworkTable
     ObjectInfo = ObjectInfo
     RateLimiterApproximate = RateLimiterApproximate
     RateLimiting = RateLimiting
@@ -52,11 +59,12 @@ class BaseLimiter:
     __slots__ = 'current_idx', 'lock', 'api', 'object_info', 'definition', 'has_from_any', 'from_any_rate', 'from_any_unit', \
         'is_limit_reached', 'ip_address_cache', 'current_period_func', 'by_period', 'parent_type', 'parent_name', \
         'is_exact', 'from_any_object_id', 'from_any_object_type', 'from_any_object_name', 'cluster_id', 'is_active', \
-        'invocation_no'
+        'invocation_no', 'network_table'
 
     api:'RateLimiting'
     object_info:'ObjectInfo'
     definition:'strlist'
+    network_table:'NetworkTable'
     has_from_any:'bool'
     from_any_rate:'int'
     from_any_unit:'str'
@@ -65,7 +73,7 @@ class BaseLimiter:
     is_exact:'bool'
     invocation_no:'int'
 
-    ip_address_cache:'strdict'
+    ip_address_cache:'OrderedDict'
     by_period:'strdict'
 
     from_any_object_id:'int'
@@ -85,7 +93,7 @@ class BaseLimiter:
         self.is_active = False
         self.current_idx = 0
         self.lock = RLock()
-        self.ip_address_cache = {}
+        self.ip_address_cache = OrderedDict()
         self.by_period = {}
         self.is_exact = False
         self.invocation_no = 0
@@ -109,10 +117,6 @@ class BaseLimiter:
         """
         with self.lock:
 
-            # First, periodically clear out the IP cache to limit its size to 1,000 items
-            if len(self.ip_address_cache) >= 1000:
-                self.ip_address_cache.clear()
-
             now = datetime.utcnow()
             current_minute = self._get_current_minute(now)
             current_hour = self._get_current_hour(now)
@@ -158,29 +162,28 @@ class BaseLimiter:
 
 # ################################################################################################################################
 
-    def _get_rate_config_by_from(self, orig_from, _from_any=Const.from_any) -> 'DefinitionItem':
-        # type: (str, str) -> DefinitionItem
-
-        from_ = self.ip_address_cache.setdefault(orig_from, IPAddress(orig_from)) # type: IPAddress
-        found = None
-
-        for line in self.definition: # type: DefinitionItem
+    def _get_rate_config_by_from(self, orig_from, _max_size=Const.ip_address_cache_max_size) -> 'DefinitionItem':
+        # type: (str, int) -> DefinitionItem
 
-            # A catch-all * pattern
-            if line.from_ == _from_any:
-                found = line
-                break
+        # We may have already seen this address, in which case it becomes the most recently used one ..
+        found = self.ip_address_cache.get(orig_from)
+        if found:
+            self.ip_address_cache.move_to_end(orig_from)
+            return found
 
-            # A network match
-            elif from_ in line.from_:
-                found = line
-                break
+        # .. if not, find the first line of configuration that it matches ..
+        idx = self.network_table.get_index(IPAddress(orig_from))
 
-        # We did not match any line from configuration
-        if not found:
+        # .. we did not match any line from configuration ..
+        if idx is None:
             raise AddressNotAllowed('Address not allowed `{}`'.format(orig_from))
 
-        # We found a matching piece of from IP configuration
+        # .. we found a matching piece of from IP configuration, make sure the cache does not grow too big
+        # by evicting the least recently used address only, so that all the other ones are still cached ..
+        if len(self.ip_address_cache) >= _max_size:
+            _ = self.ip_address_cache.popitem(last=False)
+
+        found = self.ip_address_cache[orig_from] = self.definition[idx]
         return found
 
 # ################################################################################################################################
@@ -403,3 +406,286 @@ class Exact(BaseLimiter):
 
 # ################################################################################################################################
 # ################################################################################################################################
+
+class CounterStore(ABC):
+    """ A store that in-RAM limiters add their counters up in. Each counter is identified by a tuple of
+    (object_type, object_id, period, network). If the store is shared by servers, each of them learns from it
+    how many requests the others received.
+    """
+    @abstractmethod
+    def incr_many(self, cluster_id:'int', items:'anylist') -> 'intlist':
+        """ Takes a list of (object_type, object_id, period, network, requests, last_cid, last_from, last_request_time_utc)
+        tuples, adds their requests to counters and returns the counters' totals, in the same order that items were in.
+        """
+
+    @abstractmethod
+    def delete_periods(self, object_type:'str', object_id:'str', periods:'strlist') -> 'None':
+        """ Deletes counters of an object from the periods given on input.
+        """
+
+    @abstractmethod
+    def delete_object(self, object_type:'str', object_id:'str') -> 'None':
+        """ Deletes all the counters of an object.
+        """
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class LocalCounterStore(CounterStore):
+    """ Keeps counters in RAM of the current process. This is a stand-in for a store shared by all servers -
+    limiters that use the same instance of it are counted together, as though they belonged to different servers.
+    """
+    def __init__(self) -> 'None':
+        self.lock = RLock()
+        self.totals = {}
+
+    def incr_many(self, cluster_id:'int', items:'anylist') -> 'intlist':
+        out = []
+
+        with self.lock:
+            for item in items:
+                key = item[:4]
+                total = self.totals.get(key, 0) + item[4]
+                self.totals[key] = total
+                out.append(total)
+
+        return out
+
+    def delete_periods(self, object_type:'str', object_id:'str', periods:'strlist') -> 'None':
+        with self.lock:
+            for key in list(self.totals):
+                if key[0] == object_type and key[1] == object_id and key[2] in periods:
+                    del self.totals[key]
+
+    def delete_object(self, object_type:'str', object_id:'str') -> 'None':
+        with self.lock:
+            for key in list(self.totals):
+                if key[0] == object_type and key[1] == object_id:
+                    del self.totals[key]
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ODBCounterStore(CounterStore):
+    """ Keeps counters in the same ODB table that exact limiters use, which makes them shared by all servers of a cluster.
+    A batch of counters is updated in one transaction and its totals are read back in one query per object.
+    """
+    def __init__(self, sql_session_func:'callable_') -> 'None':
+        self.sql_session_func = sql_session_func
+
+    def _update(self, session:'any_', cluster_id:'int', items:'anylist') -> 'None':
+
+        for object_type, object_id, period, network, requests, last_cid, last_from, last_request_time_utc in items:
+
+            # There were no new requests, we only need to read the total
+            if not requests:
+                continue
+
+            # Update the counter in place so that concurrent updates from other servers are not lost ..
+            result = session.execute(RateLimitStateTable.update().where(and_(
+                RateLimitStateTable.c.cluster_id==cluster_id,
+                RateLimitStateTable.c.object_type==object_type,
+                RateLimitStateTable.c.object_id==object_id,
+                RateLimitStateTable.c.period==period,
+                RateLimitStateTable.c.last_network==network,
+            )).values(
+                requests=RateLimitStateTable.c.requests + requests,
+                last_cid=last_cid,
+                last_from=last_from,
+                last_request_time_utc=last_request_time_utc,
+            ))
+
+            # .. or create it if it does not exist yet.
+            if not result.rowcount:
+                session.execute(RateLimitStateTable.insert().values(
+                    cluster_id=cluster_id,
+                    object_type=object_type,
+                    object_id=object_id,
+                    period=period,
+                    requests=requests,
+                    last_cid=last_cid,
+                    last_from=last_from,
+                    last_network=network,
+                    last_request_time_utc=last_request_time_utc,
+                ))
+
+    def incr_many(self, cluster_id:'int', items:'anylist') -> 'intlist':
+
+        with closing(self.sql_session_func()) as session:
+
+            # Another server may have created the same counter in the meantime, in which case the whole batch
+            # is retried - this time, the counter will be updated rather than inserted.
+            try:
+                self._update(session, cluster_id, items)
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                self._update(session, cluster_id, items)
+                session.commit()
+
+            # Read back the totals, for each object separately
+            totals = {}
+            periods_by_object = {}
+
+            for item in items:
+                periods_by_object.setdefault(item[:2], set()).add(item[2])
+
+            for (object_type, object_id), periods in periods_by_object.items():
+                query = select([
+                    RateLimitStateTable.c.period,
+                    RateLimitStateTable.c.last_network,
+                    RateLimitStateTable.c.requests,
+                ]).where(and_(
+                    RateLimitStateTable.c.cluster_id==cluster_id,
+                    RateLimitStateTable.c.object_type==object_type,
+                    RateLimitStateTable.c.object_id==object_id,
+                    RateLimitStateTable.c.period.in_(periods),
+                ))
+
+                for period, network, requests in session.execute(query):
+                    totals[(object_type, object_id, period, network)] = requests
+
+        return [totals.get(item[:4], item[4]) for item in items]
+
+    def delete_periods(self, object_type:'str', object_id:'str', periods:'strlist') -> 'None':
+        with closing(self.sql_session_func()) as session:
+            session.execute(RateLimitStateDelete().where(and_(
+                RateLimitStateTable.c.object_type==object_type,
+                RateLimitStateTable.c.object_id==object_id,
+                RateLimitStateTable.c.period.in_(periods),
+            )))
+            session.commit()
+
+    def delete_object(self, object_type:'str', object_id:'str') -> 'None':
+        with closing(self.sql_session_func()) as session:
+            session.execute(RateLimitStateDelete().where(and_(
+                RateLimitStateTable.c.object_type==object_type,
+                RateLimitStateTable.c.object_id==object_id,
+            )))
+            session.commit()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ExactInRAM(BaseLimiter):
+    """ Keeps exact counters in RAM, without accessing any external resources when limits are checked. Counters are added up
+    in a CounterStore in background - each server sends the requests it received since the previous flush and learns
+    the totals, which include requests from other servers.
+
+    With a single server, limits are exact. With many servers, each of them may accept requests that other servers received
+    since they last flushed their counters, i.e. the rate may be exceeded by at most the number of requests that
+    the other servers accepted during one flush interval.
+    """
+    def __init__(self, cluster_id:'int', counter_store:'CounterStore') -> 'None':
+        super(ExactInRAM, self).__init__(cluster_id)
+        self.counter_store = counter_store
+
+        # Periods that were deleted from RAM and are yet to be deleted from the store, in background
+        self.deleted_periods = set()
+
+# ################################################################################################################################
+
+    def _get_current_periods(self) -> 'strlist':
+        return list(self.by_period.keys())
+
+# ################################################################################################################################
+
+    def _delete_periods(self, to_delete) -> 'None':
+        for item in to_delete: # item: str
+            del self.by_period[item]
+
+        # This is called with our lock held so the store is not accessed here, it is the flusher that will do it.
+        self.deleted_periods.update(to_delete)
+
+# ################################################################################################################################
+
+    def _get_current_state(self, current_period, network_found) -> 'strdict':
+        # type: (str, str) -> dict
+
+        period_dict = self.by_period.get(current_period)
+        if period_dict is None:
+            period_dict = self.by_period[current_period] = {}
+
+        current_state = period_dict.get(network_found)
+        if current_state is None:
+            current_state = period_dict[network_found] = {
+                'requests': 0,
+                'pending': 0,
+                'last_cid': None,
+                'last_request_time_utc': None,
+                'last_from': None,
+                'last_network': None,
+            }
+
+        return current_state
+
+# ################################################################################################################################
+
+    def _set_new_state(self, current_state, cid, orig_from, network_found, now, current_period) -> 'None':
+
+        current_state['requests'] += 1
+        current_state['pending'] += 1
+        current_state['last_cid'] = cid
+        current_state['last_request_time_utc'] = now
+        current_state['last_from'] = orig_from
+        current_state['last_network'] = network_found
+
+# ################################################################################################################################
+
+    def get_pending(self) -> 'anylist':
+        """ Returns counters to be flushed, resetting them. Each element is a tuple of the state
+        and an item in the format that CounterStore.incr_many expects. Counters without new requests are returned too
+        because their totals may have been increased by other servers.
+        """
+        out = []
+
+        with self.lock:
+            for current_period, period_dict in self.by_period.items():
+                for current_state in period_dict.values():
+                    item = (self.object_info.type_, self.object_info.id, current_period, str(current_state['last_network']),
+                        current_state['pending'], current_state['last_cid'], current_state['last_from'],
+                        current_state['last_request_time_utc'])
+                    current_state['pending'] = 0
+                    out.append((current_state, item))
+
+        return out
+
+# ################################################################################################################################
+
+    def set_totals(self, pending:'anylist', totals:'intlist') -> 'None':
+        """ Sets totals that a store returned for states from get_pending. Requests received in the meantime are added to them.
+        """
+        with self.lock:
+            for (current_state, _), total in zip(pending, totals):
+                current_state['requests'] = total + current_state['pending']
+
+# ################################################################################################################################
+
+    def restore_pending(self, pending:'anylist') -> 'None':
+        """ Puts back counters that could not be flushed so that they are flushed next time.
+        """
+        with self.lock:
+            for current_state, item in pending:
+                current_state['pending'] += item[4]
+
+# ################################################################################################################################
+
+    def get_deleted_periods(self) -> 'strlist':
+        """ Returns periods that are to be deleted from the store, resetting them.
+        """
+        with self.lock:
+            out = sorted(self.deleted_periods)
+            self.deleted_periods.clear()
+
+        return out
+
+# ################################################################################################################################
+
+    def restore_deleted_periods(self, periods:'strlist') -> 'None':
+        """ Puts back periods that could not be deleted from the store so that they are deleted next time.
+        """
+        with self.lock:
+            self.deleted_periods.update(periods)
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -181,6 +181,7 @@ wait_until_port_taken = wait_until_port_taken
 
 class ModuleCtx:
     PID_To_Port_Pattern = 'zato-ipc-port-{cluster_name}-{server_name}-{pid}.txt'
+    PID_To_Socket_Pattern = 'zato-ipc-{server_id}-{pid}.sock'
 
 # ################################################################################################################################
 
@@ -2101,6 +2102,20 @@ def get_ipc_pid_port_path(cluster_name:'str', server_name:'str', pid:'int') -> '
 
 # ################################################################################################################################
 
+def get_ipc_pid_socket_path(cluster_name:'str', server_name:'str', pid:'int') -> 'str':
+
+    # Paths to Unix domain sockets cannot be longer than about a hundred characters,
+    # which is why names of clusters and servers, which can be of any length, are hashed ..
+    server_id = sha256('{}:{}'.format(cluster_name, server_name).encode('utf8')).hexdigest()[:16]
+
+    # .. now, we can build the name of the socket ..
+    file_name = ModuleCtx.PID_To_Socket_Pattern.format(server_id=server_id, pid=pid)
+
+    # .. and return its full path to our caller.
+    return os.path.join(gettempdir(), file_name)
+
+# ################################################################################################################################
+
 def save_ipc_pid_port(cluster_name:'str', server_name:'str', pid:'int', port:'int') -> 'None':
 
     # Make sure we store a string ..
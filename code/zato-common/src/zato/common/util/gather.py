@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from logging import getLogger
+from time import monotonic
+
+# gevent
+from gevent import spawn
+from gevent.pool import Pool
+
+# Zato
+from zato.common.ext.dataclasses import dataclass
+from zato.common.typing_ import dict_field
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict, anylist, anytuple, callable_, floatnone, intnone
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger('zato')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class Default:
+
+    # How many tasks at most run concurrently in a single call
+    pool_size = 32
+
+    # For how many seconds, in total, all the tasks can run before the ones still running are abandoned
+    timeout = 90
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TaskStatus:
+    OK      = 'ok'
+    Error   = 'error'
+    Timeout = 'timeout'
+    Skipped = 'skipped'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+@dataclass(init=False)
+class Task:
+    key:    'any_'
+    func:   'callable_'
+    args:   'anytuple'
+    kwargs: 'anydict' = dict_field()
+
+@dataclass(init=False)
+class TaskResult:
+    key:        'any_'
+    status:     'str'   = TaskStatus.Timeout
+    data:       'any_'  = None
+    error_info: 'str'   = ''
+    time_ms:    'float' = 0.0
+
+    @property
+    def is_ok(self) -> 'bool':
+        return self.status == TaskStatus.OK
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ScatterGather:
+    """ Runs tasks concurrently, no more than pool_size of them at a time, and returns results of each,
+    including tasks that failed or did not complete before the timeout, all in the order the tasks were given in.
+    """
+    def __init__(self, pool_size:'int'=Default.pool_size, timeout:'float'=Default.timeout) -> 'None':
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+# ################################################################################################################################
+
+    def new_task(self, key:'any_', func:'callable_', *args:'any_', **kwargs:'any_') -> 'Task':
+        task = Task()
+        task.key = key
+        task.func = func
+        task.args = args
+        task.kwargs = kwargs
+        return task
+
+# ################################################################################################################################
+
+    def _run_task(self, task:'Task', result:'TaskResult') -> 'None':
+
+        start = monotonic()
+
+        try:
+            result.data = task.func(*task.args, **task.kwargs)
+        except Exception as e:
+            result.status = TaskStatus.Error
+            result.error_info = '{}: {}'.format(e.__class__.__name__, e)
+        else:
+            result.status = TaskStatus.OK
+        finally:
+            result.time_ms = (monotonic() - start) * 1000
+
+# ################################################################################################################################
+
+    def _spawn_all(self, pool:'Pool', task_list:'anylist', result_list:'anylist') -> 'None':
+
+        # This blocks each time the pool is full until one of the tasks already running completes
+        for task, result in zip(task_list, result_list):
+            _ = pool.spawn(self._run_task, task, result)
+
+# ################################################################################################################################
+
+    def run(self, task_list:'anylist', timeout:'floatnone'=None, pool_size:'intnone'=None) -> 'anylist':
+
+        # Results of all the tasks, each of which is a timeout unless the task completes
+        result_list = [] # type: anylist
+
+        for task in task_list:
+            result = TaskResult()
+            result.key = task.key
+            result_list.append(result)
+
+        # Nothing to do if there are no tasks
+        if not task_list:
+            return result_list
+
+        timeout = timeout or self.timeout
+        pool = Pool(pool_size or self.pool_size)
+
+        # The deadline covers the time that the tasks wait for the pool too ..
+        deadline = monotonic() + timeout
+
+        # .. which is why they are added to the pool in background ..
+        spawner = spawn(self._spawn_all, pool, task_list, result_list)
+        _ = spawner.join(timeout)
+
+        # .. now, we can wait for the remaining ones ..
+        if spawner.ready():
+            _ = pool.join(max(deadline - monotonic(), 0))
+
+        # .. and abandon the ones that did not complete in time.
+        if not spawner.ready():
+            spawner.kill(block=False)
+
+        if len(pool):
+            pool.kill(block=False)
+
+        if timed_out := [str(result.key) for result in result_list if result.status == TaskStatus.Timeout]:
+            logger.info('Tasks did not complete in %ss -> %s', timeout, ', '.join(timed_out))
+
+        return result_list
+
+# ################################################################################################################################
+# ################################################################################################################################
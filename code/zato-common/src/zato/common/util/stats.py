@@ -8,8 +8,12 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 # stdlib
 import math
+import sys
+from array import array
+from base64 import b64decode, b64encode
 from datetime import timedelta
 from operator import itemgetter
+from struct import Struct
 
 # Humanize
 from humanize import precisedelta
@@ -22,6 +26,14 @@ from zato.common.api import StatsKey
 
 float_stats = ('item_max', 'item_min', 'item_mean', 'item_total_time')
 
+# Percentiles of response times that usage statistics include
+_usage_percentiles = [
+    (StatsKey.PerKeyP50,  0.5),
+    (StatsKey.PerKeyP90,  0.9),
+    (StatsKey.PerKeyP99,  0.99),
+    (StatsKey.PerKeyP999, 0.999),
+]
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -82,7 +94,232 @@ def percentile(data, percent, key=lambda x:x):
 # ################################################################################################################################
 # ################################################################################################################################
 
+# A serialised sketch begins with its relative accuracy, the count of zeros and the number of buckets ..
+_sketch_header = Struct('>dqI')
+
+# .. followed by each of the buckets, i.e. its index and count.
+_sketch_bucket = Struct('>iq')
+
+# With the default accuracy, this many buckets cover values from 1 ms to over 20 s, using about 4 KB per sketch at most
+_sketch_max_buckets = 512
+
+# ################################################################################################################################
+
+class QuantileSketch:
+    """ A mergeable sketch of a distribution of non-negative values, such as response times, from which quantiles
+    can be read with a relative error of up to relative_accuracy. Each value is counted in a bucket whose bounds grow
+    exponentially, hence the memory used depends on the range of values rather than on how many of them there are,
+    e.g. values from 1 ms to 10 s need fewer than 500 buckets, 8 bytes each. If the buckets span more than max_buckets,
+    the lowest ones are collapsed, which means that it is only low quantiles that lose their accuracy. Since a sketch
+    is kept for each service, the default max_buckets caps it at about 4 KB, even for the most varied durations.
+    """
+    __slots__ = ('relative_accuracy', 'max_buckets', 'gamma', 'inv_log_gamma', 'counts', 'offset', 'zero_count', 'count')
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=_sketch_max_buckets):
+        # type: (float, int) -> None
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.inv_log_gamma = 1 / math.log(self.gamma)
+
+        # How many values there are in each bucket, from the lowest one, whose index is in self.offset, upwards
+        self.counts = array('q')
+        self.offset = 0
+
+        # Zeros cannot be bucketed so they are counted separately
+        self.zero_count = 0
+
+        # How many values there are in total
+        self.count = 0
+
+# ################################################################################################################################
+
+    def add(self, value, _ceil=math.ceil, _log=math.log):
+        # type: (float) -> None
+
+        self.count += 1
+
+        if value <= 0:
+            self.zero_count += 1
+            return
+
+        idx = _ceil(_log(value) * self.inv_log_gamma)
+        pos = idx - self.offset
+        counts = self.counts
+
+        # This is the most common case, a value in one of the buckets that we already have ..
+        if 0 <= pos < len(counts):
+            counts[pos] += 1
+
+        # .. whereas this one needs new buckets.
+        else:
+            self._add_out_of_range(idx, 1)
+
+# ################################################################################################################################
+
+    def _add_bucket_count(self, idx, bucket_count):
+        # type: (int, int) -> None
+        pos = idx - self.offset
+
+        if 0 <= pos < len(self.counts):
+            self.counts[pos] += bucket_count
+        else:
+            self._add_out_of_range(idx, bucket_count)
+
+# ################################################################################################################################
+
+    def _add_out_of_range(self, idx, bucket_count):
+        # type: (int, int) -> None
+        counts = self.counts
+
+        # This is our first bucket ..
+        if not counts:
+            self.offset = idx
+            counts.append(bucket_count)
+            return
+
+        # .. add new buckets below the lowest one ..
+        if idx < self.offset:
+            counts[0:0] = array('q', bytes(counts.itemsize * (self.offset - idx)))
+            self.offset = idx
+
+        # .. or above the highest one ..
+        else:
+            counts.extend(array('q', bytes(counts.itemsize * (idx - self.offset - len(counts) + 1))))
+
+        counts[idx - self.offset] += bucket_count
+
+        # .. and make sure that there are not too many of them.
+        if len(counts) > self.max_buckets:
+            self._collapse()
+
+# ################################################################################################################################
+
+    def _collapse(self):
+        # type: () -> None
+        counts = self.counts
+        len_excess = len(counts) - self.max_buckets
+
+        # The lowest buckets are collapsed into the lowest one that is kept
+        collapsed = sum(counts[:len_excess + 1])
+        del counts[:len_excess]
+
+        counts[0] = collapsed
+        self.offset += len_excess
+
+# ################################################################################################################################
+
+    def merge(self, other):
+        """ Adds all the values of another sketch, which needs to have the same relative accuracy, to this one.
+        """
+        # type: (QuantileSketch) -> None
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches of different accuracy ({} vs. {})'.format(
+                self.relative_accuracy, other.relative_accuracy))
+
+        for idx, bucket_count in other.get_buckets():
+            self._add_bucket_count(idx, bucket_count)
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+# ################################################################################################################################
+
+    def get_buckets(self):
+        """ Yields (index, count) tuples of all the buckets that are not empty, from the lowest one upwards.
+        """
+        offset = self.offset
+
+        for pos, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                yield offset + pos, bucket_count
+
+# ################################################################################################################################
+
+    def get_size(self):
+        """ Returns an approximate number of bytes of RAM that this sketch uses.
+        """
+        # type: () -> int
+        return sys.getsizeof(self) + sys.getsizeof(self.counts)
+
+# ################################################################################################################################
+
+    def quantile(self, q):
+        """ Returns an estimate of the q-quantile, e.g. 0.99 for p99, or None if there are no values.
+        """
+        # type: (float) -> float
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+
+        if seen > rank:
+            return 0.0
+
+        idx = None
+
+        for idx, bucket_count in self.get_buckets():
+            seen += bucket_count
+            if seen > rank:
+                break
+
+        # If we did not break out of the loop, which can happen only because of floating point rounding,
+        # it is the highest bucket that is returned.
+        return 2 * self.gamma ** idx / (self.gamma + 1)
+
+# ################################################################################################################################
+
+    def to_bytes(self):
+        # type: () -> bytes
+        buckets = list(self.get_buckets())
+        header = _sketch_header.pack(self.relative_accuracy, self.zero_count, len(buckets))
+
+        return header + b''.join(_sketch_bucket.pack(idx, bucket_count) for idx, bucket_count in buckets)
+
+# ################################################################################################################################
+
+    @staticmethod
+    def from_bytes(data, max_buckets=_sketch_max_buckets):
+        # type: (bytes, int) -> QuantileSketch
+        relative_accuracy, zero_count, len_buckets = _sketch_header.unpack_from(data)
+
+        sketch = QuantileSketch(relative_accuracy, max_buckets)
+        sketch.zero_count = zero_count
+        sketch.count = zero_count
+
+        offset = _sketch_header.size
+        for _ in range(len_buckets):
+            idx, bucket_count = _sketch_bucket.unpack_from(data, offset)
+            sketch._add_bucket_count(idx, bucket_count)
+            sketch.count += bucket_count
+            offset += _sketch_bucket.size
+
+        return sketch
+
+# ################################################################################################################################
+
+    def to_string(self):
+        """ Returns the sketch as a string that can be embedded in JSON documents.
+        """
+        # type: () -> str
+        return b64encode(self.to_bytes()).decode('ascii')
+
+# ################################################################################################################################
+
+    @staticmethod
+    def from_string(data, max_buckets=_sketch_max_buckets):
+        # type: (str, int) -> QuantileSketch
+        return QuantileSketch.from_bytes(b64decode(data), max_buckets)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 def collect_current_usage(data):
+    """ Combines usage statistics of a service from multiple workers or servers. Response time percentiles
+    are read from their sketches merged together, if the statistics have any.
+    """
     # type: (list) -> dict
 
     # numpy
@@ -98,6 +335,10 @@ def collect_current_usage(data):
     usage_max  = None
     usage_mean = None
 
+    # Durations of all the invocations, from all the sketches, along with their total time
+    sketch = None
+    total_time = 0
+
     # Make sure we always have a list to iterate over (rather than None)
     data = data or []
 
@@ -112,24 +353,41 @@ def collect_current_usage(data):
             last_timestamp = elem[StatsKey.PerKeyLastTimestamp]
             last_duration = elem[StatsKey.PerKeyLastDuration]
 
-        if usage_min:
-            usage_min = min([usage_min, elem[StatsKey.PerKeyMin]])
-        else:
-            usage_min = elem[StatsKey.PerKeyMin]
+        elem_min  = elem.get(StatsKey.PerKeyMin)
+        elem_max  = elem.get(StatsKey.PerKeyMax)
+        elem_mean = elem.get(StatsKey.PerKeyMean)
 
-        if usage_max:
-            usage_max  = max([usage_max, elem[StatsKey.PerKeyMax]])
-        else:
-            usage_max = elem[StatsKey.PerKeyMax]
+        if usage_min is None or (elem_min is not None and elem_min < usage_min):
+            usage_min = elem_min
+
+        if usage_max is None or (elem_max is not None and elem_max > usage_max):
+            usage_max = elem_max
 
         if usage_mean:
-            usage_mean = np.mean([usage_mean, elem[StatsKey.PerKeyMean]])
+            if elem_mean:
+                usage_mean = np.mean([usage_mean, elem_mean])
         else:
-            usage_mean = elem[StatsKey.PerKeyMean]
+            usage_mean = elem_mean
+
+        elem_sketch = elem.get(StatsKey.PerKeySketch)
+
+        if elem_sketch:
+            elem_sketch = QuantileSketch.from_string(elem_sketch)
+
+            if sketch:
+                sketch.merge(elem_sketch)
+            else:
+                sketch = elem_sketch
 
-        usage_mean = round(usage_mean, 3) if usage_mean else 0
+            total_time += elem.get(StatsKey.PerKeyTotalTime) or 0
 
-    return {
+    # With sketches, the mean can be computed from all the durations rather than from the means of each worker
+    if sketch and sketch.count:
+        usage_mean = total_time / sketch.count
+
+    usage_mean = round(usage_mean, 3) if usage_mean else 0
+
+    out = {
         StatsKey.PerKeyValue: usage,
         StatsKey.PerKeyLastDuration:  last_duration,
         StatsKey.PerKeyLastTimestamp: last_timestamp,
@@ -138,6 +396,12 @@ def collect_current_usage(data):
         StatsKey.PerKeyMean: usage_mean,
     }
 
+    for key, q in _usage_percentiles:
+        value = sketch.quantile(q) if sketch else None
+        out[key] = round(value, 3) if value is not None else None
+
+    return out
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+# Zato
+from zato.common.api import IPC
+from zato.common.ipc.client import IPCClient
+from zato.common.ipc.server import IPCServer
+from zato.common.ipc.uds import UDSIPCClient, UDSIPCServer
+from zato.common.util.stats import percentile
+from zato.common.util.tcp import get_free_port
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, callable_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many requests each benchmark sends
+request_count = 2_000
+
+# How many requests are in flight at the same time when throughput is measured
+concurrency = 50
+
+username = IPC.Credentials.Username
+password = 'bench.ipc.password'
+
+cluster_name = 'bench.cluster'
+server_name = 'bench.server'
+server_pid = 1
+
+# A business request of a typical size
+request = {'name': 'zato.bench', 'value': 'abc' * 100, 'items': list(range(20))}
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def on_ipc_invoke(msg:'Bunch') -> 'any_':
+    return msg.data
+
+# ################################################################################################################################
+
+def get_http_invoke() -> 'tuple':
+
+    ipc_server = IPCServer.__new__(IPCServer)
+    ipc_server.config = Bunch(username=username, password=password, callback_func=on_ipc_invoke)
+
+    port = get_free_port(37050)
+    wsgi_server = WSGIServer(('127.0.0.1', port), ipc_server, log=None)
+    wsgi_server.start()
+
+    client = IPCClient(False, '127.0.0.1', port, username, password)
+
+    def invoke() -> 'any_':
+        return client.invoke('bench.service', request, 'bench', cluster_name=cluster_name, server_name=server_name,
+            server_pid=server_pid, source_server_name=server_name, source_server_pid=server_pid)
+
+    return invoke, wsgi_server.stop
+
+# ################################################################################################################################
+
+def get_uds_invoke() -> 'tuple':
+
+    base_dir = mkdtemp(prefix='zato-bench-ipc')
+    socket_path = os.path.join(base_dir, 'ipc.sock')
+
+    server = UDSIPCServer(socket_path, username, password, on_ipc_invoke)
+    server.start()
+
+    client = UDSIPCClient(socket_path, username, password)
+
+    def invoke() -> 'any_':
+        return client.invoke('bench.service', request, cluster_name=cluster_name, server_name=server_name,
+            server_pid=server_pid, source_server_name=server_name, source_server_pid=server_pid)
+
+    def stop() -> 'None':
+        client.close()
+        server.stop()
+        rmtree(base_dir, ignore_errors=True)
+
+    return invoke, stop
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def run_sequential(invoke:'callable_') -> 'tuple':
+    """ Returns the median and p99 round-trip time, in microseconds, of requests sent one by one.
+    """
+    times = []
+
+    for _ in range(request_count):
+        start = perf_counter()
+        response = invoke()
+        times.append((perf_counter() - start) * 1_000_000)
+
+        if not response.meta.is_ok:
+            raise Exception('Unexpected response -> {}'.format(response))
+
+    times.sort()
+
+    return percentile(times, 0.5), percentile(times, 0.99)
+
+# ################################################################################################################################
+
+def run_concurrent(invoke:'callable_') -> 'float':
+    """ Returns how many requests a second can be sent when many of them are in flight at the same time.
+    """
+    pool = Pool(concurrency)
+
+    start = perf_counter()
+
+    for _ in range(request_count):
+        _ = pool.spawn(invoke)
+
+    pool.join()
+
+    return request_count / (perf_counter() - start)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    template = '{:>10} {:>12} {:>12} {:>12}'
+
+    print(template.format('transport', 'p50 us', 'p99 us', 'msg/s'))
+
+    for name, get_invoke in [('http', get_http_invoke), ('uds', get_uds_invoke)]:
+
+        invoke, stop = get_invoke()
+
+        try:
+
+            # The first request opens connections
+            _ = invoke()
+
+            p50, p99 = run_sequential(invoke)
+            per_second = run_concurrent(invoke)
+
+        finally:
+            stop()
+
+        print(template.format(name, '{:.0f}'.format(p50), '{:.0f}'.format(p99), '{:,.0f}'.format(per_second)))
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import sys
+from random import Random
+from timeit import timeit
+
+# Zato
+from zato.common.util.stats import percentile, QuantileSketch
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many response times each benchmark adds
+value_count = 200_000
+
+# How many times the percentiles are read from all the values added so far
+read_count = 20
+
+# Response times, in milliseconds, of services that are fast, typical, slow and ones with a very wide range of them
+distributions = {
+    'fast':    lambda random: random.lognormvariate(0, 0.5),
+    'typical': lambda random: random.lognormvariate(3, 1),
+    'slow':    lambda random: random.lognormvariate(8, 0.5),
+    'wide':    lambda random: random.uniform(0.01, 60_000),
+}
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    random = Random(1208)
+    template = '{:>8} {:>10} {:>10} {:>12} {:>12} {:>10}'
+
+    print(template.format('dist', 'add ns', 'list KB', 'sorting ms', 'sketch ms', 'sketch KB'))
+
+    for name, func in distributions.items():
+
+        values = [func(random) for _ in range(value_count)]
+        sketch = QuantileSketch()
+
+        def run_sketch_add() -> 'None':
+            add = sketch.add
+            for value in values:
+                add(value)
+
+        def run_sorting() -> 'None':
+            for q in 0.5, 0.9, 0.99, 0.999:
+                _ = percentile(sorted(values), q)
+
+        def run_sketch() -> 'None':
+            for q in 0.5, 0.9, 0.99, 0.999:
+                _ = sketch.quantile(q)
+
+        add_time = timeit(run_sketch_add, number=1) / value_count * 1_000_000_000
+
+        # What keeping all the values in a list takes, which is needed to sort them, versus a sketch of them
+        list_size = (sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)) / 1024
+        sketch_size = sketch.get_size() / 1024
+
+        sorting_time = timeit(run_sorting, number=read_count) / read_count * 1000
+        sketch_time = timeit(run_sketch, number=read_count) / read_count * 1000
+
+        print(template.format(name, '{:.0f}'.format(add_time), '{:,.0f}'.format(list_size),
+            '{:.2f}'.format(sorting_time), '{:.3f}'.format(sketch_time), '{:.1f}'.format(sketch_size)))
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from random import Random
+from timeit import timeit
+
+# netaddr
+from netaddr import IPAddress
+
+# Zato
+from zato.common.rate_limiting import DefinitionParser
+from zato.common.rate_limiting.common import NetworkTable
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.rate_limiting.common import DefinitionItem
+    from zato.common.typing_ import any_, list_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many lines each definition has
+line_counts = [10, 100, 1000]
+
+# How many distinct addresses are looked up and how many times each benchmark runs
+address_count = 1000
+repeat = 20
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_definition(line_count:'int', random:'Random') -> 'list_[DefinitionItem]':
+
+    lines = []
+
+    for _ in range(line_count):
+        address = '10.{}.{}.0'.format(random.randrange(256), random.randrange(256))
+        lines.append('{}/{} = 100/m'.format(address, random.choice([16, 20, 24])))
+
+    return DefinitionParser().parse('\n'.join(lines), 1, 'http_soap', 'bench')
+
+# ################################################################################################################################
+
+def lookup_by_scan(definition:'list_[DefinitionItem]', address:'IPAddress') -> 'any_':
+    """ Finds the first matching line in the same way that limiters did before they used network tables.
+    """
+    for line in definition:
+        if address in line.from_:
+            return line
+
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    random = Random(1208)
+    template = '{:>6} {:>14} {:>14} {:>8}'
+
+    print(template.format('lines', 'scan µs', 'table µs', 'speedup'))
+
+    for line_count in line_counts:
+
+        definition = get_definition(line_count, random)
+        table = NetworkTable(definition)
+
+        addresses = [IPAddress('10.{}.{}.{}'.format(random.randrange(256), random.randrange(256), random.randrange(256)))
+            for _ in range(address_count)]
+
+        def run_scan() -> 'None':
+            for address in addresses:
+                _ = lookup_by_scan(definition, address)
+
+        def run_table() -> 'None':
+            for address in addresses:
+                _ = table.get_index(address)
+
+        lookups = address_count * repeat
+        scan = timeit(run_scan, number=repeat) / lookups * 1_000_000
+        table_time = timeit(run_table, number=repeat) / lookups * 1_000_000
+
+        print(template.format(line_count, '{:.2f}'.format(scan), '{:.2f}'.format(table_time),
+            '{:.0f}x'.format(scan / table_time)))
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
+# ################################################################################################################################
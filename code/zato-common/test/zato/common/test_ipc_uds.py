@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# This comes first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+import os
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent import sleep, spawn
+from gevent.pywsgi import WSGIServer
+
+# Zato
+from zato.common.api import IPC
+from zato.common.ipc.api import IPCAPI
+from zato.common.ipc.server import IPCServer
+from zato.common.ipc.uds import UDSIPCClient, UDSIPCServer, UDSNotAvailable
+from zato.common.util.api import get_ipc_pid_socket_path, save_ipc_pid_port
+from zato.common.util.tcp import get_free_port
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestConfig:
+    username = IPC.Credentials.Username
+    password = 'test.ipc.password'
+    cluster_name = 'test.ipc.cluster'
+    server_name = 'test.ipc.server'
+    source_pid = 1_000_001
+    target_pid = 1_000_002
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def on_ipc_invoke(msg:'Bunch') -> 'any_':
+
+    # Each request can ask to be responded to after a delay
+    sleep(msg.data.get('delay', 0))
+
+    if msg.data.get('raise'):
+        raise Exception('Test exception')
+
+    return {'service': msg.service, 'value': msg.data.get('value'), 'source_server_pid': msg.source_server_pid}
+
+# ################################################################################################################################
+
+def start_http_ipc_server(port:'int') -> 'WSGIServer':
+    """ Starts the same IPC server as the one servers start, only without reading its configuration from a server's directory.
+    """
+    ipc_server = IPCServer.__new__(IPCServer)
+    ipc_server.config = Bunch(username=TestConfig.username, password=TestConfig.password, callback_func=on_ipc_invoke)
+
+    wsgi_server = WSGIServer(('127.0.0.1', port), ipc_server, log=None)
+    wsgi_server.start()
+
+    return wsgi_server
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class UDSIPCTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.base_dir = mkdtemp(prefix='zato-test-ipc')
+        self.socket_path = os.path.join(self.base_dir, 'ipc.sock')
+        self.server = UDSIPCServer(self.socket_path, TestConfig.username, TestConfig.password, on_ipc_invoke)
+        self.server.start()
+
+    def tearDown(self) -> 'None':
+        self.server.stop()
+        rmtree(self.base_dir, ignore_errors=True)
+
+    def get_client(self, password:'str'=TestConfig.password) -> 'UDSIPCClient':
+        return UDSIPCClient(self.socket_path, TestConfig.username, password)
+
+    def invoke(self, client:'UDSIPCClient', value:'any_', **kwargs:'any_') -> 'any_':
+        timeout = kwargs.pop('timeout', 5)
+        data = dict(kwargs, value=value)
+
+        return client.invoke('my.service', data,
+            cluster_name=TestConfig.cluster_name, server_name=TestConfig.server_name, server_pid=TestConfig.target_pid,
+            timeout=timeout, source_server_name=TestConfig.server_name, source_server_pid=TestConfig.source_pid)
+
+# ################################################################################################################################
+
+    def test_invoke(self) -> 'None':
+
+        client = self.get_client()
+
+        for idx in range(3):
+            response = self.invoke(client, idx)
+
+            self.assertTrue(response.meta.is_ok)
+            self.assertTrue(response.meta.cid.startswith('zipc'))
+            self.assertEqual(response.meta.server_pid, TestConfig.target_pid)
+            self.assertDictEqual(response.data, {
+                'service': 'my.service', 'value': idx, 'source_server_pid': TestConfig.source_pid})
+
+        # All the requests were sent over a single connection
+        self.assertEqual(next(client.request_id), 4)
+
+        client.close()
+
+# ################################################################################################################################
+
+    def test_concurrent_requests(self) -> 'None':
+
+        client = self.get_client()
+
+        # The first request takes the longest so its response is received last ..
+        greenlets = [spawn(self.invoke, client, idx, delay=0.1 * (3 - idx)) for idx in range(3)]
+        responses = [greenlet.get() for greenlet in greenlets]
+
+        # .. but each response still goes to the request it belongs to.
+        self.assertListEqual([response.data['value'] for response in responses], [0, 1, 2])
+        self.assertDictEqual(client.in_flight, {})
+
+        client.close()
+
+# ################################################################################################################################
+
+    def test_errors(self) -> 'None':
+
+        client = self.get_client()
+
+        # An exception in the process invoked is returned as a response ..
+        response = self.invoke(client, 1, **{'raise': True})
+        self.assertFalse(response.meta.is_ok)
+
+        # .. a response that takes too long is not waited for ..
+        with self.assertRaises(TimeoutError):
+            _ = self.invoke(client, 2, delay=1, timeout=0.1)
+
+        # .. and the connection can still be used.
+        response = self.invoke(client, 3)
+        self.assertEqual(response.data['value'], 3)
+
+        client.close()
+
+# ################################################################################################################################
+
+    def test_invalid_credentials(self) -> 'None':
+
+        client = self.get_client(password='invalid')
+
+        with self.assertRaises(UDSNotAvailable):
+            _ = self.invoke(client, 1)
+
+# ################################################################################################################################
+
+    def test_reconnect(self) -> 'None':
+
+        client = self.get_client()
+        _ = self.invoke(client, 1)
+
+        # The server stops ..
+        self.server.stop()
+        sleep(0.1)
+
+        with self.assertRaises(UDSNotAvailable):
+            _ = self.invoke(client, 2)
+
+        # .. and starts again, in which case the client connects to it again.
+        self.server = UDSIPCServer(self.socket_path, TestConfig.username, TestConfig.password, on_ipc_invoke)
+        self.server.start()
+
+        response = self.invoke(client, 3)
+        self.assertEqual(response.data['value'], 3)
+
+        client.close()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class IPCAPITestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.http_port = get_free_port(37050)
+        self.http_server = start_http_ipc_server(self.http_port)
+        save_ipc_pid_port(TestConfig.cluster_name, TestConfig.server_name, TestConfig.target_pid, self.http_port)
+
+        self.ipc_api = IPCAPI(Bunch(name=TestConfig.server_name, pid=TestConfig.source_pid)) # type: ignore
+        self.ipc_api.password = TestConfig.password
+
+    def tearDown(self) -> 'None':
+        self.ipc_api.stop_uds_server()
+        self.http_server.stop()
+
+    def invoke(self, value:'any_') -> 'any_':
+        return self.ipc_api.invoke_by_pid(
+            False, 'my.service', {'value': value}, TestConfig.cluster_name, TestConfig.server_name, TestConfig.target_pid)
+
+# ################################################################################################################################
+
+    def test_http_is_used_if_there_is_no_socket(self) -> 'None':
+
+        response = self.invoke(1)
+
+        self.assertTrue(response.meta.is_ok)
+        self.assertEqual(response.data['value'], 1)
+
+        self.assertDictEqual(self.ipc_api.uds_clients, {})
+        self.assertDictEqual(self.ipc_api.pid_ports, {TestConfig.target_pid: self.http_port})
+
+# ################################################################################################################################
+
+    def test_socket_is_used_if_there_is_one(self) -> 'None':
+
+        self.ipc_api.start_uds_server(TestConfig.cluster_name, TestConfig.server_name, TestConfig.target_pid, on_ipc_invoke)
+
+        response = self.invoke(1)
+
+        self.assertTrue(response.meta.is_ok)
+        self.assertEqual(response.data['value'], 1)
+        self.assertIn(TestConfig.target_pid, self.ipc_api.uds_clients)
+
+        # The process stops listening on its socket so HTTP is used instead
+        self.ipc_api.uds_server.stop() # type: ignore
+        self.ipc_api.uds_clients[TestConfig.target_pid].close()
+
+        self.assertFalse(os.path.exists(
+            get_ipc_pid_socket_path(TestConfig.cluster_name, TestConfig.server_name, TestConfig.target_pid)))
+
+        response = self.invoke(2)
+
+        self.assertEqual(response.data['value'], 2)
+        self.assertNotIn(TestConfig.target_pid, self.ipc_api.uds_clients)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
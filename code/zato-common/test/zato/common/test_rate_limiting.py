@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from random import Random
+from unittest import main, TestCase
+
+# netaddr
+from netaddr import IPAddress
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Zato
+from zato.common.odb.model import RateLimitState
+from zato.common.rate_limiting import DefinitionParser, RateLimiting
+from zato.common.rate_limiting.common import AddressNotAllowed, Const, NetworkTable, RateLimitReached
+from zato.common.rate_limiting.limiter import ExactInRAM, LocalCounterStore, ODBCounterStore
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+_object_type = 'http_soap'
+_object_name = 'api.customer'
+_from = '10.0.0.1'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ExactInRAMTestCase(TestCase):
+
+    def _get_rate_limiting(self, counter_store:'any_', definition:'str'='* = 10/m') -> 'RateLimiting':
+
+        rate_limiting = RateLimiting()
+        rate_limiting.cluster_id = 1
+        rate_limiting.counter_store = counter_store
+
+        rate_limiting.create({
+            'id': 'http_soap.1',
+            'type_': _object_type,
+            'name': _object_name,
+            'is_active': True,
+            'parent_type': None,
+            'parent_name': None,
+        }, definition, True, True)
+
+        # Tests flush counters on their own
+        rate_limiting.flusher.kill()
+
+        return rate_limiting
+
+    def _check_limit(self, rate_limiting:'RateLimiting', count:'int') -> 'int':
+        """ Invokes the limiter as many times as requested and returns how many invocations were allowed.
+        """
+        allowed = 0
+
+        for idx in range(count):
+            try:
+                rate_limiting.check_limit('cid.{}'.format(idx), _object_type, _object_name, _from)
+            except RateLimitReached:
+                pass
+            else:
+                allowed += 1
+
+        return allowed
+
+# ################################################################################################################################
+
+    def test_single_server(self) -> 'None':
+
+        rate_limiting = self._get_rate_limiting(LocalCounterStore())
+        config = rate_limiting.get_config(_object_type, _object_name)
+
+        self.assertIsInstance(config, ExactInRAM)
+        self.assertTrue(config.is_exact)
+
+        # A single server is exact no matter if counters were flushed or not
+        self.assertEqual(self._check_limit(rate_limiting, 6), 6)
+        rate_limiting.flush()
+        self.assertEqual(self._check_limit(rate_limiting, 6), 4)
+        rate_limiting.flush()
+        self.assertEqual(self._check_limit(rate_limiting, 1), 0)
+
+# ################################################################################################################################
+
+    def test_many_servers(self) -> 'None':
+
+        counter_store = LocalCounterStore()
+
+        server1 = self._get_rate_limiting(counter_store)
+        server2 = self._get_rate_limiting(counter_store)
+
+        self.assertEqual(self._check_limit(server1, 4), 4)
+        self.assertEqual(self._check_limit(server2, 4), 4)
+
+        # After a flush, each server knows about the requests that the other one received ..
+        server1.flush()
+        server2.flush()
+        server1.flush()
+
+        # .. so together they allow only what remains of the limit.
+        self.assertEqual(self._check_limit(server1, 5), 2)
+
+        # The other server learns about these requests with the next flush
+        server1.flush()
+        server2.flush()
+
+        self.assertEqual(self._check_limit(server2, 5), 0)
+
+# ################################################################################################################################
+
+    def test_flush_failure(self) -> 'None':
+
+        class FailingCounterStore(LocalCounterStore):
+            is_failing = True
+
+            def incr_many(self, *args:'any_', **kwargs:'any_') -> 'any_':
+                if self.is_failing:
+                    raise Exception('Test exception')
+                return super().incr_many(*args, **kwargs)
+
+        counter_store = FailingCounterStore()
+        rate_limiting = self._get_rate_limiting(counter_store)
+
+        self._check_limit(rate_limiting, 3)
+        rate_limiting.flush()
+
+        # Counters that could not be flushed are sent the next time, along with new ones
+        self._check_limit(rate_limiting, 2)
+        counter_store.is_failing = False
+        rate_limiting.flush()
+
+        self.assertListEqual(list(counter_store.totals.values()), [5])
+
+# ################################################################################################################################
+
+    def test_delete(self) -> 'None':
+
+        counter_store = LocalCounterStore()
+        rate_limiting = self._get_rate_limiting(counter_store)
+
+        self._check_limit(rate_limiting, 3)
+        rate_limiting.flush()
+        self.assertEqual(len(counter_store.totals), 1)
+
+        rate_limiting.delete(_object_type, _object_name)
+        self.assertEqual(len(counter_store.totals), 0)
+
+# ################################################################################################################################
+
+    def test_periods_deleted_by_flusher(self) -> 'None':
+
+        counter_store = LocalCounterStore()
+        rate_limiting = self._get_rate_limiting(counter_store)
+        config = rate_limiting.get_config(_object_type, _object_name)
+
+        self._check_limit(rate_limiting, 3)
+
+        # A period that has already ended ..
+        config.by_period['m.2000-01-01T00:00'] = {}
+        counter_store.totals[(_object_type, config.object_info.id, 'm.2000-01-01T00:00', '*')] = 1
+
+        rate_limiting.flush()
+
+        # .. is deleted from RAM when limiters are cleaned up but the store is not accessed at that point ..
+        config.cleanup()
+
+        self.assertNotIn('m.2000-01-01T00:00', config.by_period)
+        self.assertEqual(len(counter_store.totals), 2)
+
+        # .. it is only the flusher that deletes it from the store.
+        rate_limiting.flush()
+
+        self.assertEqual(len(counter_store.totals), 1)
+        self.assertListEqual(config.get_deleted_periods(), [])
+
+# ################################################################################################################################
+
+    def test_odb_counter_store(self) -> 'None':
+
+        engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        RateLimitState.__table__.create(engine)
+
+        counter_store = ODBCounterStore(sessionmaker(bind=engine))
+
+        server1 = self._get_rate_limiting(counter_store)
+        server2 = self._get_rate_limiting(counter_store)
+
+        self._check_limit(server1, 3)
+        self._check_limit(server2, 4)
+
+        server1.flush()
+        server2.flush()
+
+        # Each server added its own requests to the same row ..
+        session = sessionmaker(bind=engine)()
+        rows = session.query(RateLimitState).all()
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].requests, 7)
+        self.assertEqual(rows[0].last_network, '*')
+
+        # .. and learned the total.
+        self.assertEqual(self._check_limit(server2, 5), 3)
+
+        session.close()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class NetworkTableTestCase(TestCase):
+
+    def _get_index_by_scan(self, definition:'any_', address:'IPAddress') -> 'any_':
+        """ Finds the first matching line in the same way that limiters did before they used network tables.
+        """
+        for idx, line in enumerate(definition):
+            if line.from_ == Const.from_any or address in line.from_:
+                return idx
+
+# ################################################################################################################################
+
+    def test_first_line_wins(self) -> 'None':
+
+        definition = DefinitionParser().parse("""
+            10.1.2.0/24 = 5/m
+            10.0.0.0/8 = 10/m
+            10.1.0.0/16 = 15/m
+            10.1.2.3 = 20/m
+            ::1 = 25/m
+            * = 30/m
+            127.0.0.1 = 35/m
+        """, 1, _object_type, _object_name)
+
+        table = NetworkTable(definition)
+
+        self.assertEqual(table.get_index(IPAddress('10.1.2.3')), 0)
+        self.assertEqual(table.get_index(IPAddress('10.1.3.3')), 1)
+        self.assertEqual(table.get_index(IPAddress('::1')), 4)
+        self.assertEqual(table.get_index(IPAddress('127.0.0.1')), 5)
+
+# ################################################################################################################################
+
+    def test_same_as_scan(self) -> 'None':
+
+        random = Random(1208)
+
+        for _ in range(20):
+            lines = []
+
+            for _ in range(50):
+                if random.random() < 0.8:
+                    address = '10.{}.{}.{}'.format(random.randrange(4), random.randrange(4), random.randrange(4))
+                    lines.append('{}/{} = 1/m'.format(address, random.choice([8, 16, 20, 24, 30, 32])))
+                else:
+                    lines.append('fe80::{:x}/{} = 1/m'.format(random.randrange(16), random.choice([64, 124, 128])))
+
+            if random.random() < 0.5:
+                lines.insert(random.randrange(len(lines)), '* = 1/m')
+
+            definition = DefinitionParser().parse('\n'.join(lines), 1, _object_type, _object_name)
+            table = NetworkTable(definition)
+
+            for _ in range(200):
+                if random.random() < 0.8:
+                    address = '10.{}.{}.{}'.format(random.randrange(5), random.randrange(5), random.randrange(5))
+                else:
+                    address = 'fe80::{:x}'.format(random.randrange(32))
+
+                address = IPAddress(address)
+                self.assertEqual(table.get_index(address), self._get_index_by_scan(definition, address), address)
+
+# ################################################################################################################################
+
+    def test_limiter(self) -> 'None':
+
+        rate_limiting = RateLimiting()
+        rate_limiting.create({
+            'id': 'http_soap.1',
+            'type_': _object_type,
+            'name': _object_name,
+            'is_active': True,
+            'parent_type': None,
+            'parent_name': None,
+        }, '10.0.0.0/8 = 1/m', False)
+
+        rate_limiting.check_limit('cid.1', _object_type, _object_name, '10.0.0.1')
+
+        with self.assertRaises(RateLimitReached):
+            rate_limiting.check_limit('cid.2', _object_type, _object_name, '10.0.0.1')
+
+        with self.assertRaises(AddressNotAllowed):
+            rate_limiting.check_limit('cid.3', _object_type, _object_name, '192.168.0.1')
+
+        # Addresses that were not allowed are not cached
+        config = rate_limiting.get_config(_object_type, _object_name)
+        self.assertListEqual(list(config.ip_address_cache), ['10.0.0.1'])
+
+# ################################################################################################################################
+
+    def test_ip_address_cache_evicts_least_recently_used(self) -> 'None':
+
+        rate_limiting = RateLimiting()
+        rate_limiting.create({
+            'id': 'http_soap.1',
+            'type_': _object_type,
+            'name': _object_name,
+            'is_active': True,
+            'parent_type': None,
+            'parent_name': None,
+        }, '10.0.0.0/8 = 1000/m', False)
+
+        config = rate_limiting.get_config(_object_type, _object_name)
+
+        for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            _ = config._get_rate_config_by_from(address, _max_size=3)
+
+        # The first address is used again, which means that the second one is now the least recently used ..
+        _ = config._get_rate_config_by_from('10.0.0.1', _max_size=3)
+        _ = config._get_rate_config_by_from('10.0.0.4', _max_size=3)
+
+        # .. so only that one is evicted when there is no more room for a new address.
+        self.assertListEqual(list(config.ip_address_cache), ['10.0.0.3', '10.0.0.1', '10.0.0.4'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -10,7 +10,7 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 from unittest import main, TestCase
 
 # Zato
-from zato.common.util.stats import collect_current_usage
+from zato.common.util.stats import collect_current_usage, QuantileSketch
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -63,6 +63,44 @@ class StatsTestCase(TestCase):
         self.assertEqual(result['last_timestamp'], last_timestamp3)
         self.assertEqual(result['last_duration'], last_duration3)
 
+# ################################################################################################################################
+
+    def test_collect_current_usage_sketches(self):
+
+        data = []
+
+        # Each worker had different response times ..
+        for durations in range(1, 91), range(91, 101):
+
+            sketch = QuantileSketch()
+            for duration in durations:
+                sketch.add(duration)
+
+            data.append({
+                'value': len(durations),
+                'last_timestamp': '2023-01-01T00:00:00',
+                'last_duration': durations[-1],
+                'min': durations[0],
+                'max': durations[-1],
+                'mean': sum(durations) / len(durations),
+                'total_time': sum(durations),
+                'sketch': sketch.to_string(),
+            })
+
+        result = collect_current_usage(data)
+
+        # .. the mean is of all the invocations rather than of the means of each worker ..
+        self.assertEqual(result['value'], 100)
+        self.assertEqual(result['min'], 1)
+        self.assertEqual(result['max'], 100)
+        self.assertEqual(result['mean'], 50.5)
+
+        # .. and so are the percentiles.
+        self.assertAlmostEqual(result['p50'], 50, delta=50 * 0.02)
+        self.assertAlmostEqual(result['p90'], 90, delta=90 * 0.02)
+        self.assertAlmostEqual(result['p99'], 99, delta=99 * 0.02)
+        self.assertAlmostEqual(result['p99_9'], 100, delta=100 * 0.02)
+
 # ################################################################################################################################
 # ################################################################################################################################
 
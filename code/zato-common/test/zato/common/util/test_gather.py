@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from time import monotonic
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep
+
+# Zato
+from zato.common.util.gather import ScatterGather, TaskStatus
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def run_task(value:'int', wait:'float'=0.05) -> 'int':
+    sleep(wait)
+    return value * 2
+
+def run_failing_task() -> 'None':
+    raise ValueError('Task failed')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ScatterGatherTestCase(TestCase):
+
+    def test_tasks_run_concurrently(self) -> 'None':
+
+        gather = ScatterGather()
+        task_list = [gather.new_task(idx, run_task, idx) for idx in range(20)]
+
+        start = monotonic()
+        result_list = gather.run(task_list)
+        total_time = monotonic() - start
+
+        # Had the tasks run one by one, it would have taken a second
+        self.assertLess(total_time, 0.5)
+
+        self.assertListEqual([result.key for result in result_list], list(range(20)))
+        self.assertListEqual([result.data for result in result_list], [idx * 2 for idx in range(20)])
+        self.assertTrue(all(result.is_ok for result in result_list))
+
+# ################################################################################################################################
+
+    def test_pool_size_is_respected(self) -> 'None':
+
+        gather = ScatterGather(pool_size=2)
+        task_list = [gather.new_task(idx, run_task, idx, 0.1) for idx in range(4)]
+
+        start = monotonic()
+        result_list = gather.run(task_list)
+        total_time = monotonic() - start
+
+        # Two batches of two tasks each
+        self.assertGreaterEqual(total_time, 0.2)
+        self.assertTrue(all(result.is_ok for result in result_list))
+
+# ################################################################################################################################
+
+    def test_partial_results(self) -> 'None':
+
+        gather = ScatterGather()
+        task_list = [
+            gather.new_task('ok', run_task, 1),
+            gather.new_task('error', run_failing_task),
+            gather.new_task('slow', run_task, 3, 10),
+        ]
+
+        start = monotonic()
+        result_list = gather.run(task_list, timeout=0.3)
+        total_time = monotonic() - start
+
+        # The slow task is not waited for ..
+        self.assertLess(total_time, 1)
+
+        ok, error, slow = result_list
+
+        # .. whereas the other ones return their results.
+        self.assertEqual(ok.status, TaskStatus.OK)
+        self.assertEqual(ok.data, 2)
+
+        self.assertEqual(error.status, TaskStatus.Error)
+        self.assertEqual(error.error_info, 'ValueError: Task failed')
+
+        self.assertEqual(slow.status, TaskStatus.Timeout)
+        self.assertIsNone(slow.data)
+
+# ################################################################################################################################
+
+    def test_deadline_covers_tasks_waiting_for_pool(self) -> 'None':
+
+        gather = ScatterGather(pool_size=1)
+        task_list = [gather.new_task(idx, run_task, idx, 0.2) for idx in range(5)]
+
+        start = monotonic()
+        result_list = gather.run(task_list, timeout=0.3)
+        total_time = monotonic() - start
+
+        self.assertLess(total_time, 0.6)
+        self.assertEqual(result_list[0].status, TaskStatus.OK)
+        self.assertListEqual([result.status for result in result_list[2:]], [TaskStatus.Timeout] * 3)
+
+# ################################################################################################################################
+
+    def test_no_tasks(self) -> 'None':
+        self.assertListEqual(ScatterGather().run([]), [])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
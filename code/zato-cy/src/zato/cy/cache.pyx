@@ -13,6 +13,7 @@ from datetime import datetime
 from decimal import Decimal
 from email.utils import formatdate as stdlib_format_date
 from hashlib import sha256
+from heapq import heapify, heappop, heappush
 from json import dumps as json_dumps, JSONEncoder
 from logging import getLogger
 from sys import getsizeof
@@ -23,12 +24,12 @@ from arrow import Arrow
 
 # Cython
 from cpython.dict cimport PyDict_Contains, PyDict_DelItem, PyDict_GetItem, PyDict_Items, PyDict_Keys, PyDict_SetItem, \
-    PyDict_Values
+    PyDict_Size, PyDict_Values
 from cpython.int cimport PyInt_AS_LONG,  PyInt_FromLong, PyInt_GetMax
-from cpython.list cimport PyList_GET_SIZE, PyList_Insert, PyList_SetSlice
-from cpython.object cimport Py_EQ, PyObject, PyObject_RichCompareBool
-from cpython.sequence cimport PySequence_ITEM
+from cpython.mem cimport PyMem_Free, PyMem_Realloc
+from cpython.object cimport PyObject
 from libc.stdint cimport uint64_t
+from libc.string cimport memset
 #from posix.time cimport timeval, timezone, gettimeofday
 
 # gevent
@@ -37,6 +38,9 @@ from gevent.lock import RLock
 # regex
 from regex import compile as re_compile
 
+# sortedcontainers
+from sortedcontainers import SortedList
+
 # Python 2/3 compatibility
 from builtins import bytes
 from six import binary_type, integer_types, string_types, text_type
@@ -60,6 +64,38 @@ key_types = len_values + integer_types
 class CACHE:
     DEFAULT_SIZE = _COMMON_CACHE.DEFAULT.MAX_SIZE
     MAX_ITEM_SIZE = _COMMON_CACHE.DEFAULT.MAX_ITEM_SIZE
+    MAX_BYTES = _COMMON_CACHE.DEFAULT.MAX_BYTES
+
+    # Approximately how many bytes each entry takes up in addition to its key and value,
+    # i.e. the Entry object itself, its hash and timestamps.
+    ENTRY_OVERHEAD = 1024
+
+    # How many recency stamps a position index can hold at least before it needs to renumber its entries
+    POSITION_INDEX_MIN_CAPACITY = 1024
+
+    # Types of key indexes that bulk operations can use
+    KEY_INDEX_NONE = _COMMON_CACHE.KEY_INDEX.NO_INDEX.id
+    KEY_INDEX_PREFIX_SUFFIX = _COMMON_CACHE.KEY_INDEX.PREFIX_SUFFIX.id
+    KEY_INDEX_PREFIX_SUFFIX_CONTAINS = _COMMON_CACHE.KEY_INDEX.PREFIX_SUFFIX_CONTAINS.id
+
+    # Length of n-grams that substring lookups use - patterns shorter than that always require a full scan
+    KEY_INDEX_NGRAM_SIZE = 3
+
+    # How many records of deleted entries the expiry heap may hold before it is compacted,
+    # unless there are even more records of entries that still exist.
+    EXPIRY_HEAP_MIN_STALE = 1024
+
+# ################################################################################################################################
+
+# What kind of keys bulk operations are looking for
+cdef enum:
+    _MATCH_PREFIX
+    _MATCH_SUFFIX
+    _MATCH_REGEX
+    _MATCH_CONTAINS
+    _MATCH_NOT_CONTAINS
+    _MATCH_CONTAINS_ALL
+    _MATCH_CONTAINS_ANY
 
 # ################################################################################################################################
 
@@ -78,6 +114,23 @@ class _JSONEncoder(JSONEncoder):
 
 # ################################################################################################################################
 
+cdef inline object _get_canonical_value(object value):
+    """ Returns a canonical representation of a value, e.g. if it is a dictionary then it will be the same
+    no matter in which order internally the keys are stored seeing as from our perspective there is no intrinsic order.
+    """
+    if not isinstance(value, str_types):
+        value = json_dumps(value, sort_keys=True, cls=_JSONEncoder)
+    return value if isinstance(value, bytes) else value.encode('utf8')
+
+# ################################################################################################################################
+
+cdef inline uint64_t _get_cost(object key, object canonical_value):
+    """ Returns an approximate number of bytes that an entry with a given key and value takes up.
+    """
+    return getsizeof(key) + len(canonical_value) + CACHE.ENTRY_OVERHEAD
+
+# ################################################################################################################################
+
 cdef class Entry:
     """ Represents an individual value stored in a cache.
     """
@@ -125,6 +178,22 @@ cdef class Entry:
         public object last_write_http
         public object prev_write_http
 
+        # Neighbours in the cache's recency list - _prev was used more recently than this entry and _next less recently
+        Entry _prev
+        Entry _next
+
+        # Recency stamp, grows each time the entry is moved to the head of the recency list
+        long _stamp
+
+        # When the entry was added to the cache, relative to other entries - this is the order the cache's dict iterates in
+        uint64_t _seq
+
+        # Expiration time under which the entry's current record in the expiry heap is stored, 0.0 if there is no such record
+        double _scheduled_at
+
+        # Approximately how many bytes the entry takes up - computed each time its value is set
+        public uint64_t cost
+
     cpdef dict to_dict(self):
         return {
             'key': self.key,
@@ -157,20 +226,16 @@ cdef class Entry:
     cpdef set_metadata(self, bint log_details=False):
         """ Configures metadata after set* operations.
         """
+        self._set_metadata(_get_canonical_value(self.value), log_details)
+
+    cdef object _set_metadata(self, object canonical_value, bint log_details=False):
+        """ Configures metadata after set* operations, using a canonical representation of the value computed upfront.
+        """
         # Will contain the computed hash value
         h = sha256()
 
-        # Make sure that we hash a canonical representation of the object,
-        # e.g. if it is a dictionary then we want to hash the same representation
-        # of this dictionary no matter in which order internally the keys are stored
-        # seeing as from our perspective there is no intrinsic order.
-        if isinstance(self.value, str_types):
-            value = self.value
-        else:
-            value = json_dumps(self.value, sort_keys=True, cls=_JSONEncoder)
-        value = value if isinstance(value, bytes) else value.encode('utf8')
-
-        h.update(value)
+        # Make sure that we hash a canonical representation of the object
+        h.update(canonical_value)
         self.hash = str(h.hexdigest())
 
         # Timestamps in formats other than seconds since epoch
@@ -196,18 +261,277 @@ cdef class Entry:
 
 # ################################################################################################################################
 
+cdef class _PositionIndex:
+    """ A Fenwick tree over recency stamps of cache entries. Each time an entry is moved to the head of the recency list
+    it receives a new, higher, stamp and the tree keeps track of how many live entries use stamps up to a given value,
+    which lets the cache compute the position of any entry in O(log n) instead of walking the whole recency list.
+    """
+    cdef:
+        long *tree
+        public long capacity
+        public long next_stamp
+
+    def __cinit__(self):
+        self.tree = NULL
+        self.capacity = 0
+        self.next_stamp = 1
+
+    def __dealloc__(self):
+        PyMem_Free(self.tree)
+
+# ################################################################################################################################
+
+    cdef int rebuild(self, long count) except -1:
+        """ Resets the tree so that it contains stamps from 1 to count, all of them in use. This is what the cache calls
+        after it renumbers its entries, once the stamps it already handed out no longer fit in the tree.
+        """
+        cdef long capacity = max(2 * count + 2, CACHE.POSITION_INDEX_MIN_CAPACITY)
+        cdef long idx
+        cdef long parent_idx
+        cdef long *tree = <long *>PyMem_Realloc(self.tree, (capacity + 1) * sizeof(long))
+
+        if tree is NULL:
+            raise MemoryError()
+
+        self.tree = tree
+        self.capacity = capacity
+        self.next_stamp = count + 1
+
+        memset(self.tree, 0, (capacity + 1) * sizeof(long))
+
+        # Building the tree in place in O(n) rather than by adding each stamp individually in O(n log n)
+        for idx in range(1, count + 1):
+            self.tree[idx] += 1
+            parent_idx = idx + (idx & -idx)
+            if parent_idx <= capacity:
+                self.tree[parent_idx] += self.tree[idx]
+
+        for idx in range(count + 1, capacity + 1):
+            parent_idx = idx + (idx & -idx)
+            if parent_idx <= capacity:
+                self.tree[parent_idx] += self.tree[idx]
+
+        return 0
+
+# ################################################################################################################################
+
+    cdef inline void add(self, long stamp, long delta):
+        while stamp <= self.capacity:
+            self.tree[stamp] += delta
+            stamp += stamp & -stamp
+
+# ################################################################################################################################
+
+    cdef inline long count_up_to(self, long stamp):
+        """ Returns the number of live entries whose stamps are not greater than the one given on input.
+        """
+        cdef long out = 0
+
+        while stamp > 0:
+            out += self.tree[stamp]
+            stamp -= stamp & -stamp
+
+        return out
+
+# ################################################################################################################################
+
+cdef inline bint _key_matches(int match_type, object key, object data, object regex):
+    """ Returns True if a string key matches the input criteria of a bulk operation.
+    """
+    if match_type == _MATCH_PREFIX:
+        return key.startswith(data)
+
+    elif match_type == _MATCH_SUFFIX:
+        return key.endswith(data)
+
+    elif match_type == _MATCH_REGEX:
+        return regex.match(key) is not None
+
+    elif match_type == _MATCH_CONTAINS:
+        return data in key
+
+    elif match_type == _MATCH_NOT_CONTAINS:
+        return data not in key
+
+    elif match_type == _MATCH_CONTAINS_ALL:
+        for elem in data:
+            if elem not in key:
+                return False
+        return True
+
+    elif match_type == _MATCH_CONTAINS_ANY:
+        for elem in data:
+            if elem in key:
+                return True
+        return False
+
+# ################################################################################################################################
+
+cdef inline set _get_ngrams(object value):
+    cdef Py_ssize_t ngram_size = CACHE.KEY_INDEX_NGRAM_SIZE
+    return {value[idx:idx+ngram_size] for idx in range(len(value) - ngram_size + 1)}
+
+# ################################################################################################################################
+
+cdef class _KeyIndex:
+    """ Secondary indexes of string keys that let bulk operations find matching keys in O(log n + matches)
+    instead of scanning the whole cache - sorted keys answer prefix queries, sorted reversed keys answer suffix ones
+    and, optionally, an n-gram index answers substring queries.
+    """
+    cdef:
+        public object index_type
+        object keys
+        object reversed_keys
+        dict ngrams
+
+    def __cinit__(self, object index_type):
+        self.index_type = index_type
+        self.keys = SortedList()
+        self.reversed_keys = SortedList()
+        self.ngrams = {} if index_type == CACHE.KEY_INDEX_PREFIX_SUFFIX_CONTAINS else None
+
+# ################################################################################################################################
+
+    cdef object add(self, object key):
+        self.keys.add(key)
+        self.reversed_keys.add(key[::-1])
+
+        if self.ngrams is not None:
+            for ngram in _get_ngrams(key):
+                keys = self.ngrams.get(ngram)
+                if keys is None:
+                    self.ngrams[ngram] = keys = set()
+                keys.add(key)
+
+# ################################################################################################################################
+
+    cdef object remove(self, object key):
+        self.keys.remove(key)
+        self.reversed_keys.remove(key[::-1])
+
+        if self.ngrams is not None:
+            for ngram in _get_ngrams(key):
+                keys = self.ngrams[ngram]
+                keys.discard(key)
+                if not keys:
+                    del self.ngrams[ngram]
+
+# ################################################################################################################################
+
+    cdef object clear(self):
+        self.keys.clear()
+        self.reversed_keys.clear()
+
+        if self.ngrams is not None:
+            self.ngrams.clear()
+
+# ################################################################################################################################
+
+    cdef list _with_prefix(self, object sorted_keys, object prefix):
+        cdef list out = []
+
+        for key in sorted_keys.irange(minimum=prefix):
+            if not key.startswith(prefix):
+                break
+            out.append(key)
+
+        return out
+
+# ################################################################################################################################
+
+    cdef object _containing(self, object data):
+        """ Returns all keys containing the input string or None if the n-gram index cannot be used to find them.
+        """
+        cdef set smallest = None
+
+        if self.ngrams is None or len(data) < CACHE.KEY_INDEX_NGRAM_SIZE:
+            return None
+
+        # Each matching key must contain each of the pattern's n-grams so it suffices
+        # to look up the smallest of the sets and confirm which of its keys really contain the pattern.
+        for ngram in _get_ngrams(data):
+            keys = self.ngrams.get(ngram)
+            if not keys:
+                return []
+            if smallest is None or len(keys) < len(smallest):
+                smallest = keys
+
+        return [key for key in smallest if data in key]
+
+# ################################################################################################################################
+
+    cdef object find(self, int match_type, object data):
+        """ Returns all keys matching the input criteria, in no particular order, or None if a given type of query
+        cannot be answered by the index and the caller should scan all the keys instead.
+        """
+        cdef object out
+        cdef set found
+
+        if match_type == _MATCH_PREFIX:
+            return self._with_prefix(self.keys, data)
+
+        elif match_type == _MATCH_SUFFIX:
+            return [key[::-1] for key in self._with_prefix(self.reversed_keys, data[::-1])]
+
+        elif match_type == _MATCH_CONTAINS:
+            return self._containing(data)
+
+        elif match_type == _MATCH_CONTAINS_ALL:
+
+            # Look up candidates by the longest pattern, which is likely to be the most selective one,
+            # and confirm that they contain all the other ones too.
+            if not data:
+                return None
+
+            out = self._containing(max(data, key=len))
+            if out is None:
+                return None
+
+            return [key for key in out if _key_matches(_MATCH_CONTAINS_ALL, key, data, None)]
+
+        elif match_type == _MATCH_CONTAINS_ANY:
+            found = set()
+
+            for elem in data:
+                out = self._containing(elem)
+                if out is None:
+                    return None
+                found.update(out)
+
+            return list(found)
+
+        # Regular expressions and negative patterns always require a scan
+        return None
+
+# ################################################################################################################################
+
 cdef class Cache:
-    """ An LRU cache that optionally rejects entries bigger than N bytes. Entries can have a TTL assigned - periodic processes
-    will clean up entries older than allowed.
+    """ An LRU cache that optionally rejects entries bigger than N bytes and evicts the least recently used ones
+    whenever all of them together exceed an approximate memory budget. Entries can have a TTL assigned - periodic processes
+    will clean up entries older than allowed. Recency of entries is kept in a doubly-linked list threaded through
+    the entries themselves so that moving an entry to the head, or evicting the tail, is O(1), whereas positions
+    of entries are computed on demand, in O(log n), by a position index.
     """
     cdef:
         public long max_size
         public long max_item_size
         public bint has_max_item_size
+        public long max_bytes             # Approximate memory budget, in bytes, of all the entries, 0 if there is none
+        public bint has_max_bytes
+        public uint64_t current_bytes     # Approximately how many bytes all the entries take up now
+        public uint64_t peak_bytes        # The highest value current_bytes ever had, not reset by .clear
         public bint extend_expiry_on_get
         public bint extend_expiry_on_set
         public dict _data
-        public list _index
+        Entry _head # The most recently used entry
+        Entry _tail # The least recently used entry, the first one to evict
+        _PositionIndex _positions
+        _KeyIndex _key_index   # An optional index of string keys that bulk operations use, None if not configured
+        uint64_t _insertions   # How many entries have been added so far, used to order entries the way self._data does
+        list _expiry_heap      # Records of (expires_at, seq, entry) for entries that can expire, soonest first
+        uint64_t _expiry_stale # How many records in the expiry heap belong to entries that no longer exist
+        public uint64_t expiry_examined       # How many expiry heap records the last call to .delete_expired looked at
+        public uint64_t expiry_examined_total # The same as above but for all calls to .delete_expired
         public uint64_t misses
         public uint64_t hits
         public uint64_t set_ops
@@ -220,7 +544,9 @@ cdef class Cache:
 
     def __cinit__(self):
         self._data = {}
-        self._index = []
+        self._expiry_heap = []
+        self._positions = _PositionIndex()
+        self._positions.rebuild(0)
         self.hits_per_position = {}
         self._expired_on_op = []
         self.hits = 0
@@ -229,23 +555,57 @@ cdef class Cache:
         self.get_ops = 0
         self._regex_cache = {}
 
-    def __init__(self, max_size=None, max_item_size=None, extend_expiry_on_get=True, extend_expiry_on_set=True, lock=None):
+    def __init__(self, max_size=None, max_item_size=None, extend_expiry_on_get=True, extend_expiry_on_set=True, lock=None,
+        key_index=None, max_bytes=None):
         self._lock = lock or RLock()
         self.default_get = object()
         with self._lock:
-            self._update_config(max_size, max_item_size, extend_expiry_on_get, extend_expiry_on_set)
+            self._update_config(max_size, max_item_size, extend_expiry_on_get, extend_expiry_on_set, key_index, max_bytes)
 
-    def _update_config(self, max_size, max_item_size, extend_expiry_on_get, extend_expiry_on_set):
+    def _update_config(self, max_size, max_item_size, extend_expiry_on_get, extend_expiry_on_set, key_index=None,
+        max_bytes=None):
         self.max_size = max_size or CACHE.DEFAULT_SIZE
         self.max_item_size = max_item_size or CACHE.MAX_ITEM_SIZE
         self.has_max_item_size = self.max_item_size > 0
+        self.max_bytes = int(max_bytes or CACHE.MAX_BYTES)
+        self.has_max_bytes = self.max_bytes > 0
         self.extend_expiry_on_get = extend_expiry_on_get
         self.extend_expiry_on_set = extend_expiry_on_set
         self.hits_per_position.update(dict((key, 0) for key in xrange(self.max_size)))
+        self._set_key_index(key_index or CACHE.KEY_INDEX_NONE)
+
+        # The budget may have been just lowered
+        if self.has_max_bytes:
+            self._evict_to_max_bytes(None)
 
     def update_config(self, config):
         with self._lock:
-            self._update_config(config.max_size, config.max_item_size, config.extend_expiry_on_get, config.extend_expiry_on_set)
+            self._update_config(config.max_size, config.max_item_size, config.extend_expiry_on_get, config.extend_expiry_on_set,
+                config.get('key_index'), config.get('max_bytes'))
+
+# ################################################################################################################################
+
+    cdef object _set_key_index(self, object key_index):
+        """ Creates, rebuilds or drops the key index if its type changed. Must be called with self._lock held.
+        """
+        current = self._key_index.index_type if self._key_index is not None else CACHE.KEY_INDEX_NONE
+
+        if key_index == current:
+            return
+
+        if key_index == CACHE.KEY_INDEX_NONE:
+            self._key_index = None
+        else:
+            self._key_index = _KeyIndex(key_index)
+            for key in self._data:
+                if isinstance(key, str_types):
+                    self._key_index.add(key)
+
+# ################################################################################################################################
+
+    property key_index:
+        def __get__(self):
+            return self._key_index.index_type if self._key_index is not None else CACHE.KEY_INDEX_NONE
 
 # ################################################################################################################################
 
@@ -274,7 +634,7 @@ cdef class Cache:
 
     def __len__(self):
         with self._lock:
-            return PyList_GET_SIZE(self._index)
+            return PyDict_Size(self._data)
 
 # ################################################################################################################################
 
@@ -288,11 +648,25 @@ cdef class Cache:
         with self._lock:
             return self._data.iterkeys()
 
+# ################################################################################################################################
+
+    cdef list _keys_by_position(self):
+        """ Returns all keys, starting from the most recently used one. Must be called with self._lock held.
+        """
+        cdef list out = []
+        cdef Entry entry = self._head
+
+        while entry is not None:
+            out.append(entry.key)
+            entry = entry._next
+
+        return out
+
 # ################################################################################################################################
 
     cpdef list keys_by_position(self):
         with self._lock:
-            return list(self._index)
+            return self._keys_by_position()
 
 # ################################################################################################################################
 
@@ -322,10 +696,11 @@ cdef class Cache:
 
     def get_slice(self, start, stop, step):
         with self._lock:
-            for key in self._index[start:stop:step]:
-                entry = self._data[key]
+            keys = self._keys_by_position()
+            for position in range(len(keys))[start:stop:step]:
+                entry = self._data[keys[position]]
                 as_dict = entry.to_dict()
-                as_dict['position'] = self._get_index(key)
+                as_dict['position'] = position
                 yield as_dict
 
 # ################################################################################################################################
@@ -336,7 +711,14 @@ cdef class Cache:
         # The attributes cleared below must be kept in sync with the ones from __cinit__.
         with self._lock:
             self._data.clear()
-            self._index[:] = []
+            self._head = None
+            self._tail = None
+            self._positions.rebuild(0)
+            if self._key_index is not None:
+                self._key_index.clear()
+            self._expiry_heap[:] = []
+            self._expiry_stale = 0
+            self.current_bytes = 0
             self.hits_per_position.clear()
             self._expired_on_op[:] = []
             self.hits = 0
@@ -354,10 +736,20 @@ cdef class Cache:
             return
         else:
             # We run under self.lock so at this point we know that the key was valid
-            # and _remove_from_index_by_idx is safe to call.
+            # and the entry is still linked, which means that _unlink is safe to call.
             out = entry.value
             del self._data[key]
-            self._remove_from_index_by_idx(self._get_index(key))
+            self._unlink(entry)
+            self.current_bytes -= entry.cost
+
+            if self._key_index is not None and isinstance(key, str_types):
+                self._key_index.remove(key)
+
+            # The entry's record in the expiry heap, if any, will be dropped once it is popped or the heap is compacted
+            if entry._scheduled_at:
+                entry._scheduled_at = 0.0
+                self._expiry_stale += 1
+                self._maybe_compact_expiry_heap()
 
             return out
 
@@ -377,25 +769,14 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef object key
+        cdef object value
         cdef dict out = {}
-        cdef object value = None
-        cdef list to_delete = []
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if key.startswith(data):
-                    if return_found:
-                        out[key] = <Entry>self._data[key].value
-                    to_delete.append(key)
-                if idx == limit:
-                    break
-
-        # We could not do in the loop above because that would have changed self._data
-        # and result in 'RuntimeError: dictionary changed size during iteration'.
-        for key in to_delete:
-            self._delete(key)
+            for key in self._find_keys(_MATCH_PREFIX, data, limit):
+                value = self._delete(key)
+                if return_found:
+                    out[key] = value
 
         return out
 
@@ -407,25 +788,14 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef object key
+        cdef object value
         cdef dict out = {}
-        cdef object value = None
-        cdef list to_delete = []
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if key.endswith(data):
-                    if return_found:
-                        out[key] = <Entry>self._data[key].value
-                    to_delete.append(key)
-                if idx == limit:
-                    break
-
-        # We could not do in the loop above because that would have changed self._data
-        # and result in 'RuntimeError: dictionary changed size during iteration'.
-        for key in to_delete:
-            self._delete(key)
+            for key in self._find_keys(_MATCH_SUFFIX, data, limit):
+                value = self._delete(key)
+                if return_found:
+                    out[key] = value
 
         return out
 
@@ -436,27 +806,15 @@ cdef class Cache:
         that matched the input criteria along with their previous values.
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
-        cdef object regex = self._regex_cache.setdefault(data, re_compile(data))
         cdef object key
+        cdef object value
         cdef dict out = {}
-        cdef object value = None
-        cdef list to_delete = []
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if regex.match(key):
-                    if return_found:
-                        out[key] = <Entry>self._data[key].value
-                    to_delete.append(key)
-                if idx == limit:
-                    break
-
-        # We could not do in the loop above because that would have changed self._data
-        # and result in 'RuntimeError: dictionary changed size during iteration'.
-        for key in to_delete:
-            self._delete(key)
+            for key in self._find_keys(_MATCH_REGEX, data, limit):
+                value = self._delete(key)
+                if return_found:
+                    out[key] = value
 
         return out
 
@@ -468,25 +826,14 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef object key
+        cdef object value
         cdef dict out = {}
-        cdef object value = None
-        cdef list to_delete = []
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if data in key:
-                    if return_found:
-                        out[key] = <Entry>self._data[key].value
-                    to_delete.append(key)
-                if idx == limit:
-                    break
-
-        # We could not do in the loop above because that would have changed self._data
-        # and result in 'RuntimeError: dictionary changed size during iteration'.
-        for key in to_delete:
-            self._delete(key)
+            for key in self._find_keys(_MATCH_CONTAINS, data, limit):
+                value = self._delete(key)
+                if return_found:
+                    out[key] = value
 
         return out
 
@@ -498,25 +845,14 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef object key
+        cdef object value
         cdef dict out = {}
-        cdef object value = None
-        cdef list to_delete = []
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if data not in key:
-                    if return_found:
-                        out[key] = <Entry>self._data[key].value
-                    to_delete.append(key)
-                if idx == limit:
-                    break
-
-        # We could not do in the loop above because that would have changed self._data
-        # and result in 'RuntimeError: dictionary changed size during iteration'.
-        for key in to_delete:
-            self._delete(key)
+            for key in self._find_keys(_MATCH_NOT_CONTAINS, data, limit):
+                value = self._delete(key)
+                if return_found:
+                    out[key] = value
 
         return out
 
@@ -528,34 +864,14 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef object key
+        cdef object value
         cdef dict out = {}
-        cdef object value = None
-        cdef list to_delete = []
-        cdef bint add_key
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-
-                use_key = True
-                for elem in data:
-                    if elem not in key:
-                        use_key = False
-                        break
-
-                if use_key:
-                    if return_found:
-                        out[key] = <Entry>self._data[key].value
-                    to_delete.append(key)
-
-                if idx == limit:
-                    break
-
-        # We could not do in the loop above because that would have changed self._data
-        # and result in 'RuntimeError: dictionary changed size during iteration'.
-        for key in to_delete:
-            self._delete(key)
+            for key in self._find_keys(_MATCH_CONTAINS_ALL, data, limit):
+                value = self._delete(key)
+                if return_found:
+                    out[key] = value
 
         return out
 
@@ -568,51 +884,85 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef object key
+        cdef object value
         cdef dict out = {}
-        cdef object value = None
-        cdef list to_delete = []
-        cdef bint use_key
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
+            for key in self._find_keys(_MATCH_CONTAINS_ANY, data, limit):
+                value = self._delete(key)
+                if return_found:
+                    out[key] = value
+
+        return out
+
+# ################################################################################################################################
+
+    cdef list _find_keys(self, int match_type, object data, int limit):
+        """ Returns string keys matching the input criteria of a bulk operation, in the same order that a scan
+        of self._data would find them in, so that the operation has the same effects no matter if the key index is used or not.
+        The index is not used if there is a limit because the limit applies to how many keys a scan looks at.
+        Must be called with self._lock held.
+        """
+        cdef object found
+        cdef list out
+
+        if self._key_index is not None and not limit:
+            found = self._key_index.find(match_type, data)
+            if found is not None:
+                out = [((<Entry>PyDict_GetItem(self._data, key))._seq, key) for key in found]
+                out.sort()
+                return [elem[1] for elem in out]
 
-                use_key = False
-                for elem in data:
-                    if elem in key:
-                        use_key = True
-                        break
+        return self._scan_keys(match_type, data, limit)
 
-                if use_key:
-                    if return_found:
-                        out[key] = <Entry>self._data[key].value
-                    to_delete.append(key)
+# ################################################################################################################################
+
+    cdef list _scan_keys(self, int match_type, object data, int limit):
+        """ Scans all keys for the ones matching the input criteria of a bulk operation. Must be called with self._lock held.
+        """
+        cdef list out = []
+        cdef object regex = None
 
-                if idx == limit:
-                    break
+        if match_type == _MATCH_REGEX:
+            regex = self._regex_cache.setdefault(data, re_compile(data))
 
-        # We could not do in the loop above because that would have changed self._data
-        # and result in 'RuntimeError: dictionary changed size during iteration'.
-        for key in to_delete:
-            self._delete(key)
+        for idx, key in enumerate(self._data.iterkeys(), 1):
+            if not isinstance(key, str_types):
+                continue
+            if _key_matches(match_type, key, data, regex):
+                out.append(key)
+            if idx == limit:
+                break
 
         return out
 
 # ################################################################################################################################
 
-    cdef inline long _get_index(self, object key):
-        """ C-only version of self.get_position that will always return a long - must be called only
-        if key is known to be in self._index or self._data and only with self._lock held.
+    cdef inline long _get_position(self, Entry entry):
+        """ C-only version of self.index that will always return a long - must be called only
+        if the entry is known to be in self._data and only with self._lock held. Position 0 is the head of the recency list,
+        i.e. it is the number of entries that were used more recently than the input one.
+        """
+        return PyDict_Size(self._data) - self._positions.count_up_to(entry._stamp)
+
+# ################################################################################################################################
+
+    cdef object _evict_to_max_bytes(self, Entry keep):
+        """ Deletes entries from the tail of the recency list until all of them fit in self.max_bytes,
+        except for the one given on input, if any. Must be called with self._lock held.
         """
-        cdef Py_ssize_t index_idx = 0
-        cdef Py_ssize_t cache_size = PyList_GET_SIZE(self._index)
-        cdef bint index_key_eq
+        cdef Entry victim
 
-        while index_idx < cache_size:
-            if PyObject_RichCompareBool(PySequence_ITEM(self._index, index_idx), <object>key, Py_EQ):
-                return index_idx
-            index_idx += 1
+        while self.current_bytes > <uint64_t>self.max_bytes:
+            victim = self._tail
+
+            if victim is keep:
+                victim = victim._prev
+
+            if victim is None:
+                break
+
+            self._delete(victim.key)
 
 # ################################################################################################################################
 
@@ -621,18 +971,67 @@ cdef class Cache:
         """
         with self._lock:
             if PyDict_Contains(self._data, key):
-                return self._get_index(key)
+                return self._get_position(<Entry>PyDict_GetItem(self._data, key))
+
+# ################################################################################################################################
+
+    cdef inline object _link_head(self, Entry entry):
+        """ Makes an unlinked entry the head of the recency list and gives it a new stamp. Must be called with self._lock held.
+        """
+        # Renumber all the entries if there are no stamps left in the position index
+        if self._positions.next_stamp > self._positions.capacity:
+            self._renumber()
+
+        entry._stamp = self._positions.next_stamp
+        self._positions.next_stamp += 1
+        self._positions.add(entry._stamp, 1)
+
+        entry._prev = None
+        entry._next = self._head
+
+        if self._head is None:
+            self._tail = entry
+        else:
+            self._head._prev = entry
+
+        self._head = entry
 
 # ################################################################################################################################
 
-    cdef inline object _remove_from_index_by_idx(self, long idx):
-        """ Remove object from from index by its position - this is what listremove in Objects/listobject.c does
-        and we use the same technique because there is no public PyList_Remove function. Returns the removed key.
+    cdef inline object _unlink(self, Entry entry):
+        """ Removes an entry from the recency list in O(1). Must be called with self._lock held.
         """
-        cdef object index_key = PySequence_ITEM(self._index, idx)
-        PyList_SetSlice(self._index, idx, idx+1, <object>NULL)
+        if entry._prev is None:
+            self._head = entry._next
+        else:
+            entry._prev._next = entry._next
 
-        return index_key
+        if entry._next is None:
+            self._tail = entry._prev
+        else:
+            entry._next._prev = entry._prev
+
+        entry._prev = None
+        entry._next = None
+
+        self._positions.add(entry._stamp, -1)
+
+# ################################################################################################################################
+
+    cdef object _renumber(self):
+        """ Assigns consecutive stamps, starting from 1 at the tail, to all the linked entries and rebuilds
+        the position index accordingly. Because the index is rebuilt with twice as much capacity as there are entries,
+        this runs once per at least n moves to the head, which keeps the amortised cost of a move O(1).
+        """
+        cdef long stamp = 0
+        cdef Entry entry = self._tail
+
+        while entry is not None:
+            stamp += 1
+            entry._stamp = stamp
+            entry = entry._prev
+
+        self._positions.rebuild(stamp)
 
 # ################################################################################################################################
 
@@ -653,11 +1052,10 @@ cdef class Cache:
         cdef Entry entry
         cdef double _now
         cdef double _orig_now = 0.0
-        cdef Py_ssize_t cache_size = PyList_GET_SIZE(self._index)
-        cdef Py_ssize_t index_idx
-        cdef bint old_key_eq
-        cdef long hits_per_position
+        cdef Py_ssize_t cache_size = PyDict_Size(self._data)
         cdef long len_value
+        cdef object canonical_value
+        cdef uint64_t cost
 
         # If multiple processes synchronize contents of their caches, the one that originally added the keys
         # will dictate what the actual, original key addition timestamp was. Otherwise, we are this first
@@ -676,6 +1074,15 @@ cdef class Cache:
                 if len_value > self.max_item_size:
                     raise ValueError('Value too long {} > {}'.format(len_value, self.max_item_size))
 
+        # Hashing needs a canonical representation of the value anyway so we compute it once, here, before we know
+        # whether the value will fit in the memory budget at all.
+        canonical_value = _get_canonical_value(value)
+        cost = _get_cost(key, canonical_value)
+
+        if self.has_max_bytes:
+            if cost > <uint64_t>self.max_bytes:
+                raise ValueError('Value too big {} > {}'.format(cost, self.max_bytes))
+
         # Update total # of .set operations
         self.set_ops += 1
 
@@ -704,20 +1111,25 @@ cdef class Cache:
                         if self.extend_expiry_on_set and entry.expiry:
                             entry.expires_at = _now + entry.expiry
 
+            # The entry may have just received its expiration time
+            self._schedule_expiry(entry)
+
             # Update access information for that entry, if we get to this point, the entry is not expired,
             # or at least its expiry time has been extended.
             entry.prev_write = entry.last_write
             entry.last_write = _now
             out = entry.value
             entry.value = value
-            entry.set_metadata()
+            entry._set_metadata(canonical_value)
+            self.current_bytes = self.current_bytes - entry.cost + cost
+            entry.cost = cost
 
         # No such key in cache - let's add it.
         else:
 
             # Make sure there is room for the new key
             if cache_size == self.max_size:
-                PyDict_DelItem(self._data, self._index.pop())
+                self._delete(self._tail.key)
 
             # Actually insert entry
             entry = Entry()
@@ -730,10 +1142,26 @@ cdef class Cache:
             entry.hits = 0
             entry.expiry = expiry
             entry.expires_at = 0.0 if not expiry else _now + expiry
-            entry.set_metadata()
+            entry._set_metadata(canonical_value)
+            entry.cost = cost
+            self.current_bytes += cost
+
+            entry._seq = self._insertions
+            self._insertions += 1
 
             PyDict_SetItem(self._data, key, entry)
-            PyList_Insert(self._index, 0, key)
+            self._link_head(entry)
+            self._schedule_expiry(entry)
+
+            if self._key_index is not None and isinstance(key, str_types):
+                self._key_index.add(key)
+
+        # Make room for the value that was just set, if needed
+        if self.has_max_bytes:
+            self._evict_to_max_bytes(entry)
+
+        if self.current_bytes > self.peak_bytes:
+            self.peak_bytes = self.current_bytes
 
         # If any output dict for metadata was passed in by reference, set its requires items.
         if meta_ref is not None:
@@ -762,27 +1190,25 @@ cdef class Cache:
         cdef double _now = orig_now if orig_now else self._get_timestamp()
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if key.startswith(data):
+            for key in self._find_keys(_MATCH_PREFIX, data, limit):
 
-                    # Set it before the update which would overwrite it, this is why we can return
-                    # value alone, without any metadata.
-                    if return_found:
-                        entry = <Entry>self._data[key]
-                        out[key] = entry if details else entry.value
+                # Setting a key may have evicted others that matched too, if the cache has a max. size in bytes,
+                # and these are not set again because this would undo the eviction.
+                if not PyDict_Contains(self._data, key):
+                    continue
 
-                    self._set(key, value, expiry, False, None, _now)
+                # Set it before the update which would overwrite it, this is why we can return
+                # value alone, without any metadata.
+                if return_found:
+                    entry = <Entry>self._data[key]
+                    out[key] = entry if details else entry.value
 
-                    # Indicate to our caller that there was at least one matching key
-                    if _needs_any_found_report:
-                        meta_ref['_any_found'] = True
-                        _needs_any_found_report = False
+                self._set(key, value, expiry, False, None, _now)
 
-                # Our caller knows how many keys to look up at most
-                if idx == limit:
-                    break
+                # Indicate to our caller that there was at least one matching key
+                if _needs_any_found_report:
+                    meta_ref['_any_found'] = True
+                    _needs_any_found_report = False
 
         if meta_ref:
             meta_ref['_now'] = _now
@@ -803,29 +1229,25 @@ cdef class Cache:
         cdef double _now = orig_now if orig_now else self._get_timestamp()
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
+            for key in self._find_keys(_MATCH_SUFFIX, data, limit):
 
-                if not isinstance(key, str_types):
+                # Setting a key may have evicted others that matched too, if the cache has a max. size in bytes,
+                # and these are not set again because this would undo the eviction.
+                if not PyDict_Contains(self._data, key):
                     continue
 
-                if key.endswith(data):
-
-                    # Set it before the update which would overwrite it, this is why we can return
-                    # value alone, without any metadata.
-                    if return_found:
-                        entry = <Entry>self._data[key]
-                        out[key] = entry if details else entry.value
-
-                    self._set(key, value, expiry, False, None, _now)
+                # Set it before the update which would overwrite it, this is why we can return
+                # value alone, without any metadata.
+                if return_found:
+                    entry = <Entry>self._data[key]
+                    out[key] = entry if details else entry.value
 
-                    # Indicate to our caller that there was at least one matching key
-                    if _needs_any_found_report:
-                        meta_ref['_any_found'] = True
-                        _needs_any_found_report = False
+                self._set(key, value, expiry, False, None, _now)
 
-                # Our caller knows how many keys to look up at most
-                if idx == limit:
-                    break
+                # Indicate to our caller that there was at least one matching key
+                if _needs_any_found_report:
+                    meta_ref['_any_found'] = True
+                    _needs_any_found_report = False
 
         if meta_ref:
             meta_ref['_now'] = _now
@@ -842,34 +1264,29 @@ cdef class Cache:
         """
         cdef dict out = {}
         cdef Entry entry
-        cdef object regex = self._regex_cache.setdefault(data, re_compile(data))
         cdef bint _needs_any_found_report = True if meta_ref else False
         cdef double _now = orig_now if orig_now else self._get_timestamp()
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
+            for key in self._find_keys(_MATCH_REGEX, data, limit):
 
-                if not isinstance(key, str_types):
+                # Setting a key may have evicted others that matched too, if the cache has a max. size in bytes,
+                # and these are not set again because this would undo the eviction.
+                if not PyDict_Contains(self._data, key):
                     continue
 
-                if regex.match(key):
+                # Set it before the update which would overwrite it, this is why we can return
+                # value alone, without any metadata.
+                if return_found:
+                    entry = <Entry>self._data[key]
+                    out[key] = entry if details else entry.value
 
-                    # Set it before the update which would overwrite it, this is why we can return
-                    # value alone, without any metadata.
-                    if return_found:
-                        entry = <Entry>self._data[key]
-                        out[key] = entry if details else entry.value
+                self._set(key, value, expiry, False, None, _now)
 
-                    self._set(key, value, expiry, False, None, _now)
-
-                    # Indicate to our caller that there was at least one matching key
-                    if _needs_any_found_report:
-                        meta_ref['_any_found'] = True
-                        _needs_any_found_report = False
-
-                # Our caller knows how many keys to look up at most
-                if idx == limit:
-                    break
+                # Indicate to our caller that there was at least one matching key
+                if _needs_any_found_report:
+                    meta_ref['_any_found'] = True
+                    _needs_any_found_report = False
 
         if meta_ref:
             meta_ref['_now'] = _now
@@ -890,30 +1307,25 @@ cdef class Cache:
         cdef double _now = orig_now if orig_now else self._get_timestamp()
 
         with self._lock:
+            for key in self._find_keys(_MATCH_CONTAINS, data, limit):
 
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-
-                if not isinstance(key, str_types):
+                # Setting a key may have evicted others that matched too, if the cache has a max. size in bytes,
+                # and these are not set again because this would undo the eviction.
+                if not PyDict_Contains(self._data, key):
                     continue
 
-                if data in key:
-
-                    # Set it before the update which would overwrite it, this is why we can return
-                    # value alone, without any metadata.
-                    if return_found:
-                        entry = <Entry>self._data[key]
-                        out[key] = entry if details else entry.value
+                # Set it before the update which would overwrite it, this is why we can return
+                # value alone, without any metadata.
+                if return_found:
+                    entry = <Entry>self._data[key]
+                    out[key] = entry if details else entry.value
 
-                    self._set(key, value, expiry, False, None, _now)
+                self._set(key, value, expiry, False, None, _now)
 
-                    # Indicate to our caller that there was at least one matching key
-                    if _needs_any_found_report:
-                        meta_ref['_any_found'] = True
-                        _needs_any_found_report = False
-
-                # Our caller knows how many keys to look up at most
-                if idx == limit:
-                    break
+                # Indicate to our caller that there was at least one matching key
+                if _needs_any_found_report:
+                    meta_ref['_any_found'] = True
+                    _needs_any_found_report = False
 
         if meta_ref:
             meta_ref['_now'] = _now
@@ -934,29 +1346,28 @@ cdef class Cache:
         cdef double _now = orig_now if orig_now else self._get_timestamp()
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
+            for key in self._find_keys(_MATCH_NOT_CONTAINS, data, limit):
 
-                if not isinstance(key, str_types):
+                # Setting a key may have evicted others that matched too, if the cache has a max. size in bytes,
+                # and these are not set again because this would undo the eviction.
+                if not PyDict_Contains(self._data, key):
                     continue
 
-                if data not in key:
-
-                    # Set it before the update which would overwrite it, this is why we can return
-                    # value alone, without any metadata.
-                    if return_found:
-                        entry = <Entry>self._data[key]
-                        out[key] = entry if details else entry.value
+                # Set it before the update which would overwrite it, this is why we can return
+                # value alone, without any metadata.
+                if return_found:
+                    entry = <Entry>self._data[key]
+                    out[key] = entry if details else entry.value
 
-                    self._set(key, value, expiry, False, None, _now)
+                self._set(key, value, expiry, False, None, _now)
 
-                    # Indicate to our caller that there was at least one matching key
-                    if _needs_any_found_report:
-                        meta_ref['_any_found'] = True
-                        _needs_any_found_report = False
+                # Indicate to our caller that there was at least one matching key
+                if _needs_any_found_report:
+                    meta_ref['_any_found'] = True
+                    _needs_any_found_report = False
 
-                # Our caller knows how many keys to look up at most
-                if idx == limit:
-                    break
+        if meta_ref:
+            meta_ref['_now'] = _now
 
         return out
 
@@ -970,40 +1381,29 @@ cdef class Cache:
         """
         cdef dict out = {}
         cdef Entry entry
-        cdef bint use_key
         cdef bint _needs_any_found_report = True if meta_ref else False
         cdef double _now = orig_now if orig_now else self._get_timestamp()
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
+            for key in self._find_keys(_MATCH_CONTAINS_ALL, data, limit):
 
-                if not isinstance(key, str_types):
+                # Setting a key may have evicted others that matched too, if the cache has a max. size in bytes,
+                # and these are not set again because this would undo the eviction.
+                if not PyDict_Contains(self._data, key):
                     continue
 
-                use_key = True
-                for elem in data:
-                    if elem not in key:
-                        use_key = False
-                        break
+                # Set it before the update which would overwrite it, this is why we can return
+                # value alone, without any metadata.
+                if return_found:
+                    entry = <Entry>self._data[key]
+                    out[key] = entry if details else entry.value
 
-                if use_key:
+                self._set(key, value, expiry, False, None, _now)
 
-                    # Set it before the update which would overwrite it, this is why we can return
-                    # value alone, without any metadata.
-                    if return_found:
-                        entry = <Entry>self._data[key]
-                        out[key] = entry if details else entry.value
-
-                    self._set(key, value, expiry, False, None, _now)
-
-                    # Indicate to our caller that there was at least one matching key
-                    if _needs_any_found_report:
-                        meta_ref['_any_found'] = True
-                        _needs_any_found_report = False
-
-                # Our caller knows how many keys to look up at most
-                if idx == limit:
-                    break
+                # Indicate to our caller that there was at least one matching key
+                if _needs_any_found_report:
+                    meta_ref['_any_found'] = True
+                    _needs_any_found_report = False
 
         if meta_ref:
             meta_ref['_now'] = _now
@@ -1020,40 +1420,29 @@ cdef class Cache:
         """
         cdef dict out = {}
         cdef Entry entry
-        cdef bint use_key
         cdef bint _needs_any_found_report = True if meta_ref else False
         cdef double _now = orig_now if orig_now else self._get_timestamp()
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
+            for key in self._find_keys(_MATCH_CONTAINS_ANY, data, limit):
 
-                if not isinstance(key, str_types):
+                # Setting a key may have evicted others that matched too, if the cache has a max. size in bytes,
+                # and these are not set again because this would undo the eviction.
+                if not PyDict_Contains(self._data, key):
                     continue
 
-                use_key = False
-                for elem in data:
-                    if elem in key:
-                        use_key = True
-                        break
-
-                if use_key:
-
-                    # Set it before the update which would overwrite it, this is why we can return
-                    # value alone, without any metadata.
-                    if return_found:
-                        entry = <Entry>self._data[key]
-                        out[key] = entry if details else entry.value
+                # Set it before the update which would overwrite it, this is why we can return
+                # value alone, without any metadata.
+                if return_found:
+                    entry = <Entry>self._data[key]
+                    out[key] = entry if details else entry.value
 
-                    self._set(key, value, expiry, False, None, _now)
+                self._set(key, value, expiry, False, None, _now)
 
-                    # Indicate to our caller that there was at least one matching key
-                    if _needs_any_found_report:
-                        meta_ref['_any_found'] = True
-                        _needs_any_found_report = False
-
-                # Our caller knows how many keys to look up at most
-                if idx == limit:
-                    break
+                # Indicate to our caller that there was at least one matching key
+                if _needs_any_found_report:
+                    meta_ref['_any_found'] = True
+                    _needs_any_found_report = False
 
         if meta_ref:
             meta_ref['_now'] = _now
@@ -1069,8 +1458,6 @@ cdef class Cache:
         cdef object _item
         cdef Entry entry
         cdef Py_ssize_t index_idx
-        cdef Py_ssize_t cache_size
-        cdef object index_key
         cdef double _now = self._get_timestamp()
 
         try:
@@ -1099,7 +1486,7 @@ cdef class Cache:
             self.hits += 1
 
             # Current position of that key in index
-            index_idx = self._get_index(key)
+            index_idx = self._get_position(entry)
 
             # We have the key's position so we can now update per-position counter
             # to be able to offer statistics on how often a key is found at a given position.
@@ -1107,11 +1494,10 @@ cdef class Cache:
             hits_per_position += 1
             PyDict_SetItem(self.hits_per_position, index_idx, PyInt_FromLong(hits_per_position))
 
-            # Remove key from index
-            index_key = self._remove_from_index_by_idx(index_idx)
-
-            # Now insert the key back at the head position.
-            PyList_Insert(self._index, 0, index_key)
+            # Move the entry to the head of the recency list, unless it already is there.
+            if entry is not self._head:
+                self._unlink(entry)
+                self._link_head(entry)
 
             # Update last/prev access information + hits
             entry.prev_read = entry.last_read
@@ -1150,13 +1536,8 @@ cdef class Cache:
         cdef dict out = {}
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if key.startswith(data):
-                    out[key] = self._get(key, self.default_get, details)
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_PREFIX, data, limit):
+                out[key] = self._get(key, self.default_get, details)
 
         return out
 
@@ -1170,13 +1551,8 @@ cdef class Cache:
         cdef dict out = {}
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if key.endswith(data):
-                    out[key] = self._get(key, self.default_get, details)
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_SUFFIX, data, limit):
+                out[key] = self._get(key, self.default_get, details)
 
         return out
 
@@ -1188,16 +1564,10 @@ cdef class Cache:
         it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef dict out = {}
-        cdef object regex = self._regex_cache.setdefault(data, re_compile(data))
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if regex.match(key):
-                    out[key] = self._get(key, self.default_get, details)
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_REGEX, data, limit):
+                out[key] = self._get(key, self.default_get, details)
 
         return out
 
@@ -1212,13 +1582,8 @@ cdef class Cache:
         cdef dict out = {}
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if data in key:
-                    out[key] = self._get(key, self.default_get, details)
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_CONTAINS, data, limit):
+                out[key] = self._get(key, self.default_get, details)
 
         return out
 
@@ -1232,13 +1597,8 @@ cdef class Cache:
         cdef dict out = {}
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if data not in key:
-                    out[key] = self._get(key, self.default_get, details)
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_NOT_CONTAINS, data, limit):
+                out[key] = self._get(key, self.default_get, details)
 
         return out
 
@@ -1250,25 +1610,10 @@ cdef class Cache:
         it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef dict out = {}
-        cdef bint use_key
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-
-                if not isinstance(key, str_types):
-                    continue
-
-                use_key = True
-                for elem in data:
-                    if elem not in key:
-                        use_key = False
-                        break
-
-                if use_key:
-                    out[key] = self._get(key, self.default_get, details)
-
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_CONTAINS_ALL, data, limit):
+                out[key] = self._get(key, self.default_get, details)
 
         return out
 
@@ -1280,25 +1625,10 @@ cdef class Cache:
         it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef dict out = {}
-        cdef bint use_key
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-
-                if not isinstance(key, str_types):
-                    continue
-
-                use_key = False
-                for elem in data:
-                    if elem in key:
-                        use_key = True
-                        break
-
-                if use_key:
-                    out[key] = self._get(key, self.default_get, details)
-
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_CONTAINS_ANY, data, limit):
+                out[key] = self._get(key, self.default_get, details)
 
         return out
 
@@ -1332,14 +1662,9 @@ cdef class Cache:
         cdef bint found_any = False
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if key.startswith(data):
-                    self._expire(key, expiry, None)
-                    found_any = True
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_PREFIX, data, limit):
+                self._expire(key, expiry, None)
+                found_any = True
 
         return found_any
 
@@ -1352,14 +1677,9 @@ cdef class Cache:
         cdef bint found_any = False
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if key.endswith(data):
-                    self._expire(key, expiry, None)
-                    found_any = True
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_SUFFIX, data, limit):
+                self._expire(key, expiry, None)
+                found_any = True
 
         return found_any
 
@@ -1370,17 +1690,11 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef bint found_any = False
-        cdef object regex = self._regex_cache.setdefault(data, re_compile(data))
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if regex.match(key):
-                    self._expire(key, expiry, None)
-                    found_any = True
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_REGEX, data, limit):
+                self._expire(key, expiry, None)
+                found_any = True
 
         return found_any
 
@@ -1393,14 +1707,9 @@ cdef class Cache:
         cdef bint found_any = False
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if data in key:
-                    self._expire(key, expiry, None)
-                    found_any = True
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_CONTAINS, data, limit):
+                self._expire(key, expiry, None)
+                found_any = True
 
         return found_any
 
@@ -1413,14 +1722,9 @@ cdef class Cache:
         cdef bint found_any = False
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-                if data not in key:
-                    self._expire(key, expiry, None)
-                    found_any = True
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_NOT_CONTAINS, data, limit):
+                self._expire(key, expiry, None)
+                found_any = True
 
         return found_any
 
@@ -1431,25 +1735,11 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef bint found_any = False
-        cdef bint use_key
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-
-                use_key = True
-                for elem in data:
-                    if elem not in key:
-                        use_key = False
-                        break
-
-                if use_key:
-                    self._expire(key, expiry, None)
-                    found_any = True
-
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_CONTAINS_ALL, data, limit):
+                self._expire(key, expiry, None)
+                found_any = True
 
         return found_any
 
@@ -1460,25 +1750,11 @@ cdef class Cache:
         Similarly to other self.get/set/expire/delete methods, it's a separate one to reduce code branching/CPU mispredictions.
         """
         cdef bint found_any = False
-        cdef bint use_key
 
         with self._lock:
-            for idx, key in enumerate(self._data.iterkeys(), 1):
-                if not isinstance(key, str_types):
-                    continue
-
-                use_key = False
-                for elem in data:
-                    if elem in key:
-                        use_key = True
-                        break
-
-                if use_key:
-                    self._expire(key, expiry, None)
-                    found_any = True
-
-                if idx == limit:
-                    break
+            for key in self._find_keys(_MATCH_CONTAINS_ANY, data, limit):
+                self._expire(key, expiry, None)
+                found_any = True
 
         return found_any
 
@@ -1507,33 +1783,100 @@ cdef class Cache:
                 if expires_at > entry.expires_at:
                     entry.expiry = expiry
                     entry.expires_at = expires_at
+                    self._schedule_expiry(entry)
+
+# ################################################################################################################################
+
+    cdef inline object _schedule_expiry(self, Entry entry):
+        """ Adds an entry to the expiry heap if it can expire and the heap does not have a record for it yet,
+        or if its existing record is for a later time than the entry's expiration time. Extending expiration time does not
+        require a new record - delete_expired moves the existing one further in the heap once it pops it
+        and finds out that the entry has not expired yet. This is why each entry has at most one current record in the heap.
+        Must be called with self._lock held.
+        """
+        if entry.expires_at and (not entry._scheduled_at or entry.expires_at < entry._scheduled_at):
+
+            # The previous record, if any, is now stale
+            if entry._scheduled_at:
+                self._expiry_stale += 1
+
+            entry._scheduled_at = entry.expires_at
+            heappush(self._expiry_heap, (entry.expires_at, entry._seq, entry))
+
+            self._maybe_compact_expiry_heap()
+
+# ################################################################################################################################
+
+    cdef inline object _maybe_compact_expiry_heap(self):
+        """ Drops records of deleted entries from the expiry heap if there are more of them than records of existing ones.
+        The cost is O(n) but it is incurred at most once per n deletions. Must be called with self._lock held.
+        """
+        cdef Entry entry
+
+        if self._expiry_stale < CACHE.EXPIRY_HEAP_MIN_STALE or self._expiry_stale * 2 < len(self._expiry_heap):
+            return
+
+        self._expiry_heap[:] = [record for record in self._expiry_heap if self._is_current_expiry_record(record)]
+        heapify(self._expiry_heap)
+        self._expiry_stale = 0
+
+# ################################################################################################################################
+
+    cdef inline bint _is_current_expiry_record(self, tuple record):
+        """ Returns True if a record from the expiry heap is still the current one for an entry that exists.
+        """
+        cdef Entry entry = <Entry>record[2]
+        return entry._scheduled_at == record[0] and self._data.get(entry.key) is entry
 
 # ################################################################################################################################
 
     cpdef list delete_expired(self):
         """ Deletes all entries expired as of now. Also, deletes all entries possibly found to have expired by .get or .set calls.
+        Only the records of the expiry heap that are due are looked at, rather than all the entries in the cache.
         """
         cdef list deleted
+        cdef tuple record
+        cdef Entry entry
         cdef double _now = self._get_timestamp()
-        cdef double expires_at
-
-        # Collects all keys to be deleted and in another pass, delete them all.
-        # It's performed it two steps so as to be able to hold self._lock only once.
+        cdef uint64_t examined = 0
 
         with self._lock:
 
             deleted = self._expired_on_op[:]
 
-            # Collect keys still in cache
-            for key, value in PyDict_Items(self._data):
-                expires_at = value.expires_at
-                if expires_at and _now > expires_at:
-                    self._delete(key)
-                    deleted.append(key)
+            while self._expiry_heap and _now > self._expiry_heap[0][0]:
+
+                record = heappop(self._expiry_heap)
+                entry = <Entry>record[2]
+                examined += 1
+
+                # The entry was deleted or it received an earlier expiration time, which means it has a newer record.
+                # Either way, this record was counted as a stale one when that happened.
+                if not self._is_current_expiry_record(record):
+                    if self._expiry_stale:
+                        self._expiry_stale -= 1
+                    continue
+
+                entry._scheduled_at = 0.0
+
+                # Expiration was reset after the record was added
+                if not entry.expires_at:
+                    continue
+
+                # Expiration was extended after the record was added so the entry needs a new record
+                if entry.expires_at >= _now:
+                    self._schedule_expiry(entry)
+                    continue
+
+                self._delete(entry.key)
+                deleted.append(entry.key)
 
             # Collect keys deleted by .get operations
             self._expired_on_op[:] = []
 
+            self.expiry_examined = examined
+            self.expiry_examined_total += examined
+
         return deleted
 
 # ################################################################################################################################
@@ -10,6 +10,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 # stdlib
 import re as stdlib_re
+from collections import OrderedDict
 from datetime import datetime
 from logging import getLogger
 from operator import itemgetter
@@ -23,6 +24,7 @@ from zato.bunch import bunchify
 from zato.common.api import HTTP_SOAP, MISC, TRACE1
 
 http_any_internal = HTTP_SOAP.ACCEPT.ANY_INTERNAL
+url_cache_max_size_default = HTTP_SOAP.URL_CACHE_MAX_SIZE
 
 # ################################################################################################################################
 
@@ -39,6 +41,12 @@ unused_marker = 'unused'
 
 _internal_url_path_indicator = '{}/zato/'.format(target_separator)
 
+# Characters that have a special meaning in regular expressions - a part of a pattern without any of them matches only itself
+_regex_special = frozenset('\\.^$*+?{}[]|()')
+
+# What HTTP Accept headers matching anything look like in patterns
+_http_accept_any_pattern = '{}HTTP_SEP{}'.format(http_any_internal, http_any_internal)
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -132,35 +140,253 @@ cdef class Matcher:
 # ################################################################################################################################
 # ################################################################################################################################
 
+cdef inline bint _is_literal(unicode value):
+    """ Returns True if a part of a pattern can only match itself.
+    """
+    if http_any_internal in value:
+        return False
+
+    for elem in value:
+        if elem in _regex_special:
+            return False
+
+    return True
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+cdef class RouterNode:
+    """ A node of a Router's tree - each one stands for a literal segment of URL path patterns.
+    """
+    cdef:
+        public dict children
+
+        # Channels whose URL path patterns end in this node
+        public list exact
+
+        # Channels whose URL path patterns continue past this node with a segment that is not literal,
+        # e.g. '/customer/{id}' or '/api/v1.0' - they are candidates for any URL path that reaches this node.
+        public list wildcard
+
+    def __init__(self):
+        self.children = {}
+        self.exact = []
+        self.wildcard = []
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+cdef class Router:
+    """ Indexes HTTP channels by literal segments of their URL path patterns, with HTTP methods and Accept headers
+    as secondary keys, so that finding channels that may match a URL path needs to walk as many nodes as the path
+    has segments rather than evaluate the regex of each channel. The tree only preselects candidates - each of them
+    is still confirmed by its own Matcher, in the order of channel_data, which means that the first channel matching
+    a target wins, as it does in a full scan.
+    """
+    cdef:
+        public RouterNode root
+
+    def __init__(self, list channel_data, unicode sep=target_separator):
+        self.root = RouterNode()
+
+        for idx, item in enumerate(channel_data):
+            self._add(idx, item, sep)
+
+# ################################################################################################################################
+
+    cdef _add(self, int idx, dict item, unicode sep):
+
+        cdef Matcher matcher = item['match_target_compiled']
+        cdef RouterNode node = self.root
+        cdef RouterNode child
+        cdef list parts = matcher.pattern.split(sep)
+
+        # A pattern that cannot be split into its parts is a candidate for all URL paths
+        if len(parts) != 4:
+            node.wildcard.append((idx, None, None, item))
+            return
+
+        _, http_method, http_accept, url_path = parts
+
+        # Methods and Accept headers narrow down candidates only if patterns require specific values of them
+        http_method = http_method if _is_literal(http_method) else None
+        http_accept = http_accept if (http_accept != _http_accept_any_pattern and _is_literal(http_accept)) else None
+
+        entry = (idx, http_method, http_accept, item)
+
+        for segment in url_path.split('/'):
+            if not _is_literal(segment):
+                node.wildcard.append(entry)
+                return
+
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = RouterNode()
+            node = child
+
+        node.exact.append(entry)
+
+# ################################################################################################################################
+
+    cdef inline _collect(self, list entries, list out, unicode http_method, unicode http_accept):
+        for entry in entries:
+            if entry[1] is not None and entry[1] != http_method:
+                continue
+            if entry[2] is not None and entry[2] != http_accept:
+                continue
+            out.append(entry)
+
+# ################################################################################################################################
+
+    cpdef list get_candidates(self, unicode url_path, unicode http_method, unicode http_accept):
+        """ Returns all the channel items that may match the input, in the order of channel_data.
+        """
+        cdef RouterNode node = self.root
+        cdef RouterNode child
+        cdef list out = []
+
+        self._collect(node.wildcard, out, http_method, http_accept)
+
+        for segment in url_path.split('/'):
+            child = node.children.get(segment)
+            if child is None:
+                break
+            node = child
+            self._collect(node.wildcard, out, http_method, http_accept)
+        else:
+            self._collect(node.exact, out, http_method, http_accept)
+
+        out.sort(key=itemgetter(0))
+
+        return [entry[3] for entry in out]
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 cdef class CyURLData:
 
     cdef:
         public list channel_data
-        public dict url_path_cache
+        public Router router
         bint has_trace1
 
-    def __init__(self, channel_data=None):
+        # Targets matched, mapped to tuples of (match, channel_item, channel_id), least recently used ones first
+        public object url_path_cache
+
+        # Channel IDs mapped to sets of targets that were matched to these channels
+        public dict url_cache_by_channel
+
+        public int url_cache_max_size
+        public unsigned long long url_cache_hits, url_cache_misses, url_cache_evictions
+
+    def __init__(self, channel_data=None, url_cache_max_size=url_cache_max_size_default):
         self.channel_data = channel_data
-        self.url_path_cache = {}
-        self.url_target_cache = {}
+        self.url_path_cache = OrderedDict()
+        self.url_cache_by_channel = {}
+        self.url_cache_max_size = url_cache_max_size
+        self.url_cache_hits = 0
+        self.url_cache_misses = 0
+        self.url_cache_evictions = 0
         self.has_trace1 = logger.isEnabledFor(TRACE1)
+        self.router = None
+
+# ################################################################################################################################
+
+    cpdef _set_up_router(self):
+        """ Builds anew the tree that channels are looked up in - needs to be called each time channel_data changes.
+        """
+        self.router = Router(self.channel_data or [])
+
+# ################################################################################################################################
+
+    cdef _add_to_cache(self, unicode target, dict match, object channel_item, object channel_id):
+
+        cdef set targets
+
+        if self.url_cache_max_size <= 0:
+            return
+
+        # Make room for the new target by evicting the least recently used one
+        if len(self.url_path_cache) >= self.url_cache_max_size:
+            evicted_target, (_, _, evicted_channel_id) = self.url_path_cache.popitem(last=False)
+            self._discard_channel_target(evicted_channel_id, evicted_target)
+            self.url_cache_evictions += 1
+
+        self.url_path_cache[target] = (match, channel_item, channel_id)
+
+        targets = self.url_cache_by_channel.get(channel_id)
+        if targets is None:
+            targets = self.url_cache_by_channel[channel_id] = set()
+        targets.add(target)
+
+# ################################################################################################################################
+
+    cdef _discard_channel_target(self, object channel_id, unicode target):
+
+        cdef set targets = self.url_cache_by_channel.get(channel_id)
+
+        if targets is not None:
+            targets.discard(target)
+            if not targets:
+                del self.url_cache_by_channel[channel_id]
+
+# ################################################################################################################################
+
+    cpdef _remove_channel_from_cache(self, object channel_id):
+        """ Removes from cache all the targets that were matched to a given channel.
+        """
+        cdef set targets = self.url_cache_by_channel.pop(channel_id, None)
+
+        if targets:
+            for target in targets:
+                del self.url_path_cache[target]
 
 # ################################################################################################################################
 
     cpdef _remove_from_cache(self, unicode match_target):
+        """ Removes from cache all the targets that a given pattern matches - needed when a channel is created
+        because it may take precedence over channels that the targets were matched to so far.
+        """
+        cdef list matchers = []
+        cdef list targets_to_remove = []
 
-        targets_to_remove = []
-        cached_targets = self.url_path_cache.keys()
+        for item in self.channel_data:
+            matcher = item['match_target_compiled']
+            if matcher.pattern == match_target:
+                matchers.append(matcher)
 
-        for target in cached_targets:
-            for item in self.channel_data:
-                matcher = item['match_target_compiled']
-                if matcher.pattern == match_target:
-                    if matcher.match(target) is not None:
-                        targets_to_remove.append(target)
+        for target in self.url_path_cache:
+            for matcher in matchers:
+                if matcher.match(target) is not None:
+                    targets_to_remove.append(target)
+                    break
 
         for target in targets_to_remove:
-            del self.url_path_cache[target]
+            _, _, channel_id = self.url_path_cache.pop(target)
+            self._discard_channel_target(channel_id, target)
+
+# ################################################################################################################################
+
+    cpdef clear_url_cache(self):
+        self.url_path_cache.clear()
+        self.url_cache_by_channel.clear()
+
+# ################################################################################################################################
+
+    cpdef dict get_url_cache_stats(self):
+        """ Returns statistics of the cache of targets matched, e.g. to check if its size should be changed.
+        """
+        cdef unsigned long long total = self.url_cache_hits + self.url_cache_misses
+
+        return {
+            'size': len(self.url_path_cache),
+            'max_size': self.url_cache_max_size,
+            'channels': len(self.url_cache_by_channel),
+            'hits': self.url_cache_hits,
+            'misses': self.url_cache_misses,
+            'evictions': self.url_cache_evictions,
+            'hit_rate': (self.url_cache_hits / total) if total else 0.0,
+        }
 
 # ################################################################################################################################
 
@@ -170,10 +396,13 @@ cdef class CyURLData:
         """ Attemps to match the combination of SOAPt Action and URL path against
         the list of HTTP channel targets.
         """
-        cdef bint needs_user, has_target_in_cache=True
+        cdef bint needs_user
         cdef Matcher matcher
         cdef dict item
+        cdef dict match
         cdef object item_bunch
+        cdef list items
+        cdef tuple cached
 
         cdef unicode target = ''
         target += '' # This used to be a SOAP action, now it is always an empty string
@@ -184,39 +413,50 @@ cdef class CyURLData:
         target += sep
         target += url_path
 
-        try:
-            self.url_target_cache[target]
-        except KeyError:
-            has_target_in_cache = False
-
         # Return from cache if already seen
-        try:
-            ctx, channel_item = {}, self.url_path_cache[target]
-            return ctx, channel_item
-        except KeyError:
-            needs_user = not url_path.startswith('/zato')
+        cached = self.url_path_cache.get(target)
+
+        if cached is not None:
+            self.url_path_cache.move_to_end(target)
+            self.url_cache_hits += 1
+
+            # Each caller receives its own copy of parameters extracted from the URL path
+            return dict(cached[0]), cached[1]
+
+        self.url_cache_misses += 1
+        needs_user = not url_path.startswith('/zato')
+
+        if self.router is None:
+            self._set_up_router()
+
+        # Separators in methods or Accept headers, or trailing newlines that regular expressions
+        # let through before a $ anchor, may make patterns match other parts of the target
+        # than what the router assumes so in such a case all the channels are checked.
+        if ':' in http_method or ':' in http_accept or url_path.endswith('\n'):
+            items = self.channel_data
+        else:
+            items = self.router.get_candidates(url_path, http_method, http_accept)
 
-            for item in self.channel_data:
+        for item in items:
 
-                matcher = item['match_target_compiled']
-                if needs_user and matcher.is_internal:
-                    continue
+            matcher = item['match_target_compiled']
+            if needs_user and matcher.is_internal:
+                continue
 
-                match = matcher.match(target)
+            match = matcher.match(target)
 
-                if match is not None:
-                    if self.has_trace1:
-                        _log_trace1(_trace1, 'Matched target:`%s` with:`%r`', target, item)
+            if match is not None:
+                if self.has_trace1:
+                    _log_trace1(_trace1, 'Matched target:`%s` with:`%r`', target, item)
 
-                    item_bunch = _bunchify(item)
+                item_bunch = _bunchify(item)
 
-                    # Cache that target but only if it's a static URL without dynamic variables
-                    if (not has_target_in_cache) and matcher.is_static:
-                        self.url_path_cache[target] = item_bunch
+                # Cache that target, along with parameters extracted from it, if there are any
+                self._add_to_cache(target, match, item_bunch, item.get('id'))
 
-                    return match, item_bunch
+                return dict(match), item_bunch
 
-            return None, None
+        return None, None
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Compares .get and .set throughput of zato.cache.Cache with that of cache.pyx from before its recency index
+# was changed from a Python list to an intrusive linked list, or from any other git revision given on input.
+# Both are actual Cython builds - the previous one is compiled into a temporary directory each time the benchmark runs.
+#
+# Usage: python bench_cache.py [git-revision-of-baseline-cache.pyx]
+
+# stdlib
+import os
+import sys
+from importlib.util import module_from_spec, spec_from_file_location
+from glob import glob
+from random import Random
+from shutil import rmtree
+from subprocess import check_call, check_output
+from tempfile import mkdtemp
+from time import perf_counter
+
+# Zato
+from zato.cache import Cache
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many entries each cache holds when it is benchmarked
+cache_sizes = [1_000, 100_000, 1_000_000]
+
+# How many .get and .set calls to time for each size - the baseline's list-based index is O(n) per call
+# so it gets far fewer operations than the current implementation to keep the run time bearable.
+ops_current = 200_000
+ops_baseline = 2_000
+
+# Where cache.pyx is, relative to the top-level directory of the repository
+cache_pyx_path = 'code/zato-cy/src/zato/cy/cache.pyx'
+
+# Under what name the baseline is built, so that it does not clash with the current zato.cache
+baseline_module_name = 'zato_cache_baseline'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_baseline_rev(repo_dir:'str') -> 'str':
+    """ Returns the revision that the commit replacing the list-based recency index was based on,
+    i.e. the last one in which cache.pyx still inserted keys to a Python list.
+    """
+    last_rev = check_output(['git', 'log', '-1', '--format=%H', '-G', 'PyList_Insert', '--', cache_pyx_path],
+        cwd=repo_dir, text=True).strip()
+    return last_rev + '^'
+
+# ################################################################################################################################
+
+def build_baseline(repo_dir:'str', rev:'str', build_dir:'str') -> 'type':
+    """ Compiles cache.pyx as it was in a given revision and returns its Cache class.
+    """
+    source = check_output(['git', 'show', '{}:{}'.format(rev, cache_pyx_path)], cwd=repo_dir)
+    pyx_path = os.path.join(build_dir, baseline_module_name + '.pyx')
+
+    with open(pyx_path, 'wb') as f:
+        _ = f.write(source)
+
+    # Builds the extension in place, next to its .pyx file
+    check_call([sys.executable, '-m', 'Cython.Build.Cythonize', '-3', '-q', '-i', pyx_path], cwd=build_dir)
+
+    so_path = glob(os.path.join(build_dir, baseline_module_name + '.*.so'))[0]
+    spec = spec_from_file_location(baseline_module_name, so_path)
+    module = module_from_spec(spec) # type: ignore
+    spec.loader.exec_module(module) # type: ignore
+
+    return module.Cache
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def run(cache_class:'type', ops:'int', size:'int', keys:'list', random:'Random') -> 'tuple':
+
+    cache = cache_class(size)
+    for key in keys:
+        cache.set(key, key, 0.0, False)
+
+    get_keys = [random.choice(keys) for _ in range(ops)]
+    set_keys = ['new-{}'.format(idx) for idx in range(ops)]
+
+    start = perf_counter()
+    for key in get_keys:
+        cache.get(key, None, False)
+    get_rate = ops / (perf_counter() - start)
+
+    start = perf_counter()
+    for key in set_keys:
+        cache.set(key, key, 0.0, False)
+    set_rate = ops / (perf_counter() - start)
+
+    return get_rate, set_rate
+
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    repo_dir = check_output(['git', 'rev-parse', '--show-toplevel'], cwd=os.path.dirname(os.path.abspath(__file__)),
+        text=True).strip()
+    rev = sys.argv[1] if len(sys.argv) > 1 else get_baseline_rev(repo_dir)
+
+    build_dir = mkdtemp(prefix='zato-bench-cache')
+
+    try:
+        baseline_class = build_baseline(repo_dir, rev, build_dir)
+
+        random = Random(1208)
+        template = '{:>10} {:>14} {:>16} {:>16}'
+
+        print('Baseline is cache.pyx from {}'.format(rev))
+        print(template.format('size', 'impl', 'get ops/s', 'set ops/s'))
+
+        for size in cache_sizes:
+            keys = ['key-{}'.format(idx) for idx in range(size)]
+
+            for name, cache_class, ops in (('baseline', baseline_class, ops_baseline), ('current', Cache, ops_current)):
+                get_rate, set_rate = run(cache_class, ops, size, keys, random)
+                print(template.format(size, name, '{:,.0f}'.format(get_rate), '{:,.0f}'.format(set_rate)))
+
+    finally:
+        rmtree(build_dir, ignore_errors=True)
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
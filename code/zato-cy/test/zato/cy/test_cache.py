@@ -12,8 +12,12 @@ from time import sleep
 from unittest import main as unittest_main, TestCase
 from uuid import uuid4
 
+# Bunch
+from bunch import Bunch
+
 # Zato
 from zato.cache import Cache, KeyExpiredError
+from zato.common.api import CACHE
 from zato.common.py23_ import maxint
 
 # ################################################################################################################################
@@ -315,6 +319,139 @@ class CacheTestCace(TestCase):
         self.assertEqual(c.hits_per_position[0], 6)
         self.assertEqual(c.hits_per_position[1], 1)
 
+# ################################################################################################################################
+
+    def test_positions_after_many_moves(self):
+
+        # More moves to the head than the position index can hold stamps for, so the entries will be renumbered
+        max_size = 10
+        moves = 5000
+
+        keys = ['key{}'.format(idx) for idx in range(max_size)]
+
+        c = Cache(max_size)
+        for key in keys:
+            c.set(key, key, 0.0, None)
+
+        # This is what the order of keys should look like, with the most recently used one at the front
+        expected = list(reversed(keys))
+
+        for idx in range(moves):
+            key = keys[(idx * 7) % max_size]
+            position = c.index(key)
+
+            self.assertEqual(position, expected.index(key))
+            self.assertEqual(c.get(key, None, True).position, position)
+
+            expected.remove(key)
+            expected.insert(0, key)
+
+        self.assertListEqual(c.keys_by_position(), expected)
+        self.assertEqual(sum(c.hits_per_position.values()), moves)
+
+        # Eviction must still remove the least recently used key
+        c.set('new', 'new', 0.0, None)
+        self.assertIsNone(c.index(expected[-1]))
+        self.assertEqual(c.index('new'), 0)
+        self.assertEqual(len(c), max_size)
+
+# ################################################################################################################################
+
+    def _get_key_index_caches(self):
+
+        max_size = 50
+
+        # All the caches are populated in the same way, including evictions and deletions
+        no_index = Cache(max_size)
+        prefix_suffix = Cache(max_size, key_index=CACHE.KEY_INDEX.PREFIX_SUFFIX.id)
+        prefix_suffix_contains = Cache(max_size, key_index=CACHE.KEY_INDEX.PREFIX_SUFFIX_CONTAINS.id)
+
+        caches = [no_index, prefix_suffix, prefix_suffix_contains]
+
+        for c in caches:
+            for idx in range(70):
+                c.set('customer:{}:order:{}'.format(idx % 7, idx), idx, 0.0, None)
+                c.set('invoice:{}:customer'.format(idx), idx, 0.0, None)
+            c.set(123, 'non-string-key', 0.0, None)
+            c.delete('invoice:69:customer')
+
+        return caches
+
+# ################################################################################################################################
+
+    def test_key_index_get_matches_scan(self):
+
+        caches = self._get_key_index_caches()
+
+        for func_name, data in (
+            ('get_by_prefix', 'customer:3:'),
+            ('get_by_prefix', 'no-such-prefix'),
+            ('get_by_prefix', ''),
+            ('get_by_suffix', ':customer'),
+            ('get_by_suffix', 'order:65'),
+            ('get_contains', ':order:6'),
+            ('get_contains', ':6'),
+            ('get_not_contains', 'order'),
+            ('get_contains_all', ['customer:1', 'order:6']),
+            ('get_contains_any', ['order:66', 'invoice:50']),
+            ('get_contains_any', ['order:66', ':5']),
+            ):
+
+            expected = getattr(caches[0], func_name)(data, False, 0)
+
+            for c in caches[1:]:
+                returned = getattr(c, func_name)(data, False, 0)
+
+                # Values, the order they were returned in and the side effects of .get must be the same as with a scan
+                self.assertDictEqual(returned, expected)
+                self.assertListEqual(list(returned), list(expected))
+                self.assertListEqual(c.keys_by_position(), caches[0].keys_by_position())
+                self.assertDictEqual(c.hits_per_position, caches[0].hits_per_position)
+
+# ################################################################################################################################
+
+    def test_key_index_delete_matches_scan(self):
+
+        caches = self._get_key_index_caches()
+
+        for func_name, data in (
+            ('delete_by_prefix', 'customer:2:'),
+            ('delete_by_suffix', ':customer'),
+            ('delete_contains', 'order:6'),
+            ('delete_contains_all', ['customer:1', 'order:5']),
+            ('delete_contains_any', ['order:4', 'order:3']),
+            ):
+
+            expected = getattr(caches[0], func_name)(data, True, 0)
+
+            for c in caches[1:]:
+                self.assertDictEqual(getattr(c, func_name)(data, True, 0), expected)
+
+            for c in caches[1:]:
+                self.assertListEqual(c.keys_by_position(), caches[0].keys_by_position())
+                self.assertDictEqual(
+                    {key: entry.value for key, entry in c.items()}, {key: entry.value for key, entry in caches[0].items()})
+
+# ################################################################################################################################
+
+    def test_key_index_update_config(self):
+
+        c = Cache(10)
+        c.set('abc:1', 1, 0.0, None)
+        c.set('abc:2', 2, 0.0, None)
+        c.set('xyz:1', 3, 0.0, None)
+
+        self.assertEqual(c.key_index, CACHE.KEY_INDEX.NO_INDEX.id)
+
+        config = Bunch(max_size=10, max_item_size=None, extend_expiry_on_get=True, extend_expiry_on_set=True,
+            key_index=CACHE.KEY_INDEX.PREFIX_SUFFIX_CONTAINS.id)
+        c.update_config(config)
+
+        # Keys that already existed must have been added to the newly created index
+        self.assertEqual(c.key_index, CACHE.KEY_INDEX.PREFIX_SUFFIX_CONTAINS.id)
+        self.assertDictEqual(c.get_by_prefix('abc:', False, 0), {'abc:1':1, 'abc:2':2})
+        self.assertDictEqual(c.get_contains('z:1', False, 0), {'xyz:1':3})
+
 # ################################################################################################################################
 
     def test_del(self):
@@ -358,6 +495,63 @@ class CacheTestCace(TestCase):
         self.assertIn(key2, c)
         self.assertNotIn(key3, c)
 
+# ################################################################################################################################
+
+    def test_delete_expired_examines_only_due_entries(self):
+
+        c = Cache()
+
+        for idx in range(100):
+            c.set('no-expiry-{}'.format(idx), idx, 0.0, None)
+            c.set('later-{}'.format(idx), idx, 100.0, None)
+
+        for idx in range(5):
+            c.set('soon-{}'.format(idx), idx, 0.03, None)
+
+        # Deleted before it expired, which means that its record is no longer current
+        c.delete('soon-0')
+
+        sleep(0.05)
+
+        deleted = c.delete_expired()
+        self.assertEqual(sorted(deleted), ['soon-1', 'soon-2', 'soon-3', 'soon-4'])
+        self.assertEqual(c.expiry_examined, 5)
+        self.assertEqual(len(c), 200)
+
+        # Nothing is due now so nothing should be examined
+        self.assertListEqual(c.delete_expired(), [])
+        self.assertEqual(c.expiry_examined, 0)
+        self.assertEqual(c.expiry_examined_total, 5)
+
+# ################################################################################################################################
+
+    def test_delete_expired_after_extension(self):
+
+        key1, expected1 = 'key1', 'value1'
+
+        expiry = 0.1
+
+        c = Cache(extend_expiry_on_get=True)
+        c.set(key1, expected1, expiry, None)
+
+        # Extend expiration time for the key by reading it, this does not add anything to the expiry heap ..
+        sleep(expiry * 0.6)
+        c.get(key1, None, False)
+        c.get(key1, None, False)
+
+        # .. so the key's original record is examined when the original expiration time passes,
+        # but the key is not deleted because its record is moved further in the heap instead ..
+        sleep(expiry * 0.6)
+        self.assertListEqual(c.delete_expired(), [])
+        self.assertEqual(c.expiry_examined, 1)
+        self.assertIn(key1, c)
+
+        # .. which means that it will be deleted once the extended expiration time passes.
+        sleep(expiry)
+        self.assertListEqual(c.delete_expired(), [key1])
+        self.assertEqual(c.expiry_examined, 1)
+        self.assertNotIn(key1, c)
+
 # ################################################################################################################################
 
     def test_get_deletes_expired_key(self):
@@ -474,6 +668,134 @@ class CacheTestCace(TestCase):
         returned1 = c.get(key1, None, False)
         self.assertIs(returned1, expected1)
 
+# ################################################################################################################################
+
+    def test_max_bytes_eviction(self):
+
+        value = 'a' * 1000
+
+        c = Cache()
+        cost = c.set('key1', value, 0.0, True).cost
+
+        # Room for exactly two entries of the same size
+        c = Cache(max_bytes=cost * 2)
+
+        c.set('key1', value, 0.0, False)
+        c.set('key2', value, 0.0, False)
+        self.assertEqual(c.current_bytes, cost * 2)
+
+        # Reading key1 makes key2 the least recently used entry ..
+        c.get('key1', None, False)
+
+        # .. so this is the one to be evicted when the third entry is added.
+        c.set('key3', value, 0.0, False)
+
+        self.assertListEqual(sorted(c.keys()), ['key1', 'key3'])
+        self.assertEqual(c.current_bytes, cost * 2)
+        self.assertEqual(c.peak_bytes, cost * 2)
+
+        c.delete('key1')
+        self.assertEqual(c.current_bytes, cost)
+        self.assertEqual(c.peak_bytes, cost * 2)
+
+        c.clear()
+        self.assertEqual(c.current_bytes, 0)
+        self.assertEqual(c.peak_bytes, cost * 2)
+
+# ################################################################################################################################
+
+    def test_max_bytes_update_existing(self):
+
+        c = Cache(max_bytes=10000)
+
+        cost1 = c.set('key1', 'a' * 1000, 0.0, True).cost
+        cost2 = c.set('key1', 'a' * 2000, 0.0, True).cost
+
+        self.assertEqual(cost2 - cost1, 1000)
+        self.assertEqual(c.current_bytes, cost2)
+        self.assertEqual(c.peak_bytes, cost2)
+
+# ################################################################################################################################
+
+    def test_max_bytes_value_too_big(self):
+
+        c = Cache(max_bytes=1500)
+
+        try:
+            c.set('key1', 'a' * 1000, 0.0, False)
+        except ValueError as e:
+            self.assertTrue(e.args[0].startswith('Value too big '))
+        else:
+            self.fail('Expected a ValueError to be raised')
+
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.current_bytes, 0)
+
+# ################################################################################################################################
+
+    def test_max_bytes_update_config(self):
+
+        value = 'a' * 1000
+
+        c = Cache()
+        for idx in range(10):
+            cost = c.set('key{}'.format(idx), value, 0.0, True).cost
+
+        # There is no budget by default
+        self.assertEqual(len(c), 10)
+        self.assertEqual(c.current_bytes, cost * 10)
+
+        # Lowering the budget evicts the least recently used entries at once
+        config = Bunch(max_size=None, max_item_size=None, extend_expiry_on_get=True, extend_expiry_on_set=True,
+            max_bytes=cost * 3)
+        c.update_config(config)
+
+        self.assertListEqual(c.keys_by_position(), ['key9', 'key8', 'key7'])
+        self.assertEqual(c.current_bytes, cost * 3)
+
+# ################################################################################################################################
+
+    def test_max_bytes_set_by_criteria(self):
+
+        keys = ['a.1.z', 'a.2.z', 'a.3.z']
+        value = 'a' * 1000
+        new_value = 'b' * 1600
+
+        c = Cache()
+        cost = c.set(keys[0], value, 0.0, True).cost
+
+        set_funcs = [
+            ('set_by_prefix', 'a.'),
+            ('set_by_suffix', '.z'),
+            ('set_by_regex', r'a\.\d\.z'),
+            ('set_contains', '.z'),
+            ('set_not_contains', 'x'),
+            ('set_contains_all', ['a.', '.z']),
+            ('set_contains_any', ['a.', 'x']),
+        ]
+
+        for func_name, data in set_funcs:
+            for return_found in (True, False):
+
+                # There is room for all the keys, but not once the first one is given a bigger value ..
+                c = Cache(max_bytes=cost * 3 + 500)
+                for key in keys:
+                    c.set(key, value, 0.0, False)
+
+                func = getattr(c, func_name)
+                found = func(data, new_value, 0.0, False, None, return_found, 0)
+
+                # .. which evicts the least recently used one of the others, which is not set again.
+                self.assertEqual(len(c), 2, func_name)
+                self.assertLessEqual(c.current_bytes, c.max_bytes, func_name)
+
+                for key in c.keys():
+                    self.assertEqual(c.get(key, None, False), new_value, func_name)
+
+                if return_found:
+                    self.assertListEqual(sorted(found), sorted(c.keys()), func_name)
+                    self.assertTrue(all(elem == value for elem in found.values()), func_name)
+
 # ################################################################################################################################
 
 if __name__ == '__main__':
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from random import Random
+from unittest import main as unittest_main, TestCase
+
+# Zato
+from zato.common.util.url_dispatcher import get_match_target
+from zato.url_dispatcher import CyURLData, Matcher
+
+# ################################################################################################################################
+
+http_methods_allowed_re = '(GET|POST|PUT|DELETE)'
+
+# Name, URL path, HTTP method and HTTP Accept of each channel, in the order they are matched in
+channels = [
+    ('api.customer.get', '/api/customer/{cust_id}', 'GET', None),
+    ('api.customer.new', '/api/customer/new', None, None),
+    ('api.customer.orders', '/api/customer/{cust_id}/orders', None, None),
+    ('api.customer.order', '/api/customer/{cust_id}/order-{order_id}.json', None, None),
+    ('api.customer.put', '/api/customer/{cust_id}', 'PUT', None),
+    ('api.file', '/api/file/{path}', None, None),
+    ('api.invoice.json', '/api/invoice', None, 'application/json'),
+    ('api.invoice.any', '/api/invoice', None, '*/*'),
+    ('api.ping', '/api/ping', 'GET', None),
+    ('api.version', '/api/v1.0/version', None, None),
+    ('root', '/', None, None),
+    ('root.any', '/{name}', None, None),
+    ('zato.ping', '/zato/ping', None, None),
+]
+
+url_paths = [
+    '/api/customer/123',
+    '/api/customer/new',
+    '/api/customer/123/orders',
+    '/api/customer/123/order-456.json',
+    '/api/customer/123/order-456.xml',
+    '/api/file/a/b/c.txt',
+    '/api/invoice',
+    '/api/ping',
+    '/api/ping/',
+    '/api/v1.0/version',
+    '/api/v1x0/version',
+    '/api/unknown',
+    '/',
+    '/abc',
+    '/zato/ping',
+    '/zato/unknown',
+    '',
+]
+
+http_methods = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
+http_accepts = ['*/*', 'application/json', 'text/html', 'a:::b']
+
+
+# ################################################################################################################################
+
+def get_channel_item(name, url_path, http_method, http_accept):
+
+    match_target = get_match_target({
+        'soap_action': '',
+        'url_path': url_path,
+        'http_method': http_method,
+        'http_accept': http_accept,
+    }, http_methods_allowed_re=http_methods_allowed_re)
+
+    return {
+        'id': name,
+        'name': name,
+        'is_internal': url_path.startswith('/zato'),
+        'match_target': match_target,
+        'match_target_compiled': Matcher(match_target, True),
+    }
+
+# ################################################################################################################################
+
+def match_by_scan(channel_data, url_path, http_method, http_accept):
+    """ Matches channels in the same way as CyURLData.match did before channels were looked up through a router.
+    """
+    target = ':::{}:::{}:::{}'.format(http_method, http_accept, url_path)
+    needs_user = not url_path.startswith('/zato')
+
+    for item in channel_data:
+        matcher = item['match_target_compiled']
+        if needs_user and matcher.is_internal:
+            continue
+
+        match = matcher.match(target)
+        if match is not None:
+            return match, item['name']
+
+    return None, None
+
+# ################################################################################################################################
+
+class URLDispatcherTestCase(TestCase):
+
+    def _get_url_data(self, url_cache_max_size=100):
+        channel_data = [get_channel_item(*elem) for elem in channels]
+        url_data = CyURLData(channel_data, url_cache_max_size)
+        url_data._set_up_router()
+        return url_data
+
+    def _match(self, url_data, url_path, http_method, http_accept):
+        http_accept = http_accept.replace('*', 'haany').replace('/', 'HTTP_SEP')
+        match, item = url_data.match(url_path, http_method, http_accept)
+        return match, (item['name'] if item else None)
+
+# ################################################################################################################################
+
+    def test_match(self):
+
+        url_data = self._get_url_data()
+
+        self.assertEqual(self._match(url_data, '/api/customer/123', 'GET', '*/*'), ({'cust_id':'123'}, 'api.customer.get'))
+        self.assertEqual(self._match(url_data, '/api/customer/123', 'PUT', '*/*'), ({'cust_id':'123'}, 'api.customer.put'))
+        self.assertEqual(self._match(url_data, '/api/customer/new', 'GET', '*/*'), ({'cust_id':'new'}, 'api.customer.get'))
+        self.assertEqual(self._match(url_data, '/api/customer/new', 'POST', '*/*'), ({}, 'api.customer.new'))
+        self.assertEqual(self._match(url_data, '/api/invoice', 'GET', 'application/json'), ({}, 'api.invoice.json'))
+        self.assertEqual(self._match(url_data, '/api/invoice', 'GET', 'text/html'), ({}, 'api.invoice.any'))
+        self.assertEqual(self._match(url_data, '/api/file/a/b', 'GET', '*/*'), ({'path':'a/b'}, 'api.file'))
+        self.assertEqual(self._match(url_data, '/api/v1.0/version', 'GET', '*/*'), ({}, 'api.version'))
+
+        # The first channel matching a path wins, even if a later one matches it more closely
+        self.assertEqual(self._match(url_data, '/zato/ping', 'GET', '*/*'), ({'name':'zato/ping'}, 'root.any'))
+        self.assertEqual(self._match(url_data, '/api/customer/123/orders', 'PATCH', '*/*'), (None, None))
+
+# ################################################################################################################################
+
+    def test_match_same_as_scan(self):
+
+        url_data = self._get_url_data()
+        random = Random(1208)
+
+        for _ in range(2):
+            for url_path in url_paths:
+                for http_method in http_methods:
+                    for http_accept in http_accepts:
+
+                        accept = http_accept.replace('*', 'haany').replace('/', 'HTTP_SEP')
+                        expected = match_by_scan(url_data.channel_data, url_path, http_method, accept)
+
+                        self.assertEqual(self._match(url_data, url_path, http_method, http_accept), expected,
+                            (url_path, http_method, http_accept))
+
+            # Static URL paths are now cached so let's check them again, after channels are reordered
+            random.shuffle(url_data.channel_data)
+            url_data.clear_url_cache()
+            url_data._set_up_router()
+
+# ################################################################################################################################
+
+    def test_remove_from_cache(self):
+
+        url_data = self._get_url_data()
+
+        self.assertEqual(self._match(url_data, '/api/ping', 'GET', '*/*'), ({}, 'api.ping'))
+        self.assertEqual(len(url_data.url_path_cache), 1)
+
+        # A new channel matching the same path, placed before the one already cached
+        item = get_channel_item('api.ping.new', '/api/ping', 'GET', None)
+        url_data.channel_data.insert(0, item)
+
+        # Nothing changes until the cache is cleared and the router is rebuilt ..
+        self.assertEqual(self._match(url_data, '/api/ping', 'GET', '*/*'), ({}, 'api.ping'))
+
+        url_data._remove_from_cache(item['match_target'])
+        url_data._set_up_router()
+
+        # .. and now the new channel is found.
+        self.assertEqual(len(url_data.url_path_cache), 0)
+        self.assertEqual(self._match(url_data, '/api/ping', 'GET', '*/*'), ({}, 'api.ping.new'))
+
+# ################################################################################################################################
+
+    def test_cache_dynamic(self):
+
+        url_data = self._get_url_data()
+
+        match1, _ = self._match(url_data, '/api/customer/123', 'GET', '*/*')
+        match2, _ = self._match(url_data, '/api/customer/123', 'GET', '*/*')
+
+        self.assertEqual(match1, {'cust_id':'123'})
+        self.assertEqual(match2, {'cust_id':'123'})
+
+        # Each caller receives its own copy of parameters
+        match2['cust_id'] = '456'
+        self.assertEqual(self._match(url_data, '/api/customer/123', 'GET', '*/*'), ({'cust_id':'123'}, 'api.customer.get'))
+
+        stats = url_data.get_url_cache_stats()
+
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 2 / 3)
+
+# ################################################################################################################################
+
+    def test_cache_eviction(self):
+
+        url_data = self._get_url_data(url_cache_max_size=2)
+
+        self._match(url_data, '/api/customer/1', 'GET', '*/*')
+        self._match(url_data, '/api/customer/2', 'GET', '*/*')
+
+        # Using the first target makes the second one the least recently used ..
+        self._match(url_data, '/api/customer/1', 'GET', '*/*')
+        self._match(url_data, '/api/ping', 'GET', '*/*')
+
+        # .. so it is the one that is evicted.
+        self.assertListEqual(list(url_data.url_path_cache), [
+            ':::GET:::haanyHTTP_SEPhaany:::/api/customer/1',
+            ':::GET:::haanyHTTP_SEPhaany:::/api/ping',
+        ])
+
+        self.assertDictEqual(url_data.url_cache_by_channel, {
+            'api.customer.get': {':::GET:::haanyHTTP_SEPhaany:::/api/customer/1'},
+            'api.ping': {':::GET:::haanyHTTP_SEPhaany:::/api/ping'},
+        })
+
+        self.assertEqual(url_data.get_url_cache_stats()['evictions'], 1)
+
+# ################################################################################################################################
+
+    def test_cache_disabled(self):
+
+        url_data = self._get_url_data(url_cache_max_size=0)
+
+        self.assertEqual(self._match(url_data, '/api/ping', 'GET', '*/*'), ({}, 'api.ping'))
+        self.assertEqual(self._match(url_data, '/api/ping', 'GET', '*/*'), ({}, 'api.ping'))
+        self.assertEqual(len(url_data.url_path_cache), 0)
+
+# ################################################################################################################################
+
+    def test_remove_channel_from_cache(self):
+
+        url_data = self._get_url_data()
+
+        self._match(url_data, '/api/customer/1', 'GET', '*/*')
+        self._match(url_data, '/api/customer/2', 'GET', '*/*')
+        self._match(url_data, '/api/ping', 'GET', '*/*')
+
+        url_data._remove_channel_from_cache('api.customer.get')
+
+        self.assertListEqual(list(url_data.url_path_cache), [':::GET:::haanyHTTP_SEPhaany:::/api/ping'])
+        self.assertListEqual(list(url_data.url_cache_by_channel), ['api.ping'])
+
+        # Channels without any targets cached are ignored
+        url_data._remove_channel_from_cache('api.file')
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = unittest_main()
+
+# ################################################################################################################################
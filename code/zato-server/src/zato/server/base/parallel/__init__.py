@@ -40,7 +40,7 @@ from zato.common.api import DATA_FORMAT, default_internal_modules, EnvFile, EnvV
 from zato.common.audit import audit_pii
 from zato.common.audit_log import AuditLog
 from zato.common.bearer_token import BearerTokenManager
-from zato.common.broker_message import HOT_DEPLOY, MESSAGE_TYPE
+from zato.common.broker_message import CLUSTER, HOT_DEPLOY, MESSAGE_TYPE
 from zato.common.const import SECRETS
 from zato.common.events.common import Default as EventsDefault
 from zato.common.facade import SecurityFacade
@@ -60,6 +60,7 @@ from zato.common.util.api import absolutize, get_config_from_file, get_kvdb_conf
     register_diag_handlers, save_ipc_pid_port, spawn_greenlet, StaticConfig
 from zato.common.util.env import populate_environment_from_file
 from zato.common.util.file_transfer import path_string_list_to_list
+from zato.common.util.gather import ScatterGather
 from zato.common.util.hot_deploy_ import extract_pickup_from_items
 from zato.common.util.json_ import BasicParser
 from zato.common.util.platform_ import is_posix
@@ -94,8 +95,9 @@ if 0:
     from zato.common.ipc.client import IPCResponse
     from zato.common.odb.api import ODBManager
     from zato.common.odb.model import Cluster as ClusterModel
-    from zato.common.typing_ import any_, anydict, anylist, anyset, callable_, dictlist, intset, listorstr, strdict, strbytes, \
-        strlist, strorlistnone, strnone, strorlist, strset
+    from zato.common.typing_ import any_, anydict, anylist, anyset, callable_, dictlist, intlist, intlistnone, intset, \
+        listorstr, strdict, strbytes, strlist, strorlistnone, strnone, strorlist, strset
+    from zato.common.util.gather import TaskResult
     from zato.server.connection.cache import Cache, CacheAPI
     from zato.server.connection.connector.subprocess_.ipc import SubprocessIPC
     from zato.server.ext.zunicorn.arbiter import Arbiter
@@ -114,6 +116,7 @@ if 0:
     SSOAPI = SSOAPI # type: ignore
     StartupCallableTool = StartupCallableTool
     SubprocessIPC = SubprocessIPC
+    TaskResult = TaskResult
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -217,6 +220,8 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
         self.pid = -1
         self.sync_internal = False
         self.ipc_api = IPCAPI(self)
+        self.worker_pids = None # type: intlistnone
+        self.worker_pids_gather = ScatterGather()
         self.fifo_response_buffer_size = -1
         self.is_first_worker = False
         self.process_idx = -1
@@ -1181,6 +1186,12 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
 
             logger.info('First worker of `%s` is %s', self.name, self.pid)
 
+            # Let other servers know that we are running so that they do not have to wait for us to be noticed
+            self.broker_client.publish({
+                'action': CLUSTER.SERVER_JOINED.value,
+                'server_name': self.name,
+            })
+
             self.startup_callable_tool.invoke(SERVER_STARTUP.PHASE.IN_PROCESS_FIRST, kwargs={
                 'server': self,
             })
@@ -1284,9 +1295,19 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
             callback_func=self.on_ipc_invoke_callback,
         )
 
-        # .. we can now store the information about what IPC port to use with this PID.
+        # .. other processes will prefer to invoke us over a Unix domain socket, if it can be used ..
+        self.ipc_api.use_uds = is_posix and asbool(self.fs_server_config.main.get('ipc_use_uds', True))
+
+        if self.ipc_api.use_uds:
+            self.ipc_api.start_uds_server(self.cluster_name, self.name, self.pid, self.on_ipc_invoke_callback)
+
+        # .. we can now store the information about what IPC port to use with this PID ..
         save_ipc_pid_port(self.cluster_name, self.name, self.pid, bind_port)
 
+        # .. and let other processes know that they need to read our PID.
+        if self.fs_server_config.main.gunicorn_workers > 1:
+            _ = spawn_greenlet(self.invoke_all_pids, 'zato.info.invalidate-worker-pids', None)
+
 # ################################################################################################################################
 
     def _stop_after_timeout(self):
@@ -1575,6 +1596,24 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
 
         return data
 
+# ################################################################################################################################
+
+    def get_worker_pids(self) -> 'intlist':
+        """ Returns PIDs of all the processes of current server, reading them only if they are not known yet.
+        """
+        if self.worker_pids is None:
+            all_pids_response = self.invoke('zato.info.get-worker-pids', serialize=False)
+            self.worker_pids = all_pids_response['pids']
+
+        return cast_('intlist', self.worker_pids)
+
+# ################################################################################################################################
+
+    def invalidate_worker_pids(self) -> 'None':
+        """ Makes PIDs be read again the next time they are needed, e.g. because a process started or stopped.
+        """
+        self.worker_pids = None
+
 # ################################################################################################################################
 
     def invoke_all_pids(self, service:'str', request:'any_', timeout:'int'=5, *args:'any_', **kwargs:'any_') -> 'dictlist':
@@ -1585,13 +1624,26 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
         out:'dictlist' = []
 
         try:
-            # Get all current PIDs
-            all_pids_response = self.invoke('zato.info.get-worker-pids', serialize=False)
-            pids = all_pids_response['pids']
+            # Get all current PIDs ..
+            pids = self.get_worker_pids()
+
+            # .. invoke all of them concurrently, waiting no longer than the timeout for all of them in total ..
+            task_list = [self.worker_pids_gather.new_task(pid, self.invoke_by_pid, service, request, pid, timeout=timeout)
+                for pid in pids]
+            result_list = self.worker_pids_gather.run(task_list, timeout)
+
+            for result in result_list:
+                result = cast_('TaskResult', result)
+
+                # .. a process may have stopped in the meantime so we will read the PIDs again the next time ..
+                if not result.is_ok:
+                    logger.warning('PID %s invocation error (%s) `%s`', result.key, result.status, result.error_info)
+                    self.invalidate_worker_pids()
+                    self.ipc_api.forget_pid(result.key)
+                    continue
+
+                pid_response = result.data
 
-            # Invoke each of them
-            for pid in pids:
-                pid_response = self.invoke_by_pid(service, request, pid, timeout=timeout, *args, **kwargs)
                 if pid_response.data is not None:
 
                     # If this is an internal service, we want to remove its root-level response element.
@@ -1921,6 +1973,9 @@ class ParallelServer(BrokerMessageReceiver, ConfigLoader, HTTPHandler):
                 self.server_startup_ipc.close()
                 self.connector_config_ipc.close()
 
+            # Stop accepting IPC requests over Unix domain sockets
+            self.ipc_api.stop_uds_server()
+
             # WSX connections for this server cleanup
             self.cleanup_wsx(True)
 
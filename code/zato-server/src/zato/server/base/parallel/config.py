@@ -45,6 +45,7 @@ class ModuleCtx:
     Audit_Max_Len_Messages = AuditLog.Default.max_len_messages
     Config_Store = ('apikey', 'basic_auth', 'jwt')
     Rate_Limit_Exact = RATE_LIMIT.TYPE.EXACT.id
+    Rate_Limit_Exact_In_RAM = RATE_LIMIT.TYPE.EXACT_IN_RAM.id
     Rate_Limit_Sec_Def = RATE_LIMIT.OBJECT_TYPE.SEC_DEF
     Rate_Limit_HTTP_SOAP = RATE_LIMIT.OBJECT_TYPE.HTTP_SOAP
 
@@ -477,7 +478,9 @@ class ConfigLoader:
 
             # This is reusable no matter if it is edit or create action
             rate_limit_def = config['rate_limit_def']
-            is_exact = config['rate_limit_type'] == ModuleCtx.Rate_Limit_Exact
+            rate_limit_type = config['rate_limit_type']
+            is_in_ram = rate_limit_type == ModuleCtx.Rate_Limit_Exact_In_RAM
+            is_exact = is_in_ram or rate_limit_type == ModuleCtx.Rate_Limit_Exact
 
             # Base dict that will be used as is, if we are to create the rate limiting configuration,
             # or it will be updated with existing configuration, if it already exists.
@@ -498,11 +501,11 @@ class ConfigLoader:
                 rate_limit_config['parent_type'] = existing_config.parent_type
                 rate_limit_config['parent_name'] = existing_config.parent_name
 
-                self.rate_limiting.edit(object_type, object_name, rate_limit_config, rate_limit_def, is_exact)
+                self.rate_limiting.edit(object_type, object_name, rate_limit_config, rate_limit_def, is_exact, is_in_ram)
 
             # .. otherwise, we will be creating a new one
             else:
-                self.rate_limiting.create(rate_limit_config, rate_limit_def, is_exact)
+                self.rate_limiting.create(rate_limit_config, rate_limit_def, is_exact, is_in_ram)
 
         # We are not to have any rate limits, but it is possible that previously we were required to,
         # in which case this needs to be cleaned up.
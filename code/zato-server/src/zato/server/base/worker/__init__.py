@@ -70,6 +70,7 @@ from zato.server.connection.odoo import OdooWrapper
 from zato.server.connection.sap import SAPWrapper
 from zato.server.connection.search.es import ElasticSearchAPI, ElasticSearchConnStore
 from zato.server.connection.search.solr import SolrAPI, SolrConnStore
+from zato.server.connection.server.rpc.config import CredentialsConfig as RPCCredentialsConfig
 from zato.server.connection.sftp import SFTPIPCFacade
 from zato.server.connection.sms.twilio import TwilioAPI, TwilioConnStore
 from zato.server.connection.web_socket import ChannelWebSocket
@@ -1546,6 +1547,7 @@ class WorkerStore(_WorkerStoreBase):
         self._update_auth(msg, code_to_name[msg.action], SEC_DEF_TYPE.BASIC_AUTH,
             self._visit_wrapper_edit, keys=('username', 'name'))
         self.server.set_up_object_rate_limiting(RATE_LIMIT.OBJECT_TYPE.SEC_DEF, msg.name, 'basic_auth')
+        self._on_rpc_credentials_changed(msg)
 
     def on_broker_msg_SECURITY_BASIC_AUTH_DELETE(self, msg:'bunch_', *args:'any_') -> 'None':
         """ Deletes an HTTP Basic Auth security definition.
@@ -1557,6 +1559,13 @@ class WorkerStore(_WorkerStoreBase):
         """ Changes password of an HTTP Basic Auth security definition.
         """
         self._update_auth(msg, code_to_name[msg.action], SEC_DEF_TYPE.BASIC_AUTH, self._visit_wrapper_change_password)
+        self._on_rpc_credentials_changed(msg)
+
+    def _on_rpc_credentials_changed(self, msg:'bunch_') -> 'None':
+        """ Servers invoke each other with credentials of a specific definition so they need to be read again if it changes.
+        """
+        if msg.get('name') == RPCCredentialsConfig.sec_def_name:
+            self.server.rpc.invalidate()
 
 # ################################################################################################################################
 
@@ -2173,6 +2182,16 @@ class WorkerStore(_WorkerStoreBase):
         del msg['action']
         self.server.service_store.edit_service_data(msg)
 
+# ################################################################################################################################
+
+    def on_broker_msg_CLUSTER_SERVER_JOINED(self, msg:'bunch_', *args:'any_') -> 'None':
+        self.server.rpc.on_server_joined(msg.server_name)
+
+# ################################################################################################################################
+
+    def on_broker_msg_CLUSTER_SERVER_LEFT(self, msg:'bunch_', *args:'any_') -> 'None':
+        self.server.rpc.on_server_left(msg.server_name)
+
 # ################################################################################################################################
 
     def on_broker_msg_OUTGOING_FTP_CREATE_EDIT(self, msg:'bunch_', *args:'any_') -> 'None':
@@ -7,12 +7,15 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
-from base64 import b64encode
+from base64 import b64decode, b64encode
 from logging import getLogger
 from traceback import format_exc
 
+# Bunch
+from bunch import Bunch
+
 # gevent
-from gevent import sleep, spawn
+from gevent import sleep, spawn, spawn_later
 from gevent.lock import RLock
 
 # python-memcached
@@ -27,17 +30,18 @@ from zato.common.api import CACHE, ZATO_NOT_GIVEN
 from zato.common.broker_message import CACHE as CACHE_BROKER_MSG
 from zato.common.typing_ import cast_
 from zato.common.util.api import parse_extra_into_dict
+from zato.server.connection.cache_shared import SharedCache
 
 # Python 2/3 compatibility
 from zato.common.ext.future.utils import iteritems, itervalues
 from zato.common.py23_.past.builtins import basestring
-from zato.common.py23_ import pickle_dumps
+from zato.common.py23_ import pickle_dumps, pickle_loads
 
 # ################################################################################################################################
 # ################################################################################################################################
 
 if 0:
-    from zato.common.typing_ import any_
+    from zato.common.typing_ import any_, stranydict
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -67,12 +71,14 @@ builtin_ops = [
 ]
 
 builtin_op_to_broker_msg = {}
+builtin_op_to_sync_func = {}
 
 for builtin_op in builtin_ops:
     common_key = getattr(CACHE.STATE_CHANGED, builtin_op)
     broker_msg_value = getattr(CACHE_BROKER_MSG, 'BUILTIN_STATE_CHANGED_{}'.format(builtin_op)).value
 
     builtin_op_to_broker_msg[common_key] = broker_msg_value
+    builtin_op_to_sync_func[common_key] = 'sync_after_{}'.format(builtin_op.lower())
 
 # ################################################################################################################################
 
@@ -81,6 +87,114 @@ default_get = ZATO_NOT_GIVEN # A singleton to indicate that no default for Cache
 _no_key = 'zato-no-key'
 _no_value = 'zato-no-value'
 
+# Batches are pickled as a whole, in-band, because each is base64-encoded into a single broker message afterwards
+_sync_batch_pickle_protocol = 5
+
+# ################################################################################################################################
+
+class SyncBatch:
+    """ Collects state changes of a built-in cache whose sync_method is 'batched' and passes them on in one go
+    to a callback that sends them to other worker processes. A batch is sent when the window, in milliseconds, elapses
+    since the first state change was added or as soon as the batch has the maximum number of state changes, whichever
+    comes first. Consecutive .set operations for the same key are collapsed into the most recent one.
+    Full batches are sent in background so that the greenlet changing the state of the cache does not wait for them.
+    """
+    def __init__(self, cache_name, window, size, callback):
+        self.cache_name = cache_name
+        self.window = window / 1000.0
+        self.size = size
+        self.callback = callback
+
+        # State changes collected so far, each in a tuple of (op, data) or None if it was collapsed into a later one
+        self.ops = []
+
+        # How many elements in self.ops are not None
+        self.current_size = 0
+
+        # Maps keys to indexes in self.ops of their most recent .set operations that can be still collapsed
+        self.last_set = {}
+
+        # A greenlet that will send the current batch once the window elapses
+        self.timer = None
+
+# ################################################################################################################################
+
+    def add(self, op, data, _SET=CACHE.STATE_CHANGED.SET):
+        """ Adds a state change to the batch, sending the batch out if it is full now.
+        """
+        if op == _SET:
+            key = data['key']
+            idx = self.last_set.get(key)
+
+            if idx is not None:
+                self.ops[idx] = None
+                self.current_size -= 1
+
+            self.last_set[key] = len(self.ops)
+
+        # Any other operation may touch keys set previously so no earlier .set can be collapsed into later ones
+        else:
+            self.last_set.clear()
+
+        self.ops.append((op, data))
+        self.current_size += 1
+
+        # A full batch is taken out right away, so that new state changes go to the next one, but it is sent in background
+        if self.current_size >= self.size:
+            spawn(self._send, self._reset())
+
+        elif not self.timer:
+            self.timer = spawn_later(self.window, self._on_window_elapsed)
+
+# ################################################################################################################################
+
+    def _on_window_elapsed(self):
+        self.timer = None
+        self.flush()
+
+# ################################################################################################################################
+
+    def _reset(self):
+        """ Discards the current batch, returning all of its state changes. Cancels the timer, if there is any.
+        """
+        if self.timer:
+            self.timer.kill(block=False)
+            self.timer = None
+
+        ops = self.ops
+        self.ops = []
+        self.current_size = 0
+        self.last_set.clear()
+
+        return ops
+
+# ################################################################################################################################
+
+    def flush(self):
+        """ Sends all the state changes collected so far, if there are any.
+        """
+        self._send(self._reset())
+
+# ################################################################################################################################
+
+    def _send(self, ops):
+        """ Sends state changes from a batch, skipping ones that were collapsed into later ones.
+        """
+        ops = [elem for elem in ops if elem]
+        if ops:
+            try:
+                self.callback(self.cache_name, ops)
+            except Exception:
+                logger.warning('Could not send a sync batch of %d op(s) from cache `%s`, e:`%s`',
+                    len(ops), self.cache_name, format_exc())
+
+# ################################################################################################################################
+
+    def stop(self):
+        """ Discards the current batch without sending it.
+        """
+        self._reset()
+
 # ################################################################################################################################
 
 class Cache:
@@ -90,11 +204,44 @@ class Cache:
     def __init__(self, config):
         self.config = config
         self.after_state_changed_callback = self.config.after_state_changed_callback
+        self.sync_batch_callback = self.config.sync_batch_callback
         self.needs_sync = self.config.sync_method != CACHE.SYNC_METHOD.NO_SYNC.id
+        self.sync_batch = None
+        self._set_sync_batch(self.config)
         self.impl = _CyCache(self.config.max_size, self.config.max_item_size, self.config.extend_expiry_on_get,
-            self.config.extend_expiry_on_set)
+            self.config.extend_expiry_on_set, key_index=self.config.get('key_index'), max_bytes=self.config.get('max_bytes'))
         spawn(self._delete_expired)
 
+# ################################################################################################################################
+
+    def _set_sync_batch(self, config):
+        """ Creates a new sync batch if the cache is synchronized in batches, sending out anything collected so far
+        in the previous one, if any.
+        """
+        if self.sync_batch:
+            self.sync_batch.flush()
+
+        if config.sync_method == CACHE.SYNC_METHOD.BATCHED.id:
+            self.sync_batch = SyncBatch(
+                config.name,
+                int(config.get('sync_batch_window') or CACHE.SYNC_BATCH.WINDOW),
+                int(config.get('sync_batch_size') or CACHE.SYNC_BATCH.SIZE),
+                self.sync_batch_callback,
+            )
+        else:
+            self.sync_batch = None
+
+# ################################################################################################################################
+
+    def _after_state_changed(self, op, data):
+        """ Hands a state change over for synchronization with other worker processes, either in its own message
+        or as part of a batch.
+        """
+        if self.sync_batch:
+            self.sync_batch.add(op, data)
+        else:
+            spawn(self.after_state_changed_callback, op, self.config.name, data)
+
 # ################################################################################################################################
 
     def __getitem__(self, key):
@@ -196,7 +343,7 @@ class Cache:
         meta_ref = {'key':key, 'value':value, 'expiry':expiry} if self.needs_sync else None
         value = self.impl.set(key, value, expiry, details, meta_ref)
         if self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, meta_ref)
+            self._after_state_changed(_OP, meta_ref)
 
         return value
 
@@ -212,7 +359,7 @@ class Cache:
         out = self.impl.set_by_prefix(key, value, expiry, False, meta_ref, return_found, limit)
 
         if meta_ref['_any_found'] and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'value':value,
                 'expiry':expiry,
@@ -234,7 +381,7 @@ class Cache:
         out = self.impl.set_by_suffix(key, value, expiry, False, meta_ref, return_found, limit)
 
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'value':value,
                 'expiry':expiry,
@@ -256,7 +403,7 @@ class Cache:
         out = self.impl.set_by_regex(key, value, expiry, False, meta_ref, return_found, limit)
 
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'value':value,
                 'expiry':expiry,
@@ -278,7 +425,7 @@ class Cache:
         out = self.impl.set_contains(key, value, expiry, False, meta_ref, return_found, limit)
 
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'value':value,
                 'expiry':expiry,
@@ -300,7 +447,7 @@ class Cache:
         out = self.impl.set_not_contains(key, value, expiry, False, meta_ref, return_found, limit)
 
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'value':value,
                 'expiry':expiry,
@@ -322,7 +469,7 @@ class Cache:
         out = self.impl.set_contains_all(key, value, expiry, False, meta_ref, return_found, limit)
 
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'value':value,
                 'expiry':expiry,
@@ -344,7 +491,7 @@ class Cache:
         out = self.impl.set_contains_any(key, value, expiry, False, meta_ref, return_found, limit)
 
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'value':value,
                 'expiry':expiry,
@@ -366,7 +513,7 @@ class Cache:
                 raise
         else:
             if self.needs_sync:
-                spawn(self.after_state_changed_callback, _OP, self.config.name, {'key':key})
+                self._after_state_changed(_OP, {'key':key})
 
             return value
 
@@ -378,7 +525,7 @@ class Cache:
         """
         out = self.impl.delete_by_prefix(key, return_found, limit)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'limit':limit
             })
@@ -393,7 +540,7 @@ class Cache:
         """
         out = self.impl.delete_by_suffix(key, return_found, limit)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'limit':limit
             })
@@ -408,7 +555,7 @@ class Cache:
         """
         out = self.impl.delete_by_regex(key, return_found, limit)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'limit':limit
             })
@@ -423,7 +570,7 @@ class Cache:
         """
         out = self.impl.delete_contains(key, return_found, limit)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'limit':limit
             })
@@ -438,7 +585,7 @@ class Cache:
         """
         out = self.impl.delete_not_contains(key, return_found, limit)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'limit':limit
             })
@@ -453,7 +600,7 @@ class Cache:
         """
         out = self.impl.delete_contains_all(key, return_found, limit)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'limit':limit
             })
@@ -468,7 +615,7 @@ class Cache:
         """
         out = self.impl.delete_contains_any(key, return_found, limit)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'limit':limit
             })
@@ -484,7 +631,7 @@ class Cache:
         found_key = self.impl.expire(key, expiry, meta_ref)
 
         if self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, meta_ref)
+            self._after_state_changed(_OP, meta_ref)
 
         return found_key
 
@@ -495,7 +642,7 @@ class Cache:
         """
         out = self.impl.expire_by_prefix(key, expiry)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'expiry':expiry,
                 'limit':limit
@@ -510,7 +657,7 @@ class Cache:
         """
         out = self.impl.expire_by_suffix(key, expiry)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'expiry':expiry,
                 'limit':limit
@@ -525,7 +672,7 @@ class Cache:
         """
         out = self.impl.expire_by_regex(key, expiry)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'expiry':expiry,
                 'limit':limit
@@ -540,7 +687,7 @@ class Cache:
         """
         out = self.impl.expire_contains(key, expiry)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'expiry':expiry,
                 'limit':limit
@@ -555,7 +702,7 @@ class Cache:
         """
         out = self.impl.expire_not_contains(key, expiry)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'expiry':expiry,
                 'limit':limit
@@ -570,7 +717,7 @@ class Cache:
         """
         out = self.impl.expire_contains_all(key, expiry)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'expiry':expiry,
                 'limit':limit
@@ -585,7 +732,7 @@ class Cache:
         """
         out = self.impl.expire_contains_any(key, expiry)
         if out and self.needs_sync:
-            spawn(self.after_state_changed_callback, _OP, self.config.name, {
+            self._after_state_changed(_OP, {
                 'key':key,
                 'expiry':expiry,
                 'limit':limit
@@ -643,14 +790,27 @@ class Cache:
         self.impl.clear()
 
         if self.needs_sync:
-            spawn(self.after_state_changed_callback, _CLEAR, self.config.name, {})
+            self._after_state_changed(_CLEAR, {})
 
 # ################################################################################################################################
 
     def update_config(self, config):
-        self.needs_sync = self.config.sync_method != CACHE.SYNC_METHOD.NO_SYNC.id
+        self.needs_sync = config.sync_method != CACHE.SYNC_METHOD.NO_SYNC.id
+        self._set_sync_batch(config)
         self.impl.update_config(config)
 
+# ################################################################################################################################
+
+    def get_stats(self) -> 'stranydict':
+        """ Returns run-time statistics of the underlying cache implementation.
+        """
+        return {
+            'expiry_examined': self.impl.expiry_examined,
+            'expiry_examined_total': self.impl.expiry_examined_total,
+            'current_bytes': self.impl.current_bytes,
+            'peak_bytes': self.impl.peak_bytes,
+        }
+
 # ################################################################################################################################
 
     def _delete_expired(self, interval=5, _sleep=sleep):
@@ -666,7 +826,8 @@ class Cache:
                     _sleep(2)
                 else:
                     if deleted:
-                        logger.info('Cache `%s` deleted keys expired in the last %ss - %s', self.config.name, interval, deleted)
+                        logger.info('Cache `%s` deleted keys expired in the last %ss - %s (examined:%s)',
+                            self.config.name, interval, deleted, self.impl.expiry_examined)
         except Exception:
             logger.warning('Exception in _delete_expired loop %s', format_exc())
 
@@ -815,11 +976,25 @@ class Cache:
 
 # ################################################################################################################################
 
-    def sync_after_clear(self):
+    def sync_after_clear(self, data=None):
         """ Invoked by Cache API to synchronizes this worker's cache after a .clear operation in another worker process.
         """
         self.impl.clear()
 
+# ################################################################################################################################
+
+    def sync_after_batch(self, ops, _sync_func=builtin_op_to_sync_func):
+        """ Invoked by Cache API to synchronizes this worker's cache after a batch of operations in another worker process.
+        All the operations are applied under a single acquisition of the cache's lock.
+        """
+        with self.impl._lock:
+            for op, data in ops:
+                try:
+                    getattr(self, _sync_func[op])(Bunch(data))
+                except Exception:
+                    logger.warning('Could not apply `%s` from a sync batch in cache `%s`, data:`%s`, e:`%s`',
+                        op, self.config.name, data, format_exc())
+
 # ################################################################################################################################
 
 class _NotConfiguredAPI:
@@ -839,10 +1014,12 @@ class CacheAPI:
         self.caches = {
             CACHE.TYPE.BUILTIN:{},
             CACHE.TYPE.MEMCACHED:{},
+            CACHE.TYPE.SHARED:{},
         }
 
         self.builtin = self.caches[CACHE.TYPE.BUILTIN]
         self.memcached = self.caches[CACHE.TYPE.MEMCACHED]
+        self.shared = self.caches[CACHE.TYPE.SHARED]
 
     def _maybe_set_default(self, config, cache):
         if config.is_default:
@@ -885,14 +1062,63 @@ class CacheAPI:
             logger.warning('Could not run `%s` after_state_changed in cache `%s`, data:`%s`, e:`%s`',
                 op, cache_name, data, format_exc())
 
+# ################################################################################################################################
+
+    def publish_sync_batch(self, cache_name, ops, _pickle_dumps=pickle_dumps, _protocol=_sync_batch_pickle_protocol):
+        """ Callback method invoked by caches that synchronize their state with other worker processes in batches.
+        Keys and values are pickled along with the whole batch so there is only one encoding step per message,
+        which is required because the broker's transport is JSON-based.
+        """
+        ops = _pickle_dumps(ops, protocol=_protocol)
+        ops = b64encode(ops)
+        ops = ops.decode('utf8')
+
+        self.server.broker_client.publish({
+            'action': CACHE_BROKER_MSG.BUILTIN_STATE_CHANGED_BATCH.value,
+            'cache_name': cache_name,
+            'source_worker_id': self.server.worker_id,
+            'ops': ops,
+        })
+
 # ################################################################################################################################
 
     def _create_builtin(self, config):
         """ A low-level method building a bCache object for built-in caches. Must be called with self.lock held.
         """
         config.after_state_changed_callback = self.after_state_changed
+        config.sync_batch_callback = self.publish_sync_batch
         return Cache(config)
 
+# ################################################################################################################################
+
+    def _create_shared(self, config):
+        """ A low-level method building a cache whose entries are kept in memory shared by all the worker processes
+        of this server. Must be called with self.lock held.
+        """
+        return SharedCache(config, self.server.base_dir, self.server.deployment_key)
+
+# ################################################################################################################################
+
+    def _get_cache_type(self, config):
+        """ Returns the type of cache to build out of configuration. Shared-memory caches are defined
+        as built-in ones with their storage set accordingly.
+        """
+        if config.cache_type == CACHE.TYPE.BUILTIN:
+            if config.get('storage') == CACHE.BUILTIN_STORAGE.SHARED_MEMORY.id:
+                return CACHE.TYPE.SHARED
+
+        return config.cache_type
+
+# ################################################################################################################################
+
+    def _resolve_type(self, cache_type, name):
+        """ Returns the type under which a cache is kept - a built-in cache definition may point to a shared-memory cache.
+        """
+        if cache_type == CACHE.TYPE.BUILTIN and name in self.shared:
+            return CACHE.TYPE.SHARED
+        else:
+            return cache_type
+
 # ################################################################################################################################
 
     def _create_memcached(self, config):
@@ -923,12 +1149,14 @@ class CacheAPI:
     def _create(self, config):
         """ A low-level method building caches. Must be called with self.lock held.
         """
+        config.cache_type = self._get_cache_type(config)
+
         # Create a cache object out of configuration
         cache = getattr(self, '_create_{}'.format(config.cache_type))(config)
 
-        # Only built-in caches can be added directly because they do not establish
+        # Only built-in and shared-memory caches can be added directly because they do not establish
         # any external connections, any other cache will be built in a background greenlet
-        if config.cache_type == CACHE.TYPE.BUILTIN:
+        if config.cache_type in (CACHE.TYPE.BUILTIN, CACHE.TYPE.SHARED):
             self._add_cache(config, cache)
 
 # ################################################################################################################################
@@ -945,9 +1173,20 @@ class CacheAPI:
         """ A low-level method for updating configuration of a given cache. Must be called with self.lock held.
         """
         if config.cache_type == CACHE.TYPE.BUILTIN:
-            cache = self.caches[config.cache_type].pop(config.old_name)
-            cache.update_config(config)
-            self._add_cache(config, cache)
+
+            prev_cache_type = self._resolve_type(config.cache_type, config.old_name)
+            config.cache_type = self._get_cache_type(config)
+
+            # The cache stays in the same kind of storage so it can be reconfigured in place ..
+            if prev_cache_type == config.cache_type:
+                cache = self.caches[config.cache_type].pop(config.old_name)
+                cache.update_config(config)
+                self._add_cache(config, cache)
+
+            # .. otherwise, it needs to be built anew.
+            else:
+                self._delete(prev_cache_type, config.old_name)
+                self._create(config)
         else:
             cache = self.caches[config.cache_type][config.old_name]
             cache.disconnect_all()
@@ -967,10 +1206,18 @@ class CacheAPI:
     def _delete(self, cache_type, name):
         """ A low-level method for deleting a given cache. Must be called with self.lock held.
         """
+        cache_type = self._resolve_type(cache_type, name)
         cache = self.caches[cache_type][name]
 
         if cache_type == CACHE.TYPE.BUILTIN:
+            if cache.sync_batch:
+                cache.sync_batch.stop()
             self._clear(cache_type, name)
+
+        # Other processes may still use the shared memory so it is not cleared, only unlinked
+        elif cache_type == CACHE.TYPE.SHARED:
+            cache.close(needs_unlink=True)
+
         else:
             cache.disconnect_all()
 
@@ -989,7 +1236,7 @@ class CacheAPI:
     def _clear(self, cache_type, name):
         """ A low-level method for clearing out contents of a given cache. Must be called with self.lock held.
         """
-        self.caches[cache_type][name].clear()
+        self.caches[self._resolve_type(cache_type, name)][name].clear()
 
 # ################################################################################################################################
 
@@ -1004,7 +1251,7 @@ class CacheAPI:
     def _get_cache(self, cache_type:'str', name:'str') -> 'Cache':
         """ Actually returns a cache. Must be called with self.lock held.
         """
-        return self.caches[cache_type][name]
+        return self.caches[self._resolve_type(cache_type, name)][name]
 
 # ################################################################################################################################
 
@@ -1012,7 +1259,7 @@ class CacheAPI:
         """ Returns the lower-level cache implementation object by its type and name.
         """
         with self.lock:
-            return self.caches[cache_type][name]
+            return self._get_cache(cache_type, name)
 
 # ################################################################################################################################
 
@@ -1022,6 +1269,14 @@ class CacheAPI:
         with self.lock:
             return self._get_cache(CACHE.TYPE.BUILTIN, name)
 
+# ################################################################################################################################
+
+    def get_shared_cache(self, name):
+        """ Returns a shared-memory cache by its name.
+        """
+        with self.lock:
+            return self._get_cache(CACHE.TYPE.SHARED, name)
+
 # ################################################################################################################################
 
     def get_memcached_cache(self, name):
@@ -1035,7 +1290,14 @@ class CacheAPI:
     def get_size(self, cache_type, name):
         """ Returns current size, the number of entries, in a given cache.
         """
-        return len(self.caches[cache_type][name])
+        return len(self.caches[self._resolve_type(cache_type, name)][name])
+
+# ################################################################################################################################
+
+    def get_stats(self, cache_type:'str', name:'str') -> 'stranydict':
+        """ Returns run-time statistics of a given built-in cache.
+        """
+        return self.caches[self._resolve_type(cache_type, name)][name].get_stats()
 
 # ################################################################################################################################
 
@@ -1170,4 +1432,12 @@ class CacheAPI:
         """
         self.caches[cache_type][data.cache_name].sync_after_clear()
 
+# ################################################################################################################################
+
+    def sync_after_batch(self, cache_type, data, _pickle_loads=pickle_loads):
+        """ Synchronizes the state of this worker's cache after a batch of operations in another worker process.
+        """
+        ops = _pickle_loads(b64decode(data.ops))
+        self.caches[cache_type][data.cache_name].sync_after_batch(ops)
+
 # ################################################################################################################################
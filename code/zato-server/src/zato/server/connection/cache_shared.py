@@ -0,0 +1,980 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
+from hashlib import blake2b, sha256
+from logging import getLogger
+from mmap import mmap
+from struct import Struct
+from time import time
+from traceback import format_exc
+
+try:
+    import posix_ipc as ipc
+except ImportError:
+    # Ignore it under Windows
+    pass
+
+# gevent
+from gevent import sleep, spawn
+
+# Zato
+from zato.common.api import CACHE, ZATO_NOT_GIVEN
+from zato.common.py23_ import pickle_dumps, pickle_loads
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist, anytuple, stranydict
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger(__name__)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+_shmem_pattern = '/zato-cache-{}'
+
+# Identifies memory laid out by SharedTable - if the layout changes, so must the version
+_magic = b'ZATOSHMC'
+_version = 2
+
+# magic, version, (padding), slot_count, data_size, count, data_used, garbage, tombstones, clock_hand, hits, misses, evictions,
+# generation, last_sweep - the header takes up _header_size bytes, the rest of them are reserved.
+_header = Struct('<8sII10Q16sQ')
+_header_size = 256
+
+# Offsets of individual fields in the header
+_off_slot_count = 16
+_off_data_size  = 24
+_off_count      = 32
+_off_data_used  = 40
+_off_garbage    = 48
+_off_tombstones = 56
+_off_clock_hand = 64
+_off_hits       = 72
+_off_misses     = 80
+_off_evictions  = 88
+_off_last_sweep = 112
+
+# state, referenced, value_type, (padding), key_len, value_len, hash, offset, expiry, expires_at, last_write, (padding)
+_slot = Struct('<BBBxIIQQddd4x')
+_slot_size = _slot.size
+
+# Offsets of individual fields in a slot
+_off_slot_referenced = 1
+_off_slot_hash = 12
+_off_slot_expiry = 28
+
+_u64 = Struct('<Q')
+_expiry = Struct('<dd')
+
+# States of slots
+_slot_empty   = 0
+_slot_used    = 1
+_slot_deleted = 2
+
+# Types of values
+_value_str    = 0
+_value_bytes  = 1
+_value_int    = 2
+_value_pickle = 3
+
+# Returned by .get to indicate that there was no value for a given key
+_no_value = object()
+
+# How many bytes of the slot table to zero out at a time
+_zero_chunk_size = 1_000_000
+
+# The most a table can be filled in, counting both entries and deleted slots, before it is rebuilt
+_max_load_factor = 0.75
+
+# How many times in a row to yield to other greenlets while another process holds the lock ..
+_lock_spin_count = 100
+
+# .. before waiting that many seconds between each next attempt to acquire it.
+_lock_retry_delay = 0.001
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def _get_slot_count(max_size:'int') -> 'int':
+    """ Returns the number of slots in a table that holds up to max_size entries - a power of two that keeps the table
+    no more than half-full.
+    """
+    out = 8
+    while out < max_size * 2:
+        out *= 2
+    return out
+
+# ################################################################################################################################
+
+def encode_key(key:'any_') -> 'bytes':
+    """ Turns a key into bytes that are stored in shared memory, keeping its type so that, e.g. 'abc' and b'abc' differ.
+    """
+    if isinstance(key, str):
+        return b's' + key.encode('utf8')
+    elif isinstance(key, bytes):
+        return b'b' + key
+    elif isinstance(key, int):
+        return b'i' + str(key).encode('ascii')
+    else:
+        raise ValueError('Key must be an instance of one of {}'.format((str, bytes, int)))
+
+# ################################################################################################################################
+
+def decode_key(data:'bytes') -> 'any_':
+    """ Turns bytes from shared memory back into a key.
+    """
+    key_type, data = data[:1], data[1:]
+
+    if key_type == b's':
+        return data.decode('utf8')
+    elif key_type == b'b':
+        return data
+    else:
+        return int(data)
+
+# ################################################################################################################################
+
+def hash_key(data:'bytes') -> 'int':
+    """ Returns a hash of an encoded key. Unlike the built-in hash function, this one is the same in all processes.
+    """
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'little')
+
+# ################################################################################################################################
+
+def encode_value(value:'any_') -> 'anytuple':
+    """ Returns a type of a value and bytes that represent it in shared memory.
+    """
+    if isinstance(value, str):
+        return _value_str, value.encode('utf8')
+    elif isinstance(value, bytes):
+        return _value_bytes, value
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return _value_int, str(value).encode('ascii')
+    else:
+        return _value_pickle, pickle_dumps(value)
+
+# ################################################################################################################################
+
+def decode_value(value_type:'int', data:'bytes') -> 'any_':
+    """ Turns bytes from shared memory back into a value of a given type.
+    """
+    if value_type == _value_str:
+        return data.decode('utf8')
+    elif value_type == _value_bytes:
+        return data
+    elif value_type == _value_int:
+        return int(data)
+    else:
+        return pickle_loads(data)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SharedTable:
+    """ A hash table in memory that is mapped from a file descriptor, e.g. a POSIX shared memory object,
+    so that it can be read and written to by all processes that map the same object. Processes exclude each other
+    through flock on their own descriptors, which the kernel releases if a process holding the lock dies.
+    The lock is never waited for in a blocking call - other greenlets keep running until it can be acquired.
+    No greenlet switch can take place while the lock is held, which is why greenlets of a single process,
+    sharing the same descriptor, do not need to exclude each other.
+
+    Slots use open addressing with linear probing. Keys and values are kept in a data area that is allocated
+    sequentially - once it is full, it is compacted or, if that is not enough, entries are evicted. Eviction uses
+    the CLOCK algorithm, an approximation of LRU that only needs a single bit per entry to be updated on reads.
+
+    Methods that do not start with an underscore acquire the lock themselves, the other ones must be called with it held.
+    """
+    def __init__(self, fd:'int', max_size:'int', data_size:'int', generation:'bytes') -> 'None':
+        self.fd = fd
+        self.max_size = max_size
+        self.data_size = data_size
+
+        # Memory that was initialized with a different generation is not used, e.g. it was left over by a previous server run
+        self.generation = generation
+
+        self.slot_count = _get_slot_count(max_size)
+        self.mask = self.slot_count - 1
+        self.max_used_slots = int(self.slot_count * _max_load_factor)
+
+        self.slots_start = _header_size
+        self.data_start = _header_size + self.slot_count * _slot_size
+        self.total_size = self.data_start + self.data_size
+
+        self.mem = None # type: mmap
+
+# ################################################################################################################################
+
+    @staticmethod
+    def get_total_size(max_size:'int', data_size:'int') -> 'int':
+        """ Returns how many bytes a table with a given capacity needs.
+        """
+        return _header_size + _get_slot_count(max_size) * _slot_size + data_size
+
+# ################################################################################################################################
+
+    def open(self) -> 'None':
+        """ Maps the memory and initializes it unless it is already used by a table with the same layout and generation.
+        """
+        if os.fstat(self.fd).st_size < self.total_size:
+            os.ftruncate(self.fd, self.total_size)
+
+        self.mem = mmap(self.fd, self.total_size)
+
+        self._lock()
+        try:
+            header = _header.unpack_from(self.mem, 0)
+            magic, version, _, slot_count, data_size = header[:5]
+            generation = header[13]
+
+            if (magic, version, slot_count, data_size, generation) != \
+                (_magic, _version, self.slot_count, self.data_size, self.generation):
+                self._init()
+        finally:
+            self._unlock()
+
+# ################################################################################################################################
+
+    def close(self) -> 'None':
+        if self.mem:
+            self.mem.close()
+            self.mem = None
+
+# ################################################################################################################################
+
+    def _lock(self) -> 'None':
+
+        attempts = 0
+
+        while True:
+            try:
+                flock(self.fd, LOCK_EX | LOCK_NB)
+            except BlockingIOError:
+                attempts += 1
+                sleep(0 if attempts < _lock_spin_count else _lock_retry_delay)
+            else:
+                return
+
+    def _unlock(self) -> 'None':
+        flock(self.fd, LOCK_UN)
+
+# ################################################################################################################################
+
+    def _get(self, offset:'int') -> 'int':
+        return _u64.unpack_from(self.mem, offset)[0]
+
+    def _put(self, offset:'int', value:'int') -> 'None':
+        _u64.pack_into(self.mem, offset, value)
+
+    def _incr(self, offset:'int', value:'int'=1) -> 'None':
+        _u64.pack_into(self.mem, offset, _u64.unpack_from(self.mem, offset)[0] + value)
+
+# ################################################################################################################################
+
+    def _init(self) -> 'None':
+        """ Writes a new header and marks all the slots as empty.
+        """
+        slots_end = self.data_start
+        position = self.slots_start
+
+        while position < slots_end:
+            chunk_size = min(_zero_chunk_size, slots_end - position)
+            self.mem[position:position + chunk_size] = bytes(chunk_size)
+            position += chunk_size
+
+        _header.pack_into(self.mem, 0, _magic, _version, 0, self.slot_count, self.data_size,
+            0, 0, 0, 0, 0, 0, 0, 0, self.generation, 0)
+
+# ################################################################################################################################
+
+    def _find(self, key:'bytes', key_hash:'int') -> 'anytuple':
+        """ Returns the index of the slot holding a given key, or -1 if there is no such key, along with the index
+        of the first slot that a new entry with that key could be stored in.
+        """
+        mem = self.mem
+        mask = self.mask
+        slots_start = self.slots_start
+        data_start = self.data_start
+
+        idx = key_hash & mask
+        free_idx = -1
+
+        for _ in range(self.slot_count):
+
+            position = slots_start + idx * _slot_size
+            state = mem[position]
+
+            # Nothing was ever stored in this slot so the key cannot be found further on
+            if state == _slot_empty:
+                return -1, (idx if free_idx == -1 else free_idx)
+
+            elif state == _slot_deleted:
+                if free_idx == -1:
+                    free_idx = idx
+
+            elif _u64.unpack_from(mem, position + _off_slot_hash)[0] == key_hash:
+                _, _, _, key_len, _, _, offset, _, _, _ = _slot.unpack_from(mem, position)
+                data_position = data_start + offset
+                if mem[data_position:data_position + key_len] == key:
+                    return idx, free_idx
+
+            idx = (idx + 1) & mask
+
+        return -1, free_idx
+
+# ################################################################################################################################
+
+    def _read_slot(self, idx:'int') -> 'anytuple':
+        return _slot.unpack_from(self.mem, self.slots_start + idx * _slot_size)
+
+# ################################################################################################################################
+
+    def _read_data(self, offset:'int', length:'int') -> 'bytes':
+        position = self.data_start + offset
+        return self.mem[position:position + length]
+
+# ################################################################################################################################
+
+    def _delete_slot(self, idx:'int') -> 'None':
+        """ Marks a slot as deleted, leaving the data it pointed to for the next compaction to reclaim.
+        """
+        position = self.slots_start + idx * _slot_size
+        _, _, _, key_len, value_len, _, _, _, _, _ = _slot.unpack_from(self.mem, position)
+
+        self.mem[position] = _slot_deleted
+        self._incr(_off_count, -1)
+        self._incr(_off_tombstones)
+        self._incr(_off_garbage, key_len + value_len)
+
+# ################################################################################################################################
+
+    def _evict_one(self) -> 'None':
+        """ Evicts a single entry, the first one found by the clock hand that was not read since the hand last passed it.
+        """
+        mem = self.mem
+        mask = self.mask
+        hand = self._get(_off_clock_hand)
+
+        # Two full rounds are enough because the first one clears all the reference bits
+        for _ in range(self.slot_count * 2):
+
+            position = self.slots_start + hand * _slot_size
+
+            if mem[position] == _slot_used:
+                if mem[position + _off_slot_referenced]:
+                    mem[position + _off_slot_referenced] = 0
+                else:
+                    self._delete_slot(hand)
+                    self._incr(_off_evictions)
+                    self._put(_off_clock_hand, (hand + 1) & mask)
+                    return
+
+            hand = (hand + 1) & mask
+
+# ################################################################################################################################
+
+    def _rebuild(self) -> 'None':
+        """ Rewrites all the entries so that the data area has no gaps left by deleted entries
+        and the slot table has no deleted slots.
+        """
+        entries = []
+
+        for idx in range(self.slot_count):
+            state, referenced, value_type, key_len, value_len, key_hash, offset, expiry, expires_at, last_write = \
+                self._read_slot(idx)
+
+            if state == _slot_used:
+                data = self._read_data(offset, key_len + value_len)
+                entries.append((referenced, value_type, key_len, value_len, key_hash, expiry, expires_at, last_write, data))
+
+        clock_hand = self._get(_off_clock_hand)
+        hits = self._get(_off_hits)
+        misses = self._get(_off_misses)
+        evictions = self._get(_off_evictions)
+        last_sweep = self._get(_off_last_sweep)
+
+        self._init()
+
+        self._put(_off_clock_hand, clock_hand)
+        self._put(_off_hits, hits)
+        self._put(_off_misses, misses)
+        self._put(_off_evictions, evictions)
+        self._put(_off_last_sweep, last_sweep)
+
+        data_used = 0
+
+        for referenced, value_type, key_len, value_len, key_hash, expiry, expires_at, last_write, data in entries:
+
+            idx = key_hash & self.mask
+            while self.mem[self.slots_start + idx * _slot_size] != _slot_empty:
+                idx = (idx + 1) & self.mask
+
+            position = self.data_start + data_used
+            self.mem[position:position + len(data)] = data
+
+            _slot.pack_into(self.mem, self.slots_start + idx * _slot_size, _slot_used, referenced, value_type, key_len,
+                value_len, key_hash, data_used, expiry, expires_at, last_write)
+
+            data_used += len(data)
+
+        self._put(_off_count, len(entries))
+        self._put(_off_data_used, data_used)
+
+# ################################################################################################################################
+
+    def _allocate(self, size:'int') -> 'int':
+        """ Returns an offset in the data area under which size bytes can be stored, compacting the area
+        or evicting entries if needed. Note that both may move existing entries to other slots.
+        """
+        while True:
+
+            data_used = self._get(_off_data_used)
+
+            if data_used + size <= self.data_size:
+                self._put(_off_data_used, data_used + size)
+                return data_used
+
+            # Compaction would be enough to make room ..
+            if data_used - self._get(_off_garbage) + size <= self.data_size:
+                self._rebuild()
+
+            # .. otherwise, we need to evict something first.
+            else:
+                self._evict_one()
+
+# ################################################################################################################################
+
+    def _insert(self, key:'bytes', key_hash:'int', value_type:'int', value:'bytes', expiry:'float', expires_at:'float',
+        now:'float') -> 'None':
+        """ Stores a new entry under a key that does not exist in the table.
+        """
+        if self._get(_off_count) >= self.max_size:
+            self._evict_one()
+
+        offset = self._allocate(len(key) + len(value))
+
+        position = self.data_start + offset
+        self.mem[position:position + len(key)] = key
+        self.mem[position + len(key):position + len(key) + len(value)] = value
+
+        # Allocation may have rebuilt the table so only now do we know which slot to use
+        _, idx = self._find(key, key_hash)
+
+        slot_position = self.slots_start + idx * _slot_size
+        if self.mem[slot_position] == _slot_deleted:
+            self._incr(_off_tombstones, -1)
+
+        _slot.pack_into(self.mem, slot_position, _slot_used, 0, value_type, len(key), len(value), key_hash, offset,
+            expiry, expires_at, now)
+
+        self._incr(_off_count)
+
+        if self._get(_off_count) + self._get(_off_tombstones) > self.max_used_slots:
+            self._rebuild()
+
+# ################################################################################################################################
+
+    def get(self, key:'bytes', key_hash:'int', now:'float', extend_expiry:'bool') -> 'anytuple':
+        """ Returns a tuple of (value_type, value, expiry, expires_at, last_write) for a given key or None if there is no
+        such key or it has already expired.
+        """
+        self._lock()
+        try:
+            idx, _ = self._find(key, key_hash)
+
+            if idx == -1:
+                self._incr(_off_misses)
+                return None
+
+            _, _, value_type, key_len, value_len, _, offset, expiry, expires_at, last_write = self._read_slot(idx)
+            position = self.slots_start + idx * _slot_size
+
+            if expires_at and now >= expires_at:
+                self._delete_slot(idx)
+                self._incr(_off_misses)
+                return None
+
+            if extend_expiry and expiry:
+                expires_at = now + expiry
+                _expiry.pack_into(self.mem, position + _off_slot_expiry, expiry, expires_at)
+
+            self.mem[position + _off_slot_referenced] = 1
+            self._incr(_off_hits)
+
+            return value_type, self._read_data(offset + key_len, value_len), expiry, expires_at, last_write
+
+        finally:
+            self._unlock()
+
+# ################################################################################################################################
+
+    def set(self, key:'bytes', key_hash:'int', value_type:'int', value:'bytes', expiry:'float', now:'float',
+        extend_expiry:'bool') -> 'anytuple':
+        """ Sets a value under a given key, returning a tuple of (value_type, value) of the previous value,
+        or None if there was none. Expiry is handled the same way built-in caches handle it.
+        """
+        if len(key) + len(value) > self.data_size:
+            raise ValueError('Value too big {} > {}'.format(len(key) + len(value), self.data_size))
+
+        self._lock()
+        try:
+            idx, _ = self._find(key, key_hash)
+
+            if idx != -1:
+                _, _, prev_type, key_len, prev_len, _, offset, prev_expiry, prev_expires_at, _ = self._read_slot(idx)
+                prev_value = self._read_data(offset + key_len, prev_len)
+
+                # An entry that has already expired is replaced with a new one
+                if prev_expires_at and now >= prev_expires_at:
+                    self._delete_slot(idx)
+                    idx = -1
+                    out = None
+                else:
+                    out = prev_type, prev_value
+
+                    # If we have a key that previously was not using expiry, we must set it now if expiry is given on input.
+                    if not prev_expires_at:
+                        expires_at = now + expiry if expiry else 0.0
+
+                    # If expiry == 0.0 it means that we are resetting an already existing expiry time ..
+                    elif expiry == 0.0:
+                        expires_at = 0.0
+
+                    # .. otherwise, the entry keeps its expiry, which is prolonged if we are configured to do it.
+                    else:
+                        expiry = prev_expiry
+                        expires_at = now + prev_expiry if extend_expiry else prev_expires_at
+
+                    # The new value fits in the space of the previous one ..
+                    if len(value) <= prev_len:
+                        position = self.data_start + offset + key_len
+                        self.mem[position:position + len(value)] = value
+                        self._incr(_off_garbage, prev_len - len(value))
+
+                        _slot.pack_into(self.mem, self.slots_start + idx * _slot_size, _slot_used, 1, value_type, key_len,
+                            len(value), key_hash, offset, expiry, expires_at, now)
+
+                    # .. otherwise, it is stored anew.
+                    else:
+                        self._delete_slot(idx)
+                        self._insert(key, key_hash, value_type, value, expiry, expires_at, now)
+
+                    return out
+
+            self._insert(key, key_hash, value_type, value, expiry, now + expiry if expiry else 0.0, now)
+
+        finally:
+            self._unlock()
+
+# ################################################################################################################################
+
+    def delete(self, key:'bytes', key_hash:'int') -> 'anytuple':
+        """ Deletes an entry by its key, returning a tuple of (value_type, value) or None if there was no such key.
+        """
+        self._lock()
+        try:
+            idx, _ = self._find(key, key_hash)
+
+            if idx == -1:
+                return None
+
+            _, _, value_type, key_len, value_len, _, offset, _, _, _ = self._read_slot(idx)
+            value = self._read_data(offset + key_len, value_len)
+            self._delete_slot(idx)
+
+            return value_type, value
+
+        finally:
+            self._unlock()
+
+# ################################################################################################################################
+
+    def expire(self, key:'bytes', key_hash:'int', expiry:'float', now:'float') -> 'bool':
+        """ Sets expiry of an entry by its key, returning True if the key was found and False otherwise.
+        """
+        self._lock()
+        try:
+            idx, _ = self._find(key, key_hash)
+
+            if idx == -1:
+                return False
+
+            position = self.slots_start + idx * _slot_size
+            _expiry.pack_into(self.mem, position + _off_slot_expiry, expiry, now + expiry if expiry else 0.0)
+
+            return True
+
+        finally:
+            self._unlock()
+
+# ################################################################################################################################
+
+    def items(self, now:'float') -> 'anylist':
+        """ Returns a list of (key, value_type, value) tuples for all the entries that have not expired yet.
+        """
+        return [(key, value_type, value) for key, value_type, value, _, _, _ in self.entries(now)]
+
+# ################################################################################################################################
+
+    def entries(self, now:'float') -> 'anylist':
+        """ Returns a list of (key, value_type, value, expiry, expires_at, last_write) tuples for all the entries
+        that have not expired yet.
+        """
+        out = []
+
+        self._lock()
+        try:
+            for idx in range(self.slot_count):
+                state, _, value_type, key_len, value_len, _, offset, expiry, expires_at, last_write = self._read_slot(idx)
+                if state == _slot_used and not (expires_at and now >= expires_at):
+                    data = self._read_data(offset, key_len + value_len)
+                    out.append((data[:key_len], value_type, data[key_len:], expiry, expires_at, last_write))
+        finally:
+            self._unlock()
+
+        return out
+
+# ################################################################################################################################
+
+    def delete_expired(self, now:'float', interval:'float'=0) -> 'anylist':
+        """ Deletes all the entries that have expired, returning their keys. If interval is given, nothing is deleted
+        unless that many seconds passed since the last time any process did it, which means that all the processes
+        can call this method periodically and only one of them will scan the table each time.
+        """
+        out = []
+
+        self._lock()
+        try:
+
+            if interval:
+                if now - self._get(_off_last_sweep) < interval:
+                    return out
+                self._put(_off_last_sweep, int(now))
+
+            for idx in range(self.slot_count):
+                state, _, _, key_len, _, _, offset, _, expires_at, _ = self._read_slot(idx)
+                if state == _slot_used and expires_at and now >= expires_at:
+                    out.append(self._read_data(offset, key_len))
+                    self._delete_slot(idx)
+        finally:
+            self._unlock()
+
+        return out
+
+# ################################################################################################################################
+
+    def clear(self) -> 'None':
+        self._lock()
+        try:
+            self._init()
+        finally:
+            self._unlock()
+
+# ################################################################################################################################
+
+    def __len__(self) -> 'int':
+        return self._get(_off_count)
+
+# ################################################################################################################################
+
+    def get_stats(self) -> 'stranydict':
+        return {
+            'current_size': self._get(_off_count),
+            'current_bytes': self._get(_off_data_used) - self._get(_off_garbage),
+            'shared_hits': self._get(_off_hits),
+            'shared_misses': self._get(_off_misses),
+            'shared_evictions': self._get(_off_evictions),
+        }
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SharedEntry:
+    """ An entry read from shared memory, offering the same details that entries of built-in caches do.
+    Reads are not tracked in shared memory which is why there are no hits nor times of reads.
+    """
+    __slots__ = ('key', 'value', 'expiry', 'expires_at', 'last_write', 'position')
+
+    def __init__(self, key:'any_', value:'any_', expiry:'float', expires_at:'float', last_write:'float',
+        position:'int'=0) -> 'None':
+        self.key = key
+        self.value = value
+        self.expiry = expiry
+        self.expires_at = expires_at
+        self.last_write = last_write
+        self.position = position
+
+    def to_dict(self) -> 'stranydict':
+        return {
+            'key': self.key,
+            'value': self.value,
+            'expiry': self.expiry,
+            'expires_at': self.expires_at,
+            'hits': 0,
+            'position': self.position,
+            'last_read': None,
+            'prev_read': None,
+            'last_write': self.last_write,
+            'prev_write': None,
+        }
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SharedCache:
+    """ A cache whose entries are kept in POSIX shared memory, in a single copy that all the worker processes of a server
+    read and write to directly, which means that there is nothing to synchronize between them. It offers the same
+    key-based API as built-in caches do - .get, .set, .delete and .expire, with TTLs - but not bulk operations.
+    """
+    needs_sync = False
+
+    def __init__(self, config:'any_', server_key:'str', deployment_key:'str') -> 'None':
+        self.config = config
+        self.server_key = server_key
+        self.deployment_key = deployment_key
+        self.table = None # type: SharedTable
+        self.shmem_name = ''
+        self._mem = None
+        self.keep_running = True
+        self._open(config)
+        spawn(self._delete_expired)
+
+# ################################################################################################################################
+
+    def _open(self, config:'any_') -> 'None':
+        """ Maps the shared memory that the configuration points to, creating it if it does not exist yet.
+        """
+        max_size = config.max_size or CACHE.DEFAULT.MAX_SIZE
+        data_size = int(config.get('max_bytes') or CACHE.DEFAULT.SHARED_DATA_SIZE)
+
+        self.max_item_size = config.max_item_size or CACHE.DEFAULT.MAX_ITEM_SIZE
+        self.extend_expiry_on_get = config.extend_expiry_on_get
+        self.extend_expiry_on_set = config.extend_expiry_on_set
+
+        # The layout is a part of the name so that all the processes map memory of the same size
+        # and a change to the configuration results in a new table.
+        shmem_suffix = '{}.{}.{}.{}'.format(self.server_key, config.name, max_size, data_size)
+        shmem_suffix = sha256(shmem_suffix.encode('utf8')).hexdigest()[:32]
+
+        self.shmem_name = _shmem_pattern.format(shmem_suffix)
+        self._mem = ipc.SharedMemory(self.shmem_name, ipc.O_CREAT, size=SharedTable.get_total_size(max_size, data_size))
+
+        generation = sha256(self.deployment_key.encode('utf8')).digest()[:16]
+
+        self.table = SharedTable(self._mem.fd, max_size, data_size, generation)
+        self.table.open()
+
+# ################################################################################################################################
+
+    def _close(self) -> 'None':
+        self.table.close()
+        self._mem.close_fd()
+
+# ################################################################################################################################
+
+    def close(self, needs_unlink:'bool'=False) -> 'None':
+        """ Unmaps the shared memory, optionally removing it too, in which case processes that still map it
+        can keep using it but no new process will be able to open it.
+        """
+        self.keep_running = False
+        self._close()
+
+        if needs_unlink:
+            self._unlink(self.shmem_name)
+
+# ################################################################################################################################
+
+    def _unlink(self, shmem_name:'str') -> 'None':
+        try:
+            ipc.unlink_shared_memory(shmem_name)
+        except ipc.ExistentialError:
+            pass
+
+# ################################################################################################################################
+
+    def __getitem__(self, key:'any_') -> 'any_':
+        if isinstance(key, slice):
+            return self.get_slice(key.start, key.stop, key.step)
+        else:
+            return self.get(key)
+
+    def __setitem__(self, key:'any_', value:'any_') -> 'any_':
+        return self.set(key, value)
+
+    def __delitem__(self, key:'any_') -> 'any_':
+        return self.delete(key)
+
+    def __contains__(self, key:'any_') -> 'bool':
+        return self.get(key, _no_value) is not _no_value
+
+    def __len__(self) -> 'int':
+        return len(self.table)
+
+# ################################################################################################################################
+
+    def get(self, key:'any_', default:'any_'=ZATO_NOT_GIVEN, details:'bool'=False) -> 'any_':
+        """ Returns a value stored under a given key. If details is True, return metadata about the key as well.
+        """
+        key = encode_key(key)
+        result = self.table.get(key, hash_key(key), time(), self.extend_expiry_on_get)
+
+        if result is None:
+            return None if default is ZATO_NOT_GIVEN else default
+
+        value_type, value, expiry, expires_at, last_write = result
+        value = decode_value(value_type, value)
+
+        if details:
+            return SharedEntry(decode_key(key), value, expiry, expires_at, last_write)
+        else:
+            return value
+
+# ################################################################################################################################
+
+    def has_key(self, key:'any_', default:'any_'=ZATO_NOT_GIVEN, details:'bool'=False) -> 'bool':
+        """ Returns True or False, depending on whether such a key exists in the cache or not.
+        """
+        value = self.get(key, default=default, details=details)
+        return value != ZATO_NOT_GIVEN
+
+# ################################################################################################################################
+
+    def set(self, key:'any_', value:'any_', expiry:'float'=0.0, details:'bool'=False) -> 'any_':
+        """ Sets key to a given value. Key must be string/unicode, bytes or an integer. Expiry is in seconds (or a fraction of).
+        Returns the previous value, if any.
+        """
+        if isinstance(value, (str, bytes)) and self.max_item_size > 0:
+            if len(value) > self.max_item_size:
+                raise ValueError('Value too long {} > {}'.format(len(value), self.max_item_size))
+
+        key = encode_key(key)
+        value_type, encoded = encode_value(value)
+
+        prev = self.table.set(key, hash_key(key), value_type, encoded, expiry, time(), self.extend_expiry_on_set)
+
+        if prev is not None:
+            return decode_value(*prev)
+
+# ################################################################################################################################
+
+    def delete(self, key:'any_', raise_key_error:'bool'=True) -> 'any_':
+        """ Deletes a cache entry by its key.
+        """
+        encoded = encode_key(key)
+        prev = self.table.delete(encoded, hash_key(encoded))
+
+        if prev is None:
+            if raise_key_error:
+                raise KeyError(key)
+        else:
+            return decode_value(*prev)
+
+# ################################################################################################################################
+
+    def expire(self, key:'any_', expiry:'float'=0.0) -> 'bool':
+        """ Sets expiry in seconds (or a fraction of) for a given key.
+        """
+        key = encode_key(key)
+        return self.table.expire(key, hash_key(key), expiry, time())
+
+# ################################################################################################################################
+
+    def _get_entries(self) -> 'anylist':
+        """ Returns all the entries that have not expired yet, sorted by their keys.
+        """
+        out = []
+
+        for position, (key, value_type, value, expiry, expires_at, last_write) in enumerate(sorted(self.table.entries(time()))):
+            out.append(SharedEntry(
+                decode_key(key), decode_value(value_type, value), expiry, expires_at, last_write, position))
+
+        return out
+
+# ################################################################################################################################
+
+    def items(self) -> 'anylist':
+        """ Returns (key, entry) tuples of all the entries in the cache, just like built-in caches do.
+        """
+        return [(entry.key, entry) for entry in self._get_entries()]
+
+    def keys(self) -> 'anylist':
+        return [decode_key(key) for key, _, _ in self.table.items(time())]
+
+    def values(self) -> 'anylist':
+        return self._get_entries()
+
+    iteritems = items
+    iterkeys = keys
+    itervalues = values
+
+# ################################################################################################################################
+
+    def get_slice(self, start:'any_', stop:'any_', step:'any_') -> 'anylist':
+        """ Returns details of entries from a given slice, as dicts, e.g. for the entry browser in web-admin.
+        """
+        return [entry.to_dict() for entry in self._get_entries()[start:stop:step]]
+
+# ################################################################################################################################
+
+    def clear(self) -> 'None':
+        """ Clears the cache - removes all entries, in all the processes.
+        """
+        self.table.clear()
+
+# ################################################################################################################################
+
+    def update_config(self, config:'any_') -> 'None':
+        """ Maps the memory that new configuration points to, which keeps all the entries unless the size of the cache changed.
+        """
+        prev_shmem_name = self.shmem_name
+
+        self._close()
+        self.config = config
+        self._open(config)
+
+        if self.shmem_name != prev_shmem_name:
+            self._unlink(prev_shmem_name)
+
+# ################################################################################################################################
+
+    def get_stats(self) -> 'stranydict':
+        """ Returns run-time statistics of the table in shared memory.
+        """
+        return self.table.get_stats()
+
+# ################################################################################################################################
+
+    def _delete_expired(self, interval:'int'=5) -> 'None':
+        """ Invokes in its own greenlet in background to delete expired cache entries. Any of the processes may delete them
+        but only one of them will, in each interval.
+        """
+        try:
+            while self.keep_running:
+                try:
+                    sleep(interval)
+                    if self.keep_running:
+                        deleted = self.table.delete_expired(time(), interval)
+                except Exception:
+                    logger.warning('Exception while deleting expired keys %s', format_exc())
+                    sleep(2)
+                else:
+                    if deleted:
+                        logger.info('Shared cache `%s` deleted keys expired in the last %ss - %s',
+                            self.config.name, interval, [decode_key(key) for key in deleted])
+        except Exception:
+            logger.warning('Exception in _delete_expired loop %s', format_exc())
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -12,7 +12,7 @@ from logging import getLogger
 from traceback import format_exc
 
 # Zato
-from zato.common.events.common import Action
+from zato.common.events.common import Action, decode_push_batch, decode_push_batch_len, LenBatchLen
 from zato.common.util.json_ import JSONParser
 from zato.common.util.tcp import ZatoStreamServer
 from zato.server.connection.connector.subprocess_.base import BaseConnectionContainer
@@ -66,6 +66,7 @@ class EventsConnectionContainer(BaseConnectionContainer):
         self._action_map = {
             Action.Ping: self._on_event_ping,
             Action.Push: self._on_event_push,
+            Action.PushBatch: self._on_event_push_batch,
             Action.GetTable: self._on_event_get_table,
         }
 
@@ -106,11 +107,25 @@ class EventsConnectionContainer(BaseConnectionContainer):
 
         # We received JSON bytes so we now need to load a Python object out of it ..
         data = self._json_parser.parse(data)
-        data = data.as_dict() # type: dict
+
+        # .. which will be a dict already unless the parser is simdjson's ..
+        if not isinstance(data, dict):
+            data = data.as_dict() # type: dict
 
         # .. now, we can push it to the database.
         self.events_db.access_state(_opcode, data)
 
+# ################################################################################################################################
+
+    def _on_event_push_batch(self, data, ignored_address_str, _opcode=OpCode.Push):
+        # type: (bytes, str, str) -> None
+
+        # We received a batch of events stored by column so we turn it into a list of events first ..
+        data = decode_push_batch(data)
+
+        # .. now, we can push all of them to the database at once.
+        self.events_db.access_state_many(_opcode, data)
+
 # ################################################################################################################################
 
     def _on_event_get_table(self, ignored_address_str, _opcode=OpCode.Tabulate):
@@ -137,16 +152,21 @@ class EventsConnectionContainer(BaseConnectionContainer):
             # Keep running until explicitly requested not to
             while self.keep_running:
 
-                # We work on a line-by-line basis
-                line = socket_file.readline()
+                # Each message begins with its action ..
+                action = socket_file.read(Action.LenAction)
 
                 # No input = client is no longer connected
-                if not line:
+                if not action:
                     logger.info('Stream client disconnected (%s)', address_str)
                     break
 
-                # Extract the action sent ..
-                action = line[:2]
+                # .. batches of events are prefixed with their length, because they are binary data ..
+                if action == Action.PushBatch:
+                    data = socket_file.read(decode_push_batch_len(socket_file.read(LenBatchLen)))
+
+                # .. whereas everything else is sent on a line-by-line basis ..
+                else:
+                    data = socket_file.readline()
 
                 # .. find the handler function ..
                 func = self._action_map.get(action)
@@ -157,11 +177,10 @@ class EventsConnectionContainer(BaseConnectionContainer):
                     break
 
                 # .. otherwise, handle the action ..
-                data = line[2:]
-
                 try:
                     response = func(data, address_str) # type: str
                 except Exception as e:
+                    response = None
                     logger.warning('Exception when calling func `%s` -> %s -> %s -> %s', func, address_str, data, e.args)
 
                 # .. not all actions will result in a response ..
@@ -9,8 +9,14 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 # stdlib
 import os
 from datetime import datetime, timedelta
+from shutil import rmtree
+from traceback import format_exc
 from typing import Optional as optional
 
+# gevent
+from gevent import spawn
+from gevent.lock import RLock
+
 # Humanize
 from humanize import intcomma as int_to_comma
 
@@ -18,6 +24,8 @@ from humanize import intcomma as int_to_comma
 from zato.common.api import Stats
 from zato.common.ext.dataclasses import dataclass
 from zato.common.in_ram import InRAMStore
+from zato.common.json_internal import dumps, loads
+from zato.server.connection.connector.subprocess_.impl.events.rollup import Granularity, RollupStore
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -48,6 +56,8 @@ class OpCode:
         ReadParqet  = 'InternalReadParqet'
         CreateNewDF = 'InternalCreateNewDF'
         CombineData = 'InternalCombineData'
+        DropPartition    = 'InternalDropPartition'
+        CompactPartition = 'InternalCompactPartition'
 
 _op_int_save_data     = OpCode.Internal.SaveData
 _op_int_sync_state    = OpCode.Internal.SyncState
@@ -55,6 +65,390 @@ _op_int_get_from_ram  = OpCode.Internal.GetFromRAM
 _op_int_read_parqet   = OpCode.Internal.ReadParqet
 _op_int_create_new_df = OpCode.Internal.CreateNewDF
 _op_int_combine_data  = OpCode.Internal.CombineData
+_op_int_drop_partition    = OpCode.Internal.DropPartition
+_op_int_compact_partition = OpCode.Internal.CompactPartition
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class PartitionBy:
+    """ Data is stored in partitions, each one holding data from a single month, day or hour.
+    """
+    Month = 'month'
+    Day   = 'day'
+    Hour  = 'hour'
+
+# ################################################################################################################################
+
+def _get_month_end(start):
+    # type: (datetime) -> datetime
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+# How a partition is named after timestamps of its data - length of the ISO timestamp prefix, its format
+# and a function returning the end of a partition given its start.
+_partition_config = {
+    PartitionBy.Month: (7,  '%Y-%m',       _get_month_end),
+    PartitionBy.Day:   (10, '%Y-%m-%d',    lambda start: start + timedelta(days=1)),
+    PartitionBy.Hour:  (13, '%Y-%m-%dT%H', lambda start: start + timedelta(hours=1)),
+}
+
+# Each partition is a directory of files with this extension
+_file_ext = '.parquet'
+
+# Files are written under a temporary name first
+_tmp_prefix = '.tmp-'
+
+# A compaction that is in progress is described by a manifest with this prefix, which lets us find out at startup
+# what to do with a partition if the previous compaction of it did not complete.
+_manifest_prefix = '.compact-'
+
+# How rollups of each granularity are partitioned
+_rollup_partition_by = {
+    Granularity.Minute: PartitionBy.Day,
+    Granularity.Hour:   PartitionBy.Month,
+    Granularity.Day:    PartitionBy.Month,
+}
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class PartitionedStorage:
+    """ Keeps DataFrames in a directory of partitions, each holding data from a single period of time as a set
+    of immutable files. New data is only ever appended as new files, expired partitions are deleted as a whole
+    and files of each partition can be compacted into one.
+    """
+    def __init__(self, logger, path, key, partition_by=PartitionBy.Day, max_partition_files=32):
+        # type: (Logger, str, str, str, int) -> None
+
+        # Our self.logger object
+        self.logger = logger
+
+        # Top-level directory of all the partitions
+        self.path = path
+
+        # Name of the column with ISO timestamps, or their prefixes, that data is partitioned by
+        self.key = key
+
+        # How partitions are named
+        self.partition_by = partition_by
+        self.partition_name_len = _partition_config[partition_by][0]
+
+        # A partition that is still being written to is compacted once it has that many files,
+        # whereas older partitions are compacted as soon as they have more than one.
+        self.max_partition_files = max_partition_files
+
+        # Held while files are read from or deleted
+        self.lock = RLock()
+
+        # Makes names of new files unique
+        self.file_idx = 0
+
+        # Complete or roll back compactions that may have been interrupted before we started
+        self.recover()
+
+# ################################################################################################################################
+
+    def get_tmp_path(self, path):
+        """ Returns a temporary path that a file is written to before it is moved to its final path.
+        """
+        # type: (str) -> str
+        dir_name, file_name = os.path.split(path)
+        return os.path.join(dir_name, _tmp_prefix + file_name)
+
+# ################################################################################################################################
+
+    def get_manifest_path(self, path):
+        """ Returns a path to the manifest of a compaction that results in a file of a given path.
+        """
+        # type: (str) -> str
+        dir_name, file_name = os.path.split(path)
+        return os.path.join(dir_name, _manifest_prefix + file_name + '.json')
+
+# ################################################################################################################################
+
+    def recover(self):
+        """ Brings each partition to a consistent state if a previous compaction of it was interrupted. If the compacted file
+        is in place, the files it replaced are deleted, otherwise it is the compacted file that is deleted.
+        Files that were not fully written are deleted too.
+        """
+        # type: () -> None
+        for name in self.get_partition_list():
+
+            partition_path = os.path.join(self.path, name)
+
+            for elem in sorted(os.listdir(partition_path)):
+
+                if not elem.startswith(_manifest_prefix):
+                    continue
+
+                manifest_path = os.path.join(partition_path, elem)
+
+                with open(manifest_path, 'rb') as f:
+                    manifest = loads(f.read())
+
+                compacted_path = os.path.join(partition_path, manifest['compacted'])
+
+                # The compacted file was moved in place, which means that it has all the data ..
+                if os.path.exists(compacted_path):
+                    self.logger.info('Completing compaction of partition %s of %s', name, self.path)
+                    for file_name in manifest['source']:
+                        source_path = os.path.join(partition_path, file_name)
+                        if os.path.exists(source_path):
+                            os.remove(source_path)
+
+                # .. otherwise, the files it was to replace still have it.
+                else:
+                    self.logger.info('Rolling back compaction of partition %s of %s', name, self.path)
+
+                os.remove(manifest_path)
+
+            # Now, there is nothing that temporary files can still be needed for
+            for elem in os.listdir(partition_path):
+                if elem.startswith(_tmp_prefix):
+                    os.remove(os.path.join(partition_path, elem))
+
+# ################################################################################################################################
+
+    def parse_partition_name(self, name):
+        """ Returns a tuple of the start and end time of a partition or None if name is not one of a partition.
+        """
+        # type: (str) -> optional[tuple]
+        for _, time_format, get_end in _partition_config.values():
+            try:
+                start = datetime.strptime(name, time_format)
+            except ValueError:
+                continue
+            else:
+                return start, get_end(start)
+
+# ################################################################################################################################
+
+    def get_partition_file_list(self, name):
+        """ Returns full paths to all the files of a partition, in the order that they were written in.
+        """
+        # type: (str) -> list
+        partition_path = os.path.join(self.path, name)
+
+        if not os.path.isdir(partition_path):
+            return []
+
+        file_names = []
+
+        for elem in os.listdir(partition_path):
+            if elem.endswith(_file_ext) and not elem.startswith(_tmp_prefix):
+                file_names.append(elem)
+
+        file_names.sort()
+
+        return [os.path.join(partition_path, elem) for elem in file_names]
+
+# ################################################################################################################################
+
+    def get_partition_list(self, start=None, end=None):
+        """ Returns names of all the partitions that may hold data from between start and end, which are both optional.
+        """
+        # type: (optional[datetime], optional[datetime]) -> list
+        if not os.path.isdir(self.path):
+            return []
+
+        out = []
+
+        for name in sorted(os.listdir(self.path)):
+
+            # Ignore anything that is not a partition ..
+            partition_range = self.parse_partition_name(name)
+            if not partition_range:
+                continue
+
+            # .. as well as partitions outside the range of time requested ..
+            partition_start, partition_end = partition_range
+
+            if start and partition_end <= start:
+                continue
+
+            if end and partition_start >= end:
+                continue
+
+            # .. and return everything else.
+            out.append(name)
+
+        return out
+
+# ################################################################################################################################
+
+    def new_file_path(self, partition_name):
+        """ Returns a path to a new file in a partition. File names sort in the order that they were created in.
+        """
+        # type: (str) -> str
+        self.file_idx += 1
+        file_name = '{}-{:08d}{}'.format(utcnow().strftime('%Y%m%dT%H%M%S%f'), self.file_idx, _file_ext)
+
+        return os.path.join(self.path, partition_name, file_name)
+
+# ################################################################################################################################
+
+    def write_file(self, data, path):
+        """ Saves a DataFrame to a file, first under a temporary name, so that readers never see incomplete files.
+        """
+        # type: (DataFrame, str) -> None
+        tmp_path = self.get_tmp_path(path)
+
+        data.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+# ################################################################################################################################
+
+    def read_files(self, path_list):
+        """ Reads all the input files into a single DataFrame.
+        """
+        # type: (list) -> DataFrame
+
+        # Pandas
+        import pandas as pd
+
+        # Each file is read on its own because their schemas may differ, e.g. if an optional column
+        # had only None values in one file but not in another, which concat can reconcile.
+        data_list = [pd.read_parquet(path) for path in path_list]
+
+        if len(data_list) == 1:
+            return data_list[0]
+        else:
+            return pd.concat(data_list, ignore_index=True)
+
+# ################################################################################################################################
+
+    def load(self, start=None, end=None):
+        """ Reads data from all the partitions that may hold data from between start and end, or from all of them
+        if these are not given. Returns None if there is no such data.
+        """
+        # type: (optional[datetime], optional[datetime]) -> optional[DataFrame]
+        with self.lock:
+
+            path_list = []
+            for name in self.get_partition_list(start, end):
+                path_list.extend(self.get_partition_file_list(name))
+
+            if path_list:
+                return self.read_files(path_list)
+
+# ################################################################################################################################
+
+    def save(self, data):
+        """ Appends data to storage, each partition that it belongs to gets a new file. Returns the number of files written.
+        """
+        # type: (DataFrame) -> int
+        len_files = 0
+        partition_names = data[self.key].astype(str).str.slice(0, self.partition_name_len)
+
+        for name, partition_data in data.groupby(partition_names):
+
+            # Create the partition if this is the first time it is written to ..
+            os.makedirs(os.path.join(self.path, name), exist_ok=True)
+
+            # .. and add a new file with the data to it.
+            self.write_file(partition_data, self.new_file_path(name))
+            len_files += 1
+
+        return len_files
+
+# ################################################################################################################################
+
+    def drop_expired(self, max_retained):
+        """ Deletes partitions whose all data is older than max_retained. Returns the number of partitions deleted.
+        """
+        # type: (datetime) -> int
+        len_dropped = 0
+
+        with self.lock:
+            for name in self.get_partition_list(end=max_retained):
+
+                # This partition may be still needed if some of its data is younger than max_retained
+                _, partition_end = self.parse_partition_name(name)
+                if partition_end > max_retained:
+                    continue
+
+                self.logger.info('Dropping expired partition %s from %s', name, self.path)
+                rmtree(os.path.join(self.path, name))
+
+                len_dropped += 1
+
+        return len_dropped
+
+# ################################################################################################################################
+
+    def compact_partition(self, name, merge_func=None):
+        """ Replaces all files of a partition with a single one. An optional merge_func can reduce data of all the files,
+        e.g. to merge rows that have the same key, before it is saved.
+        """
+        # type: (str, object) -> None
+
+        # Files that will be replaced - new ones may be added while we run, which is fine
+        # because they will not be in this list and will be compacted next time.
+        path_list = self.get_partition_file_list(name)
+
+        # Let the user know what we are doing ..
+        self.logger.info('Compacting partition %s of %s; len_files=%s', name, self.path, len(path_list))
+
+        # .. read all the data from the partition ..
+        start = utcnow()
+        data = self.read_files(path_list)
+
+        if merge_func:
+            data = merge_func(data)
+
+        # .. save it to a single file, under a temporary name, which readers ignore ..
+        compacted_path = self.new_file_path(name)
+        tmp_path = self.get_tmp_path(compacted_path)
+
+        data.to_parquet(tmp_path, index=False)
+
+        # .. describe what is going to be replaced so that it can be completed or rolled back at startup ..
+        manifest_path = self.get_manifest_path(compacted_path)
+        manifest = dumps({
+            'compacted': os.path.basename(compacted_path),
+            'source': [os.path.basename(path) for path in path_list],
+        })
+
+        with open(self.get_tmp_path(manifest_path), 'w') as f:
+            _ = f.write(manifest)
+        os.replace(self.get_tmp_path(manifest_path), manifest_path)
+
+        # .. replace the files that were compacted with the new one, making sure that no one is reading them at the same time,
+        #    which means that readers see either the old files or the new one but never both of them ..
+        with self.lock:
+            os.replace(tmp_path, compacted_path)
+
+            for path in path_list:
+                os.remove(path)
+
+            # .. the compaction is complete now so its manifest is no longer needed ..
+            os.remove(manifest_path)
+
+        # .. and log the time it took to compact the partition.
+        self.logger.info('Partition %s of %s compacted in %s', name, self.path, utcnow() - start)
+
+# ################################################################################################################################
+
+    def compact(self, merge_func=None, _utcnow=utcnow):
+        """ Compacts all the partitions that have more files than they should. Returns the number of partitions compacted.
+        """
+        # type: (object) -> int
+        now = _utcnow()
+        len_compacted = 0
+
+        for name in self.get_partition_list():
+
+            _, partition_end = self.parse_partition_name(name)
+            len_files = len(self.get_partition_file_list(name))
+
+            # No more data will be written to partitions that already ended
+            max_files = 1 if partition_end <= now else self.max_partition_files - 1
+
+            if len_files > max_files:
+                self.compact_partition(name, merge_func)
+                len_compacted += 1
+
+        return len_compacted
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -174,8 +568,16 @@ class Event:
 # ################################################################################################################################
 
 class EventsDatabase(InRAMStore):
-
-    def __init__(self, logger, fs_data_path, sync_threshold, sync_interval, max_retention=Stats.MaxRetention):
+    """ Keeps events in RAM and saves them periodically to persistent storage, in partitions, each holding events
+    from a single day or hour. Each sync only appends new files, retention deletes whole partitions
+    and files of each partition are compacted into one in background.
+
+    As events are pushed, they also update rollups, i.e. per-minute, hourly and daily summaries of each object,
+    which are what statistics are tabulated from. Rollups are kept in their own partitions, alongside raw events,
+    and they can be retained for longer than raw events.
+    """
+    def __init__(self, logger, fs_data_path, sync_threshold, sync_interval, max_retention=Stats.MaxRetention,
+        partition_by=PartitionBy.Day, max_partition_files=32, rollup_max_retention=None):
         super().__init__(sync_threshold, sync_interval)
 
         # Numpy
@@ -202,6 +604,21 @@ class EventsDatabase(InRAMStore):
         # Fow how long to keep statistics in persistent storage
         self.max_retention = max_retention # type: int
 
+        # Raw events are kept in partitions directly under our top-level directory ..
+        self.storage = PartitionedStorage(logger, self.fs_data_path, 'timestamp', partition_by, max_partition_files)
+
+        # .. and rollups are in a directory of their own, with a subdirectory for each granularity.
+        rollup_storage = {}
+
+        for granularity, rollup_partition_by in _rollup_partition_by.items():
+            rollup_storage[granularity] = PartitionedStorage(
+                logger, os.path.join(self.fs_data_path, 'rollup', granularity), 'bucket', rollup_partition_by, max_partition_files)
+
+        self.rollups = RollupStore(logger, rollup_storage, rollup_max_retention)
+
+        # Makes sure that only one compaction runs at a time
+        self.is_compacting = False
+
         # Configure our opcodes
         self.opcode_to_func[OpCode.Push] = self.push
         self.opcode_to_func[OpCode.Tabulate] = self.get_table
@@ -225,10 +642,24 @@ class EventsDatabase(InRAMStore):
         self.telemetry[_op_int_read_parqet]   = 0
         self.telemetry[_op_int_create_new_df] = 0
         self.telemetry[_op_int_combine_data]  = 0
+        self.telemetry[_op_int_drop_partition]    = 0
+        self.telemetry[_op_int_compact_partition] = 0
 
         # Configure Panda objects
         self.set_up_group_by()
 
+        # Earlier versions kept all of the events in a single file which we now need to split into partitions ..
+        if os.path.isfile(self.fs_data_path):
+            self.migrate_single_file()
+
+        # .. and they did not have rollups either, which is why they may need to be built from raw events.
+        # This reads all of the events retained so it is done in background, unless a sync or tabulation
+        # needs the rollups before that, in which case they are built by whichever runs first.
+        self.needs_rollups = not self.rollups.has_data()
+
+        if self.needs_rollups:
+            _ = spawn(self.build_rollups)
+
 # ################################################################################################################################
 
     def set_up_group_by(self):
@@ -270,27 +701,100 @@ class EventsDatabase(InRAMStore):
         # type: (dict) -> None
         self.in_ram_store.append(data)
 
+        # Events without a duration have nothing to add to rollups
+        total_time_ms = data.get('total_time_ms')
+
+        if total_time_ms is not None:
+            self.rollups.push(data.get('object_id'), data['timestamp'], total_time_ms)
+
+# ################################################################################################################################
+
+    def migrate_single_file(self):
+        """ Splits a single file with all the events, as it was kept by earlier versions, into partitions.
+        """
+        # Pandas
+        import pandas as pd
+
+        # Let the users know what we are doing ..
+        self.logger.info('Migrating DF data from %s to partitions', self.fs_data_path)
+
+        # .. read everything from the file ..
+        existing = pd.read_parquet(self.fs_data_path) # type: pd.DataFrame
+
+        # .. move it out of the way so that the partitions can be created in its place ..
+        legacy_path = self.fs_data_path + '.legacy'
+        os.rename(self.fs_data_path, legacy_path)
+
+        # .. save all the events again, this time in partitions ..
+        self.save_data(existing)
+
+        # .. and delete the file now that we no longer need it.
+        os.remove(legacy_path)
+
+# ################################################################################################################################
+
+    def build_rollups(self):
+        """ Builds rollups out of all the raw events in storage.
+        """
+        # type: () -> None
+
+        # Events are not synced while we run so none of them can be added to rollups twice
+        with self.update_lock:
+            if self.needs_rollups:
+                self._build_rollups()
+                self.needs_rollups = False
+
+# ################################################################################################################################
+
+    def _build_rollups(self):
+        # type: () -> None
+
+        # There may be no events at all ..
+        if not self.storage.get_partition_list():
+            return
+
+        # .. but if there are, read all of them ..
+        existing = self.load_data_from_storage()
+
+        if not len(existing):
+            return
+
+        # .. let the users know what we are doing ..
+        self.logger.info('Building rollups out of len_existing=%s', int_to_comma(len(existing)))
+
+        # .. build the rollups ..
+        start = utcnow()
+        self.rollups.push_data(existing[existing['total_time_ms'].notna()])
+
+        # .. save them ..
+        _ = self.rollups.save()
+
+        # .. and log the time it took to build them.
+        self.logger.info('Rollups built in %s', utcnow() - start)
+
 # ################################################################################################################################
 
-    def load_data_from_storage(self):
-        """ Reads existing data from persistent storage and returns it as a DataFrame.
+    def load_data_from_storage(self, start=None, end=None):
+        """ Reads existing data from persistent storage and returns it as a DataFrame. Only partitions that may hold events
+        from between start and end are read, or all of them if these are not given.
         """
+        # type: (optional[datetime], optional[datetime]) -> DataFrame
 
         # Pandas
         import pandas as pd
 
-        # Let's check if we already have anything in storage ..
-        if os.path.exists(self.fs_data_path):
+        #  Let the users know what we are doing ..
+        self.logger.info('Loading DF data from %s', self.fs_data_path)
 
-            #  Let the users know what we are doing ..
-            self.logger.info('Loading DF data from %s', self.fs_data_path)
+        # .. load existing data from storage ..
+        now = utcnow()
+        existing = self.storage.load(start, end)
 
-            # .. load existing data from storage ..
-            start = utcnow()
-            existing = pd.read_parquet(self.fs_data_path) # type: pd.DataFrame
+        # .. we have some data ..
+        if existing is not None:
 
             # .. log the time it took to load the data ..
-            self.logger.info('DF data read in %s; len_existing=%s', utcnow() - start, int_to_comma(len(existing)))
+            self.logger.info('DF data read in %s; len_existing=%s', utcnow() - now, int_to_comma(len(existing)))
 
             # .. update counters ..
             self.telemetry[_op_int_read_parqet] += 1
@@ -303,6 +807,10 @@ class EventsDatabase(InRAMStore):
             # .. update counters ..
             self.telemetry[_op_int_create_new_df] += 1
 
+        # .. the oldest partition may still hold events past their retention time and partitions
+        #    may have events from outside of the range requested, so these need to be left out ..
+        existing = self.trim(existing, start, end)
+
         # .. return the result, no matter where it came from.
         return existing
 
@@ -382,16 +890,23 @@ class EventsDatabase(InRAMStore):
 
 # ################################################################################################################################
 
-    def trim(self, data, utcnow=utcnow, timedelta=timedelta):
+    def trim(self, data, start=None, end=None, utcnow=utcnow, timedelta=timedelta):
 
         if len(data):
 
             # Check how many of the past events to leave, i.e. events older than this will be discarded
             max_retained = utcnow() - timedelta(milliseconds=self.max_retention)
-            max_retained = max_retained.isoformat()
+
+            # .. we may have been also asked for events from a specific range of time ..
+            if start and start > max_retained:
+                max_retained = start
 
             # .. construct a new dataframe, containing only the events that are younger than max_retained ..
-            data = data[data['timestamp'] > max_retained]
+            data = data[data['timestamp'] > max_retained.isoformat()]
+
+            # .. and, optionally, older than the end of the range requested ..
+            if end:
+                data = data[data['timestamp'] < end.isoformat()]
 
         # .. and return it to our caller.
         return data
@@ -399,6 +914,8 @@ class EventsDatabase(InRAMStore):
 # ################################################################################################################################
 
     def save_data(self, data):
+        """ Saves events to persistent storage, each partition they belong to gets a new file with these events.
+        """
         # type: (DataFrame) -> None
 
         # Let the user know what we are doing ..
@@ -406,13 +923,43 @@ class EventsDatabase(InRAMStore):
 
         # .. save the DF to persistent storage ..
         start = utcnow()
-        data.to_parquet(self.fs_data_path)
+        len_files = self.storage.save(data)
 
         # .. log the time it took to save to storage ..
         self.logger.info('DF saved in %s', utcnow() - start)
 
-        # .. update counters ..
-        self.telemetry[_op_int_save_data] += 1
+        # .. update counters.
+        self.telemetry[_op_int_save_data] += len_files
+
+# ################################################################################################################################
+
+    def drop_expired_partitions(self, _utcnow=utcnow):
+        """ Deletes partitions of events and rollups past their retention time.
+        """
+        # type: () -> None
+
+        # Events older than that are not retained ..
+        max_retained = _utcnow() - timedelta(milliseconds=self.max_retention)
+
+        # .. so we can delete their partitions, along with partitions of rollups that expired.
+        self.telemetry[_op_int_drop_partition] += self.storage.drop_expired(max_retained)
+        _ = self.rollups.drop_expired(_utcnow)
+
+# ################################################################################################################################
+
+    def compact_partitions(self):
+        """ Compacts all the partitions of events and rollups that have more files than they should.
+        """
+        # type: () -> None
+        try:
+            self.telemetry[_op_int_compact_partition] += self.storage.compact()
+            _ = self.rollups.compact()
+
+        except Exception:
+            self.logger.warning('Exception while compacting DF partitions -> `%s`', format_exc())
+
+        finally:
+            self.is_compacting = False
 
 # ################################################################################################################################
 
@@ -426,24 +973,28 @@ class EventsDatabase(InRAMStore):
         self.logger.info('*********************** DataFrame (DF) Sync storage ***************************** ')
         self.logger.info('********************************************************************************* ')
 
-        # Get the existing data from storage
-        existing = self.load_data_from_storage()
-
-        # Get data that is currently in RAM
-        current = self.get_data_from_ram()
+        # Rollups must be built out of events in storage before any new ones are saved there
+        self.build_rollups()
 
-        # Combine data from storage and RAM
-        combined = self.combine_data(existing, current)
+        # Save data that is currently in RAM, only new events are written to storage
+        if self.in_ram_store:
+            current = self.get_data_from_ram()
+            self.save_data(current)
 
-        # Trim the data to the retention threshold
-        trimmed = self.trim(combined)
+        # Save rollups updated since the previous sync
+        _ = self.rollups.save()
 
-        # Save the combined result to storage
-        self.save_data(trimmed)
+        # Delete partitions past the retention threshold
+        self.drop_expired_partitions()
 
         # Clear our current dataset
         self.in_ram_store[:] = []
 
+        # Compact partitions in background
+        if not self.is_compacting:
+            self.is_compacting = True
+            _ = spawn(self.compact_partitions)
+
         # Log the total processing time
         self.logger.info('DF total processing time %s', utcnow() - now_total)
 
@@ -458,29 +1009,49 @@ class EventsDatabase(InRAMStore):
 
 # ################################################################################################################################
 
-    def get_table(self):
+    def get_table(self, start=None, end=None):
+        """ Tabulates statistics of events from between start and end, or of all the events retained if these are not given.
+        Statistics are merged from rollups of the finest granularity that is still kept for start, which means that events
+        of the first and last minute, hour or day in the range may be included as a whole.
+        """
+        # type: (optional[datetime], optional[datetime]) -> DataFrame
 
-        # Prepare configuration ..
-        group_by = self.group_by[Stats.TabulateAggr]
+        # Pandas
+        import pandas as pd
 
+        # Rollups that have not been saved yet are updated by each push whereas syncing moves them to storage,
+        # which is why both kinds are read under the same lock that syncing holds. Otherwise, a sync taking place
+        # in between would make us either miss some of the rollups or count them twice ..
         with self.update_lock:
+            self.build_rollups()
+            summary = self.rollups.get_summary(start, end)
 
-            # .. make sure we have access to the latest data ..
-            self._sync_state()
+        # .. each object becomes a column, which is what our callers expect ..
+        tabulated = {}
 
-            # .. read our input data from persistent storage ..
-            data = self.load_data_from_storage()
+        for object_id, rollup in summary.items():
+            stats = rollup.to_stats()
+            tabulated[object_id] = {name: stats[name] for name in self.agg_by}
 
-        # .. tabulate all the statistics found ..
-        tabulated = data.\
-            groupby(group_by).\
-            agg(**self.agg_by)
+        # .. finally, return the result.
+        return pd.DataFrame(tabulated)
 
-        # .. convert rows to columns which is what our callers expect ..
-        tabulated = tabulated.transpose()
+# ################################################################################################################################
 
-        # .. finally, return the result.
-        return tabulated
+    def get_trend(self, granularity, start=None, end=None):
+        """ Returns, for each object, statistics of each minute, hour or day between start and end, including percentiles.
+        """
+        # type: (str, optional[datetime], optional[datetime]) -> dict
+        with self.update_lock:
+            self.build_rollups()
+            trend = self.rollups.get_trend(granularity, start, end)
+
+        out = {}
+
+        for object_id, rollup_list in trend.items():
+            out[object_id] = [(bucket, rollup.to_stats()) for bucket, rollup in rollup_list]
+
+        return out
 
 # ################################################################################################################################
 
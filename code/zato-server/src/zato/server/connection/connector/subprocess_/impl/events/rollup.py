@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from datetime import datetime, timedelta
+from typing import Optional as optional
+
+# Zato
+from zato.common.api import Stats
+from zato.common.util.stats import QuantileSketch
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from logging import Logger
+    from pandas import DataFrame
+    from zato.server.connection.connector.subprocess_.impl.events.database import PartitionedStorage
+
+    DataFrame = DataFrame
+    Logger = Logger
+    PartitionedStorage = PartitionedStorage
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+utcnow = datetime.utcnow
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class Granularity:
+    Minute = 'minute'
+    Hour   = 'hour'
+    Day    = 'day'
+
+# From the finest to the coarsest one
+_granularity_list = [Granularity.Minute, Granularity.Hour, Granularity.Day]
+
+# Length of the ISO timestamp prefix that buckets of each granularity are named after
+_bucket_len = {
+    Granularity.Minute: 16,
+    Granularity.Hour:   13,
+    Granularity.Day:    10,
+}
+
+# Each rollup in storage is a row with these columns
+_columns = ['bucket', 'object_id', 'count', 'count_nonzero', 'total', 'min', 'max', 'sketch']
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class Rollup:
+    """ A summary of the durations of all the events of a single object in a single bucket of time.
+    """
+    __slots__ = ('count', 'count_nonzero', 'total', 'min', 'max', 'sketch')
+
+    def __init__(self):
+        # type: () -> None
+        self.count = 0
+        self.count_nonzero = 0
+        self.total = 0.0
+        self.min = None # type: optional[float]
+        self.max = None # type: optional[float]
+        self.sketch = QuantileSketch()
+
+# ################################################################################################################################
+
+    def add(self, value):
+        # type: (float) -> None
+        self.count += 1
+        self.total += value
+
+        if value:
+            self.count_nonzero += 1
+
+        if self.min is None or value < self.min:
+            self.min = value
+
+        if self.max is None or value > self.max:
+            self.max = value
+
+        self.sketch.add(value)
+
+# ################################################################################################################################
+
+    def merge(self, other):
+        # type: (Rollup) -> None
+        self.count += other.count
+        self.count_nonzero += other.count_nonzero
+        self.total += other.total
+
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+        self.sketch.merge(other.sketch)
+
+# ################################################################################################################################
+
+    def to_row(self, bucket, object_id):
+        # type: (str, str) -> list
+        return [bucket, object_id, self.count, self.count_nonzero, self.total, self.min, self.max, self.sketch.to_bytes()]
+
+# ################################################################################################################################
+
+    @staticmethod
+    def from_row(count, count_nonzero, total, min_value, max_value, sketch):
+        # type: (int, int, float, float, float, bytes) -> Rollup
+        rollup = Rollup()
+        rollup.count = count
+        rollup.count_nonzero = count_nonzero
+        rollup.total = total
+        rollup.min = min_value
+        rollup.max = max_value
+        rollup.sketch = QuantileSketch.from_bytes(sketch)
+
+        return rollup
+
+# ################################################################################################################################
+
+    def to_stats(self):
+        """ Returns the same statistics that tabulating raw events would, along with response time percentiles.
+        """
+        # type: () -> dict
+        return {
+            'item_max': self.max,
+            'item_min': self.min,
+            'item_mean': self.total / self.count if self.count else None,
+            'item_total_time': self.total,
+            'item_total_usage': self.count_nonzero,
+            'item_p50': self.sketch.quantile(0.5),
+            'item_p90': self.sketch.quantile(0.9),
+            'item_p99': self.sketch.quantile(0.99),
+            'item_p99_9': self.sketch.quantile(0.999),
+        }
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class RollupStore:
+    """ Maintains rollups of events at the granularity of a minute, hour and day, each updated as events are pushed.
+    Rollups that have not been saved yet are kept in RAM whereas saved ones are in storage, with rollups
+    of each granularity in their own partitions. A rollup may be saved in parts, e.g. each time events are synced
+    during the minute, hour or day that it is for, and the parts are merged when it is read or when the storage is compacted.
+    """
+    def __init__(self, logger, storage, max_retention=None):
+        # type: (Logger, dict[str, PartitionedStorage], optional[dict]) -> None
+
+        # Our self.logger object
+        self.logger = logger
+
+        # Granularity -> For how long to keep its rollups, in milliseconds
+        self.max_retention = max_retention or Stats.RollupMaxRetention
+
+        # Granularity -> (bucket, object_id) -> Rollup not saved yet
+        self.pending = {granularity: {} for granularity in _granularity_list} # type: dict
+
+        # Granularity -> Storage of its rollups
+        self.storage = storage
+
+        # Pairs of (pending rollups, length of their bucket names) that each event updates
+        self._push_to = [(self.pending[granularity], _bucket_len[granularity]) for granularity in _granularity_list]
+
+# ################################################################################################################################
+
+    def push(self, object_id, timestamp, value):
+        """ Updates rollups of all the granularities with a single event.
+        """
+        # type: (str, str | datetime, float) -> None
+
+        # Events may be pushed with their timestamps as datetime objects or as ISO strings already
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.isoformat()
+
+        for pending, bucket_len in self._push_to:
+            key = (timestamp[:bucket_len], object_id)
+            rollup = pending.get(key)
+
+            if not rollup:
+                rollup = pending[key] = Rollup()
+
+            rollup.add(value)
+
+# ################################################################################################################################
+
+    def push_data(self, data):
+        """ Updates rollups with all the events from a DataFrame.
+        """
+        # type: (DataFrame) -> None
+        for object_id, timestamp, value in zip(data['object_id'], data['timestamp'], data['total_time_ms']):
+            self.push(object_id, timestamp, value)
+
+# ################################################################################################################################
+
+    def has_data(self):
+        # type: () -> bool
+        for granularity in _granularity_list:
+            if self.pending[granularity] or self.storage[granularity].get_partition_list():
+                return True
+
+        return False
+
+# ################################################################################################################################
+
+    def to_data_frame(self, rollups):
+        # type: (dict) -> DataFrame
+
+        # Pandas
+        import pandas as pd
+
+        rows = [rollup.to_row(bucket, object_id) for (bucket, object_id), rollup in rollups.items()]
+        return pd.DataFrame(rows, columns=_columns)
+
+# ################################################################################################################################
+
+    def from_data_frame(self, data, out, min_bucket=None, max_bucket=None):
+        """ Merges rollups from a DataFrame into the out dictionary, optionally only ones between min_bucket and max_bucket.
+        """
+        # type: (DataFrame, dict, optional[str], optional[str]) -> None
+        columns = [data[name] for name in _columns]
+
+        for bucket, object_id, *values in zip(*columns):
+
+            if min_bucket and bucket < min_bucket:
+                continue
+
+            if max_bucket and bucket > max_bucket:
+                continue
+
+            rollup = Rollup.from_row(*values)
+            key = (bucket, object_id)
+
+            existing = out.get(key)
+            if existing:
+                existing.merge(rollup)
+            else:
+                out[key] = rollup
+
+# ################################################################################################################################
+
+    def merge_data(self, data):
+        """ Merges all the rows of a DataFrame that are for the same bucket and object.
+        """
+        # type: (DataFrame) -> DataFrame
+        rollups = {}
+        self.from_data_frame(data, rollups)
+
+        return self.to_data_frame(rollups)
+
+# ################################################################################################################################
+
+    def save(self):
+        """ Saves all the pending rollups to storage and returns the number of files written.
+        """
+        # type: () -> int
+        len_files = 0
+
+        for granularity in _granularity_list:
+            pending = self.pending[granularity]
+
+            if pending:
+                len_files += self.storage[granularity].save(self.to_data_frame(pending))
+                pending.clear()
+
+        return len_files
+
+# ################################################################################################################################
+
+    def drop_expired(self, _utcnow=utcnow):
+        """ Deletes partitions of rollups past their retention time and returns the number of partitions deleted.
+        """
+        # type: () -> int
+        now = _utcnow()
+        len_dropped = 0
+
+        for granularity in _granularity_list:
+            max_retained = now - timedelta(milliseconds=self.max_retention[granularity])
+            len_dropped += self.storage[granularity].drop_expired(max_retained)
+
+        return len_dropped
+
+# ################################################################################################################################
+
+    def compact(self):
+        """ Compacts partitions of rollups of all the granularities and returns the number of partitions compacted.
+        """
+        # type: () -> int
+        len_compacted = 0
+
+        for granularity in _granularity_list:
+            len_compacted += self.storage[granularity].compact(self.merge_data)
+
+        return len_compacted
+
+# ################################################################################################################################
+
+    def get_granularity(self, start=None, _utcnow=utcnow):
+        """ Returns the finest granularity whose rollups are still kept for events since start.
+        """
+        # type: (optional[datetime]) -> str
+        if start:
+            now = _utcnow()
+            for granularity in _granularity_list:
+                if now - timedelta(milliseconds=self.max_retention[granularity]) <= start:
+                    return granularity
+
+        return Granularity.Day
+
+# ################################################################################################################################
+
+    def load(self, granularity, start=None, end=None):
+        """ Returns rollups of a given granularity, both saved and pending ones, whose buckets are between start and end.
+        Buckets are included as a whole, i.e. the first and last one may include events from before start or after end.
+        """
+        # type: (str, optional[datetime], optional[datetime]) -> dict
+        bucket_len = _bucket_len[granularity]
+
+        # The range of buckets to return ..
+        min_bucket = start.isoformat()[:bucket_len] if start else None
+        max_bucket = (end - timedelta(microseconds=1)).isoformat()[:bucket_len] if end else None
+
+        # .. this is what we return, note that it has only new Rollup objects, which makes it possible
+        #    for our callers to merge them without modifying any of the pending ones ..
+        out = {}
+
+        # .. read the rollups from storage ..
+        data = self.storage[granularity].load(start, end)
+        if data is not None:
+            self.from_data_frame(data, out, min_bucket, max_bucket)
+
+        # .. and merge the pending ones in.
+        for key, pending in self.pending[granularity].items():
+
+            bucket = key[0]
+
+            if min_bucket and bucket < min_bucket:
+                continue
+
+            if max_bucket and bucket > max_bucket:
+                continue
+
+            rollup = out.get(key)
+            if not rollup:
+                rollup = out[key] = Rollup()
+            rollup.merge(pending)
+
+        return out
+
+# ################################################################################################################################
+
+    def get_summary(self, start=None, end=None):
+        """ Returns a single rollup for each object, summarising all of its events between start and end,
+        using the finest granularity whose rollups are still kept.
+        """
+        # type: (optional[datetime], optional[datetime]) -> dict
+        out = {}
+
+        for (_, object_id), rollup in self.load(self.get_granularity(start), start, end).items():
+            summary = out.get(object_id)
+            if summary:
+                summary.merge(rollup)
+            else:
+                out[object_id] = rollup
+
+        return out
+
+# ################################################################################################################################
+
+    def get_trend(self, granularity, start=None, end=None):
+        """ Returns, for each object, a list of (bucket, rollup) tuples between start and end, sorted by bucket.
+        """
+        # type: (str, optional[datetime], optional[datetime]) -> dict
+        out = {}
+
+        for (bucket, object_id), rollup in sorted(self.load(granularity, start, end).items()):
+            out.setdefault(object_id, []).append((bucket, rollup))
+
+        return out
+
+# ################################################################################################################################
+# ################################################################################################################################
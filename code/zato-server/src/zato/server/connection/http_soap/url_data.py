@@ -21,7 +21,7 @@ from six import PY2
 
 # Zato
 from zato.bunch import Bunch
-from zato.common.api import CHANNEL, CONNECTION, DATA_FORMAT, MISC, RATE_LIMIT, SEC_DEF_TYPE, URL_TYPE, ZATO_NONE
+from zato.common.api import CHANNEL, CONNECTION, DATA_FORMAT, HTTP_SOAP, MISC, RATE_LIMIT, SEC_DEF_TYPE, URL_TYPE, ZATO_NONE
 from zato.common.vault_ import VAULT
 from zato.common.broker_message import code_to_name, SECURITY, VAULT as VAULT_BROKER_MSG
 from zato.common.dispatch import dispatcher
@@ -76,7 +76,8 @@ class URLData(CyURLData, OAuthDataStore):
                  oauth_config=None, apikey_config=None, aws_config=None, \
                  tls_channel_sec_config=None, tls_key_cert_config=None, \
                  vault_conn_sec_config=None, kvdb=None, broker_client=None, odb=None, jwt_secret=None, vault_conn_api=None):
-        super(URLData, self).__init__(channel_data)
+        url_cache_max_size = int(worker.server.fs_server_config.http.get('url_cache_max_size', HTTP_SOAP.URL_CACHE_MAX_SIZE))
+        super(URLData, self).__init__(channel_data, url_cache_max_size)
 
         self.worker = worker # type: WorkerStore
         self.url_sec = url_sec
@@ -616,7 +617,9 @@ class URLData(CyURLData, OAuthDataStore):
 
         # No error, let's delete channel info
         if match_idx != ZATO_NONE:
-            self.channel_data.pop(match_idx)
+            item = self.channel_data.pop(match_idx)
+            self._remove_channel_from_cache(item.get('id'))
+            self._set_up_router()
 
 # ################################################################################################################################
 
@@ -1038,7 +1041,7 @@ class URLData(CyURLData, OAuthDataStore):
 
     def sort_channel_data(self):
         """ Sorts channel items by name and then re-arranges the result so that user-facing services are closer to the begining
-        of the list which makes it faster to look them up - searches in the list are O(n).
+        of the list, which is the order that channels are matched in. Rebuilds the router channels are looked up through.
         """
         channel_data = []
         user_services = []
@@ -1057,6 +1060,7 @@ class URLData(CyURLData, OAuthDataStore):
         channel_data.extend(internal_services)
 
         self.channel_data[:] = channel_data
+        self._set_up_router()
 
 # ################################################################################################################################
 
@@ -1166,9 +1170,6 @@ class URLData(CyURLData, OAuthDataStore):
             'url_path': msg.get('old_url_path'),
         }, http_methods_allowed_re=self.worker.server.http_methods_allowed_re)
 
-        # Delete from URL cache
-        self._remove_from_cache(old_match_target)
-
         # In case of an internal error, we won't have the match all
         match_idx = ZATO_NONE
         for item in self.channel_data:
@@ -1181,6 +1182,9 @@ class URLData(CyURLData, OAuthDataStore):
         else:
             old_data = {}
 
+        # Delete from URL cache all the targets that were matched to this channel
+        self._remove_channel_from_cache(old_data.get('id', msg.id))
+
         # Channel's security now
         del self.url_sec[old_match_target]
 
@@ -15,6 +15,7 @@ from operator import add as op_add, gt as op_gt, lt as op_lt, sub as op_sub
 # Zato
 from zato.common.api import StatsKey
 from zato.common.typing_ import dataclass
+from zato.common.util.stats import QuantileSketch
 from zato.server.connection.kvdb.core import BaseRepo
 
 # ################################################################################################################################
@@ -43,6 +44,9 @@ _stats_key_per_key_value          = StatsKey.PerKeyValue
 _stats_key_per_key_last_timestamp = StatsKey.PerKeyLastTimestamp
 _stats_key_per_key_last_duration  = StatsKey.PerKeyLastDuration
 
+_stats_key_per_key_total_time = StatsKey.PerKeyTotalTime
+_stats_key_per_key_sketch     = StatsKey.PerKeySketch
+
 max_value = sys.maxsize
 
 # ################################################################################################################################
@@ -85,6 +89,10 @@ class NumberRepo(BaseRepo):
 
         self.current_value = self.in_ram_store[_stats_key_current_value] # type: anydict
 
+        # Keys -> Sketches of their durations, which are kept in self.current_value only as strings,
+        # and only when they are read or saved, so that updating them does not need to serialise them each time.
+        self.sketches = {} # type: anydict
+
 # ################################################################################################################################
 
     def _change_value(
@@ -178,12 +186,14 @@ class NumberRepo(BaseRepo):
 # ################################################################################################################################
 
     def _get(self, key:'str') -> 'anydict':
+        self._set_sketch_string(key)
         return self.current_value.get(key) # type: ignore
 
 # ################################################################################################################################
 
     def _remove_all(self) -> 'None':
         self.current_value.clear()
+        self.sketches.clear()
 
 # ################################################################################################################################
 
@@ -191,40 +201,75 @@ class NumberRepo(BaseRepo):
         # type: () -> None
         for key in self.in_ram_store: # type: str
             self.in_ram_store[key] = 0
+        self.sketches.clear()
 
 # ################################################################################################################################
 
-    def set_last_duration(self, key:'str', current_duration:'float') -> 'None':
+    def _set_sketch_string(self, key:'str') -> 'None':
+
+        sketch = self.sketches.get(key) # type: QuantileSketch
+        if sketch:
+            self.current_value[key][_stats_key_per_key_sketch] = sketch.to_string()
+
+# ################################################################################################################################
+
+    def _dumps(self) -> 'bytes':
+
+        # Sketches are saved along with everything else ..
+        for key in self.sketches:
+            self._set_sketch_string(key)
+
+        # .. which we can now serialise.
+        return super()._dumps()
+
+# ################################################################################################################################
 
-        # Numpy
-        import numpy as np
+    def _loads(self, data:'bytes') -> 'None':
 
+        # Load everything ..
+        super()._loads(data)
+
+        # .. and turn strings of sketches back into sketches that can be updated.
+        for key, per_key_dict in self.current_value.items():
+            sketch = per_key_dict.get(_stats_key_per_key_sketch)
+            if sketch:
+                self.sketches[key] = QuantileSketch.from_string(sketch)
+
+# ################################################################################################################################
+
+    def set_last_duration(self, key:'str', current_duration:'float') -> 'None':
+        """ Updates statistics of a key with the duration of its latest invocation, in milliseconds.
+        Percentiles of all the durations are in a sketch whose update takes constant time and memory.
+        """
         with self.update_lock:
 
             per_key_dict = self.current_value[key]
-            previous_duration = per_key_dict[_stats_key_per_key_last_duration]
-
-            if previous_duration:
-                to_compare = [previous_duration, current_duration]
-                new_min  = min(to_compare)
-                new_max  = max(to_compare)
-                new_mean = np.mean(to_compare)
-            else:
-                new_min  = current_duration
-                new_max  = current_duration
-                new_mean = current_duration
-
-            # We need to check the exact class here instead of using isinstance(new_mean, float)
-            # because numpy.float64 is a subclass of float. It is good when the mean
-            # is used in computations but when it comes to JSON serialisation it really
-            # needs to be a float rather than np.float64. That is why here we turn float64 into a real float.
-            uses_numpy = new_mean.__class__ is np.float64
-            new_mean = new_mean.item() if uses_numpy else new_mean # type: ignore
 
+            # Each key has its own sketch ..
+            sketch = self.sketches.get(key) # type: QuantileSketch
+            if not sketch:
+                sketch = self.sketches[key] = QuantileSketch()
+
+            # .. which we can now update ..
+            sketch.add(current_duration)
+
+            # .. along with the total time of all the invocations ..
+            total_time = (per_key_dict.get(_stats_key_per_key_total_time) or 0) + current_duration
+
+            # .. as well as the minimum and maximum ones ..
+            current_min = per_key_dict[_stats_key_per_key_min]
+            current_max = per_key_dict[_stats_key_per_key_max]
+
+            if current_min is None or current_duration < current_min:
+                per_key_dict[_stats_key_per_key_min] = current_duration
+
+            if current_max is None or current_duration > current_max:
+                per_key_dict[_stats_key_per_key_max] = current_duration
+
+            # .. and the mean is of all the invocations too.
             per_key_dict[_stats_key_per_key_last_duration] = current_duration
-            per_key_dict[_stats_key_per_key_min]  = new_min
-            per_key_dict[_stats_key_per_key_max]  = new_max
-            per_key_dict[_stats_key_per_key_mean] = new_mean
+            per_key_dict[_stats_key_per_key_total_time] = total_time
+            per_key_dict[_stats_key_per_key_mean] = total_time / sketch.count
 
 # ################################################################################################################################
 # ################################################################################################################################
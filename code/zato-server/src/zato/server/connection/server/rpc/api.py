@@ -8,22 +8,29 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 # stdlib
 from logging import getLogger
+from time import monotonic
+
+# gevent
+from gevent.lock import RLock
 
 # Zato
-from zato.common.ext.dataclasses import dataclass
-from zato.common.typing_ import cast_, list_field
+from zato.common.ext.dataclasses import asdict, dataclass
+from zato.common.typing_ import cast_, dict_field, list_field
+from zato.common.util.gather import ScatterGather, TaskStatus
 from zato.server.connection.server.rpc.invoker import LocalServerInvoker, RemoteServerInvoker
 
 # ################################################################################################################################
 # ################################################################################################################################
 
 if 0:
-    from zato.common.typing_ import any_, anylist, generator_, stranydict
+    from zato.common.typing_ import any_, anylist, dictlist, floatnone, generator_, list_, stranydict, strlist, strstrdict
+    from zato.common.util.gather import TaskResult
     from zato.server.base.parallel import ParallelServer
     from zato.server.connection.server.rpc.config import ConfigSource, RPCServerInvocationCtx
     from zato.server.connection.server.rpc.invoker import PerPIDResponse, ServerInvoker
 
     ConfigSource = ConfigSource
+    TaskResult = TaskResult
     ParallelServer = ParallelServer
     PerPIDResponse = PerPIDResponse
     RPCServerInvocationCtx = RPCServerInvocationCtx
@@ -31,6 +38,34 @@ if 0:
 # ################################################################################################################################
 # ################################################################################################################################
 
+class MembershipConfig:
+
+    # For how many seconds the list of servers is cached unless it is invalidated earlier
+    TTL = 60
+
+    # A server that could not be invoked is skipped for that many seconds ..
+    DownMin = 2
+
+    # .. which is doubled after each subsequent failure, up to that many seconds.
+    DownMax = 60
+
+    # Servers that responded within that many seconds are not pinged before they are invoked
+    PingSkipWindow = 30
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class InvokeAllConfig:
+
+    # How many servers at most are invoked concurrently
+    PoolSize = 16
+
+    # For how many seconds, in total, servers can be invoked before the ones that did not respond are abandoned
+    Deadline = 90
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 @dataclass
 class InvokeAllResult:
 
@@ -41,6 +76,32 @@ class InvokeAllResult:
     # This is a list of responses from each PID of each server
     data: 'anylist' = list_field()
 
+    # Names of servers that failed now or were not invoked at all because they had failed recently
+    skipped: 'strlist' = list_field()
+
+    # Status of each server, e.g. whether it responded or the deadline expired before it did
+    status: 'strstrdict' = dict_field()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+@dataclass(init=False)
+class PeerHealth:
+
+    server_name: 'str'
+
+    # How many times in a row the server could not be invoked
+    failure_count: 'int' = 0
+
+    # When the server was last invoked, or failed to be, as returned by time.monotonic
+    last_ok:      'float' = 0.0
+    last_failure: 'float' = 0.0
+
+    # The server is not invoked until that time, as returned by time.monotonic
+    down_until: 'float' = 0.0
+
+    last_error: 'str' = ''
+
 # ################################################################################################################################
 # ################################################################################################################################
 
@@ -62,16 +123,21 @@ class ConfigCtx:
         ctx = self.config_source.get_server_ctx(self.parallel_server, self.config_source.current_cluster_name, server_name)
         return self.remote_server_invoker_class(ctx)
 
+    def get_server_invoker(self, ctx:'RPCServerInvocationCtx') -> 'ServerInvoker':
+        if ctx.server_name == self.config_source.current_server_name:
+            cluster_name = cast_('str', ctx.cluster_name)
+            server_name  = cast_('str', ctx.server_name)
+            invoker = self.local_server_invoker_class(self.parallel_server, cluster_name, server_name)
+        else:
+            invoker = self.remote_server_invoker_class(ctx)
+        return invoker
+
+    def get_server_ctx_list(self) -> 'list_[RPCServerInvocationCtx]':
+        return self.config_source.get_server_ctx_list(self.config_source.current_cluster_name)
+
     def get_remote_server_invoker_list(self) -> 'generator_[ServerInvoker, None, None]':
-        ctx_list = self.config_source.get_server_ctx_list(self.config_source.current_cluster_name)
-        for ctx in ctx_list:
-            if ctx.server_name == self.config_source.current_server_name:
-                cluster_name = cast_('str', ctx.cluster_name)
-                server_name  = cast_('str', ctx.server_name)
-                invoker = self.local_server_invoker_class(self.parallel_server, cluster_name, server_name)
-            else:
-                invoker = self.remote_server_invoker_class(ctx)
-            yield invoker
+        for ctx in self.get_server_ctx_list():
+            yield self.get_server_invoker(ctx)
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -79,12 +145,40 @@ class ConfigCtx:
 class ServerRPC:
     """ A facade through which Zato servers can be invoked.
     """
-    def __init__(self, config_ctx:'ConfigCtx') -> 'None':
+    def __init__(
+        self,
+        config_ctx, # type: ConfigCtx
+        ttl = MembershipConfig.TTL, # type: float
+        down_min = MembershipConfig.DownMin, # type: float
+        down_max = MembershipConfig.DownMax, # type: float
+        ping_skip_window = MembershipConfig.PingSkipWindow, # type: float
+        pool_size = InvokeAllConfig.PoolSize, # type: int
+        deadline = InvokeAllConfig.Deadline   # type: float
+    ) -> 'None':
         self.config_ctx = config_ctx
         self.current_cluster_name = self.config_ctx.config_source.current_cluster_name
         self._invokers = {} # type: stranydict
         self.logger = getLogger('zato')
 
+        # Cluster membership is read from the configuration source no more often than that ..
+        self.ttl = ttl
+
+        # .. unless it is invalidated earlier, which is when it is expired right away.
+        self.expires_at = 0.0
+
+        # Per-server health, by server name
+        self.health = {} # type: stranydict
+
+        self.down_min = down_min
+        self.down_max = down_max
+        self.ping_skip_window = ping_skip_window
+
+        # Makes sure that only one greenlet at a time reads the membership when it expires
+        self.lock = RLock()
+
+        # Invokes all servers concurrently
+        self.gather = ScatterGather(pool_size, deadline)
+
 # ################################################################################################################################
 
     def _get_invoker_by_server_name(self, server_name:'str') -> 'ServerInvoker':
@@ -114,9 +208,131 @@ class ServerRPC:
 
 # ################################################################################################################################
 
-    def populate_invokers(self) -> 'None':
-        for invoker in self.config_ctx.get_remote_server_invoker_list():
-            self._invokers[invoker.server_name] = invoker
+    def _close_invoker(self, invoker:'ServerInvoker') -> 'None':
+
+        # Only remote invokers have connections to close
+        if isinstance(invoker, RemoteServerInvoker):
+            try:
+                invoker.close()
+            except Exception as e:
+                self.logger.info('Could not close RPC invoker for `%s` -> %s', invoker.server_name, e)
+
+# ################################################################################################################################
+
+    def _remove_server(self, server_name:'str') -> 'None':
+
+        if invoker := self._invokers.pop(server_name, None):
+            self._close_invoker(invoker)
+
+        _ = self.health.pop(server_name, None)
+
+# ################################################################################################################################
+
+    def populate_invokers(self, force:'bool'=False) -> 'None':
+        """ Reads all the servers from the configuration source, reusing invokers of servers whose configuration did not change,
+        so that their connections are kept open, and closing the ones of servers that are no longer in the cluster.
+        """
+        # The membership is still valid so there is nothing to do
+        if not force and monotonic() < self.expires_at:
+            return
+
+        with self.lock:
+
+            # Another greenlet could have populated it while we were waiting for the lock
+            if not force and monotonic() < self.expires_at:
+                return
+
+            current = set()
+
+            for ctx in self.config_ctx.get_server_ctx_list():
+
+                server_name = cast_('str', ctx.server_name)
+                current.add(server_name)
+
+                # Keep existing invokers if they still point to the same address and use the same credentials ..
+                if existing := self._invokers.get(server_name):
+                    if isinstance(existing, LocalServerInvoker) or existing.invocation_ctx == ctx:
+                        continue
+                    else:
+                        self._close_invoker(existing)
+
+                # .. otherwise, the server just joined or its configuration changed.
+                self._invokers[server_name] = self.config_ctx.get_server_invoker(ctx)
+
+            # Servers that left the cluster
+            for server_name in set(self._invokers) - current:
+                self.logger.info('Server `%s` is no longer in cluster `%s`', server_name, self.current_cluster_name)
+                self._remove_server(server_name)
+
+            self.expires_at = monotonic() + self.ttl
+
+# ################################################################################################################################
+
+    def invalidate(self) -> 'None':
+        """ Makes the membership be read again the next time servers are invoked.
+        """
+        self.expires_at = 0.0
+
+# ################################################################################################################################
+
+    def on_server_joined(self, server_name:'str') -> 'None':
+        """ Called when a server starts in the cluster or when its configuration changes.
+        """
+        # A server that starts again is not considered down anymore
+        _ = self.health.pop(server_name, None)
+        self.invalidate()
+
+# ################################################################################################################################
+
+    def on_server_left(self, server_name:'str') -> 'None':
+        """ Called when a server is deleted from the cluster.
+        """
+        with self.lock:
+            self._remove_server(server_name)
+
+        self.invalidate()
+
+# ################################################################################################################################
+
+    def _get_health(self, server_name:'str') -> 'PeerHealth':
+        if not (health := self.health.get(server_name)):
+            health = PeerHealth()
+            health.server_name = server_name
+            self.health[server_name] = health
+        return health
+
+# ################################################################################################################################
+
+    def on_invoke_ok(self, server_name:'str', now:'floatnone'=None) -> 'None':
+        health = self._get_health(server_name)
+        health.failure_count = 0
+        health.down_until = 0.0
+        health.last_ok = now or monotonic()
+
+# ################################################################################################################################
+
+    def on_invoke_error(self, server_name:'str', error:'str', now:'floatnone'=None) -> 'None':
+
+        now = now or monotonic()
+
+        health = self._get_health(server_name)
+        health.failure_count += 1
+        health.last_failure = now
+        health.last_error = error
+
+        # Each subsequent failure makes us wait longer before the server is invoked again
+        down_for = min(self.down_min * 2 ** (health.failure_count - 1), self.down_max)
+        health.down_until = now + down_for
+
+        self.logger.info('Server `%s` marked as down for %ss after %s failure(s) -> %s',
+            server_name, down_for, health.failure_count, error)
+
+# ################################################################################################################################
+
+    def get_peer_health(self) -> 'dictlist':
+        """ Returns health information about each server that was invoked so far.
+        """
+        return [asdict(health) for health in self.health.values()]
 
 # ################################################################################################################################
 
@@ -134,14 +350,61 @@ class ServerRPC:
         # Response to produce
         out = InvokeAllResult()
 
-        # Now, invoke all the servers ..
-        for invoker in self._invokers.values():
+        # Each server is one task
+        task_list = []
+
+        # Build a task for each server to invoke ..
+        for server_name, invoker in list(self._invokers.items()):
             invoker = cast_('ServerInvoker', invoker)
 
-            # .. each response object received is a list of sub-responses,
-            # .. with each sub-response representing a specific PID ..
-            response = invoker.invoke_all_pids(service, request, *args, **kwargs)
-            out.data.extend(response)
+            # .. our own server is always available ..
+            if isinstance(invoker, LocalServerInvoker):
+                task = self.gather.new_task(server_name, invoker.invoke_all_pids, service, request, *args, **kwargs)
+                task_list.append(task)
+                continue
+
+            now = monotonic()
+            health = self.health.get(server_name)
+
+            # .. remote ones are skipped if they failed recently, without waiting for a ping to time out ..
+            if health and now < health.down_until:
+                out.is_ok = False
+                out.skipped.append(server_name)
+                out.status[server_name] = TaskStatus.Skipped
+                continue
+
+            # .. and they do not need to be pinged if they responded a moment ago ..
+            needs_ping = not (health and now - health.last_ok < self.ping_skip_window)
+
+            task = self.gather.new_task(server_name, invoker.invoke_all_pids, service, request,
+                needs_ping=needs_ping, *args, **kwargs)
+            task_list.append(task)
+
+        # .. now, invoke all of them concurrently ..
+        result_list = self.gather.run(task_list)
+
+        # .. each response received is a list of sub-responses,
+        # .. with each sub-response representing a specific PID ..
+        for result in result_list:
+            result = cast_('TaskResult', result)
+            server_name = result.key
+            is_local = isinstance(self._invokers.get(server_name), LocalServerInvoker)
+
+            out.status[server_name] = result.status
+
+            if result.is_ok:
+                if not is_local:
+                    self.on_invoke_ok(server_name)
+                if result.data:
+                    out.data.extend(result.data)
+            else:
+                out.is_ok = False
+                out.skipped.append(server_name)
+
+                if is_local:
+                    self.logger.warning('Local server invocation error (%s) -> %s', result.status, result.error_info)
+                else:
+                    self.on_invoke_error(server_name, result.error_info or result.status)
 
         # .. now we can return the result.
         return out
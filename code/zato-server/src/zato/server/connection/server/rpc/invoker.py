@@ -165,8 +165,11 @@ class RemoteServerInvoker(ServerInvoker):
                 service)
             return
 
-        # Optionally, ping the remote server to quickly find out if it is still available ..
-        if self.invocation_ctx.needs_ping:
+        # Our caller may know that the server responded a moment ago, in which case there is no need to ping it ..
+        needs_ping = kwargs.pop('needs_ping', True) and self.invocation_ctx.needs_ping
+
+        # .. otherwise, ping the remote server to quickly find out if it is still available ..
+        if needs_ping:
             ping_timeout = kwargs.get('ping_timeout') or self.ping_timeout
             _ = requests_get(self.ping_address, timeout=ping_timeout)
 
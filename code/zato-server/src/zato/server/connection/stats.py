@@ -7,14 +7,18 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 """
 
 # stdlib
+from collections import deque
 from logging import getLogger
+from traceback import format_exc
 
 # gevent
+from gevent import spawn
+from gevent.event import Event
 from gevent.lock import RLock
 
 # Zato
 from zato.common.events.client import Client as EventsClient
-from zato.common.events.common import EventInfo, PushCtx
+from zato.common.events.common import Default, EventInfo, PushCtx
 from zato.common.util.api import new_cid
 
 # ################################################################################################################################
@@ -33,15 +37,42 @@ object_type_service = EventInfo.CommonObject.service
 # ################################################################################################################################
 
 class ServiceStatsClient:
-    def __init__(self, impl_class=None):
-        # type: (object) -> None
+    """ Sends information about service invocations to the events backend. Each event is only enqueued in a bounded backlog
+    and a background greenlet sends them in batches, once a batch is full or once in flush_interval seconds,
+    which means that invoking a service never waits for the backend. If the backlog is full, new events are dropped
+    and counted in self.dropped_count.
+    """
+    def __init__(
+        self,
+        impl_class=None,
+        batch_size=Default.push_batch_size,
+        flush_interval=Default.push_flush_interval,
+        max_backlog=Default.push_max_backlog,
+    ):
+        # type: (object, int, float, int) -> None
         self.host = '<ServiceStatsClient-host>'
         self.port = -1
         self.impl = None # type: EventsClient
         self.impl_class = impl_class or EventsClient
-        self.backlog = []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self.backlog = deque()
         self.lock = RLock()
 
+        # Set when there are enough events in the backlog to send a full batch
+        self.has_full_batch = Event()
+
+        # Events sent to the backend and ones dropped since startup
+        self.pushed_count = 0
+        self.dropped_count = 0
+
+        # How many dropped events have been already logged about
+        self._dropped_count_logged = 0
+
+        # Our background greenlet runs until we are stopped
+        self.keep_running = True
+
 # ################################################################################################################################
 
     def init(self, host, port):
@@ -57,39 +88,77 @@ class ServiceStatsClient:
 
     def run(self):
         self.impl.run()
+        _ = spawn(self._run_flusher)
 
 # ################################################################################################################################
 
-    def _push_backlog(self):
-        """ Pushes an event to the backend, assuming that we have access to the backend already.
+    def _run_flusher(self):
+        """ Runs in background, sending events from the backlog until we are stopped.
         """
-        # type: (str, str, str, int, str) -> None
+        while self.keep_running:
+
+            # Wait until there is a full batch or until it is time to send whatever there is ..
+            _ = self.has_full_batch.wait(self.flush_interval)
+            self.has_full_batch.clear()
+
+            # .. send it ..
+            try:
+                _ = self.flush()
+            except Exception:
+                logger.warning('Exception in stats flusher -> `%s`', format_exc())
+
+            # .. and let the users know if some of the events had to be dropped.
+            if self.dropped_count != self._dropped_count_logged:
+                logger.warning('Stats backlog full (%s), dropped %s event(s) (total: %s)',
+                    self.max_backlog, self.dropped_count - self._dropped_count_logged, self.dropped_count)
+                self._dropped_count_logged = self.dropped_count
+
+# ################################################################################################################################
+
+    def flush(self):
+        """ Sends all the events from the backlog in batches and returns how many were sent.
+        """
+        # type: () -> int
 
         # Make sure we are connected to the backend ..
-        if self.impl:
+        if not self.impl:
+            return 0
+
+        len_pushed = 0
+
+        # .. make sure only one greenlet sends events at a time ..
+        with self.lock:
 
-            # .. ensure no updates to the backlog while we run ..
-            with self.lock:
+            # .. and send batches until the backlog is empty. Events added to the backlog while we run
+            # are sent too because we keep taking events from its left side while new ones are appended to the right one.
+            while self.backlog:
+                batch = []
+                popleft = self.backlog.popleft
 
-                # .. get all enqueued events ..
-                for item in self.backlog[:]: # type: PushCtx
+                for _ in range(min(self.batch_size, len(self.backlog))):
+                    batch.append(popleft())
 
-                    # .. push each to the backend ..
-                    self.impl.push(item)
+                self.impl.push_batch(batch)
+                len_pushed += len(batch)
 
-                    # .. and remove it from the queue ..
-                    self.backlog.remove(item)
+        self.pushed_count += len_pushed
+        return len_pushed
 
 # ################################################################################################################################
 
     def push(self, cid, timestamp, service_name, is_request, total_time_ms=0, id=None):
-        """ Accepts information about the service, enqueues it as a push context and tries to empty the backlog.
+        """ Accepts information about the service and enqueues it as a push context to be sent to the backend in background.
         The reason we first need the backlog is that we may not be connected to the backend yet
-        when this method executes. That is we need a staging area, a backlog, first.
+        when this method executes and that we do not want for each service invocation to wait for the backend.
         """
         # type: (str, str, str, int, str) -> None
 
-        # Fill out the details of a context object ..
+        # Drop the event if there is no place for it ..
+        if len(self.backlog) >= self.max_backlog:
+            self.dropped_count += 1
+            return
+
+        # .. otherwise, fill out the details of a context object ..
         ctx = PushCtx()
         ctx.id = id or new_cid()
         ctx.cid = cid
@@ -99,12 +168,21 @@ class ServiceStatsClient:
         ctx.object_id = service_name
         ctx.total_time_ms = total_time_ms
 
-        # .. push the event to the backlog queue, using a lock to ensure the backlog is not modified in between ..
-        with self.lock:
-            self.backlog.append(ctx)
+        # .. enqueue it ..
+        self.backlog.append(ctx)
 
-        # .. and try to send it to the backend now.
-        self._push_backlog()
+        # .. and wake up our background greenlet if there is a full batch to send already.
+        if len(self.backlog) >= self.batch_size:
+            self.has_full_batch.set()
+
+# ################################################################################################################################
+
+    def stop(self):
+        """ Sends all the events enqueued so far and stops the background greenlet.
+        """
+        self.keep_running = False
+        self.has_full_batch.set()
+        _ = self.flush()
 
 # ################################################################################################################################
 
@@ -116,6 +194,10 @@ class ServiceStatsClient:
 
     def sync_state(self):
 
+        # Send what we have so far so that it can be synced as well ..
+        _ = self.flush()
+
+        # .. and request the sync now.
         with self.lock:
             self.impl.sync_state()
 
@@ -44,6 +44,7 @@ from gevent.pywsgi import WSGIServer as _Gevent_WSGIServer
 
 # ws4py
 from zato.server.ext.ws4py.exc import HandshakeError
+from zato.server.ext.ws4py.messaging import TextMessage
 from zato.server.ext.ws4py.websocket import WebSocket as _WebSocket
 from zato.server.ext.ws4py.server.geventserver import GEventWebSocketPool, WebSocketWSGIHandler
 from zato.server.ext.ws4py.server.wsgiutils import WebSocketWSGIApplication
@@ -61,6 +62,7 @@ from zato.common.util.python_ import get_python_id
 from zato.common.util.wsx import cleanup_wsx_client, ContextHandler
 from zato.common.vault_ import VAULT
 from zato.server.connection.connector import Connector
+from zato.server.connection.web_socket.broadcast import BroadcastEngine, Default as BroadcastDefault
 from zato.server.connection.web_socket.msg import AuthenticateResponse, InvokeClientRequest, ClientMessage, copy_forbidden, \
      error_response, ErrorResponse, Forbidden, OKResponse, InvokeClientPubSubRequest
 from zato.server.pubsub.delivery.tool import PubSubTool
@@ -110,10 +112,7 @@ _wsgi_drop_keys = ('ws4py.socket', 'wsgi.errors', 'wsgi.input')
 
 code_invalid_utf8 = 4001
 code_pings_missed = 4002
-
-# ################################################################################################################################
-
-_missing = object()
+code_slow_consumer = 4006
 
 # ################################################################################################################################
 
@@ -948,6 +947,15 @@ class WebSocket(_WebSocket):
         self.disconnect_client(new_cid(), code_pings_missed, 'Pings missed')
         self.update_terminated_status()
 
+# ################################################################################################################################
+
+    def on_slow_consumer(self, queue_size:'int') -> 'None':
+        logger.warning(
+            'Peer %s (%s) did not read %s messages sent to it, forcing its connection to close (%s)',
+            self._peer_address, self._peer_fqdn, queue_size, self.peer_conn_info_pretty)
+
+        _ = spawn(self.disconnect_client, new_cid(), code_slow_consumer, 'Slow consumer')
+
 # ################################################################################################################################
 
     def register_auth_client(self, _assigned_msg:'str'='Assigned sws_id:`%s` to `%s` (%s %s %s)') -> 'None':
@@ -1004,7 +1012,7 @@ class WebSocket(_WebSocket):
             if response:
 
                 # Assign any potential attributes sent across by the client WebSocket
-                self.client_attrs = request.client_attrs
+                self.container.set_client_attrs(self, request.client_attrs)
 
                 # Register the client for future use
                 self.register_auth_client()
@@ -1318,6 +1326,21 @@ class WebSocket(_WebSocket):
         # Call the super-class that will actually send the message.
         super().send(data)
 
+# ################################################################################################################################
+
+    def send_frame(self, cid:'str', frame:'bytes', data:'any_') -> 'None':
+        """ Sends a message that was already serialised and framed, e.g. one that is broadcast to many clients.
+        """
+        if self.is_audit_log_sent_active:
+            self._store_audit_log_data(DataSent, data, cid)
+
+        try:
+            self._write(frame)
+        except Exception as e:
+            self.disconnect_client(cid, close_code.runtime_invoke_client, 'Client invocation runtime error')
+            raise RuntimeInvocationError(cid, 'WSX client disconnected cid:`{}, peer:`{}` ({})'.format(
+                cid, self.peer_conn_info_pretty, e))
+
 # ################################################################################################################################
 
     def _store_audit_log_data(
@@ -1472,7 +1495,7 @@ class WebSocket(_WebSocket):
             self.pub_client_id, ' {})'.format(self.ext_client_name) if self.ext_client_name else ')')
 
         self.unregister_auth_client()
-        self.container.clients.pop(self.pub_client_id, None)
+        self.container.remove_client(self)
 
         # Unregister the client from audit log
         if self.is_audit_log_sent_active or self.is_audit_log_received_active:
@@ -1597,6 +1620,17 @@ class WebSocketContainer(WebSocketWSGIApplication):
     ) -> 'None':
         self.config = config
         self.clients = {}
+
+        # Maps each key and value of client attributes to pub_client_id values of clients that have them
+        self.client_attrs_index = {} # type: dict[tuple, strset]
+
+        # Messages to many clients at a time are sent through this engine
+        wsx_config = self.config.parallel_server.fs_server_config.wsx
+        self.broadcast_engine = BroadcastEngine(
+            int(wsx_config.get('broadcast_pool_size') or BroadcastDefault.pool_size),
+            int(wsx_config.get('broadcast_queue_size') or BroadcastDefault.queue_size),
+        )
+
         super(WebSocketContainer, self).__init__(*args, **kwargs)
 
 # ################################################################################################################################
@@ -1664,44 +1698,112 @@ class WebSocketContainer(WebSocketWSGIApplication):
 
 # ################################################################################################################################
 
-    def invoke_client_by_attrs(self, cid:'str', attrs:'stranydict', request:'any_', timeout:'int') -> 'any_':
+    def _get_client_attrs_keys(self, client_attrs:'stranydict') -> 'anylist':
+        """ Returns keys of the client attributes index for each of the attributes given on input.
+        """
+        out = []
 
-        # Iterate over all the currently connected WebSockets ..
-        for client in self.clients.values():
+        for key, value in client_attrs.items():
 
-            # .. by default, assume that we do not need to invoke this client ..
-            should_invoke = False
+            # Values that cannot be hashed cannot be looked up either
+            try:
+                _ = hash(value)
+            except TypeError:
+                continue
+            else:
+                out.append((key, value))
+
+        return out
 
-            # .. add static typing ..
-            client = cast_('WebSocket', client)
+# ################################################################################################################################
 
-            # .. go through each of the attrs that the client is expected to have ..
-            for expected_key, expected_value in attrs.items():
+    def set_client_attrs(self, client:'WebSocket', client_attrs:'stranydict') -> 'None':
 
-                # .. check if the client has such a key at all ..
-                client_value = client.client_attrs.get(expected_key, _missing)
+        # Remove from the index any attributes that the client may have had previously ..
+        self._unindex_client_attrs(client)
 
-                # .. if not, we do not need to continue ..
-                if client_value is _missing:
-                    continue
+        # .. assign the new ones ..
+        client.client_attrs = client_attrs
+
+        # .. and add them to the index.
+        for index_key in self._get_client_attrs_keys(client_attrs):
+            self.client_attrs_index.setdefault(index_key, set()).add(client.pub_client_id)
+
+# ################################################################################################################################
 
-                # .. otherwise, confirm that the value is the same ..
-                # .. and iterate further if it is not ..
-                if client_value != expected_value:
-                    continue
+    def _unindex_client_attrs(self, client:'WebSocket') -> 'None':
 
-                # .. if we are here, it means that this client can be invoked ..
-                should_invoke = True
+        for index_key in self._get_client_attrs_keys(client.client_attrs):
+            if pub_client_ids := self.client_attrs_index.get(index_key):
+                pub_client_ids.discard(client.pub_client_id)
 
-            # .. do invoke it now in background ..
-            if should_invoke:
-                _ = spawn(client.invoke_client, cid, request, wait_for_response=False)
+                # Do not keep keys that no client has anymore
+                if not pub_client_ids:
+                    del self.client_attrs_index[index_key]
+
+# ################################################################################################################################
+
+    def remove_client(self, client:'WebSocket') -> 'None':
+        _ = self.clients.pop(client.pub_client_id, None)
+        self._unindex_client_attrs(client)
+        self.broadcast_engine.remove_client(client.pub_client_id)
+
+# ################################################################################################################################
+
+    def invoke_client_by_attrs(self, cid:'str', attrs:'stranydict', request:'any_', timeout:'int') -> 'any_':
+
+        # IDs of clients that have any of the attributes expected ..
+        pub_client_ids = set() # type: strset
+
+        for index_key in self._get_client_attrs_keys(attrs):
+            if matching := self.client_attrs_index.get(index_key):
+                pub_client_ids.update(matching)
+
+        # .. which are the only clients that we need to invoke ..
+        client_list = [self.clients[pub_client_id] for pub_client_id in pub_client_ids if pub_client_id in self.clients]
+
+        # .. and we invoke them in background.
+        self._broadcast(cid, request, client_list)
 
 # ################################################################################################################################
 
     def broadcast(self, cid:'str', request:'any_') -> 'None':
-        for client in self.clients.values():
-            _ = spawn(client.invoke_client, cid, request, wait_for_response=False)
+        self._broadcast(cid, request, list(self.clients.values()))
+
+# ################################################################################################################################
+
+    def _broadcast(self, cid:'str', request:'any_', client_list:'anylist') -> 'None':
+
+        # Nothing to do if there are no clients to send the message to
+        if not client_list:
+            return
+
+        # If input request is a string, try to decode it from JSON, but leave as-is in case
+        # of an error or if it is not a string, same as when a single client is invoked ..
+        if isinstance(request, str):
+            try:
+                request = stdlib_loads(request)
+            except ValueError:
+                pass
+
+        # .. all the clients of a channel share its configuration, including how to serialise messages,
+        # .. which means that we can serialise the message and frame it once for all of them ..
+        client = cast_('WebSocket', client_list[0])
+
+        msg = InvokeClientRequest(cid, request, None)
+        serialized = msg.serialize(client._json_dump_func)
+        frame = TextMessage(serialized).single(mask=False)
+
+        logger.info('Broadcasting message `%s` (%s B) to %s client(s) of `%s`',
+            cid, len(serialized), len(client_list), self.config.name)
+
+        # .. and now, the same frame can be sent to each of them.
+        self.broadcast_engine.broadcast(cid, frame, serialized, client_list)
+
+# ################################################################################################################################
+
+    def get_broadcast_stats(self) -> 'stranydict':
+        return self.broadcast_engine.get_stats()
 
 # ################################################################################################################################
 
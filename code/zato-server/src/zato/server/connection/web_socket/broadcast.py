@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from collections import deque
+from logging import getLogger
+
+# gevent
+from gevent import spawn
+from gevent.pool import Pool
+from gevent.queue import Queue
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict, anylist
+    from zato.server.connection.web_socket import WebSocket
+    from gevent import Greenlet
+
+    Greenlet = Greenlet
+    WebSocket = WebSocket
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = getLogger('zato_web_socket')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class Default:
+
+    # How many clients at most are written to concurrently
+    pool_size = 100
+
+    # How many messages at most can wait to be sent to a single client before it is considered a slow consumer
+    queue_size = 1000
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ClientQueue:
+    """ Messages waiting to be sent to a single client, in the order that they were broadcast in.
+    """
+    __slots__ = ('client', 'items', 'is_scheduled', 'is_dropped')
+
+    def __init__(self, client:'WebSocket') -> 'None':
+        self.client = client
+        self.items = deque()
+
+        # Whether a worker is already sending, or will be sending, messages from this queue
+        self.is_scheduled = False
+
+        # Set to True if the client is disconnected and nothing else should be sent to it
+        self.is_dropped = False
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class BroadcastEngine:
+    """ Sends messages that were already serialised and framed to many WebSocket clients at a time.
+    Each client has a queue of its own and no more than pool_size clients are written to concurrently.
+    Clients that cannot keep up with the messages sent to them are disconnected.
+    """
+    def __init__(self, pool_size:'int'=Default.pool_size, queue_size:'int'=Default.queue_size) -> 'None':
+        self.pool = Pool(pool_size)
+        self.queue_size = queue_size
+
+        # Queues of all the clients that were sent anything, by their pub_client_id
+        self.queues = {} # type: dict[str, ClientQueue]
+
+        # Queues that have messages to send and are waiting for a worker
+        self.ready = Queue()
+        self.dispatcher = None # type: Greenlet | None
+
+        # Statistics
+        self.total_broadcasts = 0
+        self.total_sent = 0
+        self.total_dropped = 0
+
+# ################################################################################################################################
+
+    def broadcast(self, cid:'str', frame:'bytes', data:'any_', client_list:'anylist') -> 'None':
+        """ Enqueues a frame for each of the clients given on input. Returns as soon as the frame is enqueued,
+        without waiting for it to be sent.
+        """
+        item = (cid, frame, data)
+
+        for client in client_list:
+
+            # Get or create a queue for that client ..
+            if not (queue := self.queues.get(client.pub_client_id)):
+                queue = self.queues[client.pub_client_id] = ClientQueue(client)
+
+            # .. this client is being disconnected so we do not send anything to it ..
+            if queue.is_dropped:
+                continue
+
+            # .. this client does not read what we send it quickly enough ..
+            if len(queue.items) >= self.queue_size:
+                self._drop(queue)
+                client.on_slow_consumer(len(queue.items))
+                continue
+
+            queue.items.append(item)
+
+            # .. and now a worker can send it, unless one is going to already.
+            if not queue.is_scheduled:
+                queue.is_scheduled = True
+                self.ready.put(queue)
+
+        self.total_broadcasts += 1
+
+        if not self.dispatcher:
+            self.dispatcher = spawn(self._run_dispatcher)
+
+# ################################################################################################################################
+
+    def _run_dispatcher(self) -> 'None':
+        while True:
+            queue = self.ready.get()
+
+            # This blocks until a worker is available
+            _ = self.pool.spawn(self._send_queue, queue)
+
+# ################################################################################################################################
+
+    def _send_queue(self, queue:'ClientQueue') -> 'None':
+
+        client = queue.client
+
+        try:
+            while queue.items and not queue.is_dropped:
+                cid, frame, data = queue.items.popleft()
+                client.send_frame(cid, frame, data)
+                self.total_sent += 1
+
+        # The client will have been disconnected already so we only need to stop sending anything to it
+        except Exception as e:
+            logger.info('Could not send message to `%s` -> %s', client.pub_client_id, e)
+            self._drop(queue)
+
+        finally:
+            queue.is_scheduled = False
+
+# ################################################################################################################################
+
+    def _drop(self, queue:'ClientQueue') -> 'None':
+
+        # The queue is kept until the client is removed so that nothing is enqueued for it in the meantime
+        queue.is_dropped = True
+        queue.items.clear()
+        self.total_dropped += 1
+
+# ################################################################################################################################
+
+    def remove_client(self, pub_client_id:'str') -> 'None':
+        if queue := self.queues.pop(pub_client_id, None):
+            queue.is_dropped = True
+            queue.items.clear()
+
+# ################################################################################################################################
+
+    def get_stats(self) -> 'anydict':
+        return {
+            'clients': len(self.queues),
+            'depth': sum(len(queue.items) for queue in self.queues.values()),
+            'busy_workers': len(self.pool),
+            'total_broadcasts': self.total_broadcasts,
+            'total_sent': self.total_sent,
+            'total_dropped': self.total_dropped,
+        }
+
+# ################################################################################################################################
+# ################################################################################################################################
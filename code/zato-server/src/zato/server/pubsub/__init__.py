@@ -30,6 +30,7 @@ from zato.common.odb.query.pubsub.queue import set_to_delete
 from zato.common.typing_ import cast_, dict_, optional
 from zato.common.util.api import as_bool, spawn_greenlet, wait_for_dict_key, wait_for_dict_key_by_get_func
 from zato.common.util.time_ import datetime_from_ms, utcnow_as_ms
+from zato.server.pubsub.core.confirm import DeliveryConfirmConfig, DeliveryConfirmer
 from zato.server.pubsub.core.endpoint import EndpointAPI
 from zato.server.pubsub.core.trigger import NotifyPubSubTasksTrigger
 from zato.server.pubsub.core.hook import HookAPI
@@ -38,6 +39,7 @@ from zato.server.pubsub.core.sql import SQLAPI
 from zato.server.pubsub.core.topic import TopicAPI
 from zato.server.pubsub.model import inttopicdict, strsubdict, strtopicdict, Subscription, SubKeyServer
 from zato.server.pubsub.publisher import Publisher
+from zato.server.pubsub.spill import delete_stale_spill_dirs, SpillConfig, SpillStore
 from zato.server.pubsub.sync import InRAMSync
 
 # ################################################################################################################################
@@ -45,7 +47,7 @@ from zato.server.pubsub.sync import InRAMSync
 
 if 0:
     from zato.common.typing_ import any_, anydict, anylist, anytuple, callable_, callnone, dictlist, intdict, \
-        intlist, intnone, list_, stranydict, strnone, strstrdict, strlist, strlistdict, \
+        intlist, intnone, list_, stranydict, strnone, strset, strstrdict, strlist, strlistdict, \
         strlistempty, strtuple, type_
     from zato.distlock import Lock
     from zato.server.base.parallel import ParallelServer
@@ -129,8 +131,29 @@ class PubSub:
         # A list of PubSubTool objects, each containing delivery tasks
         self.pubsub_tools = [] # type: list_[PubSubTool]
 
+        # Non-GD messages that do not fit in RAM are spilled over to files in a directory of this process,
+        # whereas directories of processes that no longer exist are deleted.
+        spill_dir = self.server.fs_server_config.pubsub.get('spill_dir') or SpillConfig.spill_dir
+        spill_dir = os.path.join(self.server.work_dir, spill_dir)
+
+        delete_stale_spill_dirs(spill_dir)
+
+        # The disk space configured is for the whole server so each of its processes gets a share of it
+        spill_max_disk_size = int(self.server.fs_server_config.pubsub.get('spill_max_disk_size', SpillConfig.max_disk_size))
+        spill_max_disk_size = spill_max_disk_size // max(1, int(self.server.fs_server_config.main.gunicorn_workers or 1))
+
+        self.spill_store = SpillStore(
+            os.path.join(spill_dir, str(self.server.pid)),
+            int(self.server.fs_server_config.pubsub.get('spill_segment_size') or SpillConfig.segment_size),
+            spill_max_disk_size,
+        )
+
+        # Spilled-over messages wait on disk until delivery tasks have few enough messages in RAM
+        self.spill_refill_max_delivery_depth = int(self.server.fs_server_config.pubsub.get(
+            'spill_refill_max_delivery_depth') or SpillConfig.refill_max_delivery_depth)
+
         # A backlog of messages that have at least one subscription, i.e. this is what delivery servers use.
-        self.sync_backlog = InRAMSync(self)
+        self.sync_backlog = InRAMSync(self, self.spill_store)
 
         # How many messages have been published through this server, regardless of which topic they were for
         self.msg_pub_counter = 0
@@ -179,6 +202,20 @@ class PubSub:
         # Provides access to SQL queries
         self.sql_api = SQLAPI(self.cluster_id, self.new_session_func)
 
+        # Delivered messages may be confirmed in SQL in batches, across all the delivery tasks
+        pubsub_config = self.server.fs_server_config.pubsub
+
+        if as_bool(pubsub_config.get('delivery_confirm_batch', DeliveryConfirmConfig.is_enabled)):
+            self.delivery_confirmer = DeliveryConfirmer(
+                cluster_id = self.cluster_id,
+                new_session_func = self.new_session_func,
+                window = float(pubsub_config.get('delivery_confirm_window') or DeliveryConfirmConfig.window),
+                max_messages = int(pubsub_config.get('delivery_confirm_max_messages') or DeliveryConfirmConfig.max_messages),
+            )
+            self.delivery_confirmer.start()
+        else:
+            self.delivery_confirmer = None
+
         # Low-level implementation of the public pub/sub API
         self.pubapi = PubAPI(
             pubsub = self,
@@ -197,7 +234,8 @@ class PubSub:
             set_sync_has_msg_func = self._set_sync_has_msg,
             get_subscriptions_by_topic_func = self.get_subscriptions_by_topic,
             get_delivery_server_by_sub_key_func = self.get_delivery_server_by_sub_key,
-            sync_backlog_get_delete_messages_by_sub_keys_func = self.sync_backlog.get_delete_messages_by_sub_keys
+            sync_backlog_get_delete_messages_by_sub_keys_func = self.sync_backlog.get_delete_messages_by_sub_keys,
+            sync_backlog_refill_func = self._refill_sync_backlog,
         )
 
         if spawn_trigger_notify:
@@ -214,6 +252,12 @@ class PubSub:
             except Exception:
                 logger.info('Ignoring exception in PubSub.stop -> %s', format_exc())
 
+        self.notify_pub_sub_tasks_trigger.stop()
+        self.impl_publisher.stop()
+
+        if self.delivery_confirmer:
+            self.delivery_confirmer.stop()
+
 # ################################################################################################################################
 
     @property
@@ -542,6 +586,39 @@ class PubSub:
             topic_id = self.topic_api.get_topic_id_by_name(topic_name)
             return self.sync_backlog.get_topic_depth(topic_id)
 
+# ################################################################################################################################
+
+    def get_non_gd_spill_stats(self, topic_name:'str'='') -> 'stranydict':
+        """ Returns statistics of non-GD messages spilled over to disk, either for a given topic by its name or for all of them.
+        """
+        with self.lock:
+            topic_id = self.topic_api.get_topic_id_by_name(topic_name) if topic_name else None
+            with self.sync_backlog.lock:
+                return self.spill_store.get_stats(topic_id)
+
+# ################################################################################################################################
+
+    def _refill_sync_backlog(self, topic_id:'int') -> 'bool':
+        """ Moves non-GD messages of a topic spilled over to disk back to RAM, unless delivery tasks of the topic
+        still have too many messages to deliver. Returns True if the topic needs to be synced again, i.e. if any messages
+        were moved or if there are any still on disk. Must be called with self.lock held.
+        """
+        topic = self.topic_api.get_topic_by_id(topic_id)
+
+        # Delivery tasks of other processes are not known to us, so only the ones of this process are checked ..
+        for sub in self.subscriptions_by_topic.get(topic.name, []):
+            if ps_tool := self._get_pubsub_tool_by_sub_key(sub.sub_key):
+                if ps_tool.get_delivery_list_size(sub.sub_key) > self.spill_refill_max_delivery_depth:
+                    break
+
+        # .. and only if none of them has too many messages already are more of them moved to RAM.
+        else:
+            if self.sync_backlog.refill_from_spill(topic_id, self.subscriptions_by_sub_key):
+                return True
+
+        with self.sync_backlog.lock:
+            return self.spill_store.has_messages(topic_id)
+
 # ################################################################################################################################
 
     def get_topic_by_name(self, topic_name:'str') -> 'Topic':
@@ -1271,10 +1348,23 @@ class PubSub:
 
 # ################################################################################################################################
 
-    def confirm_pubsub_msg_delivered(self, *args:'any_', **kwargs:'any_') -> 'None':
-        """ Sets in SQL delivery status of a given message to True.
+    def confirm_pubsub_msg_delivered(self, sub_key:'str', delivered_pub_msg_id_list:'strlist') -> 'None':
+        """ Sets in SQL delivery status of a given message to True, either right away or along with other confirmations.
+        """
+        if self.delivery_confirmer:
+            self.delivery_confirmer.confirm(sub_key, delivered_pub_msg_id_list)
+        else:
+            self.sql_api.confirm_pubsub_msg_delivered(sub_key, delivered_pub_msg_id_list)
+
+# ################################################################################################################################
+
+    def get_pending_delivery_confirmations(self, sub_key:'str') -> 'strset':
+        """ Returns IDs of messages delivered to sub_key whose delivery is not confirmed in SQL yet.
         """
-        self.sql_api.confirm_pubsub_msg_delivered(*args, **kwargs)
+        if self.delivery_confirmer:
+            return self.delivery_confirmer.get_pending(sub_key)
+        else:
+            return set()
 
 # ################################################################################################################################
 
@@ -1604,6 +1694,10 @@ class PubSub:
         else:
             topic.sync_has_non_gd_msg = value
 
+        # Let the trigger know that it has a topic to sync
+        if value:
+            self.notify_pub_sub_tasks_trigger.mark_topic_dirty(topic_id)
+
 # ################################################################################################################################
 
     def set_sync_has_msg(
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+from contextlib import closing
+from traceback import format_exc
+
+# gevent
+from gevent import sleep, spawn
+from gevent.event import Event
+
+# Zato
+from zato.common.odb.query.pubsub.delivery import confirm_pubsub_msg_delivered as _confirm_pubsub_msg_delivered
+from zato.common.util.time_ import utcnow_as_ms
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import callable_, strlist, strset
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger('zato_pubsub.ps')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class DeliveryConfirmConfig:
+    """ Default configuration of batched delivery confirmations, can be overridden in the [pubsub] stanza of server.conf.
+    """
+    # Whether confirmations of delivered messages are collected and stored in SQL in batches
+    is_enabled = False
+
+    # For how long to collect confirmations before they are stored, in seconds
+    window = 0.1
+
+    # Confirmations are stored right away once that many messages are waiting for it
+    max_messages = 1000
+
+    # How many message IDs there can be in a single UPDATE statement
+    max_ids_per_query = 500
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class DeliveryConfirmer:
+    """ Collects IDs of messages delivered by all the delivery tasks and marks them as delivered in SQL in bulk,
+    either when the window lapses or when enough of them are waiting, whichever comes first.
+
+    Delivery tasks do not wait for their messages to be confirmed in SQL, which means that confirmations are at-least-once.
+    If the server stops abruptly, any messages delivered but not confirmed yet are still enqueued in SQL
+    and they will be delivered again when their subscriptions are next picked up. If an UPDATE fails, its IDs are kept
+    and stored along with the next batch.
+
+    As long as the server runs, messages pending confirmation are not enqueued for delivery again,
+    which is what self.get_pending is for.
+    """
+    def __init__(
+        self,
+        *,
+        cluster_id,       # type: int
+        new_session_func, # type: callable_
+        window,           # type: float
+        max_messages,     # type: int
+        max_ids_per_query=DeliveryConfirmConfig.max_ids_per_query, # type: int
+    ) -> 'None':
+
+        self.cluster_id = cluster_id
+        self.new_session_func = new_session_func
+        self.window = window
+        self.max_messages = max_messages
+        self.max_ids_per_query = max_ids_per_query
+
+        self.keep_running = True
+
+        # Sub key -> IDs of delivered messages not confirmed yet
+        self.pending = {} # type: dict[str, strset]
+
+        # Sub key -> IDs of messages currently being confirmed
+        self.in_flight = {} # type: dict[str, strset]
+
+        # How many messages there are in self.pending
+        self.pending_msg_count = 0
+
+        # Set when the first confirmation of a batch arrives and when a batch has max. messages
+        self.has_pending = Event()
+        self.is_batch_full = Event()
+
+        # How many batches and messages were confirmed, for statistics
+        self.batch_count = 0
+        self.confirmed_count = 0
+
+# ################################################################################################################################
+
+    def start(self) -> 'None':
+        _ = spawn(self._run_writer)
+
+# ################################################################################################################################
+
+    def stop(self) -> 'None':
+        """ Stops the writer, storing in SQL anything that is still pending before it exits.
+        """
+        self.keep_running = False
+        self.has_pending.set()
+
+# ################################################################################################################################
+
+    def confirm(self, sub_key:'str', pub_msg_id_list:'strlist') -> 'None':
+        """ Adds IDs of delivered messages to the current batch - returns without waiting for them to be stored in SQL.
+        """
+        pending = self.pending.setdefault(sub_key, set())
+        len_before = len(pending)
+        pending.update(pub_msg_id_list)
+        self.pending_msg_count += len(pending) - len_before
+
+        self.has_pending.set()
+        if self.pending_msg_count >= self.max_messages:
+            self.is_batch_full.set()
+
+# ################################################################################################################################
+
+    def get_pending(self, sub_key:'str') -> 'strset':
+        """ Returns IDs of messages delivered to sub_key that are not confirmed in SQL yet.
+        """
+        pending = self.pending.get(sub_key)
+        in_flight = self.in_flight.get(sub_key)
+
+        if pending and in_flight:
+            return pending | in_flight
+        else:
+            return pending or in_flight or set()
+
+# ################################################################################################################################
+
+    def _run_writer(self) -> 'None':
+
+        # Confirmations that are already pending are still stored after we are stopped
+        while self.keep_running or self.pending:
+
+            _ = self.has_pending.wait()
+            self.has_pending.clear()
+
+            if not self.pending:
+                continue
+
+            # Let other tasks add their confirmations, unless the batch is already full ..
+            if self.keep_running and self.pending_msg_count < self.max_messages:
+                _ = self.is_batch_full.wait(self.window)
+
+            # .. and take all that has been confirmed so far.
+            self.in_flight = self.pending
+            self.pending = {}
+            self.pending_msg_count = 0
+            self.is_batch_full.clear()
+
+            is_ok = self._store(self.in_flight)
+            self.in_flight = {}
+
+            # If storing failed, the IDs are pending again and we try again later, unless we are being stopped,
+            # in which case the messages will be delivered again once the server starts.
+            if not is_ok:
+                if self.keep_running:
+                    sleep(self.window)
+                else:
+                    logger.warning('Delivery of %d message(s) not confirmed on stop', self.pending_msg_count)
+                    break
+
+# ################################################################################################################################
+
+    def _store(self, batch:'dict[str, strset]') -> 'bool':
+        """ Marks all the messages from a batch as delivered in a single transaction. Returns False if it could not be done.
+        """
+        now = utcnow_as_ms()
+        msg_count = sum(len(pub_msg_ids) for pub_msg_ids in batch.values())
+
+        try:
+            with closing(self.new_session_func()) as session:
+
+                for sub_key, pub_msg_ids in batch.items():
+                    pub_msg_id_list = sorted(pub_msg_ids)
+
+                    for idx in range(0, len(pub_msg_id_list), self.max_ids_per_query):
+                        id_list = pub_msg_id_list[idx:idx + self.max_ids_per_query]
+                        _confirm_pubsub_msg_delivered(session, self.cluster_id, sub_key, id_list, now)
+
+                session.commit()
+
+        except Exception:
+
+            # Put the IDs back so that they are confirmed with the next batch - until they are,
+            # the messages will be delivered again if the server stops in the meantime.
+            logger.warning('Could not confirm delivery of %d message(s) of %d sub_key(s), e:`%s`',
+                msg_count, len(batch), format_exc())
+
+            for sub_key, pub_msg_ids in batch.items():
+                self.confirm(sub_key, list(pub_msg_ids))
+
+            return False
+
+        else:
+            self.batch_count += 1
+            self.confirmed_count += msg_count
+
+            return True
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+from contextlib import closing
+from traceback import format_exc
+
+# gevent
+from gevent import sleep, spawn
+from gevent.event import AsyncResult, Event
+
+# Zato
+from zato.common.api import PUBSUB
+from zato.common.odb.query.pubsub.publish import EnqueuedMsgInsert, MsgInsert, sql_publish_with_retry, sub_only_keys
+from zato.common.odb.query.pubsub.topic import get_gd_depth_topic, get_gd_depth_topic_list
+from zato.common.pubsub import msg_pub_ignore
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import anydict, anylist, anytuple, callable_, intdict, intlist, intnone
+    from zato.server.pubsub.publisher import PubCtx
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger('zato_pubsub.ps')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+_float_str = PUBSUB.FLOAT_STRING_CONVERT
+
+# Keys of GD messages that are not columns of the topic messages table
+_topic_msg_skip = frozenset(msg_pub_ignore + sub_only_keys)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class GroupCommitConfig:
+    """ Default configuration of group commits of GD messages, can be overridden in the [pubsub] stanza of server.conf.
+    """
+    # Whether GD messages of concurrent publishers are committed together
+    is_enabled = False
+
+    # For how long to wait for more publications before a batch is committed, in seconds
+    window = 0.002
+
+    # A batch is committed right away once it has that many messages
+    max_messages = 500
+
+    # How often in-RAM depth counters of topics are reconciled with SQL, in seconds
+    depth_reconcile_interval = 5
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class GDDepthCounter:
+    """ Keeps GD depth of each topic in RAM, so that publications can be checked against the topic's max. depth
+    without a COUNT query each time. Other servers publish to the same topics, and delivery tasks consume their messages,
+    which is why the counters are periodically reconciled with SQL.
+    """
+    def __init__(self) -> 'None':
+
+        # Topic ID -> Depth as of the last reconciliation, plus messages published since then
+        self.depth = {} # type: intdict
+
+        # Topic ID -> Messages published but not committed yet
+        self.in_flight = {} # type: intdict
+
+# ################################################################################################################################
+
+    def has_topic(self, topic_id:'int') -> 'bool':
+        return topic_id in self.depth
+
+# ################################################################################################################################
+
+    def set_depth(self, topic_id:'int', depth:'int') -> 'None':
+        self.depth[topic_id] = depth + self.in_flight.get(topic_id, 0)
+
+# ################################################################################################################################
+
+    def reserve(self, topic_id:'int', max_depth:'int', count:'int') -> 'intnone':
+        """ Returns the topic's new depth if count messages can be published to it or None if its max. depth would be exceeded.
+        """
+        depth = self.depth.get(topic_id, 0) + count
+        if depth > max_depth:
+            return None
+
+        self.depth[topic_id] = depth
+        self.in_flight[topic_id] = self.in_flight.get(topic_id, 0) + count
+
+        return depth
+
+# ################################################################################################################################
+
+    def on_committed(self, topic_id:'int', count:'int', is_ok:'bool') -> 'None':
+        """ Called once messages reserved earlier were committed or, if is_ok is False, rolled back.
+        """
+        self.in_flight[topic_id] -= count
+        if not is_ok:
+            self.depth[topic_id] -= count
+
+# ################################################################################################################################
+
+    def reconcile(self, sql_depth:'intdict') -> 'None':
+        """ Sets the depth of each known topic to what SQL returned, taking into account messages not committed yet.
+        Topics that SQL did not return have no messages.
+        """
+        for topic_id in self.depth:
+            self.set_depth(topic_id, sql_depth.get(topic_id, 0))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class GDGroupCommitter:
+    """ Collects GD messages published by concurrent greenlets and inserts them to SQL in a single transaction,
+    with one multi-row INSERT per table. Each publisher is blocked until the transaction with its messages is committed.
+    """
+    def __init__(
+        self,
+        *,
+        cluster_id,       # type: int
+        new_session_func, # type: callable_
+        pub_counter_func, # type: callable_
+        window,           # type: float
+        max_messages,     # type: int
+        depth_reconcile_interval, # type: float
+    ) -> 'None':
+
+        self.cluster_id = cluster_id
+        self.new_session_func = new_session_func
+        self.pub_counter_func = pub_counter_func
+        self.window = window
+        self.max_messages = max_messages
+        self.depth_reconcile_interval = depth_reconcile_interval
+
+        self.depth_counter = GDDepthCounter()
+        self.keep_running = True
+
+        # Publications waiting to be committed, each with a result that its publisher waits for
+        self.pending = [] # type: anylist
+
+        # How many messages there are in all the pending publications
+        self.pending_msg_count = 0
+
+        # Set when the first publication of a batch arrives and when a batch has max. messages
+        self.has_pending = Event()
+        self.is_batch_full = Event()
+
+        # How many publications there were in the last batch - if it was one, there are no concurrent publishers
+        self.last_batch_size = 1
+
+        # How many batches and publications were committed, for statistics
+        self.batch_count = 0
+        self.publication_count = 0
+
+# ################################################################################################################################
+
+    def start(self) -> 'None':
+        _ = spawn(self._run_writer)
+        _ = spawn(self._run_reconciler)
+
+# ################################################################################################################################
+
+    def stop(self) -> 'None':
+        self.keep_running = False
+        self.has_pending.set()
+
+# ################################################################################################################################
+
+    def reserve_depth(self, ctx:'PubCtx') -> 'intnone':
+        """ Returns the topic's new depth if GD messages of a publication do not exceed its max. depth or None otherwise.
+        """
+        topic = ctx.topic
+
+        # We do not know the depth of this topic yet so it needs to be read from SQL, but only this one time
+        if not self.depth_counter.has_topic(topic.id):
+            with closing(self.new_session_func()) as session:
+                depth = get_gd_depth_topic(session, self.cluster_id, topic.id)
+            if not self.depth_counter.has_topic(topic.id):
+                self.depth_counter.set_depth(topic.id, depth)
+
+        return self.depth_counter.reserve(topic.id, topic.max_depth_gd, len(ctx.gd_msg_list))
+
+# ################################################################################################################################
+
+    def publish(self, ctx:'PubCtx') -> 'None':
+        """ Adds GD messages of a publication to the current batch and blocks until they are committed.
+        Depth must have been reserved for them already. Raises an exception if they could not be committed.
+        """
+        result = AsyncResult()
+
+        self.pending.append((ctx, result))
+        self.pending_msg_count += len(ctx.gd_msg_list)
+
+        self.has_pending.set()
+        if self.pending_msg_count >= self.max_messages:
+            self.is_batch_full.set()
+
+        result.get()
+
+# ################################################################################################################################
+
+    def _run_writer(self) -> 'None':
+
+        # Publications that are already pending are still committed after we are stopped
+        while self.keep_running or self.pending:
+
+            _ = self.has_pending.wait()
+            self.has_pending.clear()
+
+            if not self.pending:
+                continue
+
+            # Let other publishers join the batch, unless it is already full or there is no one else publishing,
+            # in which case waiting would only delay the publication without anything to show for it ..
+            if self.pending_msg_count < self.max_messages:
+                if len(self.pending) > 1 or self.last_batch_size > 1:
+                    _ = self.is_batch_full.wait(self.window)
+
+            # .. and take all that has been published so far.
+            batch = self.pending
+            self.pending = []
+            self.pending_msg_count = 0
+            self.is_batch_full.clear()
+            self.last_batch_size = len(batch)
+
+            self._commit(batch)
+
+# ################################################################################################################################
+
+    def _run_reconciler(self) -> 'None':
+
+        while self.keep_running:
+            sleep(self.depth_reconcile_interval)
+
+            topic_id_list = list(self.depth_counter.depth) # type: intlist
+            if not topic_id_list:
+                continue
+
+            try:
+                with closing(self.new_session_func()) as session:
+                    rows = get_gd_depth_topic_list(session, self.cluster_id, topic_id_list)
+                self.depth_counter.reconcile({row.topic_id: row.depth for row in rows})
+            except Exception:
+                logger.warning('Could not reconcile GD depth of topics %s, e:`%s`', topic_id_list, format_exc())
+
+# ################################################################################################################################
+
+    def _get_rows(self, batch:'anylist') -> 'anytuple':
+        """ Returns rows for the topic messages table, grouped by their columns, and for subscriber queues.
+        """
+        # Columns -> Rows - messages have no keys for attributes that are None so each group gets its own INSERT
+        topic_rows = {} # type: anydict
+        queue_rows = [] # type: anylist
+
+        for ctx, _ in batch:
+
+            now = _float_str.format(ctx.now)
+
+            for msg in ctx.gd_msg_list:
+                row = {key: value for key, value in msg.items() if key not in _topic_msg_skip}
+                topic_rows.setdefault(frozenset(row), []).append(row)
+
+                for sub in ctx.subscriptions_by_topic:
+                    queue_rows.append({
+                        'creation_time': now,
+                        'pub_msg_id': msg['pub_msg_id'],
+                        'endpoint_id': sub.endpoint_id,
+                        'topic_id': ctx.topic.id,
+                        'sub_key': sub.sub_key,
+                        'cluster_id': self.cluster_id,
+                        'sub_pattern_matched': msg['sub_pattern_matched'][sub.sub_key],
+                    })
+
+        return list(topic_rows.values()), queue_rows
+
+# ################################################################################################################################
+
+    def _commit(self, batch:'anylist') -> 'None':
+
+        try:
+            topic_rows, queue_rows = self._get_rows(batch)
+
+            with closing(self.new_session_func()) as session:
+
+                for rows in topic_rows:
+                    _ = session.execute(MsgInsert().values(rows))
+
+                if queue_rows:
+                    _ = session.execute(EnqueuedMsgInsert().values(queue_rows))
+
+                session.commit()
+
+        except Exception:
+
+            # A single publication may have made the whole batch fail, e.g. because of a duplicate message ID
+            # or a subscription deleted in the meantime, so each one is committed on its own now, with the usual retries.
+            logger.info('Could not commit a batch of %d GD publication(s), committing them one by one; e:`%s`',
+                len(batch), format_exc())
+
+            for ctx, result in batch:
+                self._commit_one(ctx, result)
+
+        else:
+            self.batch_count += 1
+            self.publication_count += len(batch)
+
+            for ctx, result in batch:
+                self.depth_counter.on_committed(ctx.topic.id, len(ctx.gd_msg_list), True)
+                result.set(None)
+
+# ################################################################################################################################
+
+    def _commit_one(self, ctx:'PubCtx', result:'AsyncResult') -> 'None':
+
+        try:
+            with closing(self.new_session_func()) as session:
+
+                _ = sql_publish_with_retry(
+
+                    now = ctx.now,
+                    cid = ctx.cid,
+                    topic_id = ctx.topic.id,
+                    topic_name = ctx.topic.name,
+                    cluster_id = self.cluster_id,
+                    pub_counter = self.pub_counter_func(),
+
+                    session = session,
+                    new_session_func = self.new_session_func,
+                    before_queue_insert_func = None,
+
+                    gd_msg_list = ctx.gd_msg_list,
+                    subscriptions_by_topic = ctx.subscriptions_by_topic,
+                    should_collect_ctx = False
+                )
+
+                session.commit()
+
+        except Exception as e:
+            self.depth_counter.on_committed(ctx.topic.id, len(ctx.gd_msg_list), False)
+            result.set_exception(e)
+
+        else:
+            self.publication_count += 1
+            self.depth_counter.on_committed(ctx.topic.id, len(ctx.gd_msg_list), True)
+            result.set(None)
+
+# ################################################################################################################################
+# ################################################################################################################################
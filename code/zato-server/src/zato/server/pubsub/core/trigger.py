@@ -13,16 +13,20 @@ import logging
 from traceback import format_exc
 
 # gevent
-from gevent import sleep, spawn
+from gevent import spawn
+from gevent.event import Event
+
+# Zato
 from zato.common.typing_ import cast_
 from zato.common.util.api import new_cid
+from zato.common.util.time_ import utcnow_as_ms
 
 # ################################################################################################################################
 # ################################################################################################################################
 
 if 0:
     from gevent.lock import RLock
-    from zato.common.typing_ import anydict, callable_, intanydict, intnone
+    from zato.common.typing_ import anydict, callable_, callnone, floatnone, intanydict, intnone
     from zato.server.pubsub.model import inttopicdict, sublist
 
 # ################################################################################################################################
@@ -46,7 +50,8 @@ class NotifyPubSubTasksTrigger:
         set_sync_has_msg_func, # type: callable_
         get_subscriptions_by_topic_func,     # type: callable_
         get_delivery_server_by_sub_key_func, # type: callable_
-        sync_backlog_get_delete_messages_by_sub_keys_func # type: callable_
+        sync_backlog_get_delete_messages_by_sub_keys_func, # type: callable_
+        sync_backlog_refill_func=None # type: callnone
     ) -> 'None':
 
         self.lock = lock
@@ -57,14 +62,58 @@ class NotifyPubSubTasksTrigger:
         self.get_subscriptions_by_topic_func = get_subscriptions_by_topic_func
         self.get_delivery_server_by_sub_key_func = get_delivery_server_by_sub_key_func
         self.sync_backlog_get_delete_messages_by_sub_keys_func = sync_backlog_get_delete_messages_by_sub_keys_func
+        self.sync_backlog_refill_func = sync_backlog_refill_func
 
         self.keep_running = True
 
+        # IDs of topics that messages were published to since they were last synced, in the order of publication.
+        # This is a dict rather than a set to preserve the order and to ignore duplicates.
+        self.dirty_topics = {} # type: intanydict
+
+        # Set each time a topic becomes dirty so that we can wait for it instead of checking all the topics periodically
+        self.has_dirty_topics = Event()
+
+# ################################################################################################################################
+
+    def mark_topic_dirty(self, topic_id:'int') -> 'None':
+        """ Lets the trigger know that there are new messages for a topic. Must be called with self.lock held.
+        """
+        self.dirty_topics[topic_id] = None
+        self.has_dirty_topics.set()
+
+# ################################################################################################################################
+
+    def stop(self) -> 'None':
+        self.keep_running = False
+        self.has_dirty_topics.set()
+
+# ################################################################################################################################
+
+    def _get_wait_timeout(self, _utcnow_as_ms:'callable_'=utcnow_as_ms) -> 'floatnone':
+        """ Returns for how long to wait for new dirty topics, i.e. until the earliest time that one of the topics
+        that are already dirty can be synced, or None if there are no such topics. Must be called with self.lock held.
+        """
+        out = None # type: floatnone
+        now = _utcnow_as_ms()
+
+        for topic_id in self.dirty_topics:
+            topic = self.topics.get(topic_id)
+
+            # The topic may have been deleted in the meantime
+            if not topic:
+                continue
+
+            timeout = max(topic.last_synced + topic.task_sync_interval - now, 0.0)
+            if out is None or timeout < out:
+                out = timeout
+
+        return out
+
 # ################################################################################################################################
 
     def run(self) -> 'None':
-        """ A background greenlet which periodically lets delivery tasks know that there are perhaps
-        new GD messages for the topic that this class represents.
+        """ A background greenlet which lets delivery tasks know that there are perhaps new messages
+        for topics that were marked dirty.
         """
 
         # Local aliases
@@ -72,9 +121,10 @@ class NotifyPubSubTasksTrigger:
         _current_iter = 0
         _new_cid      = new_cid
         _spawn        = cast_('callable_', spawn)
-        _sleep        = cast_('callable_', sleep)
         _self_lock    = self.lock
         _self_topics  = self.topics
+        _self_dirty_topics = self.dirty_topics
+        _self_has_dirty_topics = self.has_dirty_topics
 
         _logger_info      = logger.info
         _logger_warn      = logger.warning
@@ -87,6 +137,7 @@ class NotifyPubSubTasksTrigger:
         _self_get_delivery_server_by_sub_key = self.get_delivery_server_by_sub_key_func
 
         _sync_backlog_get_delete_messages_by_sub_keys = self.sync_backlog_get_delete_messages_by_sub_keys_func
+        _sync_backlog_refill = self.sync_backlog_refill_func
 
         def _cmp_non_gd_msg(elem:'anydict') -> 'float':
             return elem['pub_time']
@@ -103,20 +154,33 @@ class NotifyPubSubTasksTrigger:
             # This may be handy for logging purposes, even if there is no max. for the loop iters
             _current_iter += 1
 
-            # Sleep for a while before continuing - the call to sleep is here because this while loop is quite long
-            # so it would be inconvenient to have it down below.
-            _sleep(0.01)
+            # Wait until a topic becomes dirty or until one that already is can be synced - the wait is here
+            # because this while loop is quite long so it would be inconvenient to have it down below.
+            with _self_lock:
+                timeout = self._get_wait_timeout()
+
+            _ = _self_has_dirty_topics.wait(timeout)
 
             # Blocks other pub/sub processes for a moment
             with _self_lock:
 
+                # Clear the event while the lock is held so that topics marked dirty after this point set it again
+                _self_has_dirty_topics.clear()
+
                 # Will map a few temporary objects down below
                 topic_id_dict = {} # type: intanydict
 
-                # Get all topics ..
-                for _topic in _self_topics.values():
+                # Get all the topics that messages were published to ..
+                for _topic_id in list(_self_dirty_topics):
+
+                    # .. the topic may have been deleted in the meantime ..
+                    _topic = _self_topics.get(_topic_id)
+                    if not _topic:
+                        del _self_dirty_topics[_topic_id]
+                        continue
 
-                    # Does the topic require task synchronization now?
+                    # Does the topic require task synchronization now? If not, it stays dirty, which means that
+                    # all the messages published to it until its sync interval lapses will be synced together.
                     if not _topic.needs_task_sync():
                         continue
                     else:
@@ -125,6 +189,7 @@ class NotifyPubSubTasksTrigger:
                     # OK, the time has come for this topic to sync its state with subscribers
                     # but still skip it if we know that there have been no messages published to it since the last time.
                     if not (_topic.sync_has_gd_msg or _topic.sync_has_non_gd_msg):
+                        del _self_dirty_topics[_topic_id]
                         continue
 
                     # There are some messages, let's see if there are subscribers ..
@@ -136,9 +201,13 @@ class NotifyPubSubTasksTrigger:
                         if _self_get_delivery_server_by_sub_key(_sub.sub_key):
                             subs.append(_sub)
 
-                    # .. if there are any subscriptions at all, we store that information for later use.
+                    # .. if there are any subscriptions at all, we store that information for later use ..
                     if subs:
                         topic_id_dict[_topic.id] = (_topic.name, subs)
+                        del _self_dirty_topics[_topic_id]
+
+                    # .. otherwise, the topic stays dirty and we will check again, after its sync interval,
+                    # if any of its subscriptions has a delivery server already.
 
                 # OK, if we had any subscriptions for at least one topic and there are any messages waiting,
                 # we can continue.
@@ -165,7 +234,7 @@ class NotifyPubSubTasksTrigger:
                             non_gd_msg_list = _sync_backlog_get_delete_messages_by_sub_keys(topic_id, sub_keys)
 
                             # .. also, continue only if there are still messages for the ones that are up ..
-                            if topic.sync_has_gd_msg or topic.sync_has_non_gd_msg:
+                            if topic.sync_has_gd_msg or non_gd_msg_list:
 
                                 # Note that we may have both GD and non-GD messages on input
                                 # and we need to have a max that takes both into account.
@@ -204,6 +273,12 @@ class NotifyPubSubTasksTrigger:
                         _self_set_sync_has_msg(topic_id, True, False, 'PubSub.loop')
                         _self_set_sync_has_msg(topic_id, False, False, 'PubSub.loop')
 
+                        # .. and now that the in-RAM backlog has been drained, move messages spilled over to disk
+                        # back to RAM, if there are any. The topic stays dirty for as long as any are left on disk,
+                        # including ones that cannot be moved yet because subscribers have too many messages to deliver.
+                        if _sync_backlog_refill and _sync_backlog_refill(topic_id):
+                            _self_set_sync_has_msg(topic_id, False, True, 'PubSub.refill')
+
                 except Exception:
                     e_formatted = format_exc()
                     _logger_zato_warn(e_formatted)
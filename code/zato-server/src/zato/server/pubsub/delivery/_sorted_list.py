@@ -20,8 +20,9 @@ from sortedcontainers import SortedList as _SortedList
 # ################################################################################################################################
 
 if 0:
-    from zato.common.typing_ import any_
+    from zato.common.typing_ import any_, anylist, tuple_
     from zato.server.pubsub.delivery.message import Message
+    from zato.server.pubsub.delivery.task import msgiter
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -45,24 +46,60 @@ class SortedList(_SortedList):
 
 # ################################################################################################################################
 
-    def remove_pubsub_msg(self, msg:'Message') -> 'None':
-        """ Removes a pubsub message from a SortedList instance - we cannot use the regular .remove method
+    def _get_pubsub_msg_pos(self, msg:'Message') -> 'tuple_[int, int]':
+        """ Returns the position of a pubsub message as a tuple of its sublist's index and the index in that sublist.
+        Messages are matched by their pub_msg_id - we cannot use the regular .index method
         because it may triggger __cmp__ per https://github.com/grantjenks/sorted_containers/issues/81.
         """
-
-        logger.info('In remove_pubsub_msg msg:`%s`, mxs:`%s`', msg.pub_msg_id, self._maxes)
         pos = bisect_left(self._maxes, msg)
 
         if pos == len(self._maxes):
             raise ValueError('{0!r} not in list (1)'.format(msg))
 
-        for _list_idx, _list_msg in enumerate(self._lists[pos]):
+        _list = self._lists[pos]
+
+        # Look up the message among the ones that do not sort after it, starting from the first that does not sort before it ..
+        for idx in range(bisect_left(_list, msg), len(_list)):
+            _list_msg = _list[idx]
             if msg.pub_msg_id == _list_msg.pub_msg_id:
-                idx = _list_idx
-                self._delete(pos, idx)
+                return pos, idx
+            if msg < _list_msg:
                 break
-        else:
-            raise ValueError('{0!r} not in list (2)'.format(msg))
+
+        # .. and if it is not there, look it up in the whole sublist.
+        for idx, _list_msg in enumerate(_list):
+            if msg.pub_msg_id == _list_msg.pub_msg_id:
+                return pos, idx
+
+        raise ValueError('{0!r} not in list (2)'.format(msg))
+
+# ################################################################################################################################
+
+    def remove_pubsub_msg(self, msg:'Message') -> 'None':
+        """ Removes a pubsub message from a SortedList instance - we cannot use the regular .remove method
+        because it may triggger __cmp__ per https://github.com/grantjenks/sorted_containers/issues/81.
+        """
+        pos, idx = self._get_pubsub_msg_pos(msg)
+        self._delete(pos, idx)
+
+# ################################################################################################################################
+
+    def remove_pubsub_msg_list(self, msg_list:'msgiter') -> 'None':
+        """ Removes all of the pubsub messages given on input, each in logarithmic time. Messages that are not in the list
+        do not prevent the others from being removed but a ValueError is raised with all of them once the others are removed.
+        """
+        not_found = [] # type: anylist
+
+        for msg in msg_list:
+            try:
+                pos, idx = self._get_pubsub_msg_pos(msg)
+            except ValueError:
+                not_found.append(msg)
+            else:
+                self._delete(pos, idx)
+
+        if not_found:
+            raise ValueError('{0!r} not in list (3)'.format(not_found))
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -16,6 +16,7 @@ from typing import Iterable as iterable_
 
 # gevent
 from gevent import sleep, spawn
+from gevent.event import Event
 from gevent.lock import RLock
 from gevent.thread import getcurrent
 
@@ -129,6 +130,10 @@ class DeliveryTask:
         # This is a lock used for micro-operations such as changing or consulting the contents of self.delete_requested.
         self.interrupt_lock = RLock()
 
+        # Set each time there may be something new for the task to do, e.g. when messages are added to self.delivery_list,
+        # which lets idle tasks wait for it instead of polling for messages.
+        self.wake_up_event = Event()
+
         # If self.wrap_in_list is True, messages will be always wrapped in a list,
         # even if there is only one message to send. Note that self.wrap_in_list will be False
         # only if both batch_size is 1 and wrap_one_msg_in_list is True.
@@ -164,14 +169,11 @@ class DeliveryTask:
         """
         logger.info('Deleting message(s) `%s` from `%s` (%s)', to_delete, self.sub_key, self.topic_name)
 
-        # Mark as deleted in SQL
+        # Mark as deleted in SQL ..
         self.pubsub_set_to_delete(self.sub_key, [msg.pub_msg_id for msg in to_delete])
 
-        # Go through each of the messages that is to be deleted ..
-        for msg in to_delete:
-
-            # .. delete it from our in-RAM delivery list ..
-            self.delivery_list.remove_pubsub_msg(msg)
+        # .. and delete them from our in-RAM delivery list.
+        self.delivery_list.remove_pubsub_msg_list(to_delete)
 
 # ################################################################################################################################
 
@@ -434,7 +436,7 @@ class DeliveryTask:
             result.exception_list.append(e)
 
         else:
-            # On successful delivery, remove these messages from SQL and our own delivery_list
+            # On successful delivery, remove these messages from SQL, possibly in a batch, and our own delivery_list
             try:
                 # All message IDs that we have delivered
                 delivered_msg_id_list = [msg.pub_msg_id for msg in to_deliver] # type: ignore[attr-defined]
@@ -447,12 +449,11 @@ class DeliveryTask:
                 result.exception_list.append(update_err)
             else:
                 with self.delivery_lock:
-                    for msg in to_deliver: # type: ignore[attr-defined]
-                        try:
-                            self.delivery_list.remove_pubsub_msg(msg)
-                        except Exception as remove_err:
-                            result.status_code = status_code.Error
-                            result.exception_list.append(remove_err)
+                    try:
+                        self.delivery_list.remove_pubsub_msg_list(to_deliver) # type: ignore[attr-defined]
+                    except Exception as remove_err:
+                        result.status_code = status_code.Error
+                        result.exception_list.append(remove_err)
 
                 # Status of messages is updated in both SQL and RAM so we can now log success
                 # unless, for some reason, we were not able to remove the messages from self.delivery_list.
@@ -551,12 +552,12 @@ class DeliveryTask:
                 delivery_method = self.sub_config['delivery_method']
 
                 # We are a task that does not notify endpoints, i.e. we are pull-style and our subscribers
-                # will query us themselves so in this case we can sleep for a while and repeat the loop -
+                # will query us themselves so in this case we can wait until we are woken up and repeat the loop -
                 # perhaps before the next iteration of the loop begins someone will change delivery_method
                 # to one that allows for notifications to be sent. If not, we will be simply looping forever,
-                # checking periodically below if the delivery method is still the same.
+                # checking each time we are woken up if the delivery method is still the same.
                 if delivery_method not in _notify_methods:
-                    sleep(5)
+                    self._wait_for_wake_up(False)
                     continue
 
                 # Apparently, our delivery method has changed since the last time our self.sub_config
@@ -629,7 +630,7 @@ class DeliveryTask:
                 else:
 
                     # .. thus, we can wait until one arrives.
-                    sleep(default_sleep_time) # pyright: ignore[reportGeneralTypeIssues]
+                    self._wait_for_wake_up(True)
 
         except Exception as e:
             error_msg = 'Exception in delivery task for sub_key:`%s`, e:`%s`'
@@ -637,6 +638,33 @@ class DeliveryTask:
             logger.warning(error_msg, self.sub_key, e_formatted)
             logger_zato.warning(error_msg, self.sub_key, e)
 
+# ################################################################################################################################
+
+    def _wait_for_wake_up(self, needs_empty_delivery_list:'bool') -> 'None':
+        """ Waits until self.wake_up is called. Returns immediately if the task is to stop
+        or if it has messages to deliver and it is not to wait for new ones.
+        """
+        # Clear the event first so that a wake-up signalled after the checks below is not lost ..
+        self.wake_up_event.clear()
+
+        # .. we may have been stopped in the meantime ..
+        if not self.keep_running:
+            return
+
+        # .. or there may be messages to deliver already ..
+        if needs_empty_delivery_list and self.delivery_list:
+            return
+
+        # .. otherwise, we have nothing to do until someone signals that we do.
+        _ = self.wake_up_event.wait()
+
+# ################################################################################################################################
+
+    def wake_up(self) -> 'None':
+        """ Lets the task know that there may be new messages for it to deliver or that its configuration changed.
+        """
+        self.wake_up_event.set()
+
 # ################################################################################################################################
 
     def _log_delivery_method_changed(self, current_delivery_method:'str') -> 'None':
@@ -693,6 +721,7 @@ class DeliveryTask:
         if self.keep_running:
             logger.info('Stopping delivery task for sub_key:`%s`', self.sub_key)
             self.keep_running = False
+            self.wake_up()
 
 # ################################################################################################################################
 
@@ -721,6 +750,9 @@ class DeliveryTask:
     def update_sub_config(self) -> 'None':
         self._set_sub_config_attrs()
 
+        # The delivery method may have changed, e.g. from pull to notify
+        self.wake_up()
+
 # ################################################################################################################################
 
     def get_queue_depth(self) -> 'tuple_[int, int]':
@@ -265,11 +265,22 @@ class PubSubTool:
         task = self.delivery_tasks[sub_key]
         task.update_sub_config()
 
+# ################################################################################################################################
+
+    def _wake_up_task(self, sub_key:'str') -> 'None':
+        """ Lets a delivery task know that there are new messages for it.
+        """
+        # There will be no task if the subscription was not found when the sub_key was added
+        if task := self.delivery_tasks.get(sub_key):
+            task.wake_up()
+
 # ################################################################################################################################
 
     def _add_non_gd_messages_by_sub_key(self, sub_key:'str', messages:'dictlist') -> 'None':
         """ Low-level implementation of add_non_gd_messages_by_sub_key, must be called with a lock for input sub_key.
         """
+        count = 0
+
         for msg in messages:
 
             # Ignore messages that are replies meant to be delievered only to sub_keys
@@ -284,6 +295,10 @@ class PubSubTool:
 
             add = cast_('callable_', self.delivery_lists[sub_key].add)
             add(NonGDMessage(sub_key, self.server_name, self.server_pid, msg))
+            count += 1
+
+        if count:
+            self._wake_up_task(sub_key)
 
 # ################################################################################################################################
 
@@ -431,8 +446,14 @@ class PubSubTool:
         count = 0
         msg_ids = [] # type: strlist
 
+        # Messages already delivered whose delivery is still to be confirmed in SQL
+        pending_confirmation = self.pubsub.get_pending_delivery_confirmations(sub_key)
+
         for msg in gd_msg_list:
 
+            if msg.pub_msg_id in pending_confirmation:
+                continue
+
             msg_ids.append(msg.pub_msg_id)
             gd_msg = GDMessage(sub_key, topic_name, msg.get_value())
             delivery_list = self.delivery_lists[sub_key]
@@ -440,6 +461,9 @@ class PubSubTool:
             # logger.info('Adding a GD message `%s` to delivery_list=%s (%s)', gd_msg.pub_msg_id, hex(id(delivery_list)), sub_key)
             count += 1
 
+        if count:
+            self._wake_up_task(sub_key)
+
         # logger.info('Pushing %d GD message{}to task:%s; msg_ids:%s'.format(' ' if count==1 else 's '), count, sub_key, msg_ids)
 
 # ################################################################################################################################
@@ -521,6 +545,15 @@ class PubSubTool:
         """
         return self.delivery_tasks[sub_key].get_queue_depth()
 
+# ################################################################################################################################
+
+    def get_delivery_list_size(self, sub_key:'str') -> 'int':
+        """ Returns how many messages, GD and non-GD, are waiting to be delivered to input sub_key.
+        """
+        with self.lock:
+            task = self.delivery_tasks.get(sub_key)
+            return len(task.delivery_list) if task else 0
+
 # ################################################################################################################################
 
     def handles_sub_key(self, sub_key:'str') -> 'bool':
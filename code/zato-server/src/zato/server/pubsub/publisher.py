@@ -35,9 +35,11 @@ from zato.common.odb.query.pubsub.topic import get_gd_depth_topic
 from zato.common.pubsub import new_msg_id, PubSubMessage
 from zato.common.typing_ import any_, anydict, anydictnone, anylistnone, anynone, boolnone, cast_, dict_field, intnone, \
     list_field, strlistnone, strnone
+from zato.common.util.api import as_bool
 from zato.common.util.pubsub import get_expiration, get_priority
 from zato.common.util.sql import set_instance_opaque_attrs
 from zato.common.util.time_ import datetime_from_ms, datetime_to_ms, utcnow_as_ms
+from zato.server.pubsub.core.group_commit import GDGroupCommitter, GroupCommitConfig
 
 # ################################################################################################################################
 # ################################################################################################################################
@@ -199,6 +201,7 @@ class Publisher:
     marshal_api: 'MarshalAPI'
     service_invoke_func: 'callable_'
     new_session_func: 'callable_'
+    gd_group_committer: 'GDGroupCommitter | None'
 
     def __init__(
         self,
@@ -215,6 +218,29 @@ class Publisher:
         self.service_invoke_func = service_invoke_func
         self.new_session_func = new_session_func
 
+        # GD messages of concurrent publishers may be optionally committed together
+        config = self.server.fs_server_config.pubsub
+
+        if as_bool(config.get('gd_group_commit', GroupCommitConfig.is_enabled)):
+            self.gd_group_committer = GDGroupCommitter(
+                cluster_id = self.server.cluster_id,
+                new_session_func = self.new_session_func,
+                pub_counter_func = self.server.get_pub_counter,
+                window = float(config.get('gd_group_commit_window') or GroupCommitConfig.window),
+                max_messages = int(config.get('gd_group_commit_max_messages') or GroupCommitConfig.max_messages),
+                depth_reconcile_interval = float(config.get('gd_depth_reconcile_interval') or \
+                    GroupCommitConfig.depth_reconcile_interval),
+            )
+            self.gd_group_committer.start()
+        else:
+            self.gd_group_committer = None
+
+# ################################################################################################################################
+
+    def stop(self) -> 'None':
+        if self.gd_group_committer:
+            self.gd_group_committer.stop()
+
 # ################################################################################################################################
 
     def get_data_prefixes(self, data:'str') -> 'tuple_[str, str]':
@@ -640,55 +666,75 @@ class Publisher:
         # We don't always have GD messages on request so there is no point in running an SQL transaction otherwise.
         if has_gd_msg_list:
 
-            with closing(ctx.new_session_func()) as session:
+            # GD messages of concurrent publishers may be committed together ..
+            if self.gd_group_committer:
+
+                # .. in which case depth is checked against an in-RAM counter rather than in SQL ..
+                current_depth = self.gd_group_committer.reserve_depth(ctx)
+
+                # .. note that this call raises an exception ..
+                if current_depth is None:
+                    self.reject_publication(ctx.cid, ctx.topic.name, True)
+                else:
+                    ctx.current_depth = current_depth
 
-                # Test first if we should check the depth in this iteration.
-                if ctx.topic.needs_depth_check():
+                # .. this blocks until the messages are committed along with others ..
+                self.gd_group_committer.publish(ctx)
 
-                    # Get current depth of this topic ..
-                    ctx.current_depth = get_gd_depth_topic(session, ctx.cluster_id, ctx.topic.id)
+                # .. increase the publication counter now that we have committed the messages.
+                self.server.incr_pub_counter()
 
-                    # .. and abort if max depth is already reached ..
-                    if ctx.current_depth + len_gd_msg_list > ctx.topic.max_depth_gd:
+            # .. otherwise, they are committed in a transaction of their own.
+            else:
+                with closing(ctx.new_session_func()) as session:
 
-                        # .. note thath is call raises an exception.
-                        self.reject_publication(ctx.cid, ctx.topic.name, True)
+                    # Test first if we should check the depth in this iteration.
+                    if ctx.topic.needs_depth_check():
 
-                    else:
+                        # Get current depth of this topic ..
+                        ctx.current_depth = get_gd_depth_topic(session, ctx.cluster_id, ctx.topic.id)
 
-                        # This only updates the local ctx variable
-                        ctx.current_depth = ctx.current_depth + len_gd_msg_list
+                        # .. and abort if max depth is already reached ..
+                        if ctx.current_depth + len_gd_msg_list > ctx.topic.max_depth_gd:
 
-                pub_msg_list = [elem['pub_msg_id'] for elem in ctx.gd_msg_list]
+                            # .. note thath is call raises an exception.
+                            self.reject_publication(ctx.cid, ctx.topic.name, True)
 
-                if has_logger_pubsub_debug:
-                    logger_pubsub.debug(_inserting_gd_msg, ctx.topic.name, pub_msg_list, ctx.endpoint_name,
-                        ctx.ext_client_id, ctx.cid)
+                        else:
 
-                # This is the call that runs SQL INSERT statements with messages for topics and subscriber queues
-                _ = sql_publish_with_retry(
+                            # This only updates the local ctx variable
+                            ctx.current_depth = ctx.current_depth + len_gd_msg_list
 
-                    now = ctx.now,
-                    cid = ctx.cid,
-                    topic_id = ctx.topic.id,
-                    topic_name = ctx.topic.name,
-                    cluster_id = ctx.cluster_id,
-                    pub_counter = self.server.get_pub_counter(),
+                    pub_msg_list = [elem['pub_msg_id'] for elem in ctx.gd_msg_list]
 
-                    session = session,
-                    new_session_func = ctx.new_session_func,
-                    before_queue_insert_func = None,
+                    if has_logger_pubsub_debug:
+                        logger_pubsub.debug(_inserting_gd_msg, ctx.topic.name, pub_msg_list, ctx.endpoint_name,
+                            ctx.ext_client_id, ctx.cid)
 
-                    gd_msg_list = ctx.gd_msg_list,
-                    subscriptions_by_topic = ctx.subscriptions_by_topic,
-                    should_collect_ctx = False
-                )
+                    # This is the call that runs SQL INSERT statements with messages for topics and subscriber queues
+                    _ = sql_publish_with_retry(
 
-                # Run an SQL commit for all queries above ..
-                session.commit()
+                        now = ctx.now,
+                        cid = ctx.cid,
+                        topic_id = ctx.topic.id,
+                        topic_name = ctx.topic.name,
+                        cluster_id = ctx.cluster_id,
+                        pub_counter = self.server.get_pub_counter(),
 
-                # .. increase the publication counter now that we have committed the messages ..
-                self.server.incr_pub_counter()
+                        session = session,
+                        new_session_func = ctx.new_session_func,
+                        before_queue_insert_func = None,
+
+                        gd_msg_list = ctx.gd_msg_list,
+                        subscriptions_by_topic = ctx.subscriptions_by_topic,
+                        should_collect_ctx = False
+                    )
+
+                    # Run an SQL commit for all queries above ..
+                    session.commit()
+
+                    # .. increase the publication counter now that we have committed the messages ..
+                    self.server.incr_pub_counter()
 
             # .. and set a flag to signal that there are some GD messages available
             ctx.pubsub.set_sync_has_msg(
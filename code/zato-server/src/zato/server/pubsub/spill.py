@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+import os
+from collections import deque
+from pickle import dumps, HIGHEST_PROTOCOL, loads
+from shutil import rmtree
+from struct import Struct
+
+# psutil
+from psutil import pid_exists
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist, dictlist, stranydict, strlist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger('zato_pubsub.ps')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# Each record in a segment is prefixed with its length
+_record_header = Struct('>I')
+_record_header_size = _record_header.size
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SpillConfig:
+    """ Default configuration of the spill-over tier, can be overridden in the [pubsub] stanza of server.conf.
+    """
+    # Relative to the server's work directory
+    spill_dir = 'pubsub-spill'
+
+    # Size of a file after which a new one is started - 16 MB
+    segment_size = 16 * 1024 * 1024
+
+    # How much disk space all of the segments of a server can use - 1 GB, or no spill-over at all if set to 0.
+    # Each worker process of the server gets an equal share of it.
+    max_disk_size = 1024 * 1024 * 1024
+
+    # Spilled-over messages of a topic are moved back to RAM only if none of the topic's delivery tasks
+    # in the same process has more than that many messages waiting to be delivered.
+    refill_max_delivery_depth = 1000
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def delete_stale_spill_dirs(spill_dir:'str') -> 'None':
+    """ Deletes directories of worker processes that no longer exist. Each worker process has a directory of its own,
+    named after its PID, under spill_dir.
+    """
+    if not os.path.isdir(spill_dir):
+        return
+
+    for name in os.listdir(spill_dir):
+
+        # Ignore anything that is not a directory of a worker process ..
+        if not name.isdigit():
+            continue
+
+        # .. as well as processes that are still running ..
+        if pid_exists(int(name)):
+            continue
+
+        # .. whereas messages spilled over by processes that stopped will never be read.
+        logger.info('Deleting spill-over directory of process %s that no longer exists', name)
+        rmtree(os.path.join(spill_dir, name), ignore_errors=True)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SpillSegment:
+    """ A single append-only file with messages of a topic, written sequentially and read from the beginning.
+    The file is open for writing only until a new segment is started, and it is opened for reading only when it is
+    read for the first time, so that topics with many segments do not keep descriptors open for each of them.
+    """
+    __slots__ = ('path', 'write_file', 'read_file', 'size', 'read_size', 'count')
+
+    def __init__(self, path:'str') -> 'None':
+        self.path = path
+        self.write_file = open(path, 'wb') # type: any_
+        self.read_file = None # type: any_
+
+        # How many bytes and records were written to the file
+        self.size = 0
+        self.count = 0
+
+        # How many bytes were already read from the file
+        self.read_size = 0
+
+# ################################################################################################################################
+
+    def append(self, records:'anylist') -> 'int':
+        """ Writes pickled records to the end of the file and returns how many bytes were written.
+        """
+        data = b''.join(_record_header.pack(len(record)) + record for record in records)
+
+        self.write_file.write(data)
+        self.write_file.flush()
+
+        self.size += len(data)
+        self.count += len(records)
+
+        return len(data)
+
+# ################################################################################################################################
+
+    def read(self, max_count:'int') -> 'anylist':
+        """ Reads up to max_count records from where the previous read stopped.
+        """
+        out = [] # type: anylist
+
+        if not self.read_file:
+            self.read_file = open(self.path, 'rb')
+
+        while len(out) < max_count and self.read_size < self.size:
+            header = self.read_file.read(_record_header_size)
+            record_size, = _record_header.unpack(header)
+            out.append(loads(self.read_file.read(record_size)))
+            self.read_size += _record_header_size + record_size
+
+        return out
+
+# ################################################################################################################################
+
+    def is_consumed(self) -> 'bool':
+        return self.read_size == self.size
+
+# ################################################################################################################################
+
+    def finish_writing(self) -> 'None':
+        if self.write_file:
+            self.write_file.close()
+            self.write_file = None
+
+# ################################################################################################################################
+
+    def close(self) -> 'None':
+        self.finish_writing()
+        if self.read_file:
+            self.read_file.close()
+        os.remove(self.path)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SpillQueue:
+    """ A FIFO queue of messages of a single topic, kept in a list of segments. New messages are always written to the last
+    segment and they are read from the first one which is deleted once all of its messages have been read.
+    """
+    def __init__(self, base_dir:'str', segment_size:'int') -> 'None':
+        self.base_dir = base_dir
+        self.segment_size = segment_size
+        self.segments = deque() # type: deque[SpillSegment]
+
+        # Used to build names of segment files, always increasing
+        self.segment_idx = 0
+
+        # How many messages and bytes are in the segments that have not been read yet
+        self.depth = 0
+        self.size = 0
+
+        # Max. in-RAM depth of the topic as of the last time that messages were spilled over
+        self.max_depth = 0
+
+# ################################################################################################################################
+
+    def _new_segment(self) -> 'SpillSegment':
+        self.segment_idx += 1
+        path = os.path.join(self.base_dir, '{:016d}.spill'.format(self.segment_idx))
+        segment = SpillSegment(path)
+        self.segments.append(segment)
+        return segment
+
+# ################################################################################################################################
+
+    def append(self, records:'anylist') -> 'None':
+        segment = self.segments[-1] if self.segments else self._new_segment()
+        if segment.size >= self.segment_size:
+            segment.finish_writing()
+            segment = self._new_segment()
+
+        self.size += segment.append(records)
+        self.depth += len(records)
+
+# ################################################################################################################################
+
+    def read(self, max_count:'int') -> 'anylist':
+        out = [] # type: anylist
+
+        while self.segments and len(out) < max_count:
+            segment = self.segments[0]
+            read_size = segment.read_size
+            out.extend(segment.read(max_count - len(out)))
+            self.size -= segment.read_size - read_size
+
+            # Delete the segment if there is nothing more to read from it - if it was the last one,
+            # a new one will be created for messages that are spilled over next time.
+            if segment.is_consumed():
+                _ = self.segments.popleft()
+                segment.close()
+
+        self.depth -= len(out)
+        return out
+
+# ################################################################################################################################
+
+    def clear(self) -> 'None':
+        while self.segments:
+            self.segments.popleft().close()
+
+        self.depth = 0
+        self.size = 0
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SpillStore:
+    """ Keeps non-GD messages that do not fit in RAM in local files, in a separate queue for each topic.
+    Must be used with the lock of the in-RAM backlog held.
+
+    Spilled-over messages are not persistent, i.e. anything left over in base_dir, e.g. by a previous process that had
+    the same PID, is deleted when the store is created. Directories of other processes that stopped are deleted
+    by delete_stale_spill_dirs.
+    """
+    def __init__(self, base_dir:'str', segment_size:'int', max_disk_size:'int') -> 'None':
+        self.base_dir = base_dir
+        self.segment_size = segment_size
+        self.max_disk_size = max_disk_size
+
+        # Topic ID -> SpillQueue
+        self.queues = {} # type: dict[int, SpillQueue]
+
+        # How many bytes all the queues take on disk
+        self.disk_size = 0
+
+        # How many messages were spilled over to disk and how many of them were read back into RAM
+        self.spill_count = 0
+        self.refill_count = 0
+
+        # How many messages could not be spilled over because there was no more disk space left for them
+        self.rejected_count = 0
+
+        # Start from a clean slate, with no messages left over by a previous instance of this process
+        if os.path.exists(self.base_dir):
+            rmtree(self.base_dir)
+
+# ################################################################################################################################
+
+    @property
+    def is_enabled(self) -> 'bool':
+        return self.max_disk_size > 0
+
+# ################################################################################################################################
+
+    def has_messages(self, topic_id:'int') -> 'bool':
+        queue = self.queues.get(topic_id)
+        return bool(queue and queue.depth)
+
+# ################################################################################################################################
+
+    def spill(self, topic_id:'int', max_depth:'int', sub_keys:'strlist', messages:'dictlist') -> 'bool':
+        """ Writes messages for sub_keys to disk. Returns False if there is no more disk space for them.
+        """
+        if not self.is_enabled:
+            return False
+
+        records = [dumps((sub_keys, msg), HIGHEST_PROTOCOL) for msg in messages]
+        size = sum(len(record) + _record_header_size for record in records)
+
+        if self.disk_size + size > self.max_disk_size:
+            self.rejected_count += len(messages)
+            return False
+
+        queue = self.queues.get(topic_id)
+        if not queue:
+            queue_dir = os.path.join(self.base_dir, str(topic_id))
+            os.makedirs(queue_dir, exist_ok=True)
+            queue = self.queues[topic_id] = SpillQueue(queue_dir, self.segment_size)
+
+        queue.max_depth = max_depth
+        queue.append(records)
+
+        self.disk_size += size
+        self.spill_count += len(messages)
+
+        return True
+
+# ################################################################################################################################
+
+    def refill(self, topic_id:'int', topic_depth:'int') -> 'anylist':
+        """ Reads as many (sub_keys, msg) tuples for a topic as will fit in RAM given the topic's current in-RAM depth.
+        """
+        queue = self.queues.get(topic_id)
+        if not (queue and queue.depth):
+            return []
+
+        size = queue.size
+        out = queue.read(queue.max_depth - topic_depth)
+
+        self.disk_size -= size - queue.size
+        self.refill_count += len(out)
+
+        return out
+
+# ################################################################################################################################
+
+    def clear_topic(self, topic_id:'int') -> 'None':
+        queue = self.queues.pop(topic_id, None)
+        if queue:
+            logger.info('Deleting %d spilled-over message(s) of topic id:%s', queue.depth, topic_id)
+            self.disk_size -= queue.size
+            queue.clear()
+
+# ################################################################################################################################
+
+    def get_stats(self, topic_id:'any_'=None) -> 'stranydict':
+        """ Returns information about spilled-over messages, either for a single topic or for all of them.
+        """
+        if topic_id is None:
+            queues = list(self.queues.values())
+        else:
+            queue = self.queues.get(topic_id)
+            queues = [queue] if queue else []
+
+        return {
+            'is_enabled': self.is_enabled,
+            'segment_size': self.segment_size,
+            'max_disk_size': self.max_disk_size,
+            'disk_size': self.disk_size,
+            'depth': sum(queue.depth for queue in queues),
+            'segment_count': sum(len(queue.segments) for queue in queues),
+            'spill_count': self.spill_count,
+            'refill_count': self.refill_count,
+            'rejected_count': self.rejected_count,
+        }
+
+# ################################################################################################################################
+# ################################################################################################################################
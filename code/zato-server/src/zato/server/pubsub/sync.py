@@ -10,6 +10,7 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 # stdlib
 import logging
+from heapq import heapify, heappop, heappush
 from traceback import format_exc
 
 # gevent
@@ -19,11 +20,12 @@ from gevent.lock import RLock
 # Zato
 from zato.common.api import PUBSUB
 from zato.common.exception import BadRequest
-from zato.common.typing_ import any_, anydict, anylist, anyset, anytuple, callable_, dict_, dictlist, intsetdict, strlist, \
-     strdictdict, strset, strsetdict
+from zato.common.typing_ import any_, anydict, anylist, anyset, anytuple, callable_, dict_, dictlist, intsetdict, strintdict, \
+     strlist, strdictdict, strset, strsetdict
 from zato.common.util.api import spawn_greenlet
 from zato.common.util.pubsub import make_short_msg_copy_from_dict
 from zato.common.util.time_ import utcnow_as_ms
+from zato.server.pubsub.spill import SpillStore
 
 # ################################################################################################################################
 
@@ -111,16 +113,22 @@ class InRAMSync:
     lock: 'RLock'
     pubsub: 'PubSub'
 
-    msg_id_to_msg:     'strdictdict'
-    topic_id_msg_id:   'intsetdict'
-    sub_key_to_msg_id: 'strsetdict'
-    msg_id_to_sub_key: 'strsetdict'
+    msg_id_to_msg:      'strdictdict'
+    topic_id_msg_id:    'intsetdict'
+    sub_key_to_msg_id:  'strsetdict'
+    msg_id_to_sub_key:  'strsetdict'
+    msg_id_to_topic_id: 'strintdict'
+    expiration_heap:    'anylist'
+    spill_store:        'SpillStore'
 
-    def __init__(self, pubsub:'PubSub') -> 'None':
+    def __init__(self, pubsub:'PubSub', spill_store:'SpillStore | None'=None) -> 'None':
 
         self.lock = RLock()
         self.pubsub = pubsub
 
+        # Keeps messages that do not fit in RAM - if not given on input, no messages will be spilled over to disk
+        self.spill_store = spill_store or SpillStore('', 0, 0)
+
         # Msg ID   -> Message data - What is the actual contents of each message
         self.msg_id_to_msg = {}
 
@@ -133,6 +141,14 @@ class InRAMSync:
         # Msg ID   -> Sub key set  - What subscribers are interested in a given message
         self.msg_id_to_sub_key = {}
 
+        # Msg ID   -> Topic ID ----- What topic a given message was published to
+        self.msg_id_to_topic_id = {}
+
+        # A min-heap of (expiration_time, msg_id) tuples, thanks to which the cleanup task looks up only expired messages.
+        # Messages are not removed from it when they are deleted - such entries are skipped when they are popped and,
+        # should there be too many of them, the heap is rebuilt from messages still in the backlog.
+        self.expiration_heap = []
+
         # Start in background a cleanup task that deletes all expired and removed messages
         _ = spawn_greenlet(self.run_cleanup_task)
 
@@ -146,56 +162,122 @@ class InRAMSync:
         max_depth,  # type: int
         sub_keys,   # type: strlist
         messages,   # type: dictlist
-        _default_pri=_default_pri # type: int
     ) -> 'None':
         """ Adds all input messages to sub_keys for the topic.
         """
         with self.lock:
 
             # Local aliases
-            msg_ids = [msg['pub_msg_id'] for msg in messages]
             len_messages = len(messages)
             topic_messages = self.topic_id_msg_id.setdefault(topic_id, set())
+            has_room = len(topic_messages) + len_messages <= max_depth
+
+            # If there are already any spilled-over messages for the topic, new ones need to wait behind them
+            # to preserve the order of publication. Otherwise, they are spilled over only if they would overflow
+            # the topic's depth ..
+            if self.spill_store.has_messages(topic_id) or not has_room:
+                if self.spill_store.spill(topic_id, max_depth, sub_keys, messages):
+                    return
+
+            # .. if they cannot be spilled over to disk and would exceed the max depth, store them in log files only ..
+            if not has_room:
+                for sub_key in sub_keys:
+                    self.log_messages_to_store(cid, topic_name, max_depth, sub_key, messages)
 
-            # Try to append the messages for each of their subscribers ..
-            for sub_key in sub_keys:
+            # .. otherwise, we make it known that the sub_keys are interested in these messages.
+            self._add_messages(topic_id, sub_keys, messages, has_room)
 
-                # .. but first, make sure that storing these messages would not overflow the topic's depth,
-                # if it could exceed the max depth, store the messages in log files only ..
-                if len(topic_messages) + len_messages > max_depth:
-                    self.log_messages_to_store(cid, topic_name, max_depth, sub_key, messages)
+# ################################################################################################################################
 
-                    # .. skip this sub_key in such a case ..
-                    continue
+    def _add_messages(
+        self,
+        topic_id,   # type: int
+        sub_keys,   # type: strlist
+        messages,   # type: dictlist
+        has_sub_key_msg, # type: bool
+        _default_pri=_default_pri # type: int
+    ) -> 'None':
+        """ Low-level implementation of self.add_messages - must be called with self.lock held.
+        """
+        # Local aliases
+        msg_ids = [msg['pub_msg_id'] for msg in messages]
+        topic_messages = self.topic_id_msg_id.setdefault(topic_id, set())
 
-                # .. otherwise, we make it known that the sub_key is interested in this message ..
+        # Make it known that each sub_key is interested in this message, unless the topic's depth is exceeded ..
+        if has_sub_key_msg:
+            for sub_key in sub_keys:
                 sub_key_msg = self.sub_key_to_msg_id.setdefault(sub_key, set())
                 sub_key_msg.update(msg_ids)
 
-            # For each message given on input, store its actual contents ..
-            for msg in messages:
-                self.msg_id_to_msg[msg['pub_msg_id']] = msg
+        # For each message given on input, store its actual contents ..
+        for msg in messages:
+            self.msg_id_to_msg[msg['pub_msg_id']] = msg
+
+            # We received timestamps as strings whereas our recipients require floats
+            # so we need to do the conversion here.
+            msg['pub_time'] = float(msg['pub_time'])
+            if msg.get('ext_pub_time'):
+                msg['ext_pub_time'] = float(msg['ext_pub_time'])
+
+            # .. attach server metadata ..
+            msg['server_name'] = self.pubsub.server.name
+            msg['server_pid'] = self.pubsub.server.pid
+
+            # .. set default priority if none was given ..
+            if 'priority' not in msg:
+                msg['priority'] = _default_pri
 
-                # We received timestamps as strings whereas our recipients require floats
-                # so we need to do the conversion here.
-                msg['pub_time'] = float(msg['pub_time'])
-                if msg.get('ext_pub_time'):
-                    msg['ext_pub_time'] = float(msg['ext_pub_time'])
+            # .. add a reverse mapping, from message ID to sub_key ..
+            msg_sub_key = self.msg_id_to_sub_key.setdefault(msg['pub_msg_id'], set())
+            msg_sub_key.update(sub_keys)
 
-                # .. attach server metadata ..
-                msg['server_name'] = self.pubsub.server.name
-                msg['server_pid'] = self.pubsub.server.pid
+            # .. and to the topic ..
+            self.msg_id_to_topic_id[msg['pub_msg_id']] = topic_id
 
-                # .. set default priority if none was given ..
-                if 'priority' not in msg:
-                    msg['priority'] = _default_pri
+            # .. make the message known to the cleanup task ..
+            heappush(self.expiration_heap, (msg['expiration_time'], msg['pub_msg_id']))
 
-                # .. add a reverse mapping, from message ID to sub_key ..
-                msg_sub_key = self.msg_id_to_sub_key.setdefault(msg['pub_msg_id'], set())
-                msg_sub_key.update(sub_keys)
+        # .. and add a reference to it to the topic.
+        topic_messages.update(msg_ids)
 
-            # .. and add a reference to it to the topic.
-            topic_messages.update(msg_ids)
+# ################################################################################################################################
+
+    def refill_from_spill(
+        self,
+        topic_id,        # type: int
+        active_sub_keys, # type: any_
+        _utcnow=utcnow_as_ms # type: callable_
+    ) -> 'int':
+        """ Moves as many spilled-over messages of a topic back to RAM as its max. depth allows, skipping sub_keys
+        that are no longer in active_sub_keys. Returns how many messages were moved.
+        """
+        with self.lock:
+
+            now = _utcnow()
+            out = 0
+
+            # Messages read from disk may all turn out to be skipped, in which case we keep reading,
+            # so that the next batch is not left on disk until something else is published to the topic.
+            while not out and self.spill_store.has_messages(topic_id):
+
+                topic_depth = len(self.topic_id_msg_id.get(topic_id, ()))
+                refilled = self.spill_store.refill(topic_id, topic_depth)
+
+                # The topic's in-RAM backlog is full already
+                if not refilled:
+                    break
+
+                for sub_keys, msg in refilled:
+
+                    # Messages may have expired while they were on disk, as may have subscriptions ..
+                    sub_keys = [sub_key for sub_key in sub_keys if sub_key in active_sub_keys]
+
+                    # .. so only the remaining ones are moved back.
+                    if sub_keys and now < msg['expiration_time']:
+                        self._add_messages(topic_id, sub_keys, [msg], True)
+                        out += 1
+
+            return out
 
 # ################################################################################################################################
 
@@ -216,6 +298,9 @@ class InRAMSync:
                 for attr in _update_attrs:
                     _msg[attr] = msg[attr]
 
+                # The message may expire earlier now - if it expires later, the previous entry will be skipped.
+                heappush(self.expiration_heap, (_msg['expiration_time'], _msg['pub_msg_id']))
+
                 # Ok, found and updated
                 return True
 
@@ -226,6 +311,34 @@ class InRAMSync:
         """
         self.delete_messages([msg_id])
 
+# ################################################################################################################################
+
+    def _remove_msg(self, msg_id:'str') -> 'anytuple':
+        """ Removes all references to a message, using reverse mappings to find the topic and sub_keys that hold it.
+        Returns the message's sub_keys and contents along with flags indicating whether it was found for its topic
+        and for any sub_key. Must be called with self.lock held.
+        """
+        found_to_sub_key = self.msg_id_to_sub_key.pop(msg_id, None)
+        found_to_msg = self.msg_id_to_msg.pop(msg_id, None)
+        topic_id = self.msg_id_to_topic_id.pop(msg_id, None)
+
+        _has_topic_msg = False # Was the ID found for its topic
+        _has_sk_msg = False    # Ditto but for at least one sub_key
+
+        _topic_msg_set = self.topic_id_msg_id.get(topic_id) # type: ignore
+        if _topic_msg_set and msg_id in _topic_msg_set:
+            _topic_msg_set.remove(msg_id)
+            _has_topic_msg = True
+
+        # Note that a sub_key may not have the message if the topic's max depth was reached when the message was added
+        for sub_key in found_to_sub_key or ():
+            _sk_msg_set = self.sub_key_to_msg_id.get(sub_key)
+            if _sk_msg_set and msg_id in _sk_msg_set:
+                _sk_msg_set.remove(msg_id)
+                _has_sk_msg = True
+
+        return found_to_sub_key, found_to_msg, _has_topic_msg, _has_sk_msg
+
 # ################################################################################################################################
 
     def _delete_messages(self, msg_list:'strlist') -> 'None':
@@ -235,27 +348,7 @@ class InRAMSync:
 
         for msg_id in list(msg_list):
 
-            found_to_sub_key = self.msg_id_to_sub_key.pop(msg_id, None)
-            found_to_msg = self.msg_id_to_msg.pop(msg_id, None)
-
-            _has_topic_msg = False # Was the ID found for at least one topic
-            _has_sk_msg = False     # Ditto but for sub_keys
-
-            for _topic_msg_set in self.topic_id_msg_id.values():
-                try:
-                    _ = _topic_msg_set.remove(msg_id)
-                except KeyError:
-                    pass # This is fine, msg_id did not belong to this topic
-                else:
-                    _has_topic_msg = True
-
-            for _sk_msg_set in self.sub_key_to_msg_id.values():
-                try:
-                    _ = _sk_msg_set.remove(msg_id)
-                except KeyError:
-                    pass # This is fine, msg_id did not belong to this topic
-                else:
-                    _has_sk_msg = True
+            found_to_sub_key, found_to_msg, _has_topic_msg, _has_sk_msg = self._remove_msg(msg_id)
 
             if not found_to_sub_key:
                 logger.warning('Message not found (msg_id_to_sub_key) %s', msg_id)
@@ -306,6 +399,9 @@ class InRAMSync:
                     'Did not find any non-GD messages to delete for topic `%s`',
                     self.pubsub.get_topic_by_id(topic_id))
 
+            # Messages that did not fit in RAM are deleted too
+            self.spill_store.clear_topic(topic_id)
+
 # ################################################################################################################################
 
     def get_delete_messages_by_sub_keys(
@@ -363,13 +459,19 @@ class InRAMSync:
 
             # .. first, direct mappings ..
             _ = self.msg_id_to_msg.pop(msg_id, None)
-
-            logger.info('Deleting msg from mapping dict `%s`, before:`%s`', msg_id, self.msg_id_to_msg)
+            _ = self.msg_id_to_topic_id.pop(msg_id, None)
 
             # .. now, remove the message from topic ..
             self.topic_id_msg_id[topic_id].remove(msg_id)
 
-            logger.info('Deleting msg from mapping topic `%s`, after:`%s`', msg_id, self.topic_id_msg_id)
+            logger.info('Deleted msg `%s` from topic `%s`', msg_id, topic_id)
+
+            # .. the message is no longer waiting for these sub_keys ..
+            msg_sub_keys = self.msg_id_to_sub_key.get(msg_id)
+            if msg_sub_keys is not None:
+                msg_sub_keys.difference_update(sub_keys)
+                if not msg_sub_keys:
+                    del self.msg_id_to_sub_key[msg_id]
 
             # .. now, find the message for each sub_key ..
             for sub_key in sub_keys:
@@ -484,79 +586,107 @@ class InRAMSync:
 
                     # .. if the list is empty, it means that there no some subscribers left for that message,
                     # in which case we may deleted references to this message from other look-up structures.
+                    # Note that the message itself may have been already retrieved by another subscriber.
                     if not current_subs:
-                        del self.msg_id_to_msg[msg_id]
+                        _ = self.msg_id_to_msg.pop(msg_id, None)
+                        _ = self.msg_id_to_topic_id.pop(msg_id, None)
+                        del self.msg_id_to_sub_key[msg_id]
                         topic_msg = self.topic_id_msg_id[topic_id]
-                        topic_msg.remove(msg_id)
+                        topic_msg.discard(msg_id)
 
         logger.info(pattern, sub_keys, topic_name)
         logger_zato.info(pattern, sub_keys, topic_name)
 
 # ################################################################################################################################
 
-    def run_cleanup_task(self, _utcnow:'callable_'=utcnow_as_ms, _sleep:'callable_'=sleep) -> 'None':
-        """ A background task waking up periodically to remove all expired and retrieved messages from backlog.
+    def _get_expired_msg_ids(self, now:'float') -> 'strlist':
+        """ Pops from the expiration heap and returns IDs of all the messages that have expired.
+        Must be called with self.lock held.
+        """
+        # A dict rather than a set to keep the order of expiration
+        out = {} # type: anydict
+
+        heap = self.expiration_heap
+
+        while heap and heap[0][0] <= now:
+            _, msg_id = heappop(heap)
+
+            # The message may have been already deleted or its expiration time may have been changed,
+            # in which case there may be more than one entry for it.
+            msg = self.msg_id_to_msg.get(msg_id)
+            if msg and now >= msg['expiration_time']:
+                out[msg_id] = None
+
+        return list(out)
+
+# ################################################################################################################################
+
+    def _compact_expiration_heap(self) -> 'None':
+        """ Rebuilds the expiration heap if most of its entries point to messages that were already deleted.
+        Must be called with self.lock held.
+        """
+        if len(self.expiration_heap) > 2 * len(self.msg_id_to_msg) + 1000:
+            self.expiration_heap = [(msg['expiration_time'], msg_id) for msg_id, msg in self.msg_id_to_msg.items()]
+            heapify(self.expiration_heap)
+
+# ################################################################################################################################
+
+    def delete_expired_messages(self, now:'float') -> 'int':
+        """ Deletes all messages that expired as of now and returns how many were deleted.
+        Must be called with self.lock held.
         """
 
         # Forward declarations
         msg_id:   'str'
-        sub_key:  'str'
-        topic_id: 'int'
-
-        while True:
-            try:
-                with self.lock:
 
-                    # Local alias
-                    publishers = {} # type: dict_[int, Endpoint]
+        # Local alias
+        publishers = {} # type: dict_[int, Endpoint]
 
-                    # We keep them separate so as not to modify any objects during iteration.
-                    expired_msg = [] # type: anylist
+        # We keep them separate so as not to modify any objects during iteration.
+        expired_msg = self._get_expired_msg_ids(now)
 
-                    # Calling it once will suffice.
-                    now = _utcnow()
+        for msg_id in expired_msg:
 
-                    for _, msg in self.msg_id_to_msg.items():
+            msg = self.msg_id_to_msg[msg_id]
 
-                        if now >= msg['expiration_time']:
+            # It's possible that there will be many expired messages all sent by the same publisher
+            # so there is no need to query self.pubsub for each message.
+            if msg['published_by_id'] not in publishers:
+                publishers[msg['published_by_id']] = self.pubsub.get_endpoint_by_id(msg['published_by_id'])
 
-                            # It's possible that there will be many expired messages all sent by the same publisher
-                            # so there is no need to query self.pubsub for each message.
-                            if msg['published_by_id'] not in publishers:
-                                publishers[msg['published_by_id']] = self.pubsub.get_endpoint_by_id(msg['published_by_id'])
+            # We can be sure that it is always found
+            publisher = publishers[msg['published_by_id']] # type: Endpoint
 
-                            # We can be sure that it is always found
-                            publisher = publishers[msg['published_by_id']] # type: Endpoint
+            # Log the message to make sure the expiration event is always logged ..
+            logger_zato.info('Found an expired msg:`%s`, topic:`%s`, publisher:`%s`, pub_time:`%s`, exp:`%s`',
+                msg['pub_msg_id'], msg['topic_name'], publisher.name, msg['pub_time'], msg['expiration'])
 
-                            # Log the message to make sure the expiration event is always logged ..
-                            logger_zato.info('Found an expired msg:`%s`, topic:`%s`, publisher:`%s`, pub_time:`%s`, exp:`%s`',
-                                msg['pub_msg_id'], msg['topic_name'], publisher.name, msg['pub_time'], msg['expiration'])
+            # .. and delete it from in-RAM structures.
+            _ = self._remove_msg(msg_id)
 
-                            # .. and append it to the list of messages to be deleted.
-                            expired_msg.append((msg['pub_msg_id'], msg['topic_id']))
+        # Make sure entries of deleted messages do not accumulate
+        self._compact_expiration_heap()
 
-                    # For logging what was done
-                    len_expired = len(expired_msg)
+        return len(expired_msg)
 
-                    # Iterate over all the expired messages found and delete them from in-RAM structures
-                    for msg_id, topic_id in expired_msg:
+# ################################################################################################################################
 
-                        # Get all sub_keys waiting for these messages and delete the message from each one,
-                        # but note that there may be possibly no subscribers at all if the message was published
-                        # to a topic without any subscribers.
-                        for sub_key in self.msg_id_to_sub_key.pop(msg_id):
-                            self.sub_key_to_msg_id[sub_key].remove(msg_id)
+    def run_cleanup_task(self, _utcnow:'callable_'=utcnow_as_ms, _sleep:'callable_'=sleep) -> 'None':
+        """ A background task waking up periodically to remove all expired and retrieved messages from backlog.
+        """
+        while True:
+            try:
+                with self.lock:
 
-                        # Remove all references to the message from topic
-                        self.topic_id_msg_id[topic_id].remove(msg_id)
+                    # Calling it once will suffice.
+                    len_expired = self.delete_expired_messages(_utcnow())
 
-                        # And finally, remove the message's contents
-                        del self.msg_id_to_msg[msg_id]
+                    # For logging what was done
+                    len_messages = len(self.msg_id_to_msg)
 
-                suffix = 's' if (len_expired==0 or len_expired > 1) else ''
-                len_messages = len(self.msg_id_to_msg)
-                if len_expired or len_messages:
-                    logger.info('In-RAM. Deleted %s pub/sub message%s. Left:%s' % (len_expired, suffix, self.msg_id_to_msg))
+                if len_expired:
+                    suffix = '' if len_expired == 1 else 's'
+                    logger.info('In-RAM. Deleted %s pub/sub message%s. Left:%s', len_expired, suffix, len_messages)
 
                 # Sleep for a moment before checking again but don't do it with self.lock held.
                 _sleep(2)
@@ -771,6 +771,9 @@ class Service:
             # Assumes it goes fine by default
             e, exc_formatted = None, None
 
+            # Set only if the service was actually invoked, e.g. it was not rejected by rate limiting
+            invocation_time = None
+
             try:
 
                 # Check rate limiting first - note the usage of 'service' rather than 'self',
@@ -784,7 +787,7 @@ class Service:
                 if service.server.component_enabled.stats:
                     service.server.current_usage.incr(service.name)
 
-                service.invocation_time = _utcnow()
+                service.invocation_time = invocation_time = _utcnow()
 
                 # Check if there is a JSON Schema validator attached to the service and if so,
                 # validate input before proceeding any further.
@@ -840,6 +843,13 @@ class Service:
                 e = ex
                 exc_formatted = format_exc()
             finally:
+
+                # Statistics include response times of each service too, in milliseconds, no matter if it succeeded or not,
+                # because invocations that failed, e.g. because they timed out, are often the slowest ones.
+                if invocation_time and service.server.component_enabled.stats:
+                    duration = (_utcnow() - invocation_time).total_seconds() * 1000
+                    service.server.current_usage.set_last_duration(service.name, duration)
+
                 try:
 
                     # This obtains the response
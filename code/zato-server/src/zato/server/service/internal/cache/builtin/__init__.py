@@ -8,9 +8,6 @@ Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-# dictalchemy
-from dictalchemy.utils import asdict
-
 # Python 2/3 compatibility
 from six import add_metaclass
 
@@ -19,6 +16,7 @@ from zato.common.api import CACHE as _COMMON_CACHE
 from zato.common.broker_message import CACHE
 from zato.common.odb.model import CacheBuiltin
 from zato.common.odb.query import cache_builtin_list
+from zato.common.util.sql import get_dict_with_opaque
 from zato.server.service import Bool, Int
 from zato.server.service.internal import AdminService, AdminSIO
 from zato.server.service.internal.cache import common_instance_hook
@@ -34,7 +32,9 @@ list_func = cache_builtin_list
 skip_create_integrity_error = True
 skip_if_exists = True
 skip_input_params = ['cache_id']
-output_optional_extra = ['current_size', 'cache_id']
+input_optional_extra = ['key_index', Int('sync_batch_window'), Int('sync_batch_size'), Int('max_bytes'), 'storage']
+output_optional_extra = ['current_size', 'cache_id', 'key_index', Int('sync_batch_window'), Int('sync_batch_size'),
+    Int('max_bytes'), 'storage', Int('expiry_examined'), Int('expiry_examined_total'), Int('current_bytes'), Int('peak_bytes')]
 
 # ################################################################################################################################
 
@@ -76,6 +76,7 @@ def response_hook(self, input, _ignored, attrs, service_type):
 
             try:
                 item.current_size = self.cache.get_size(_COMMON_CACHE.TYPE.BUILTIN, item.name)
+                item.update(self.cache.get_stats(_COMMON_CACHE.TYPE.BUILTIN, item.name))
             except KeyError:
                 item.current_size = 0
 
@@ -95,10 +96,13 @@ class Get(AdminService):
         output_required = ('name', 'is_active', 'is_default', 'cache_type', Int('max_size'), Int('max_item_size'),
             Bool('extend_expiry_on_get'), Bool('extend_expiry_on_set'), 'sync_method', 'persistent_storage',
             Int('current_size'))
+        output_optional = ('key_index', Int('sync_batch_window'), Int('sync_batch_size'), Int('max_bytes'), 'storage',
+            Int('expiry_examined'), Int('expiry_examined_total'), Int('current_bytes'), Int('peak_bytes'))
 
     def handle(self):
-        response = asdict(self.server.odb.get_cache_builtin(self.server.cluster_id, self.request.input.cache_id))
+        response = get_dict_with_opaque(self.server.odb.get_cache_builtin(self.server.cluster_id, self.request.input.cache_id))
         response['current_size'] = self.cache.get_size(_COMMON_CACHE.TYPE.BUILTIN, response['name'])
+        response.update(self.cache.get_stats(_COMMON_CACHE.TYPE.BUILTIN, response['name']))
 
         self.response.payload = response
 
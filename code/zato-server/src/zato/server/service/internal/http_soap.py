@@ -837,3 +837,13 @@ class GetURLSecurity(AdminService):
         self.response.content_type = 'application/json'
 
 # ################################################################################################################################
+
+class GetURLCacheStats(AdminService):
+    """ Returns a JSON document with statistics of the cache of URL paths matched to channels in the current worker process.
+    """
+    def handle(self):
+        response = self.worker_store.request_dispatcher.url_data.get_url_cache_stats()
+        self.response.payload = dumps(response, sort_keys=True, indent=4)
+        self.response.content_type = 'application/json'
+
+# ################################################################################################################################
@@ -97,3 +97,20 @@ class GetWorkerPids(Service):
         self.response.payload.pids = get_worker_pids(self.server.base_dir)
 
 # ################################################################################################################################
+
+class InvalidateWorkerPids(Service):
+    """ Makes current process read PIDs of all the processes of current server again the next time it needs them.
+    """
+    def handle(self):
+        self.server.invalidate_worker_pids()
+
+# ################################################################################################################################
+
+class GetBrokerQueueStats(Service):
+    """ Returns statistics of the queue that current process sends its messages to all the servers through.
+    """
+    def handle(self):
+        self.response.content_type = 'application/json'
+        self.response.payload = dumps(self.server.broker_client.get_outbound_queue_stats())
+
+# ################################################################################################################################
@@ -538,6 +538,49 @@ class CollectNonGDDepth(AdminService):
 # ################################################################################################################################
 # ################################################################################################################################
 
+class GetNonGDSpillStats(AdminService):
+    """ Returns statistics of non-GD messages spilled over to disk on current server, for the input topic or for all of them.
+    """
+    class SimpleIO:
+        input_optional = ('topic_name',)
+        output_optional:'anytuple' = (Bool('is_enabled'), Int('segment_size'), Int('max_disk_size'), Int('disk_size'),
+            Int('depth'), Int('segment_count'), Int('spill_count'), Int('refill_count'), Int('rejected_count'))
+        response_elem = None
+
+    def handle(self) -> 'None':
+        self.response.payload = self.pubsub.get_non_gd_spill_stats(self.request.input.topic_name or '')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class CollectNonGDSpillStats(AdminService):
+    """ Collects statistics of non-GD messages spilled over to disk from all servers, for the input topic or for all of them.
+    """
+    class SimpleIO:
+        input_optional = ('topic_name',)
+        output_optional:'anytuple' = (Int('disk_size'), Int('depth'), Int('segment_count'), Int('spill_count'),
+            Int('refill_count'), Int('rejected_count'), AsIs('servers'))
+
+    def handle(self) -> 'None':
+
+        reply = self.server.rpc.invoke_all('zato.pubsub.topic.get-non-gd-spill-stats', {
+            'topic_name':self.request.input.topic_name
+            }, timeout=10)
+
+        # Sum up what each server returned
+        keys = ['disk_size', 'depth', 'segment_count', 'spill_count', 'refill_count', 'rejected_count']
+        totals = dict.fromkeys(keys, 0) # type: anydict
+
+        for response in reply.data:
+            for key in totals:
+                totals[key] += response[key]
+
+        totals['servers'] = reply.data
+        self.response.payload = totals
+
+# ################################################################################################################################
+# ################################################################################################################################
+
 class GetTopicMetadata(AdminService):
 
     def handle(self) -> 'None':
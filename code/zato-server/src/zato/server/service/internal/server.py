@@ -16,6 +16,7 @@ from traceback import format_exc
 from six import add_metaclass
 
 # Zato
+from zato.common.broker_message import CLUSTER
 from zato.common.exception import ZatoException
 from zato.common.odb.model import Server
 from zato.common.odb.query import server_list
@@ -70,11 +71,19 @@ class Edit(AdminService):
 
             try:
                 item = session.query(Server).filter_by(id=self.request.input.id).one()
+                old_name = item.name
                 item.name = self.request.input.name
 
                 session.add(item)
                 session.commit()
 
+                # The server is known to other ones under its new name now
+                if old_name != item.name:
+                    self.broker_client.publish({
+                        'action': CLUSTER.SERVER_LEFT.value,
+                        'server_name': old_name,
+                    })
+
                 self.response.payload = item
 
                 for name in('last_join_mod_date', 'up_mod_date'):
@@ -139,10 +148,18 @@ class Delete(AdminService):
                     self.logger.error(msg)
                     raise ZatoException(self.cid, msg)
 
+                # Read it before the object is deleted
+                server_name = server.name
+
                 # This will cascade and delete every related object
                 session.delete(server)
                 session.commit()
 
+                self.broker_client.publish({
+                    'action': CLUSTER.SERVER_LEFT.value,
+                    'server_name': server_name,
+                })
+
             except Exception:
                 session.rollback()
                 msg = 'Could not delete the server, e:`{}`'.format(format_exc())
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import os
+from base64 import b64decode, b64encode
+from multiprocessing import get_context
+from pickle import dumps as pickle_dumps, loads as pickle_loads
+from queue import Empty
+from random import Random
+from tempfile import TemporaryFile
+from time import perf_counter, time
+
+# Zato
+from zato.cache import Cache
+from zato.server.connection.cache_shared import encode_key, encode_value, hash_key, SharedTable
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many worker processes to run each benchmark with
+worker_counts = [4, 8]
+
+# How many operations each worker carries out and which part of them are writes
+ops_per_worker = 50_000
+set_ratio = 0.1
+
+# How many distinct keys there are and how big each value is
+key_count = 10_000
+value_size = 100
+
+# How often a worker with a synced cache applies updates received from other workers
+drain_every = 100
+
+max_size = key_count
+data_size = key_count * (value_size + 200)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_ops(worker_idx:'int') -> 'list':
+    random = Random(worker_idx)
+    value = 'v' * value_size
+    return [(random.random() < set_ratio, 'key-{}'.format(random.randrange(key_count)), value) for _ in range(ops_per_worker)]
+
+# ################################################################################################################################
+
+def run_shared_worker(fd_path:'str', worker_idx:'int', barrier:'any_', results:'any_') -> 'None':
+
+    # Each worker maps the memory through its own descriptor, as server workers do
+    fd = os.open(fd_path, os.O_RDWR)
+    table = SharedTable(fd, max_size, data_size, b'b' * 16)
+    table.open()
+
+    ops = get_ops(worker_idx)
+    _ = barrier.wait()
+
+    start = perf_counter()
+    for is_set, key, value in ops:
+        key = encode_key(key)
+        key_hash = hash_key(key)
+        now = time()
+
+        if is_set:
+            value_type, value = encode_value(value)
+            _ = table.set(key, key_hash, value_type, value, 0.0, now, False)
+        else:
+            _ = table.get(key, key_hash, now, False)
+
+    results.put(perf_counter() - start)
+
+# ################################################################################################################################
+
+def run_synced_worker(worker_idx:'int', queues:'list', expected:'int', barrier:'any_', results:'any_') -> 'None':
+
+    # A model of what built-in caches do - each worker keeps its own copy of data and each write is pickled,
+    # base64-encoded and sent to all the other workers, which apply it to their copies.
+    cache = Cache(max_size)
+    inbox = queues[worker_idx]
+    others = [queue for idx, queue in enumerate(queues) if idx != worker_idx]
+    received = 0
+
+    def drain(block:'bool') -> 'int':
+        count = 0
+        while True:
+            try:
+                msg = inbox.get(block)
+            except Empty:
+                return count
+            key, value = pickle_loads(b64decode(msg))
+            _ = cache.set(key, value, 0.0, False)
+            count += 1
+            if block:
+                return count
+
+    ops = get_ops(worker_idx)
+    _ = barrier.wait()
+
+    start = perf_counter()
+    for idx, (is_set, key, value) in enumerate(ops):
+
+        if is_set:
+            _ = cache.set(key, value, 0.0, False)
+            msg = b64encode(pickle_dumps((key, value)))
+            for queue in others:
+                queue.put(msg)
+        else:
+            _ = cache.get(key, None, False)
+
+        if idx % drain_every == 0:
+            received += drain(False)
+
+    # The worker is done only once it has applied all the updates from the other workers
+    while received < expected:
+        received += drain(True)
+
+    results.put(perf_counter() - start)
+
+# ################################################################################################################################
+
+def run(name:'str', worker_count:'int') -> 'float':
+
+    context = get_context('fork')
+    barrier = context.Barrier(worker_count)
+    results = context.Queue()
+    processes = []
+
+    if name == 'shared':
+        shared_file = TemporaryFile()
+        fd_path = '/proc/{}/fd/{}'.format(os.getpid(), shared_file.fileno())
+
+        for worker_idx in range(worker_count):
+            processes.append(context.Process(target=run_shared_worker, args=(fd_path, worker_idx, barrier, results)))
+    else:
+        queues = [context.Queue() for _ in range(worker_count)]
+        set_counts = [sum(1 for is_set, _, _ in get_ops(worker_idx) if is_set) for worker_idx in range(worker_count)]
+
+        for worker_idx in range(worker_count):
+            expected = sum(set_counts) - set_counts[worker_idx]
+            processes.append(context.Process(target=run_synced_worker, args=(
+                worker_idx, queues, expected, barrier, results)))
+
+    for process in processes:
+        process.start()
+
+    elapsed = max(results.get() for _ in range(worker_count))
+
+    for process in processes:
+        process.join()
+
+    return worker_count * ops_per_worker / elapsed
+
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    template = '{:>8} {:>8} {:>14} {:>20}'
+
+    print(template.format('workers', 'impl', 'ops/s', 'copies of each entry'))
+
+    for worker_count in worker_counts:
+        for name, copies in (('synced', worker_count), ('shared', 1)):
+            rate = run(name, worker_count)
+            print(template.format(worker_count, name, '{:,.0f}'.format(rate), copies))
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Must come first
+from gevent.monkey import patch_all
+_ = patch_all()
+
+# stdlib
+import os
+from fcntl import flock, LOCK_EX, LOCK_UN
+from random import Random
+from tempfile import TemporaryFile
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep, spawn
+
+# Zato
+from zato.server.connection.cache_shared import decode_key, decode_value, encode_key, encode_value, hash_key, SharedTable
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+_generation = b'z' * 16
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SharedTableTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.files = []
+
+    def tearDown(self) -> 'None':
+        for f in self.files:
+            f.close()
+
+    def _get_table(self, max_size:'int', data_size:'int') -> 'SharedTable':
+        f = TemporaryFile()
+        self.files.append(f)
+
+        table = SharedTable(f.fileno(), max_size, data_size, _generation)
+        table.open()
+
+        return table
+
+    def _set(self, table:'SharedTable', key:'any_', value:'any_', expiry:'float'=0.0, now:'float'=1.0) -> 'any_':
+        key = encode_key(key)
+        value_type, value = encode_value(value)
+        return table.set(key, hash_key(key), value_type, value, expiry, now, False)
+
+    def _get(self, table:'SharedTable', key:'any_', now:'float'=1.0, extend_expiry:'bool'=False) -> 'any_':
+        key = encode_key(key)
+        result = table.get(key, hash_key(key), now, extend_expiry)
+        if result is not None:
+            return decode_value(result[0], result[1])
+
+    def _items(self, table:'SharedTable', now:'float'=1.0) -> 'dict':
+        return {decode_key(key): decode_value(value_type, value) for key, value_type, value in table.items(now)}
+
+    def _open_fd(self, table:'SharedTable') -> 'int':
+        """ Opens the memory of a table through a new file descriptor, like another process would.
+        """
+        fd = os.open('/proc/self/fd/{}'.format(table.fd), os.O_RDWR)
+        self.addCleanup(os.close, fd)
+        return fd
+
+# ################################################################################################################################
+
+    def test_key_and_value_types(self) -> 'None':
+
+        table = self._get_table(10, 10_000)
+
+        self._set(table, 'abc', 'str')
+        self._set(table, b'abc', b'bytes')
+        self._set(table, 123, 456)
+        self._set(table, '123', {'a':[1, 2.0]})
+
+        self.assertDictEqual(self._items(table), {
+            'abc': 'str',
+            b'abc': b'bytes',
+            123: 456,
+            '123': {'a':[1, 2.0]},
+        })
+
+# ################################################################################################################################
+
+    def test_set_get_delete(self) -> 'None':
+
+        table = self._get_table(10, 10_000)
+
+        self.assertIsNone(self._set(table, 'key1', 'value1'))
+        self.assertEqual(self._get(table, 'key1'), 'value1')
+
+        # Shorter values are stored in place of the previous ones, longer ones are stored anew
+        prev_type, prev_value = self._set(table, 'key1', 'v')
+        self.assertEqual(decode_value(prev_type, prev_value), 'value1')
+        self.assertEqual(self._get(table, 'key1'), 'v')
+
+        self._set(table, 'key1', 'a much longer value')
+        self.assertEqual(self._get(table, 'key1'), 'a much longer value')
+        self.assertEqual(len(table), 1)
+
+        key = encode_key('key1')
+        value_type, value = table.delete(key, hash_key(key))
+        self.assertEqual(decode_value(value_type, value), 'a much longer value')
+
+        self.assertIsNone(table.delete(key, hash_key(key)))
+        self.assertIsNone(self._get(table, 'key1'))
+        self.assertEqual(len(table), 0)
+
+# ################################################################################################################################
+
+    def test_expiry(self) -> 'None':
+
+        table = self._get_table(10, 10_000)
+        self._set(table, 'key1', 'value1', expiry=5.0, now=100.0)
+
+        key = encode_key('key1')
+
+        # Reading the entry may prolong its expiry ..
+        self.assertEqual(table.get(key, hash_key(key), 104.0, False)[3], 105.0)
+        self.assertEqual(table.get(key, hash_key(key), 104.0, True)[3], 109.0)
+
+        # .. but once it expires, it is gone.
+        self.assertIsNone(self._get(table, 'key1', now=109.0))
+        self.assertEqual(len(table), 0)
+
+        self._set(table, 'key2', 'value2', expiry=5.0, now=100.0)
+        self._set(table, 'key3', 'value3', now=100.0)
+
+        deleted = table.delete_expired(200.0)
+
+        self.assertListEqual([decode_key(elem) for elem in deleted], ['key2'])
+        self.assertDictEqual(self._items(table, now=200.0), {'key3': 'value3'})
+
+# ################################################################################################################################
+
+    def test_delete_expired_once_per_interval(self) -> 'None':
+
+        table = self._get_table(10, 10_000)
+
+        other = SharedTable(self._open_fd(table), 10, 10_000, _generation)
+        other.open()
+
+        self._set(table, 'key1', 'value1', expiry=5.0, now=100.0)
+        self._set(table, 'key2', 'value2', expiry=5.0, now=200.0)
+
+        # The first process to sweep the table in an interval deletes what expired ..
+        self.assertListEqual([decode_key(elem) for elem in table.delete_expired(200.0, 5)], ['key1'])
+
+        # .. other ones do not scan it again in the same interval ..
+        self.assertListEqual(other.delete_expired(204.0, 5), [])
+
+        # .. and the next interval can be swept by any of them.
+        self.assertListEqual([decode_key(elem) for elem in other.delete_expired(206.0, 5)], ['key2'])
+
+# ################################################################################################################################
+
+    def test_lock_does_not_block_greenlets(self) -> 'None':
+
+        table = self._get_table(10, 10_000)
+        self._set(table, 'key1', 'value1')
+
+        # Another process holds the lock ..
+        fd = self._open_fd(table)
+        flock(fd, LOCK_EX)
+
+        # .. so reading from the table has to wait ..
+        reader = spawn(self._get, table, 'key1')
+        sleep(0.05)
+        self.assertFalse(reader.ready())
+
+        # .. yet it does not block other greenlets, which is why we can release the lock here ..
+        flock(fd, LOCK_UN)
+
+        # .. and the reader can proceed.
+        self.assertEqual(reader.get(timeout=1), 'value1')
+
+# ################################################################################################################################
+
+    def test_eviction_by_size(self) -> 'None':
+
+        table = self._get_table(4, 10_000)
+
+        for idx in range(4):
+            self._set(table, idx, idx)
+
+        # Keys that were read recently are not evicted first
+        self._get(table, 0)
+        self._get(table, 1)
+
+        self._set(table, 4, 4)
+
+        self.assertEqual(len(table), 4)
+        self.assertIn(0, self._items(table))
+        self.assertIn(1, self._items(table))
+        self.assertIn(4, self._items(table))
+
+# ################################################################################################################################
+
+    def test_compaction_and_eviction_by_data_size(self) -> 'None':
+
+        random = Random(1208)
+        table = self._get_table(50, 1000)
+        model = {}
+
+        for _ in range(5000):
+            key = 'key{}'.format(random.randrange(100))
+
+            if random.random() < 0.7:
+                value = 'v' * random.randrange(60)
+                self._set(table, key, value)
+                model[key] = value
+            else:
+                encoded = encode_key(key)
+                table.delete(encoded, hash_key(encoded))
+                model.pop(key, None)
+
+            items = self._items(table)
+
+            # Whatever is in the table must be the most recent value of a key, the rest of keys could have been evicted
+            for key, value in items.items():
+                self.assertEqual(model[key], value)
+
+            for key in set(model) - set(items):
+                del model[key]
+
+            self.assertLessEqual(len(table), 50)
+
+# ################################################################################################################################
+
+    def test_value_too_big(self) -> 'None':
+
+        table = self._get_table(10, 100)
+
+        with self.assertRaises(ValueError):
+            self._set(table, 'key1', 'a' * 200)
+
+# ################################################################################################################################
+
+    def test_generation(self) -> 'None':
+
+        table = self._get_table(10, 10_000)
+        self._set(table, 'key1', 'value1')
+
+        # The same generation keeps the data ..
+        same = SharedTable(table.fd, 10, 10_000, _generation)
+        same.open()
+        self.assertEqual(self._get(same, 'key1'), 'value1')
+
+        # .. whereas a new one starts anew.
+        new = SharedTable(table.fd, 10, 10_000, b'n' * 16)
+        new.open()
+        self.assertEqual(len(new), 0)
+
+# ################################################################################################################################
+
+    def test_multiple_processes(self) -> 'None':
+
+        table = self._get_table(1000, 100_000)
+        pids = []
+
+        for worker_idx in range(4):
+            pid = os.fork()
+
+            # Each child process opens the memory through its own file descriptor, like separate workers do
+            if pid == 0:
+                fd = os.open('/proc/self/fd/{}'.format(table.fd), os.O_RDWR)
+                child_table = SharedTable(fd, 1000, 100_000, _generation)
+                child_table.open()
+
+                for idx in range(100):
+                    self._set(child_table, '{}.{}'.format(worker_idx, idx), idx)
+
+                os._exit(0)
+
+            pids.append(pid)
+
+        for pid in pids:
+            _ = os.waitpid(pid, 0)
+
+        self.assertEqual(len(table), 400)
+        self.assertEqual(self._get(table, '3.99'), 99)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Must come first
+from gevent.monkey import patch_all
+_ = patch_all()
+
+# stdlib
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep
+
+# Zato
+from zato.common.api import CACHE
+from zato.server.connection.cache import SyncBatch
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+_set = CACHE.STATE_CHANGED.SET
+_delete = CACHE.STATE_CHANGED.DELETE
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SyncBatchTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.sent = []
+
+    def _callback(self, cache_name:'str', ops:'list') -> 'None':
+        self.sent.append((cache_name, ops))
+
+    def _get_batch(self, window:'int'=10_000, size:'int'=100) -> 'SyncBatch':
+        return SyncBatch('my.cache', window, size, self._callback)
+
+# ################################################################################################################################
+
+    def test_collapse_sets(self) -> 'None':
+
+        batch = self._get_batch()
+
+        batch.add(_set, {'key':'a', 'value':1})
+        batch.add(_set, {'key':'b', 'value':2})
+        batch.add(_set, {'key':'a', 'value':3})
+
+        self.assertEqual(batch.current_size, 2)
+        batch.flush()
+
+        self.assertEqual(len(self.sent), 1)
+        cache_name, ops = self.sent[0]
+
+        self.assertEqual(cache_name, 'my.cache')
+        self.assertListEqual(ops, [
+            (_set, {'key':'b', 'value':2}),
+            (_set, {'key':'a', 'value':3}),
+        ])
+
+# ################################################################################################################################
+
+    def test_no_collapse_across_other_ops(self) -> 'None':
+
+        batch = self._get_batch()
+
+        batch.add(_set, {'key':'a', 'value':1})
+        batch.add(_delete, {'key':'a'})
+        batch.add(_set, {'key':'a', 'value':2})
+        batch.flush()
+
+        _, ops = self.sent[0]
+        self.assertListEqual(ops, [
+            (_set, {'key':'a', 'value':1}),
+            (_delete, {'key':'a'}),
+            (_set, {'key':'a', 'value':2}),
+        ])
+
+# ################################################################################################################################
+
+    def test_flush_on_size(self) -> 'None':
+
+        batch = self._get_batch(size=3)
+
+        batch.add(_set, {'key':'a', 'value':1})
+        batch.add(_set, {'key':'b', 'value':2})
+        self.assertListEqual(self.sent, [])
+
+        # The batch is full now so it is taken out at once ..
+        batch.add(_set, {'key':'c', 'value':3})
+
+        self.assertIsNone(batch.timer)
+        self.assertEqual(batch.current_size, 0)
+
+        # .. but it is sent in background, without blocking the greenlet that added to it.
+        self.assertListEqual(self.sent, [])
+        sleep(0)
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(len(self.sent[0][1]), 3)
+
+# ################################################################################################################################
+
+    def test_flush_on_window(self) -> 'None':
+
+        batch = self._get_batch(window=5)
+
+        batch.add(_set, {'key':'a', 'value':1})
+        batch.add(_set, {'key':'b', 'value':2})
+        self.assertListEqual(self.sent, [])
+
+        sleep(0.05)
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(len(self.sent[0][1]), 2)
+        self.assertIsNone(batch.timer)
+
+# ################################################################################################################################
+
+    def test_stop(self) -> 'None':
+
+        batch = self._get_batch(window=5)
+        batch.add(_set, {'key':'a', 'value':1})
+        batch.stop()
+
+        sleep(0.05)
+
+        self.assertListEqual(self.sent, [])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
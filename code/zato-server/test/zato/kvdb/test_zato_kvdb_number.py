@@ -17,6 +17,7 @@ from dateutil.parser import parse as dt_parse
 # Zato
 from zato.common.api import StatsKey
 from zato.common.test import rand_int, rand_string
+from zato.common.util.stats import QuantileSketch
 from zato.server.connection.kvdb.api import NumberRepo
 
 # ################################################################################################################################
@@ -208,6 +209,58 @@ class NumberTestCase(TestCase):
 
         self.assertEqual(data[StatsKey.PerKeyLastDuration], last_duration)
 
+# ################################################################################################################################
+
+    def test_repo_set_last_duration_stats(self):
+
+        repo_name = rand_string()
+        key_name = rand_string()
+
+        repo = NumberRepo(repo_name, sync_threshold, sync_interval)
+        repo.incr(key_name)
+
+        for duration in 30, 10, 20:
+            repo.set_last_duration(key_name, duration)
+
+        data = repo.get(key_name) # type: dict
+
+        # The minimum, maximum and mean are of all the durations rather than of the last two ..
+        self.assertEqual(data[StatsKey.PerKeyLastDuration], 20)
+        self.assertEqual(data[StatsKey.PerKeyMin], 10)
+        self.assertEqual(data[StatsKey.PerKeyMax], 30)
+        self.assertEqual(data[StatsKey.PerKeyMean], 20)
+        self.assertEqual(data[StatsKey.PerKeyTotalTime], 60)
+
+        # .. and there is a sketch of them that percentiles can be read from.
+        sketch = QuantileSketch.from_string(data[StatsKey.PerKeySketch])
+
+        self.assertEqual(sketch.count, 3)
+        self.assertAlmostEqual(sketch.quantile(0.5), 20, delta=20 * 0.01)
+
+# ################################################################################################################################
+
+    def test_repo_sketch_dumps_loads(self):
+
+        repo_name = rand_string()
+        key_name = rand_string()
+
+        repo1 = NumberRepo(repo_name, sync_threshold, sync_interval)
+        repo1.incr(key_name)
+
+        for duration in range(1, 101):
+            repo1.set_last_duration(key_name, duration)
+
+        repo2 = NumberRepo(repo_name, sync_threshold, sync_interval)
+        repo2.loads(repo1.dumps())
+
+        # The sketch can be updated after it was loaded
+        repo2.set_last_duration(key_name, 1000)
+
+        sketch = repo2.sketches[key_name] # type: QuantileSketch
+
+        self.assertEqual(sketch.count, 101)
+        self.assertAlmostEqual(sketch.quantile(1), 1000, delta=1000 * 0.01)
+
 # ################################################################################################################################
 
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+from random import Random
+from time import process_time, time
+
+# gevent
+from gevent import sleep
+from gevent.lock import RLock
+
+# Zato
+from zato.common.api import PUBSUB
+from zato.server.pubsub.delivery.message import Message
+from zato.server.pubsub.delivery.task import DeliveryTask
+from zato.server.pubsub.delivery._sorted_list import SortedList
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many subscriptions, i.e. delivery tasks, each benchmark runs with
+sub_counts = [10, 1000, 10_000]
+
+# For how long idle CPU usage is measured, in seconds
+idle_time = 2.0
+
+# How many messages are published to measure latency and how often, in seconds
+msg_count = 200
+msg_interval = 0.01
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class PollingDeliveryTask(DeliveryTask):
+    """ Waits for messages in the same way that delivery tasks did before they could be woken up.
+    """
+    def _wait_for_wake_up(self, needs_empty_delivery_list:'bool') -> 'None':
+        sleep(0.1 if needs_empty_delivery_list else 5)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FakePubSub:
+    def wait_for_topic(self, *ignored:'any_') -> 'None':
+        pass
+
+# ################################################################################################################################
+
+def get_sub_config(sub_key:'str') -> 'any_':
+    return {
+        'sub_key': sub_key,
+        'topic_id': 1,
+        'topic_name': '/bench',
+        'endpoint_name': 'bench',
+        'delivery_method': PUBSUB.DELIVERY_METHOD.NOTIFY.id,
+        'task_delivery_interval': 100,
+        'delivery_batch_size': 100,
+        'wrap_one_msg_in_list': True,
+        'wait_sock_err': 1,
+        'wait_non_sock_err': 1,
+    }
+
+# ################################################################################################################################
+
+def run(task_class:'any_', sub_count:'int') -> 'any_':
+
+    latencies = [] # type: anylist
+
+    def deliver(sub_key:'str', messages:'anylist') -> 'None':
+        now = time()
+        for msg in messages:
+            latencies.append(now - msg.pub_time)
+
+    def noop(*ignored:'any_') -> 'None':
+        pass
+
+    tasks = []
+
+    for idx in range(sub_count):
+        sub_key = 'sk.{}'.format(idx)
+        tasks.append(task_class(
+            pubsub = FakePubSub(),
+            sub_config = get_sub_config(sub_key),
+            sub_key = sub_key,
+            delivery_lock = RLock(),
+            delivery_list = SortedList(),
+            deliver_pubsub_msg = deliver,
+            confirm_pubsub_msg_delivered_cb = noop,
+            enqueue_initial_messages_func = noop,
+            pubsub_set_to_delete = noop,
+            pubsub_get_before_delivery_hook = noop,
+            pubsub_invoke_before_delivery_hook = noop,
+        ))
+
+    # Let all the tasks start and become idle ..
+    sleep(1)
+
+    # .. measure how much CPU they use when there is nothing to deliver ..
+    start = process_time()
+    sleep(idle_time)
+    idle_cpu = (process_time() - start) / idle_time * 100
+
+    # .. and how long it takes to deliver messages published to random subscriptions.
+    random = Random(1208)
+
+    for idx in range(msg_count):
+        task = tasks[random.randrange(sub_count)]
+
+        msg = Message()
+        msg.pub_msg_id = 'msg.{}'.format(idx)
+        msg.pub_time = time()
+
+        with task.delivery_lock:
+            task.delivery_list.add(msg)
+        task.wake_up()
+
+        sleep(msg_interval)
+
+    while len(latencies) < msg_count:
+        sleep(0.01)
+
+    for task in tasks:
+        task.stop()
+
+    # Let the tasks notice they were stopped
+    sleep(0.5)
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+    return idle_cpu, p99
+
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    # Tasks log each delivery
+    logging.disable(logging.CRITICAL)
+
+    template = '{:>8} {:>8} {:>12} {:>12}'
+    print(template.format('subs', 'impl', 'idle CPU %', 'p99 ms'))
+
+    for sub_count in sub_counts:
+        for name, task_class in (('polling', PollingDeliveryTask), ('event', DeliveryTask)):
+            idle_cpu, p99 = run(task_class, sub_count)
+            print(template.format(sub_count, name, '{:.1f}'.format(idle_cpu), '{:.2f}'.format(p99)))
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
+# ################################################################################################################################
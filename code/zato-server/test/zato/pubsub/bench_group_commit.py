@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+import logging
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+# gevent
+from gevent import joinall, spawn
+from gevent.event import AsyncResult
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Zato
+from zato.common.odb.model import Base
+from zato.server.pubsub.core.group_commit import GDGroupCommitter
+
+# Zato - test
+from test_group_commit import FakePubCtx, FakeSubscription, FakeTopic
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many greenlets publish at the same time
+publisher_counts = [1, 10, 100]
+
+# How many publications each publisher makes
+pub_per_publisher = 50
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def run(publisher_count:'int', is_group_commit:'bool') -> 'float':
+
+    base_dir = mkdtemp(prefix='zato-bench-group-commit')
+    engine = create_engine('sqlite:///{}'.format(os.path.join(base_dir, 'odb.db')))
+    Base.metadata.create_all(engine)
+
+    committer = GDGroupCommitter(
+        cluster_id = 1,
+        new_session_func = sessionmaker(bind=engine),
+        pub_counter_func = lambda: 1,
+        window = 0.002,
+        max_messages = 500,
+        depth_reconcile_interval = 60,
+    )
+    committer.start()
+
+    topic = FakeTopic(1, max_depth_gd=10 ** 9)
+    subs = [FakeSubscription('sk.1', 1), FakeSubscription('sk.2', 2)]
+
+    def publish(publisher_idx:'int') -> 'None':
+        for idx in range(pub_per_publisher):
+            ctx = FakePubCtx(topic, 'msg.{}.{}'.format(publisher_idx, idx), subs) # type: any_
+            _ = committer.reserve_depth(ctx)
+
+            # Each publication in a transaction of its own, as without group commits
+            if is_group_commit:
+                committer.publish(ctx)
+            else:
+                result = AsyncResult()
+                committer._commit_one(ctx, result)
+                result.get()
+
+    start = time()
+    _ = joinall([spawn(publish, idx) for idx in range(publisher_count)], raise_error=True)
+    elapsed = time() - start
+
+    committer.stop()
+    rmtree(base_dir)
+
+    return publisher_count * pub_per_publisher / elapsed
+
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    # Publications are logged by SQL functions
+    logging.disable(logging.CRITICAL)
+
+    template = '{:>10} {:>14} {:>14}'
+    print(template.format('publishers', 'single pub/s', 'group pub/s'))
+
+    for publisher_count in publisher_counts:
+        single = run(publisher_count, False)
+        group = run(publisher_count, True)
+        print(template.format(publisher_count, '{:.0f}'.format(single), '{:.0f}'.format(group)))
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+from random import Random
+from time import process_time
+
+# gevent
+from gevent import sleep, spawn
+from gevent.lock import RLock
+
+# Zato
+from zato.server.pubsub.core.trigger import NotifyPubSubTasksTrigger
+from zato.server.pubsub.model import Topic
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many topics there are
+topic_count = 5000
+
+# How many messages per second are published, each to a random topic
+publish_rates = [0, 10, 100]
+
+# For how long CPU usage is measured, in seconds
+measure_time = 3.0
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FakeSubscription:
+    sub_key = 'sk.1'
+
+# ################################################################################################################################
+
+def get_topic(topic_id:'int') -> 'Topic':
+    return Topic({
+        'id': topic_id,
+        'name': '/topic.{}'.format(topic_id),
+        'is_active': True,
+        'is_internal': False,
+        'max_depth_gd': 100,
+        'max_depth_non_gd': 100,
+        'has_gd': True,
+        'depth_check_freq': 100,
+        'pub_buffer_size_gd': 0,
+        'task_delivery_interval': 100,
+        'meta_store_frequency': 1,
+        'task_sync_interval': 500,
+    }, 'server1', 123)
+
+# ################################################################################################################################
+
+def run(publish_rate:'int') -> 'float':
+
+    lock = RLock()
+    topics = {topic_id: get_topic(topic_id) for topic_id in range(topic_count)}
+
+    def set_sync_has_msg(topic_id:'int', is_gd:'bool', value:'bool', source:'str', gd_pub_time_max:'float'=0.0) -> 'None':
+        topic = topics[topic_id]
+        if is_gd:
+            topic.sync_has_gd_msg = value
+            topic.gd_pub_time_max = gd_pub_time_max
+        else:
+            topic.sync_has_non_gd_msg = value
+
+        if value:
+            trigger.mark_topic_dirty(topic_id)
+
+    def noop(*ignored:'any_') -> 'anylist':
+        return []
+
+    trigger = NotifyPubSubTasksTrigger(
+        lock = lock,
+        topics = topics,
+        sync_max_iters = None,
+        invoke_service_func = noop,
+        set_sync_has_msg_func = set_sync_has_msg,
+        get_subscriptions_by_topic_func = lambda topic_name: [FakeSubscription()],
+        get_delivery_server_by_sub_key_func = lambda sub_key: 'server1',
+        sync_backlog_get_delete_messages_by_sub_keys_func = noop,
+    )
+
+    _ = spawn(trigger.run)
+    sleep(0.5)
+
+    random = Random(1208)
+    start = process_time()
+
+    if publish_rate:
+        for _ in range(int(measure_time * publish_rate)):
+            with lock:
+                set_sync_has_msg(random.randrange(topic_count), True, True, 'bench', 1.0)
+            sleep(1.0 / publish_rate)
+    else:
+        sleep(measure_time)
+
+    cpu = (process_time() - start) / measure_time * 100
+
+    trigger.stop()
+    sleep(0.1)
+
+    return cpu
+
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    # The trigger logs each sync
+    logging.disable(logging.CRITICAL)
+
+    template = '{:>8} {:>10} {:>8}'
+    print(template.format('topics', 'msg/s', 'CPU %'))
+
+    for publish_rate in publish_rates:
+        print(template.format(topic_count, publish_rate, '{:.1f}'.format(run(publish_rate))))
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
+# ################################################################################################################################
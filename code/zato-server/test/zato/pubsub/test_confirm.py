@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep
+
+# SQLAlchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Zato
+from zato.common.api import PUBSUB
+from zato.common.odb.model import Base, PubSubEndpointEnqueuedMessage
+from zato.common.util.time_ import utcnow_as_ms
+from zato.server.pubsub.core.confirm import DeliveryConfirmer
+from zato.server.pubsub.delivery.message import Message
+from zato.server.pubsub.delivery._sorted_list import SortedList
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import strlist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+cluster_id = 1
+_delivered = PUBSUB.DELIVERY_STATUS.DELIVERED
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class DeliveryConfirmerTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+
+        self.new_session_func = sessionmaker(bind=engine)
+        self.confirmer = DeliveryConfirmer(
+            cluster_id = cluster_id,
+            new_session_func = self.new_session_func,
+            window = 0.05,
+            max_messages = 10,
+            max_ids_per_query = 3,
+        )
+        self.confirmer.start()
+
+        session = self.new_session_func()
+        for sub_key in 'sk.1', 'sk.2':
+            for idx in range(10):
+                session.add(PubSubEndpointEnqueuedMessage(
+                    creation_time = utcnow_as_ms(),
+                    sub_pattern_matched = 'sub=/*',
+                    pub_msg_id = 'msg.{}'.format(idx),
+                    endpoint_id = 1,
+                    topic_id = 1,
+                    sub_key = sub_key,
+                    cluster_id = cluster_id,
+                ))
+        session.commit()
+        session.close()
+
+    def tearDown(self) -> 'None':
+        self.confirmer.stop()
+
+    def _get_delivered(self, sub_key:'str') -> 'strlist':
+        session = self.new_session_func()
+        try:
+            query = session.query(PubSubEndpointEnqueuedMessage.pub_msg_id).\
+                filter(PubSubEndpointEnqueuedMessage.sub_key==sub_key).\
+                filter(PubSubEndpointEnqueuedMessage.delivery_status==_delivered)
+            return sorted(row.pub_msg_id for row in query.all())
+        finally:
+            session.close()
+
+# ################################################################################################################################
+
+    def test_confirmations_are_stored_after_window(self) -> 'None':
+
+        for idx in range(4):
+            self.confirmer.confirm('sk.1', ['msg.{}'.format(idx)])
+        self.confirmer.confirm('sk.2', ['msg.5', 'msg.6'])
+
+        # Nothing is stored until the window lapses ..
+        self.assertListEqual(self._get_delivered('sk.1'), [])
+        self.assertSetEqual(self.confirmer.get_pending('sk.1'), {'msg.0', 'msg.1', 'msg.2', 'msg.3'})
+
+        # .. and then all of the confirmations are stored together.
+        sleep(0.1)
+
+        self.assertListEqual(self._get_delivered('sk.1'), ['msg.0', 'msg.1', 'msg.2', 'msg.3'])
+        self.assertListEqual(self._get_delivered('sk.2'), ['msg.5', 'msg.6'])
+        self.assertSetEqual(self.confirmer.get_pending('sk.1'), set())
+
+        self.assertEqual(self.confirmer.batch_count, 1)
+        self.assertEqual(self.confirmer.confirmed_count, 6)
+
+# ################################################################################################################################
+
+    def test_full_batch_is_stored_right_away(self) -> 'None':
+
+        self.confirmer.confirm('sk.1', ['msg.{}'.format(idx) for idx in range(10)])
+        sleep(0.01)
+
+        self.assertEqual(len(self._get_delivered('sk.1')), 10)
+        self.assertEqual(self.confirmer.batch_count, 1)
+
+# ################################################################################################################################
+
+    def test_pending_are_stored_on_stop(self) -> 'None':
+
+        self.confirmer.confirm('sk.2', ['msg.1'])
+        self.confirmer.stop()
+        sleep(0.01)
+
+        self.assertListEqual(self._get_delivered('sk.2'), ['msg.1'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SortedListTestCase(TestCase):
+
+    def test_remove_pubsub_msg_list(self) -> 'None':
+
+        # A small load factor makes for many sublists
+        delivery_list = SortedList()
+        delivery_list._reset(4)
+
+        messages = []
+        for idx in range(50):
+            msg = Message()
+            msg.pub_msg_id = 'msg.{}'.format(idx)
+            msg.pub_time = float(idx // 3)
+            messages.append(msg)
+            delivery_list.add(msg)
+
+        # Messages that compare as equal are still told apart by their IDs
+        to_remove = messages[1:50:2]
+        delivery_list.remove_pubsub_msg_list(to_remove)
+
+        self.assertListEqual([msg.pub_msg_id for msg in delivery_list], [msg.pub_msg_id for msg in messages[0:50:2]])
+
+        # Messages that are not in the list are reported but the others are still removed
+        with self.assertRaises(ValueError):
+            delivery_list.remove_pubsub_msg_list([messages[0], messages[1]])
+
+        self.assertEqual(len(delivery_list), 24)
+        self.assertNotIn('msg.0', [msg.pub_msg_id for msg in delivery_list])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
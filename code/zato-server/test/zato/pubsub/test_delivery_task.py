@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep
+from gevent.lock import RLock
+
+# Zato
+from zato.common.api import PUBSUB
+from zato.server.pubsub.delivery.message import Message
+from zato.server.pubsub.delivery.task import DeliveryTask
+from zato.server.pubsub.delivery._sorted_list import SortedList
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FakePubSub:
+    def wait_for_topic(self, *ignored:'any_') -> 'None':
+        pass
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class DeliveryTaskTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.delivered = [] # type: anylist
+        self.tasks = []     # type: anylist
+
+    def tearDown(self) -> 'None':
+        for task in self.tasks:
+            task.stop()
+
+    def _get_task(self, delivery_method:'str'=PUBSUB.DELIVERY_METHOD.NOTIFY.id) -> 'DeliveryTask':
+
+        def deliver(sub_key:'str', messages:'anylist') -> 'None':
+            self.delivered.extend(msg.pub_msg_id for msg in messages)
+
+        def noop(*ignored:'any_') -> 'None':
+            pass
+
+        task = DeliveryTask(
+            pubsub = FakePubSub(),
+            sub_config = {
+                'sub_key': 'sk.123',
+                'topic_id': 1,
+                'topic_name': '/test',
+                'endpoint_name': 'test',
+                'delivery_method': delivery_method,
+                'task_delivery_interval': 100,
+                'delivery_batch_size': 100,
+                'wrap_one_msg_in_list': True,
+                'wait_sock_err': 1,
+                'wait_non_sock_err': 1,
+            },
+            sub_key = 'sk.123',
+            delivery_lock = RLock(),
+            delivery_list = SortedList(),
+            deliver_pubsub_msg = deliver,
+            confirm_pubsub_msg_delivered_cb = noop,
+            enqueue_initial_messages_func = noop,
+            pubsub_set_to_delete = noop,
+            pubsub_get_before_delivery_hook = noop,
+            pubsub_invoke_before_delivery_hook = noop,
+        )
+        self.tasks.append(task)
+
+        # Let the task start
+        sleep(0.01)
+
+        return task
+
+    def _add_message(self, task:'DeliveryTask', pub_msg_id:'str') -> 'None':
+        msg = Message()
+        msg.pub_msg_id = pub_msg_id
+
+        with task.delivery_lock:
+            task.delivery_list.add(msg)
+
+# ################################################################################################################################
+
+    def test_idle_task_waits_for_wake_up(self) -> 'None':
+
+        task = self._get_task()
+        delivery_iter = task.delivery_iter
+
+        # Without a wake-up, an idle task does not run at all ..
+        self._add_message(task, 'msg.1')
+        sleep(0.2)
+
+        self.assertEqual(task.delivery_iter, delivery_iter)
+        self.assertListEqual(self.delivered, [])
+
+        # .. and once it is woken up, it delivers its messages right away.
+        task.wake_up()
+        sleep(0.01)
+
+        self.assertListEqual(self.delivered, ['msg.1'])
+
+# ################################################################################################################################
+
+    def test_delivery_method_changed(self) -> 'None':
+
+        task = self._get_task(PUBSUB.DELIVERY_METHOD.PULL.id)
+
+        self._add_message(task, 'msg.1')
+        task.wake_up()
+        sleep(0.01)
+
+        # Pull-style tasks do not deliver anything themselves ..
+        self.assertListEqual(self.delivered, [])
+
+        # .. unless their delivery method changes.
+        task.sub_config['delivery_method'] = PUBSUB.DELIVERY_METHOD.NOTIFY.id
+        task.update_sub_config()
+        sleep(0.01)
+
+        self.assertListEqual(self.delivered, ['msg.1'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+from time import monotonic
+from unittest import main, TestCase
+
+# gevent
+from gevent import joinall, spawn
+
+# SQLAlchemy
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Zato
+from zato.common.odb.model import Base, PubSubEndpointEnqueuedMessage, PubSubMessage
+from zato.common.util.time_ import utcnow_as_ms
+from zato.server.pubsub.core.group_commit import GDDepthCounter, GDGroupCommitter
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+cluster_id = 1
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FakeTopic:
+    def __init__(self, topic_id:'int', max_depth_gd:'int'=1000) -> 'None':
+        self.id = topic_id
+        self.name = '/topic.{}'.format(topic_id)
+        self.max_depth_gd = max_depth_gd
+
+# ################################################################################################################################
+
+class FakeSubscription:
+    def __init__(self, sub_key:'str', endpoint_id:'int') -> 'None':
+        self.sub_key = sub_key
+        self.endpoint_id = endpoint_id
+
+# ################################################################################################################################
+
+class FakePubCtx:
+    def __init__(self, topic:'FakeTopic', pub_msg_id:'str', subscriptions_by_topic:'anylist') -> 'None':
+        self.cid = 'cid.{}'.format(pub_msg_id)
+        self.now = utcnow_as_ms()
+        self.topic = topic
+        self.subscriptions_by_topic = subscriptions_by_topic
+        self.gd_msg_list = [{
+            'pub_msg_id': pub_msg_id,
+            'pub_pattern_matched': 'pub=/*',
+            'pub_time': self.now,
+            'data': 'data',
+            'data_prefix': 'data',
+            'data_prefix_short': 'data',
+            'size': 4,
+            'published_by_id': 1,
+            'cluster_id': cluster_id,
+            'topic_id': topic.id,
+            'has_gd': True,
+            'delivery_count': 0,
+            'topic_name': topic.name,
+            'sub_pattern_matched': {sub.sub_key: 'sub=/*' for sub in subscriptions_by_topic},
+        }]
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class GDGroupCommitterTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+
+        self.new_session_func = sessionmaker(bind=engine)
+        self.committer = GDGroupCommitter(
+            cluster_id = cluster_id,
+            new_session_func = self.new_session_func,
+            pub_counter_func = lambda: 1,
+            window = 0.01,
+            max_messages = 100,
+            depth_reconcile_interval = 60,
+        )
+        self.committer.start()
+
+        self.topic = FakeTopic(1)
+        self.subs = [FakeSubscription('sk.1', 1), FakeSubscription('sk.2', 2)]
+
+    def tearDown(self) -> 'None':
+        self.committer.stop()
+
+    def _count(self, model:'any_') -> 'int':
+        session = self.new_session_func()
+        try:
+            return session.query(func.count(model.id)).scalar()
+        finally:
+            session.close()
+
+    def _publish(self, *pub_msg_id_list:'str') -> 'anylist':
+        ctx_list = [FakePubCtx(self.topic, pub_msg_id, self.subs) for pub_msg_id in pub_msg_id_list]
+        for ctx in ctx_list:
+            self.assertIsNotNone(self.committer.reserve_depth(ctx))
+
+        greenlets = [spawn(self.committer.publish, ctx) for ctx in ctx_list]
+        _ = joinall(greenlets)
+
+        return greenlets
+
+# ################################################################################################################################
+
+    def test_concurrent_publications_are_committed_together(self) -> 'None':
+
+        greenlets = self._publish(*['msg.{}'.format(idx) for idx in range(10)])
+
+        self.assertTrue(all(greenlet.successful() for greenlet in greenlets))
+        self.assertEqual(self.committer.batch_count, 1)
+        self.assertEqual(self.committer.publication_count, 10)
+
+        self.assertEqual(self._count(PubSubMessage), 10)
+        self.assertEqual(self._count(PubSubEndpointEnqueuedMessage), 20)
+
+        # Committed messages are no longer in flight
+        self.assertEqual(self.committer.depth_counter.depth[self.topic.id], 10)
+        self.assertEqual(self.committer.depth_counter.in_flight[self.topic.id], 0)
+
+# ################################################################################################################################
+
+    def test_failed_batch_is_committed_one_by_one(self) -> 'None':
+
+        greenlets = self._publish('msg.1', 'msg.2', 'msg.1')
+
+        # The duplicate message is rejected but it does not affect other publications
+        self.assertTrue(greenlets[0].successful())
+        self.assertTrue(greenlets[1].successful())
+        self.assertIsInstance(greenlets[2].exception, IntegrityError)
+
+        self.assertEqual(self.committer.batch_count, 0)
+        self.assertEqual(self._count(PubSubMessage), 2)
+        self.assertEqual(self.committer.depth_counter.depth[self.topic.id], 2)
+
+# ################################################################################################################################
+
+    def test_single_publisher_does_not_wait(self) -> 'None':
+
+        # A window much longer than a commit takes
+        self.committer.window = 1
+
+        start = monotonic()
+
+        for idx in range(3):
+            greenlets = self._publish('msg.{}'.format(idx))
+            self.assertTrue(greenlets[0].successful())
+
+        # No one else was publishing so there was no need to wait for anyone
+        self.assertLess(monotonic() - start, 1)
+        self.assertEqual(self.committer.batch_count, 3)
+        self.assertEqual(self._count(PubSubMessage), 3)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class GDDepthCounterTestCase(TestCase):
+
+    def test_reserve_reconcile(self) -> 'None':
+
+        counter = GDDepthCounter()
+        counter.set_depth(1, 5)
+
+        self.assertEqual(counter.reserve(1, 10, 3), 8)
+        self.assertIsNone(counter.reserve(1, 10, 3))
+
+        # Messages in flight are taken into account when depth is reconciled with SQL
+        counter.reconcile({1: 2})
+        self.assertEqual(counter.depth[1], 5)
+
+        counter.on_committed(1, 3, False)
+        self.assertEqual(counter.depth[1], 2)
+        self.assertEqual(counter.in_flight[1], 0)
+
+        # Topics that SQL did not return have no messages
+        counter.reconcile({})
+        self.assertEqual(counter.depth[1], 0)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
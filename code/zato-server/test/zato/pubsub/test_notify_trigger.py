@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep, spawn
+from gevent.lock import RLock
+
+# Zato
+from zato.server.pubsub.core.trigger import NotifyPubSubTasksTrigger
+from zato.server.pubsub.model import Topic
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FakeSubscription:
+    def __init__(self, sub_key:'str') -> 'None':
+        self.sub_key = sub_key
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class NotifyPubSubTasksTriggerTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+
+        self.lock = RLock()
+        self.topics = {}
+        self.invoked = [] # type: anylist
+        self.delivery_servers = {'sk.1': 'server1'}
+
+        for topic_id in range(1, 4):
+            self.topics[topic_id] = Topic({
+                'id': topic_id,
+                'name': '/topic.{}'.format(topic_id),
+                'is_active': True,
+                'is_internal': False,
+                'max_depth_gd': 100,
+                'max_depth_non_gd': 100,
+                'has_gd': True,
+                'depth_check_freq': 100,
+                'pub_buffer_size_gd': 0,
+                'task_delivery_interval': 100,
+                'meta_store_frequency': 1,
+                'task_sync_interval': 200,
+            }, 'server1', 123)
+
+            # Make the topics ready to be synced right away
+            self.topics[topic_id].last_synced = 0.0
+
+        self.trigger = NotifyPubSubTasksTrigger(
+            lock = self.lock,
+            topics = self.topics,
+            sync_max_iters = None,
+            invoke_service_func = self._invoke_service,
+            set_sync_has_msg_func = self._set_sync_has_msg,
+            get_subscriptions_by_topic_func = self._get_subscriptions_by_topic,
+            get_delivery_server_by_sub_key_func = self.delivery_servers.get,
+            sync_backlog_get_delete_messages_by_sub_keys_func = self._get_delete_messages,
+        )
+
+        _ = spawn(self.trigger.run)
+
+    def tearDown(self) -> 'None':
+        self.trigger.stop()
+
+# ################################################################################################################################
+
+    def _invoke_service(self, name:'str', request:'any_') -> 'None':
+        self.invoked.append(request['topic_id'])
+
+    def _set_sync_has_msg(self, topic_id:'int', is_gd:'bool', value:'bool', source:'str', gd_pub_time_max:'float'=0.0) -> 'None':
+        topic = self.topics[topic_id]
+        if is_gd:
+            topic.sync_has_gd_msg = value
+            topic.gd_pub_time_max = gd_pub_time_max
+        else:
+            topic.sync_has_non_gd_msg = value
+
+        if value:
+            self.trigger.mark_topic_dirty(topic_id)
+
+    def _get_subscriptions_by_topic(self, topic_name:'str') -> 'anylist':
+        return [FakeSubscription('sk.1')]
+
+    def _get_delete_messages(self, topic_id:'int', sub_keys:'anylist') -> 'anylist':
+        return []
+
+    def _publish(self, topic_id:'int') -> 'None':
+        with self.lock:
+            self._set_sync_has_msg(topic_id, True, True, 'test', 1.0)
+
+# ################################################################################################################################
+
+    def test_only_dirty_topics_are_synced(self) -> 'None':
+
+        self._publish(2)
+        sleep(0.05)
+
+        self.assertListEqual(self.invoked, [2])
+        self.assertDictEqual(self.trigger.dirty_topics, {})
+
+        # Flags are reset once a topic is synced
+        self.assertFalse(self.topics[2].sync_has_gd_msg)
+
+# ################################################################################################################################
+
+    def test_bursts_are_coalesced(self) -> 'None':
+
+        self._publish(1)
+        sleep(0.05)
+
+        # Messages published within the topic's sync interval are synced together ..
+        for _ in range(10):
+            self._publish(1)
+
+        sleep(0.05)
+        self.assertListEqual(self.invoked, [1])
+
+        # .. once that interval lapses.
+        sleep(0.2)
+        self.assertListEqual(self.invoked, [1, 1])
+
+# ################################################################################################################################
+
+    def test_topic_without_delivery_server(self) -> 'None':
+
+        self.delivery_servers.clear()
+
+        self._publish(3)
+        sleep(0.05)
+
+        # There is no one to deliver messages yet so the topic stays dirty ..
+        self.assertListEqual(self.invoked, [])
+        self.assertIn(3, self.trigger.dirty_topics)
+
+        # .. until a delivery server is known.
+        self.delivery_servers['sk.1'] = 'server1'
+        sleep(0.25)
+
+        self.assertListEqual(self.invoked, [3])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
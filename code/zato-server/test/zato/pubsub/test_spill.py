@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+import os
+from subprocess import Popen
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# Zato
+from zato.common.util.time_ import utcnow_as_ms
+from zato.server.pubsub import PubSub
+from zato.server.pubsub.spill import delete_stale_spill_dirs, SpillStore
+from zato.server.pubsub.sync import InRAMSync
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import dictlist, strlist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FakeServer:
+    name = 'server1'
+    pid = 123
+
+# ################################################################################################################################
+
+class FakeTopic:
+    name = '/topic.1'
+
+# ################################################################################################################################
+
+class FakePubSub:
+    server = FakeServer()
+
+    def get_topic_by_id(self, topic_id:'int') -> 'FakeTopic':
+        return FakeTopic()
+
+# ################################################################################################################################
+
+class FakePubSubTool:
+    """ Has a given number of messages waiting to be delivered to each of its sub_keys.
+    """
+    def __init__(self) -> 'None':
+        self.delivery_list_size = 0
+
+    def get_delivery_list_size(self, sub_key:'str') -> 'int':
+        return self.delivery_list_size
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_messages(*msg_ids:'str', expiration_time:'float'=0.0) -> 'dictlist':
+    expiration_time = expiration_time or utcnow_as_ms() + 3600
+    return [{
+        'pub_msg_id': msg_id,
+        'pub_time': utcnow_as_ms(),
+        'expiration_time': expiration_time,
+        'data': 'data.{}'.format(msg_id),
+    } for msg_id in msg_ids]
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class SpillStoreTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.base_dir = mkdtemp(prefix='zato-test-spill')
+
+    def tearDown(self) -> 'None':
+        rmtree(self.base_dir, ignore_errors=True)
+
+    def _get_store(self, segment_size:'int'=100, max_disk_size:'int'=100_000) -> 'SpillStore':
+        return SpillStore(os.path.join(self.base_dir, 'spill'), segment_size, max_disk_size)
+
+    def _get_segment_files(self, topic_id:'int') -> 'strlist':
+        return sorted(os.listdir(os.path.join(self.base_dir, 'spill', str(topic_id))))
+
+# ################################################################################################################################
+
+    def test_spill_refill(self) -> 'None':
+
+        store = self._get_store()
+        messages = get_messages(*['msg.{}'.format(idx) for idx in range(10)])
+
+        for msg in messages:
+            self.assertTrue(store.spill(1, 4, ['sk.1'], [msg]))
+
+        self.assertTrue(store.has_messages(1))
+        self.assertFalse(store.has_messages(2))
+
+        # Messages are spread over several segments ..
+        self.assertGreater(len(self._get_segment_files(1)), 1)
+
+        # .. each refill returns no more messages than fit in RAM ..
+        out = store.refill(1, 1)
+        self.assertListEqual([msg['pub_msg_id'] for _, msg in out], ['msg.0', 'msg.1', 'msg.2'])
+        self.assertListEqual(out[0][0], ['sk.1'])
+
+        out = store.refill(1, 4)
+        self.assertListEqual(out, [])
+
+        # .. and messages are returned in the order that they were spilled over in.
+        refilled = [] # type: strlist
+        while store.has_messages(1):
+            refilled.extend(msg['pub_msg_id'] for _, msg in store.refill(1, 0))
+
+        self.assertListEqual(refilled, ['msg.{}'.format(idx) for idx in range(3, 10)])
+
+        # Segments that were read are deleted
+        self.assertListEqual(self._get_segment_files(1), [])
+
+        stats = store.get_stats()
+        self.assertEqual(stats['disk_size'], 0)
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['spill_count'], 10)
+        self.assertEqual(stats['refill_count'], 10)
+
+# ################################################################################################################################
+
+    def test_max_disk_size(self) -> 'None':
+
+        store = self._get_store(max_disk_size=300)
+
+        while store.spill(1, 10, ['sk.1'], get_messages('msg.1')):
+            pass
+
+        stats = store.get_stats(1)
+        self.assertLessEqual(stats['disk_size'], 300)
+        self.assertEqual(stats['rejected_count'], 1)
+
+        # Once messages are read, there is room for new ones again
+        _ = store.refill(1, 9)
+        self.assertTrue(store.spill(1, 10, ['sk.1'], get_messages('msg.2')))
+
+# ################################################################################################################################
+
+    def test_disabled(self) -> 'None':
+
+        store = self._get_store(max_disk_size=0)
+
+        self.assertFalse(store.spill(1, 10, ['sk.1'], get_messages('msg.1')))
+        self.assertFalse(store.get_stats()['is_enabled'])
+
+# ################################################################################################################################
+
+    def test_clear_topic(self) -> 'None':
+
+        store = self._get_store()
+
+        _ = store.spill(1, 10, ['sk.1'], get_messages('msg.1', 'msg.2'))
+        _ = store.spill(2, 10, ['sk.1'], get_messages('msg.3'))
+
+        store.clear_topic(1)
+
+        self.assertFalse(store.has_messages(1))
+        self.assertTrue(store.has_messages(2))
+        self.assertEqual(store.get_stats()['depth'], 1)
+        self.assertListEqual(self._get_segment_files(1), [])
+
+# ################################################################################################################################
+
+    def test_segment_files_are_closed(self) -> 'None':
+
+        store = self._get_store()
+
+        for idx in range(10):
+            _ = store.spill(1, 4, ['sk.1'], get_messages('msg.{}'.format(idx)))
+
+        segments = list(store.queues[1].segments)
+
+        # Only the last segment is still written to and nothing has been read yet ..
+        self.assertTrue(all(segment.write_file is None for segment in segments[:-1]))
+        self.assertIsNotNone(segments[-1].write_file)
+        self.assertTrue(all(segment.read_file is None for segment in segments))
+
+        # .. and now only the first segment is read from.
+        _ = store.refill(1, 3)
+        self.assertIsNotNone(segments[0].read_file)
+        self.assertTrue(all(segment.read_file is None for segment in segments[1:]))
+
+# ################################################################################################################################
+
+    def test_delete_stale_spill_dirs(self) -> 'None':
+
+        # A process that is no longer running ..
+        process = Popen(['true'])
+        _ = process.wait()
+
+        dead_pid = str(process.pid)
+        live_pid = str(os.getpid())
+
+        for name in dead_pid, live_pid, 'other':
+            os.makedirs(os.path.join(self.base_dir, name, '1'))
+
+        delete_stale_spill_dirs(self.base_dir)
+
+        # .. had its directory deleted, unlike the current process, and anything that is not a directory of a process.
+        self.assertListEqual(sorted(os.listdir(self.base_dir)), sorted([live_pid, 'other']))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class InRAMSyncSpillTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.base_dir = mkdtemp(prefix='zato-test-spill')
+        self.sync = InRAMSync(FakePubSub(), SpillStore(self.base_dir, 1000, 100_000)) # type: ignore
+
+    def tearDown(self) -> 'None':
+        rmtree(self.base_dir, ignore_errors=True)
+
+    def _add(self, *msg_ids:'str', expiration_time:'float'=0.0) -> 'None':
+        messages = get_messages(*msg_ids, expiration_time=expiration_time)
+        self.sync.add_messages('cid.1', 1, '/topic.1', 2, ['sk.1', 'sk.2'], messages)
+
+    def _retrieve(self) -> 'strlist':
+        out = self.sync.retrieve_messages_by_sub_keys(1, ['sk.1', 'sk.2'])
+        return sorted(msg['pub_msg_id'] for msg in out)
+
+# ################################################################################################################################
+
+    def test_overflow_is_spilled_over(self) -> 'None':
+
+        self._add('msg.1', 'msg.2')
+        self._add('msg.3')
+
+        self.assertEqual(self.sync.get_topic_depth(1), 2)
+        self.assertTrue(self.sync.spill_store.has_messages(1))
+
+        # Even though there is room in RAM now, new messages wait behind the ones spilled over
+        self.assertListEqual(self._retrieve(), ['msg.1', 'msg.2'])
+
+        self._add('msg.4')
+        self.assertEqual(self.sync.get_topic_depth(1), 0)
+
+        self.assertEqual(self.sync.refill_from_spill(1, {'sk.1', 'sk.2'}), 2)
+        self.assertListEqual(self._retrieve(), ['msg.3', 'msg.4'])
+        self.assertDictEqual(self.sync.sub_key_to_msg_id, {'sk.1': set(), 'sk.2': set()})
+
+# ################################################################################################################################
+
+    def test_refill_skips_inactive(self) -> 'None':
+
+        self._add('msg.1', 'msg.2')
+        self._add('msg.3', expiration_time=utcnow_as_ms() - 1)
+        self._add('msg.4')
+        _ = self._retrieve()
+
+        # The expired message is skipped and the one left has no sub_key that has been unsubscribed in the meantime
+        self.assertEqual(self.sync.refill_from_spill(1, {'sk.1'}), 1)
+        self.assertDictEqual(self.sync.msg_id_to_sub_key, {'msg.4': {'sk.1'}})
+
+# ################################################################################################################################
+
+    def test_refill_skips_expired_batch(self) -> 'None':
+
+        self._add('msg.1', 'msg.2')
+        self._add('msg.3', 'msg.4', expiration_time=utcnow_as_ms() - 1)
+        self._add('msg.5')
+        _ = self._retrieve()
+
+        # The first batch read from disk has only expired messages so the next one is read too
+        self.assertEqual(self.sync.refill_from_spill(1, {'sk.1', 'sk.2'}), 1)
+        self.assertListEqual(self._retrieve(), ['msg.5'])
+        self.assertFalse(self.sync.spill_store.has_messages(1))
+
+# ################################################################################################################################
+
+    def test_clear_topic(self) -> 'None':
+
+        self._add('msg.1', 'msg.2')
+        self._add('msg.3')
+
+        self.sync.clear_topic(1)
+
+        self.assertEqual(self.sync.get_topic_depth(1), 0)
+        self.assertFalse(self.sync.spill_store.has_messages(1))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class PubSubRefillTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.base_dir = mkdtemp(prefix='zato-test-spill')
+        self.sync = InRAMSync(FakePubSub(), SpillStore(self.base_dir, 1000, 100_000)) # type: ignore
+
+        self.ps_tool = FakePubSubTool()
+        sub = Bunch(sub_key='sk.1')
+
+        self.pubsub = PubSub.__new__(PubSub)
+        self.pubsub.topic_api = FakePubSub() # type: ignore
+        self.pubsub.subscriptions_by_topic = {FakeTopic.name: [sub]}
+        self.pubsub._subscriptions_by_sub_key = {'sk.1': sub}
+        self.pubsub.pubsub_tool_by_sub_key = {'sk.1': self.ps_tool} # type: ignore
+        self.pubsub.spill_refill_max_delivery_depth = 10
+        self.pubsub.sync_backlog = self.sync
+        self.pubsub.spill_store = self.sync.spill_store
+
+    def tearDown(self) -> 'None':
+        rmtree(self.base_dir, ignore_errors=True)
+
+# ################################################################################################################################
+
+    def test_refill_waits_for_delivery_tasks(self) -> 'None':
+
+        self.sync.add_messages('cid.1', 1, FakeTopic.name, 2, ['sk.1'], get_messages('msg.1', 'msg.2'))
+        self.sync.add_messages('cid.1', 1, FakeTopic.name, 2, ['sk.1'], get_messages('msg.3'))
+        _ = self.sync.retrieve_messages_by_sub_keys(1, ['sk.1'])
+
+        # The delivery task has too many messages to deliver so nothing is moved to RAM,
+        # but the topic still needs to be synced again, later on ..
+        self.ps_tool.delivery_list_size = 11
+        self.assertTrue(self.pubsub._refill_sync_backlog(1))
+        self.assertEqual(self.sync.get_topic_depth(1), 0)
+
+        # .. and once it has fewer of them, the messages are moved.
+        self.ps_tool.delivery_list_size = 10
+        self.assertTrue(self.pubsub._refill_sync_backlog(1))
+        self.assertEqual(self.sync.get_topic_depth(1), 1)
+
+        # Now, there is nothing left on disk
+        _ = self.sync.retrieve_messages_by_sub_keys(1, ['sk.1'])
+        self.assertFalse(self.pubsub._refill_sync_backlog(1))
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+from unittest import main, TestCase
+
+# Zato
+from zato.common.util.time_ import utcnow_as_ms
+from zato.server.pubsub.sync import InRAMSync
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict, strlist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class FakeServer:
+    name = 'server1'
+    pid = 123
+
+# ################################################################################################################################
+
+class FakeEndpoint:
+    name = 'endpoint1'
+
+# ################################################################################################################################
+
+class FakePubSub:
+    server = FakeServer()
+
+    def get_endpoint_by_id(self, *ignored:'any_') -> 'FakeEndpoint':
+        return FakeEndpoint()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class InRAMSyncTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.sync = InRAMSync(FakePubSub()) # type: ignore
+
+    def _get_msg(self, msg_id:'str', topic_id:'int', expiration_time:'float') -> 'anydict':
+        return {
+            'pub_msg_id': msg_id,
+            'topic_id': topic_id,
+            'topic_name': '/topic.{}'.format(topic_id),
+            'published_by_id': 1,
+            'pub_time': utcnow_as_ms(),
+            'expiration': 1,
+            'expiration_time': expiration_time,
+        }
+
+    def _add(self, topic_id:'int', sub_keys:'strlist', *msg_ids:'str', expiration_time:'float'=0.0) -> 'None':
+        expiration_time = expiration_time or utcnow_as_ms() + 3600
+        messages = [self._get_msg(msg_id, topic_id, expiration_time) for msg_id in msg_ids]
+        self.sync.add_messages('cid.1', topic_id, '/topic.{}'.format(topic_id), 100, sub_keys, messages)
+
+# ################################################################################################################################
+
+    def test_delete_messages(self) -> 'None':
+
+        self._add(1, ['sk.1', 'sk.2'], 'msg.1', 'msg.2')
+        self._add(2, ['sk.3'], 'msg.3')
+
+        self.sync.delete_messages(['msg.1', 'msg.3'])
+
+        self.assertListEqual(sorted(self.sync.msg_id_to_msg), ['msg.2'])
+        self.assertDictEqual(self.sync.msg_id_to_topic_id, {'msg.2': 1})
+        self.assertDictEqual(self.sync.msg_id_to_sub_key, {'msg.2': {'sk.1', 'sk.2'}})
+        self.assertDictEqual(self.sync.topic_id_msg_id, {1: {'msg.2'}, 2: set()})
+        self.assertDictEqual(self.sync.sub_key_to_msg_id, {'sk.1': {'msg.2'}, 'sk.2': {'msg.2'}, 'sk.3': set()})
+
+# ################################################################################################################################
+
+    def test_delete_expired_messages(self) -> 'None':
+
+        self._add(1, ['sk.1'], 'msg.1', expiration_time=utcnow_as_ms() - 1)
+        self._add(1, ['sk.1'], 'msg.2')
+
+        with self.sync.lock:
+            self.assertEqual(self.sync.delete_expired_messages(utcnow_as_ms()), 1)
+
+        self.assertListEqual(sorted(self.sync.msg_id_to_msg), ['msg.2'])
+        self.assertDictEqual(self.sync.topic_id_msg_id, {1: {'msg.2'}})
+        self.assertDictEqual(self.sync.sub_key_to_msg_id, {'sk.1': {'msg.2'}})
+
+        # Only the message that has not expired yet is still in the heap
+        self.assertListEqual([msg_id for _, msg_id in self.sync.expiration_heap], ['msg.2'])
+
+# ################################################################################################################################
+
+    def test_expiration_time_updated(self) -> 'None':
+
+        now = utcnow_as_ms()
+
+        self._add(1, ['sk.1'], 'msg.1', 'msg.2', expiration_time=now + 10)
+
+        # One message will now expire earlier and the other one later than it was originally set to
+        for msg_id, expiration_time in (('msg.1', now - 1), ('msg.2', now + 20)):
+            msg = self._get_msg(msg_id, 1, expiration_time)
+            msg['msg_id'] = msg_id
+            msg.update({'data': '', 'size': 0, 'priority': 5, 'pub_correl_id': '', 'in_reply_to': '', 'mime_type': ''})
+            _ = self.sync.update_msg(msg)
+
+        with self.sync.lock:
+            self.assertListEqual(self.sync._get_expired_msg_ids(now + 15), ['msg.1'])
+
+# ################################################################################################################################
+
+    def test_retrieved_messages_are_skipped(self) -> 'None':
+
+        now = utcnow_as_ms()
+
+        self._add(1, ['sk.1'], 'msg.1', expiration_time=now + 10)
+
+        out = self.sync.retrieve_messages_by_sub_keys(1, ['sk.1'])
+        self.assertListEqual([msg['pub_msg_id'] for msg in out], ['msg.1'])
+        self.assertDictEqual(self.sync.msg_id_to_sub_key, {})
+        self.assertDictEqual(self.sync.msg_id_to_topic_id, {})
+
+        with self.sync.lock:
+            self.assertListEqual(self.sync._get_expired_msg_ids(now + 15), [])
+            self.assertListEqual(self.sync.expiration_heap, [])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from time import monotonic
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep
+
+# Zato
+from zato.common.typing_ import cast_
+from zato.common.util.gather import TaskStatus
+from zato.server.connection.server.rpc.api import ConfigCtx, ServerRPC
+from zato.server.connection.server.rpc.config import ConfigSource, RPCServerInvocationCtx
+from zato.server.connection.server.rpc.invoker import LocalServerInvoker, RemoteServerInvoker
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+    from zato.server.base.parallel import ParallelServer
+    ParallelServer = ParallelServer
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestConfig:
+    cluster_name = 'rpc_test_cluster'
+    server1_name = 'server1'
+    server2_name = 'server2'
+    server3_name = 'server3'
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestConfigSource(ConfigSource):
+    """ Keeps servers in RAM and counts how many times they were read.
+    """
+    def __init__(self) -> 'None':
+        super().__init__(TestConfig.cluster_name, TestConfig.server1_name, cast_('any_', None))
+        self.query_count = 0
+        self.servers = {}
+
+        for idx, server_name in enumerate([TestConfig.server1_name, TestConfig.server2_name, TestConfig.server3_name], 1):
+            self.add_server(server_name, '10.151.1.{}'.format(idx))
+
+    def add_server(self, server_name:'str', address:'str') -> 'None':
+        ctx = RPCServerInvocationCtx()
+        ctx.cluster_name = TestConfig.cluster_name
+        ctx.server_name = server_name
+        ctx.address = address
+        ctx.port = 17010
+        ctx.username = 'api_user'
+        ctx.password = 'api_password'
+        self.servers[server_name] = ctx
+
+    def get_server_ctx_list(self, cluster_name:'str') -> 'anylist':
+        self.query_count += 1
+        return list(self.servers.values())
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestLocalServerInvoker(LocalServerInvoker):
+
+    def invoke_all_pids(self, *args:'any_', **kwargs:'any_') -> 'anylist':
+        return [{'server_name': self.server_name}]
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestRemoteServerInvoker(RemoteServerInvoker):
+
+    # Names of servers that cannot be invoked
+    down = set()
+
+    # How long it takes each server to respond, by server name
+    wait_time = {}
+
+    def __init__(self, *args:'any_', **kwargs:'any_') -> 'None':
+        super().__init__(*args, **kwargs)
+        self.is_closed = False
+        self.invocation_history = [] # type: anylist
+
+    def close(self) -> 'None':
+        super().close()
+        self.is_closed = True
+
+    def invoke_all_pids(self, *args:'any_', **kwargs:'any_') -> 'anylist':
+        self.invocation_history.append(kwargs)
+
+        sleep(self.wait_time.get(self.server_name, 0))
+
+        if self.server_name in self.down:
+            raise ConnectionError('Server {} is down'.format(self.server_name))
+
+        return [{'server_name': self.server_name}]
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class ServerMembershipTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        TestRemoteServerInvoker.down = set()
+        TestRemoteServerInvoker.wait_time = {}
+        self.config_source = TestConfigSource()
+
+    def get_server_rpc(self, **kwargs:'any_') -> 'ServerRPC':
+        config_ctx = ConfigCtx(
+            self.config_source,
+            cast_('ParallelServer', None),
+            local_server_invoker_class = TestLocalServerInvoker,
+            remote_server_invoker_class = TestRemoteServerInvoker,
+        )
+        return ServerRPC(config_ctx, **kwargs)
+
+    def get_server_names(self, result:'any_') -> 'anylist':
+        return sorted(item['server_name'] for item in result.data)
+
+# ################################################################################################################################
+
+    def test_membership_is_cached(self) -> 'None':
+
+        server_rpc = self.get_server_rpc()
+
+        result = server_rpc.invoke_all('my.service')
+        invoker2 = server_rpc._invokers[TestConfig.server2_name]
+
+        _ = server_rpc.invoke_all('my.service')
+        _ = server_rpc.invoke_all('my.service')
+
+        self.assertTrue(result.is_ok)
+        self.assertListEqual(self.get_server_names(result), [
+            TestConfig.server1_name, TestConfig.server2_name, TestConfig.server3_name])
+
+        # Servers were read only once and the same invoker was used each time ..
+        self.assertEqual(self.config_source.query_count, 1)
+        self.assertIs(server_rpc._invokers[TestConfig.server2_name], invoker2)
+        self.assertEqual(len(invoker2.invocation_history), 3)
+
+        # .. and only the first invocation needed a ping.
+        self.assertListEqual([item['needs_ping'] for item in invoker2.invocation_history], [True, False, False])
+
+# ################################################################################################################################
+
+    def test_membership_is_invalidated(self) -> 'None':
+
+        server_rpc = self.get_server_rpc()
+        _ = server_rpc.invoke_all('my.service')
+
+        invoker2 = server_rpc._invokers[TestConfig.server2_name]
+        invoker3 = server_rpc._invokers[TestConfig.server3_name]
+
+        # A new server joins, the address of another one changes and yet another one leaves ..
+        self.config_source.add_server('server4', '10.151.1.4')
+        self.config_source.add_server(TestConfig.server2_name, '10.151.1.22')
+        del self.config_source.servers[TestConfig.server3_name]
+
+        # .. which is not noticed until the membership is invalidated ..
+        _ = server_rpc.invoke_all('my.service')
+        self.assertEqual(self.config_source.query_count, 1)
+
+        server_rpc.on_server_joined('server4')
+        result = server_rpc.invoke_all('my.service')
+
+        # .. now, the new server is invoked, the one that left is not and connections of both old invokers are closed.
+        self.assertEqual(self.config_source.query_count, 2)
+        self.assertListEqual(self.get_server_names(result), [TestConfig.server1_name, TestConfig.server2_name, 'server4'])
+
+        self.assertIsNot(server_rpc._invokers[TestConfig.server2_name], invoker2)
+        self.assertTrue(invoker2.is_closed)
+        self.assertTrue(invoker3.is_closed)
+
+# ################################################################################################################################
+
+    def test_membership_expires(self) -> 'None':
+
+        server_rpc = self.get_server_rpc(ttl=0)
+
+        _ = server_rpc.invoke_all('my.service')
+        invoker2 = server_rpc._invokers[TestConfig.server2_name]
+
+        _ = server_rpc.invoke_all('my.service')
+
+        # Servers were read again but the configuration did not change so the same invoker is still used
+        self.assertEqual(self.config_source.query_count, 2)
+        self.assertIs(server_rpc._invokers[TestConfig.server2_name], invoker2)
+        self.assertFalse(invoker2.is_closed)
+
+# ################################################################################################################################
+
+    def test_server_left(self) -> 'None':
+
+        server_rpc = self.get_server_rpc()
+        _ = server_rpc.invoke_all('my.service')
+
+        invoker3 = server_rpc._invokers[TestConfig.server3_name]
+        del self.config_source.servers[TestConfig.server3_name]
+
+        server_rpc.on_server_left(TestConfig.server3_name)
+
+        self.assertNotIn(TestConfig.server3_name, server_rpc._invokers)
+        self.assertTrue(invoker3.is_closed)
+
+# ################################################################################################################################
+
+    def test_down_server_is_skipped(self) -> 'None':
+
+        server_rpc = self.get_server_rpc()
+        TestRemoteServerInvoker.down.add(TestConfig.server3_name)
+
+        # The first time around, the server is invoked and it fails ..
+        result = server_rpc.invoke_all('my.service')
+        invoker3 = server_rpc._invokers[TestConfig.server3_name]
+
+        self.assertFalse(result.is_ok)
+        self.assertListEqual(result.skipped, [TestConfig.server3_name])
+        self.assertListEqual(self.get_server_names(result), [TestConfig.server1_name, TestConfig.server2_name])
+
+        # .. whereas the next time, it is not invoked at all ..
+        result = server_rpc.invoke_all('my.service')
+
+        self.assertListEqual(result.skipped, [TestConfig.server3_name])
+        self.assertEqual(len(invoker3.invocation_history), 1)
+
+        health = {item['server_name']: item for item in server_rpc.get_peer_health()}
+        self.assertEqual(health[TestConfig.server3_name]['failure_count'], 1)
+        self.assertIn('ConnectionError', health[TestConfig.server3_name]['last_error'])
+        self.assertEqual(health[TestConfig.server2_name]['failure_count'], 0)
+
+        # .. until the backoff period ends, at which point the server is pinged again ..
+        TestRemoteServerInvoker.down.clear()
+        server_rpc.health[TestConfig.server3_name].down_until = 0.0
+
+        result = server_rpc.invoke_all('my.service')
+
+        self.assertTrue(result.is_ok)
+        self.assertTrue(invoker3.invocation_history[-1]['needs_ping'])
+        self.assertEqual(server_rpc.health[TestConfig.server3_name].failure_count, 0)
+
+# ################################################################################################################################
+
+    def test_servers_are_invoked_concurrently(self) -> 'None':
+
+        server_rpc = self.get_server_rpc(deadline=0.5)
+
+        TestRemoteServerInvoker.wait_time[TestConfig.server2_name] = 0.3
+        TestRemoteServerInvoker.wait_time[TestConfig.server3_name] = 10
+
+        start = monotonic()
+        result = server_rpc.invoke_all('my.service')
+        total_time = monotonic() - start
+
+        # The slowest server is not waited for beyond the deadline ..
+        self.assertLess(total_time, 1)
+
+        # .. and the results from the other ones are still returned.
+        self.assertFalse(result.is_ok)
+        self.assertListEqual(self.get_server_names(result), [TestConfig.server1_name, TestConfig.server2_name])
+        self.assertDictEqual(result.status, {
+            TestConfig.server1_name: TaskStatus.OK,
+            TestConfig.server2_name: TaskStatus.OK,
+            TestConfig.server3_name: TaskStatus.Timeout,
+        })
+
+        # A server that did not respond in time is considered down too
+        self.assertEqual(server_rpc.health[TestConfig.server3_name].failure_count, 1)
+
+# ################################################################################################################################
+
+    def test_backoff_is_capped(self) -> 'None':
+
+        server_rpc = self.get_server_rpc(down_min=2, down_max=10)
+
+        for _ in range(5):
+            server_rpc.on_invoke_error(TestConfig.server2_name, 'error', now=100.0)
+
+        health = server_rpc.health[TestConfig.server2_name]
+
+        self.assertEqual(health.failure_count, 5)
+        self.assertEqual(health.down_until, 110.0)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from unittest import main, TestCase
+
+# gevent
+from gevent import sleep
+
+# Zato
+from zato.broker import BrokerMessageReceiver
+from zato.broker.client import BrokerClient
+from zato.broker.outbound import OutboundQueue
+from zato.common.broker_message import BROKER, SCHEDULER, SERVICE
+from zato.common.typing_ import cast_
+from zato.server.connection.server.rpc.api import InvokeAllResult
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anydict, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestServerRPC:
+    """ Records what would be sent to all the servers.
+    """
+    def __init__(self) -> 'None':
+        self.invocation_history = [] # type: anylist
+
+        # Names of servers that are to fail to be invoked
+        self.failing_servers = [] # type: anylist
+
+    def invoke_all(self, service:'str', request:'anydict', *args:'any_', **kwargs:'any_') -> 'InvokeAllResult':
+        self.invocation_history.append(request)
+
+        out = InvokeAllResult()
+        out.is_ok = not self.failing_servers
+        out.skipped = self.failing_servers
+
+        return out
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestWorkerStore:
+    """ Records names of the services that broker messages were handled for.
+    """
+    def __init__(self) -> 'None':
+        self.handled = [] # type: anylist
+
+    def on_broker_msg_SERVICE_EDIT(self, msg:'anydict') -> 'None':
+        self.handled.append(msg['name'])
+
+    def on_broker_msg_SERVICE_DELETE(self, msg:'anydict') -> 'None':
+        self.handled.append('-' + msg['name'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestReceiver(BrokerMessageReceiver):
+    def __init__(self) -> 'None':
+        super().__init__()
+        self.worker_store = TestWorkerStore()
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_msg(name:'str', action:'str'=SERVICE.EDIT.value) -> 'anydict':
+    return {'action': action, 'name': name}
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class OutboundQueueTestCase(TestCase):
+
+    def setUp(self) -> 'None':
+        self.server_rpc = TestServerRPC()
+        self.broker_client = BrokerClient(server_rpc=cast_('any_', self.server_rpc))
+
+    def get_sent_names(self) -> 'anylist':
+        out = []
+
+        for msg in self.server_rpc.invocation_history:
+            msg_list = msg['msg_list'] if msg['action'] == BROKER.BATCH.value else [msg]
+            out.extend(item['name'] for item in msg_list)
+
+        return out
+
+# ################################################################################################################################
+
+    def test_messages_are_batched(self) -> 'None':
+
+        names = ['service{}'.format(idx) for idx in range(100)]
+
+        for name in names:
+            self.broker_client.publish(get_msg(name))
+
+        sleep(0.2)
+
+        # All the messages were sent in a single envelope, in the order they were published in
+        self.assertEqual(len(self.server_rpc.invocation_history), 1)
+        self.assertEqual(self.server_rpc.invocation_history[0]['action'], BROKER.BATCH.value)
+        self.assertListEqual(self.get_sent_names(), names)
+
+        stats = self.broker_client.get_outbound_queue_stats()
+
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['total_messages'], 100)
+        self.assertEqual(stats['total_batches'], 1)
+        self.assertEqual(stats['max_batch_size'], 100)
+
+# ################################################################################################################################
+
+    def test_single_message_is_not_wrapped(self) -> 'None':
+
+        self.broker_client.invoke_async(get_msg('service1'))
+        sleep(0.2)
+
+        self.assertListEqual(self.server_rpc.invocation_history, [get_msg('service1')])
+
+# ################################################################################################################################
+
+    def test_max_batch_size(self) -> 'None':
+
+        self.broker_client.outbound_queue = OutboundQueue(self.broker_client._invoke_all_servers, max_batch_size=30)
+        names = ['service{}'.format(idx) for idx in range(100)]
+
+        for name in names:
+            self.broker_client.publish(get_msg(name))
+
+        sleep(0.5)
+
+        # Messages were split into several batches yet their order is still the same
+        self.assertListEqual([len(msg['msg_list']) for msg in self.server_rpc.invocation_history[:3]], [30, 30, 30])
+        self.assertListEqual(self.get_sent_names(), names)
+
+# ################################################################################################################################
+
+    def test_scheduler_messages_are_not_batched(self) -> 'None':
+
+        self.assertTrue(self.broker_client._needs_outbound_queue(get_msg('service1')))
+        self.assertFalse(self.broker_client._needs_outbound_queue(get_msg('service1'), from_scheduler=True))
+        self.assertFalse(self.broker_client._needs_outbound_queue(get_msg('job1', SCHEDULER.CREATE.value)))
+
+        # This is the scheduler's own client
+        broker_client = BrokerClient(server_rpc=None)
+        self.assertFalse(broker_client._needs_outbound_queue(get_msg('service1')))
+
+# ################################################################################################################################
+
+    def test_send_errors(self) -> 'None':
+
+        self.broker_client.publish(get_msg('service1'))
+        sleep(0.2)
+
+        self.assertEqual(self.broker_client.get_outbound_queue_stats()['send_errors'], 0)
+
+        # One of the servers cannot be invoked now, which makes the message count as one that could not be sent
+        self.server_rpc.failing_servers.append('server2')
+
+        self.broker_client.publish(get_msg('service2'))
+        sleep(0.2)
+
+        stats = self.broker_client.get_outbound_queue_stats()
+
+        self.assertEqual(stats['send_errors'], 1)
+        self.assertEqual(stats['total_batches'], 2)
+
+# ################################################################################################################################
+
+    def test_batch_is_received_in_order(self) -> 'None':
+
+        receiver = TestReceiver()
+        batch = {
+            'action': BROKER.BATCH.value,
+            'msg_list': [get_msg('service1'), get_msg('service2', SERVICE.DELETE.value), get_msg('service3')],
+        }
+
+        receiver.on_broker_msg(batch)
+
+        self.assertListEqual(receiver.worker_store.handled, ['service1', '-service2', 'service3'])
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
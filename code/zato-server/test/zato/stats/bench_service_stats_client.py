@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# Run gevent patches first
+from gevent.monkey import patch_all
+patch_all()
+
+# stdlib
+from datetime import datetime
+from time import perf_counter
+
+# gevent
+from gevent import sleep, spawn
+
+# Zato
+from zato.common.events.common import Action, PushCtx
+from zato.common.util.json_ import JSONParser
+from zato.common.util.tcp import get_free_port, ZatoStreamServer
+from zato.server.connection.connector.subprocess_.impl.events.container import EventsConnectionContainer
+from zato.server.connection.stats import ServiceStatsClient
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+# How many events each benchmark pushes
+event_count = 200_000
+
+# Services yield to other greenlets once in that many events, e.g. to read requests or to send responses
+yield_every = 100
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class CountingDatabase:
+    """ Only counts events received instead of storing them so that it is the protocol alone that is measured.
+    """
+    def __init__(self) -> 'None':
+        self.count = 0
+
+    def access_state(self, opcode:'str', data:'any_') -> 'None':
+        self.count += 1
+
+    def access_state_many(self, opcode:'str', data_list:'any_') -> 'None':
+        self.count += len(data_list)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+def get_container() -> 'EventsConnectionContainer':
+
+    # Only what is needed to accept events, without starting a subprocess
+    container = EventsConnectionContainer.__new__(EventsConnectionContainer)
+    container.keep_running = True
+    container._json_parser = JSONParser()
+    container.events_db = CountingDatabase()
+    container._action_map = {
+        Action.Push: container._on_event_push,
+        Action.PushBatch: container._on_event_push_batch,
+    }
+
+    return container
+
+# ################################################################################################################################
+
+def wait_for_events(events_db:'CountingDatabase', expected:'int') -> 'None':
+    while events_db.count < expected:
+        sleep(0.001)
+
+# ################################################################################################################################
+
+def run(name:'str', port:'int', events_db:'CountingDatabase') -> 'tuple':
+
+    events_db.count = 0
+
+    stats_client = ServiceStatsClient()
+    stats_client.init('127.0.0.1', port)
+
+    timestamp = datetime.utcnow().isoformat()
+
+    # This is how events were pushed before they were batched - one JSON message per event, sent right away ..
+    if name == 'per-event':
+        start = perf_counter()
+
+        for idx in range(event_count):
+            ctx = PushCtx()
+            ctx.id = 'id-{}'.format(idx)
+            ctx.cid = 'cid-{}'.format(idx)
+            ctx.timestamp = timestamp
+            ctx.event_type = 1
+            ctx.object_type = 2
+            ctx.object_id = 'service-1'
+            ctx.total_time_ms = idx
+            stats_client.impl.push(ctx)
+
+            if idx % yield_every == 0:
+                sleep(0)
+
+        request_path_time = perf_counter() - start
+
+    # .. whereas now they are only enqueued and sent in background.
+    else:
+        _ = spawn(stats_client._run_flusher)
+        start = perf_counter()
+
+        for idx in range(event_count):
+            stats_client.push('cid-{}'.format(idx), timestamp, 'service-1', True, idx, 'id-{}'.format(idx))
+
+            if idx % yield_every == 0:
+                sleep(0)
+
+        request_path_time = perf_counter() - start
+
+    wait_for_events(events_db, event_count - stats_client.dropped_count)
+    total_time = perf_counter() - start
+
+    stats_client.stop()
+    stats_client.impl.close()
+
+    return event_count / request_path_time, events_db.count / total_time, stats_client.dropped_count
+
+# ################################################################################################################################
+
+def main() -> 'None':
+
+    container = get_container()
+    port = get_free_port()
+
+    server = ZatoStreamServer(('127.0.0.1', port), container._on_new_connection)
+    server.start()
+
+    template = '{:>10} {:>22} {:>22} {:>8}'
+    print(template.format('impl', 'request path events/s', 'delivered events/s', 'dropped'))
+
+    for name in 'per-event', 'batched':
+        request_path_rate, total_rate, dropped_count = run(name, port, container.events_db)
+        print(template.format(name, '{:,.0f}'.format(request_path_rate), '{:,.0f}'.format(total_rate), dropped_count))
+
+    server.stop()
+
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    main()
+
+# ################################################################################################################################
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+import os
+from datetime import datetime, timedelta
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import main, TestCase
+from unittest.mock import patch
+
+# Zato
+from zato.server.connection.connector.subprocess_.impl.events.database import EventsDatabase, OpCode, PartitionBy
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger('zato')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+utcnow = datetime.utcnow
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class PartitionsTestCase(TestCase):
+
+    def setUp(self):
+        self.base_dir = mkdtemp(prefix='zato-test-events-db')
+        self.fs_data_path = os.path.join(self.base_dir, 'zato.events')
+
+        # Events from the current hour go to a partition that is still open
+        self.now = utcnow()
+        self.hour_ago = self.now - timedelta(hours=1)
+
+    def tearDown(self):
+        rmtree(self.base_dir, ignore_errors=True)
+
+    def get_events_db(self, max_retention=1000 * 60 * 60 * 24):
+        return EventsDatabase(logger, self.fs_data_path, 1_000_000, 1_000_000, max_retention, PartitionBy.Hour)
+
+    def push(self, events_db, timestamp, object_id='service-1', total_time_ms=10):
+        events_db.access_state(OpCode.Push, {
+            'timestamp': timestamp.isoformat(),
+            'object_id': object_id,
+            'total_time_ms': total_time_ms,
+        })
+
+    def get_files(self, timestamp):
+        partition_path = os.path.join(self.fs_data_path, timestamp.strftime('%Y-%m-%dT%H'))
+        return sorted(os.listdir(partition_path))
+
+# ################################################################################################################################
+
+    def test_sync_appends_files(self):
+
+        events_db = self.get_events_db()
+
+        self.push(events_db, self.now)
+        self.push(events_db, self.hour_ago)
+        events_db.sync_state()
+
+        self.assertEqual(len(self.get_files(self.now)), 1)
+        self.assertEqual(len(self.get_files(self.hour_ago)), 1)
+
+        # Another sync adds a new file, without reading or rewriting the existing ones ..
+        files_before = self.get_files(self.now)
+
+        self.push(events_db, self.now)
+        events_db.sync_state()
+
+        files_after = self.get_files(self.now)
+
+        self.assertEqual(len(files_after), 2)
+        self.assertEqual(files_after[0], files_before[0])
+
+        self.assertEqual(events_db.telemetry[OpCode.Internal.ReadParqet], 0)
+        self.assertEqual(events_db.telemetry[OpCode.Internal.SaveData],   3)
+
+        # .. and all the events can be read back.
+        self.assertEqual(len(events_db.load_data_from_storage()), 3)
+
+# ################################################################################################################################
+
+    def test_expired_partitions_are_dropped(self):
+
+        # Two hours of retention
+        events_db = self.get_events_db(max_retention=1000 * 60 * 60 * 2)
+
+        self.push(events_db, self.now - timedelta(hours=5))
+        self.push(events_db, self.now - timedelta(hours=4))
+        self.push(events_db, self.now)
+        events_db.sync_state()
+
+        self.assertEqual(events_db.telemetry[OpCode.Internal.DropPartition], 2)
+        self.assertListEqual(events_db.storage.get_partition_list(), [self.now.strftime('%Y-%m-%dT%H')])
+
+# ################################################################################################################################
+
+    def test_compaction(self):
+
+        events_db = self.get_events_db()
+
+        for _ in range(3):
+            self.push(events_db, self.hour_ago)
+            self.push(events_db, self.now)
+            events_db.sync_state()
+
+        events_db.compact_partitions()
+
+        # The partition that ended is compacted into a single file whereas the current one is left as it is
+        self.assertEqual(len(self.get_files(self.hour_ago)), 1)
+        self.assertEqual(len(self.get_files(self.now)), 3)
+        self.assertEqual(events_db.telemetry[OpCode.Internal.CompactPartition], 1)
+
+        self.assertEqual(len(events_db.load_data_from_storage()), 6)
+
+# ################################################################################################################################
+
+    def test_interrupted_compaction(self):
+
+        events_db = self.get_events_db()
+        partition_name = self.hour_ago.strftime('%Y-%m-%dT%H')
+
+        for _ in range(3):
+            self.push(events_db, self.hour_ago)
+            events_db.sync_state()
+
+        # The compacted file is moved in place but the process stops before all of the files it replaces are deleted ..
+        _remove = os.remove
+        remove_calls = []
+
+        def remove(path):
+            remove_calls.append(path)
+            if len(remove_calls) > 1:
+                raise OSError('Test error')
+            _remove(path)
+
+        with patch('os.remove', remove):
+            with self.assertRaises(OSError):
+                events_db.storage.compact_partition(partition_name)
+
+        # .. so the partition has both the compacted file and one of the ones it was to replace ..
+        self.assertEqual(len(events_db.storage.get_partition_file_list(partition_name)), 3)
+
+        # .. until the compaction is completed at startup.
+        events_db = self.get_events_db()
+
+        self.assertEqual(len(self.get_files(self.hour_ago)), 1)
+        self.assertEqual(len(events_db.load_data_from_storage()), 3)
+
+        # This time, the process stops before the compacted file is moved in place ..
+        self.push(events_db, self.hour_ago)
+        events_db.sync_state()
+
+        _replace = os.replace
+
+        def replace(source, target):
+            if target.endswith('.parquet'):
+                raise OSError('Test error')
+            _replace(source, target)
+
+        with patch('os.replace', replace):
+            with self.assertRaises(OSError):
+                events_db.storage.compact_partition(partition_name)
+
+        # .. so the compaction is rolled back at startup and the partition has the files it had before.
+        events_db = self.get_events_db()
+
+        self.assertEqual(len(self.get_files(self.hour_ago)), 2)
+        self.assertEqual(len(events_db.load_data_from_storage()), 4)
+
+# ################################################################################################################################
+
+    def test_get_table(self):
+
+        events_db = self.get_events_db()
+
+        self.push(events_db, self.now - timedelta(hours=3), total_time_ms=1000)
+        self.push(events_db, self.hour_ago, total_time_ms=10)
+        events_db.sync_state()
+
+        # This one stays in RAM
+        self.push(events_db, self.now, total_time_ms=30)
+
+        # All the events, including the ones in RAM ..
+        tabulated = events_db.get_table().to_dict()
+        self.assertEqual(tabulated['service-1']['item_total_usage'], 3)
+
+        # .. and only the ones from a range of time.
+        start = self.now - timedelta(hours=2)
+        tabulated = events_db.get_table(start).to_dict()
+
+        self.assertEqual(tabulated['service-1']['item_total_usage'], 2)
+        self.assertEqual(tabulated['service-1']['item_max'], 30)
+
+        # Events in RAM were not saved to storage
+        self.assertEqual(events_db.telemetry[OpCode.Internal.SyncState], 1)
+        self.assertEqual(len(events_db.in_ram_store), 1)
+
+# ################################################################################################################################
+
+    def test_migrate_single_file(self):
+
+        # Pandas
+        import pandas as pd
+
+        data = pd.DataFrame([
+            {'timestamp': self.hour_ago.isoformat(), 'object_id': 'service-1', 'total_time_ms': 10},
+            {'timestamp': self.now.isoformat(),      'object_id': 'service-1', 'total_time_ms': 20},
+        ])
+        data.to_parquet(self.fs_data_path)
+
+        events_db = self.get_events_db()
+
+        self.assertTrue(os.path.isdir(self.fs_data_path))
+        self.assertEqual(len(events_db.storage.get_partition_list()), 2)
+        self.assertEqual(len(events_db.load_data_from_storage()), 2)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
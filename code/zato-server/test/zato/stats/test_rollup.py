@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+import logging
+import os
+from datetime import datetime, timedelta
+from random import Random
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import main, TestCase
+
+# Zato
+from zato.common.util.stats import QuantileSketch
+from zato.server.connection.connector.subprocess_.impl.events.database import EventsDatabase, OpCode, PartitionBy
+from zato.server.connection.connector.subprocess_.impl.events.rollup import Granularity
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+logger = logging.getLogger('zato')
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+utcnow = datetime.utcnow
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class QuantileSketchTestCase(TestCase):
+
+    def test_quantiles_are_within_accuracy(self):
+
+        random = Random(1)
+        values = sorted(random.expovariate(1 / 50) for _ in range(10_000))
+
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+
+        for q in 0.5, 0.9, 0.99:
+            expected = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q), expected, delta=expected * 0.01)
+
+# ################################################################################################################################
+
+    def test_merge_and_round_trip(self):
+
+        sketch1 = QuantileSketch()
+        sketch2 = QuantileSketch()
+
+        for value in range(100):
+            sketch1.add(value)
+            sketch2.add(value + 100)
+
+        sketch1.merge(sketch2)
+        self.assertEqual(sketch1.count, 200)
+        self.assertEqual(sketch1.zero_count, 1)
+
+        restored = QuantileSketch.from_bytes(sketch1.to_bytes())
+        self.assertEqual(restored.count, 200)
+
+        for q in 0, 0.5, 0.99, 1:
+            self.assertEqual(restored.quantile(q), sketch1.quantile(q))
+
+        with self.assertRaises(ValueError):
+            sketch1.merge(QuantileSketch(relative_accuracy=0.05))
+
+# ################################################################################################################################
+
+    def test_empty_and_collapsed(self):
+
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+        sketch = QuantileSketch(max_buckets=10)
+        for value in range(1, 1000):
+            sketch.add(value)
+
+        # The lowest buckets are collapsed whereas the highest quantiles are still accurate
+        self.assertEqual(len(sketch.counts), 10)
+        self.assertAlmostEqual(sketch.quantile(1), 999, delta=999 * 0.01)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class RollupTestCase(TestCase):
+
+    def setUp(self):
+        self.base_dir = mkdtemp(prefix='zato-test-events-db')
+        self.fs_data_path = os.path.join(self.base_dir, 'zato.events')
+
+        # All the events are from the previous day so that none of them is in a partition that is still open
+        self.start = (utcnow() - timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    def tearDown(self):
+        rmtree(self.base_dir, ignore_errors=True)
+
+    def get_events_db(self):
+        return EventsDatabase(logger, self.fs_data_path, 1_000_000, 1_000_000, partition_by=PartitionBy.Hour)
+
+    def push(self, events_db, timestamp, object_id='service-1', total_time_ms=10):
+        events_db.access_state(OpCode.Push, {
+            'timestamp': timestamp.isoformat(),
+            'object_id': object_id,
+            'total_time_ms': total_time_ms,
+        })
+
+# ################################################################################################################################
+
+    def test_rollups_merged_across_syncs(self):
+
+        events_db = self.get_events_db()
+
+        # Each sync saves a part of the same rollups ..
+        for idx in range(3):
+            self.push(events_db, self.start + timedelta(seconds=idx), total_time_ms=10 * (idx + 1))
+            self.push(events_db, self.start + timedelta(seconds=idx), object_id='service-2', total_time_ms=5)
+            events_db.sync_state()
+
+        # .. and the parts are merged when they are read ..
+        tabulated = events_db.get_table(self.start).to_dict()
+
+        self.assertEqual(tabulated['service-1']['item_total_usage'], 3)
+        self.assertEqual(tabulated['service-1']['item_total_time'], 60)
+        self.assertEqual(tabulated['service-1']['item_min'], 10)
+        self.assertEqual(tabulated['service-1']['item_max'], 30)
+        self.assertEqual(tabulated['service-1']['item_mean'], 20)
+        self.assertEqual(tabulated['service-2']['item_total_usage'], 3)
+
+        # .. as well as when they are compacted, here, rollups of minutes from a day that already ended.
+        events_db.compact_partitions()
+
+        storage = events_db.rollups.storage[Granularity.Minute]
+        partition_list = storage.get_partition_list()
+
+        self.assertEqual(len(partition_list), 1)
+        self.assertEqual(len(storage.get_partition_file_list(partition_list[0])), 1)
+        self.assertEqual(len(storage.load()), 2)
+
+        tabulated = events_db.get_table(self.start).to_dict()
+        self.assertEqual(tabulated['service-1']['item_total_usage'], 3)
+
+# ################################################################################################################################
+
+    def test_get_trend(self):
+
+        events_db = self.get_events_db()
+
+        for minute in range(3):
+            for _ in range(minute + 1):
+                self.push(events_db, self.start + timedelta(minutes=minute), total_time_ms=100)
+
+        events_db.sync_state()
+
+        # This one is only in RAM
+        self.push(events_db, self.start + timedelta(minutes=3), total_time_ms=200)
+
+        trend = events_db.get_trend(Granularity.Minute, self.start, self.start + timedelta(minutes=3))
+        trend = trend['service-1']
+
+        self.assertListEqual([bucket for bucket, _ in trend], [
+            (self.start + timedelta(minutes=minute)).isoformat()[:16] for minute in range(3)])
+        self.assertListEqual([stats['item_total_usage'] for _, stats in trend], [1, 2, 3])
+        self.assertAlmostEqual(trend[0][1]['item_p99'], 100, delta=1)
+
+        trend = events_db.get_trend(Granularity.Hour)
+        self.assertEqual(len(trend['service-1']), 1)
+        self.assertEqual(trend['service-1'][0][1]['item_total_usage'], 7)
+        self.assertEqual(trend['service-1'][0][1]['item_max'], 200)
+
+# ################################################################################################################################
+
+    def test_rollups_built_from_raw_events(self):
+
+        events_db = self.get_events_db()
+
+        for idx in range(5):
+            self.push(events_db, self.start + timedelta(minutes=idx), total_time_ms=idx)
+
+        events_db.sync_state()
+
+        # Only raw events are kept now ..
+        rmtree(os.path.join(self.fs_data_path, 'rollup'))
+
+        # .. so the rollups are built out of them again.
+        events_db = self.get_events_db()
+        tabulated = events_db.get_table().to_dict()
+
+        self.assertEqual(tabulated['service-1']['item_total_time'], 10)
+
+        # The event that took no time at all is not counted as usage
+        self.assertEqual(tabulated['service-1']['item_total_usage'], 4)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################
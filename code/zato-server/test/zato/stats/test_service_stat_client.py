@@ -12,7 +12,8 @@ from unittest import main, TestCase
 # Zato
 from zato.common.test import rand_int, rand_string
 from zato.common.events.client import Client as EventsClient
-from zato.common.events.common import EventInfo
+from zato.common.events.common import Action, decode_push_batch, decode_push_batch_len, encode_push_batch, EventInfo, \
+     LenBatchLen
 from zato.server.connection.stats import ServiceStatsClient
 
 # ################################################################################################################################
@@ -34,8 +35,9 @@ class TestImplClass(EventsClient):
         self.host = host
         self.port = port
 
-        self.push_counter      = 0
-        self.is_run_called     = False
+        self.push_counter       = 0
+        self.push_batch_counter = 0
+        self.is_run_called      = False
         self.is_connect_called = False
 
 # ################################################################################################################################
@@ -53,6 +55,12 @@ class TestImplClass(EventsClient):
     def push(self, *args, **kwargs):
         self.push_counter += 1
 
+# ################################################################################################################################
+
+    def push_batch(self, ctx_list):
+        self.push_counter += len(ctx_list)
+        self.push_batch_counter += 1
+
 # ################################################################################################################################
 
     def close(self):
@@ -258,8 +266,8 @@ class ServiceStatsClientTestCase(TestCase):
 
     def test_push_has_impl(self):
 
-        # The client has self.impl so there should be no enqueued messages. Moreover, the implementation
-        # should be called twice because there are two requests.
+        # The client has self.impl but messages are still enqueued until they are flushed. Moreover, the implementation
+        # should be called once, with both of the requests in a single batch.
 
         host = rand_string()
         port = rand_int()
@@ -302,8 +310,66 @@ class ServiceStatsClientTestCase(TestCase):
         stats_client.push(**request1)
         stats_client.push(**request2)
 
+        self.assertEqual(len(stats_client.backlog), 2)
+        self.assertEqual(stats_client.impl.push_counter, 0)
+
+        stats_client.flush()
+
         self.assertEqual(len(stats_client.backlog), 0)
         self.assertEqual(stats_client.impl.push_counter, 2)
+        self.assertEqual(stats_client.impl.push_batch_counter, 1)
+        self.assertEqual(stats_client.pushed_count, 2)
+
+# ################################################################################################################################
+
+    def test_push_backlog_full(self):
+
+        stats_client = ServiceStatsClient(impl_class=TestImplClass, batch_size=2, max_backlog=3)
+        stats_client.init(rand_string(), rand_int())
+
+        for _ in range(5):
+            stats_client.push(rand_string(), rand_string(), rand_string(), True, rand_int())
+
+        # Events that did not fit in the backlog are dropped ..
+        self.assertEqual(len(stats_client.backlog), 3)
+        self.assertEqual(stats_client.dropped_count, 2)
+        self.assertTrue(stats_client.has_full_batch.is_set())
+
+        # .. and the rest is sent in batches of up to batch_size events.
+        stats_client.flush()
+
+        self.assertEqual(stats_client.impl.push_counter, 3)
+        self.assertEqual(stats_client.impl.push_batch_counter, 2)
+
+# ################################################################################################################################
+
+    def test_push_batch_round_trip(self):
+
+        stats_client = ServiceStatsClient()
+
+        for idx in range(3):
+            stats_client.push(rand_string(), rand_string(), 'service-{}'.format(idx), idx % 2 == 0, idx)
+
+        frame = encode_push_batch(stats_client.backlog)
+
+        # The frame begins with its action and length ..
+        self.assertTrue(frame.startswith(Action.PushBatch))
+
+        header_end = Action.LenAction + LenBatchLen
+        payload = frame[header_end:]
+
+        self.assertEqual(decode_push_batch_len(frame[Action.LenAction:header_end]), len(payload))
+
+        # .. followed by all the events.
+        events = decode_push_batch(payload)
+        self.assertEqual(len(events), 3)
+
+        for ctx, event in zip(stats_client.backlog, events):
+            self.assertEqual(event['id'], ctx.id)
+            self.assertEqual(event['object_id'], ctx.object_id)
+            self.assertEqual(event['event_type'], ctx.event_type)
+            self.assertEqual(event['total_time_ms'], ctx.total_time_ms)
+            self.assertIsNone(event['source_type'])
 
 # ################################################################################################################################
 
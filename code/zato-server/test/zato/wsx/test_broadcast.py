@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Copyright (C) 2023, Zato Source s.r.o. https://zato.io
+
+Licensed under LGPLv3, see LICENSE.txt for terms and conditions.
+"""
+
+# stdlib
+from unittest import main, TestCase
+
+# Bunch
+from bunch import Bunch
+
+# gevent
+from gevent import sleep
+
+# orjson
+from orjson import dumps, loads
+
+# Zato
+from zato.server.connection.web_socket import WebSocketContainer
+from zato.server.connection.web_socket.broadcast import BroadcastEngine
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if 0:
+    from zato.common.typing_ import any_, anylist
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class TestClient:
+    """ Records what was sent to it instead of writing it to a socket.
+    """
+    def __init__(self, container:'WebSocketContainer', pub_client_id:'str', send_time:'float'=0, **client_attrs:'any_') -> 'None':
+        self.container = container
+        self.pub_client_id = pub_client_id
+        self.send_time = send_time
+        self.client_attrs = {}
+        self.frames = [] # type: anylist
+        self.slow_consumer_count = 0
+        self.has_send_error = False
+
+        self.container.clients[pub_client_id] = self
+        self.container.set_client_attrs(self, client_attrs) # type: ignore
+
+    def _json_dump_func(self, data:'any_') -> 'bytes':
+        self.container.dumps_count += 1 # type: ignore
+        return dumps(data)
+
+    def send_frame(self, cid:'str', frame:'bytes', data:'any_') -> 'None':
+
+        if self.has_send_error:
+            raise ConnectionError('Test error')
+
+        self.container.in_progress += 1 # type: ignore
+        self.container.max_in_progress = max(self.container.max_in_progress, self.container.in_progress) # type: ignore
+
+        sleep(self.send_time)
+        self.frames.append(frame)
+
+        self.container.in_progress -= 1 # type: ignore
+
+    def on_slow_consumer(self, queue_size:'int') -> 'None':
+        self.slow_consumer_count += 1
+
+    def get_data(self) -> 'anylist':
+
+        out = []
+
+        # Server frames are never masked and our test messages are shorter than 126 bytes,
+        # which means that each frame has a header of two bytes, followed by its payload.
+        for frame in self.frames:
+            out.append(loads(frame[2:])['data'])
+
+        return out
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+class BroadcastTestCase(TestCase):
+
+    def get_container(self, **kwargs:'any_') -> 'WebSocketContainer':
+
+        container = WebSocketContainer.__new__(WebSocketContainer)
+        container.config = Bunch(name='test.channel') # type: ignore
+        container.clients = {}
+        container.client_attrs_index = {}
+        container.broadcast_engine = BroadcastEngine(**kwargs)
+
+        container.dumps_count = 0     # type: ignore
+        container.in_progress = 0     # type: ignore
+        container.max_in_progress = 0 # type: ignore
+
+        return container
+
+# ################################################################################################################################
+
+    def test_message_is_serialised_once(self) -> 'None':
+
+        container = self.get_container()
+        clients = [TestClient(container, 'ws.{}'.format(idx)) for idx in range(50)]
+
+        container.broadcast('cid.1', {'value': 1})
+        sleep(0.1)
+
+        # There was only one serialisation and each client received the same bytes
+        self.assertEqual(container.dumps_count, 1) # type: ignore
+        self.assertEqual(len({client.frames[0] for client in clients}), 1)
+
+        # Each of these is a single text frame
+        frame = clients[0].frames[0]
+        self.assertEqual(frame[0], 0x81)
+        self.assertListEqual(clients[0].get_data(), [{'value': 1}])
+
+        self.assertEqual(container.get_broadcast_stats()['total_sent'], 50)
+
+# ################################################################################################################################
+
+    def test_invoke_client_by_attrs(self) -> 'None':
+
+        container = self.get_container()
+
+        client1 = TestClient(container, 'ws.1', region='eu', tier=1)
+        client2 = TestClient(container, 'ws.2', region='us', tier=1)
+        client3 = TestClient(container, 'ws.3', region='us', tier=2)
+
+        container.invoke_client_by_attrs('cid.1', {'region': 'us'}, {'value': 1}, 5)
+        container.invoke_client_by_attrs('cid.2', {'region': 'eu', 'tier': 2}, {'value': 2}, 5)
+        sleep(0.1)
+
+        # A client is invoked if it has any of the attributes expected
+        self.assertListEqual(client1.get_data(), [{'value': 2}])
+        self.assertListEqual(client2.get_data(), [{'value': 1}])
+        self.assertListEqual(client3.get_data(), [{'value': 1}, {'value': 2}])
+
+        # Clients that are removed or change their attributes are removed from the index too
+        container.remove_client(client1) # type: ignore
+        container.set_client_attrs(client2, {'region': 'ap'}) # type: ignore
+
+        self.assertNotIn(('region', 'eu'), container.client_attrs_index)
+        self.assertNotIn(('tier', 1), container.client_attrs_index)
+        self.assertSetEqual(container.client_attrs_index[('region', 'us')], {'ws.3'})
+        self.assertSetEqual(container.client_attrs_index[('region', 'ap')], {'ws.2'})
+
+# ################################################################################################################################
+
+    def test_concurrency_is_bounded(self) -> 'None':
+
+        container = self.get_container(pool_size=2)
+        clients = [TestClient(container, 'ws.{}'.format(idx), send_time=0.05) for idx in range(6)]
+
+        container.broadcast('cid.1', {'value': 1})
+        sleep(0.4)
+
+        self.assertEqual(container.max_in_progress, 2) # type: ignore
+        self.assertTrue(all(len(client.frames) == 1 for client in clients))
+
+# ################################################################################################################################
+
+    def test_slow_consumer_is_dropped(self) -> 'None':
+
+        container = self.get_container(queue_size=3)
+
+        fast = TestClient(container, 'ws.fast')
+        slow = TestClient(container, 'ws.slow', send_time=10)
+
+        # Each message is broadcast after the previous one could have been sent
+        for idx in range(10):
+            container.broadcast('cid.{}'.format(idx), {'value': idx})
+            sleep(0.01)
+
+        # The fast client received all the messages in the order they were broadcast in ..
+        self.assertListEqual(fast.get_data(), [{'value': idx} for idx in range(10)])
+
+        # .. whereas the slow one was told that it could not keep up, only once, and nothing more is queued for it.
+        self.assertEqual(slow.slow_consumer_count, 1)
+        self.assertEqual(container.get_broadcast_stats()['total_dropped'], 1)
+        self.assertEqual(len(container.broadcast_engine.queues['ws.slow'].items), 0)
+
+# ################################################################################################################################
+
+    def test_send_error(self) -> 'None':
+
+        container = self.get_container()
+
+        client1 = TestClient(container, 'ws.1')
+        client2 = TestClient(container, 'ws.2')
+        client2.has_send_error = True
+
+        container.broadcast('cid.1', {'value': 1})
+        container.broadcast('cid.2', {'value': 2})
+        sleep(0.1)
+
+        self.assertListEqual(client1.get_data(), [{'value': 1}, {'value': 2}])
+        self.assertTrue(container.broadcast_engine.queues['ws.2'].is_dropped)
+
+# ################################################################################################################################
+# ################################################################################################################################
+
+if __name__ == '__main__':
+    _ = main()
+
+# ################################################################################################################################
+# ################################################################################################################################